@@ -9,11 +9,17 @@ from __future__ import unicode_literals
 import sys
 
 import collections
+import contextlib
 import copy
+import datetime
 import json
 import itertools
 import logging
 import shlex
+import threading
+import time
+
+from concurrent import futures
 
 import ldap3
 from ldap3.core import exceptions as ldap_exceptions
@@ -62,6 +68,29 @@ _TREADMILL_OBJCLS_OID_PREFIX = '1.3.6.1.4.1.360.10.6.2.'
 DEFAULT_PARTITION = '_default'
 DEFAULT_TENANT = '_default'
 
+# Paged searches start with small pages, so that lookups of a few entries are
+# cheap, and double the page size on each round trip up to the maximum.
+_PAGE_SIZE_MIN = 50
+_PAGE_SIZE_MAX = 1000
+
+_PAGED_RESULTS_CONTROL = '1.2.840.113556.1.4.319'
+
+# Interval between polls of the entries modified since the last poll, when
+# the search cache is enabled.
+_CACHE_POLL_INTERVAL = 5
+
+# LDAP GeneralizedTime format of modifyTimestamp.
+_GENERALIZED_TIME = '%Y%m%d%H%M%SZ'
+
+
+def generalized_time(timestamp):
+    """Format a timestamp as LDAP GeneralizedTime, e.g. for filtering on
+    modifyTimestamp.
+    """
+    return datetime.datetime.utcfromtimestamp(timestamp).strftime(
+        _GENERALIZED_TIME
+    )
+
 
 def _to_bool(value):
     """Fuzzy converion of string/int to bool."""
@@ -485,6 +514,211 @@ class AndQuery:
         return query
 
 
+class _ConnectionPool:
+    """Pool of bound LDAP connections.
+
+    Connections are created on demand, up to the pool size, spreading them
+    round-robin across the server URIs. A connection is used by one thread at
+    a time: get blocks until a connection is idle or can be created.
+    """
+
+    __slots__ = (
+        '_connect',
+        '_uris',
+        '_size',
+        '_next_uri',
+        '_conns',
+        '_idle',
+        '_pending',
+        '_cond',
+    )
+
+    def __init__(self, connect, uris, size):
+        self._connect = connect
+        self._uris = list(uris)
+        self._size = max(size, 1)
+        self._next_uri = 0
+        self._conns = []
+        self._idle = []
+        self._pending = 0
+        self._cond = threading.Condition()
+
+    @property
+    def size(self):
+        """Maximum number of connections."""
+        return self._size
+
+    def get(self):
+        """Get an idle connection, creating one if the pool is not full."""
+        with self._cond:
+            while not self._idle:
+                if len(self._conns) + self._pending < self._size:
+                    self._pending += 1
+                    start = self._next_uri
+                    self._next_uri = (start + 1) % len(self._uris)
+                    break
+                self._cond.wait()
+            else:
+                return self._idle.pop()
+
+        conn = None
+        try:
+            # Start with the next server, fail over to the others.
+            for idx in six.moves.range(len(self._uris)):
+                uri = self._uris[(start + idx) % len(self._uris)]
+                conn = self._connect(uri)
+                if conn is not None:
+                    _LOGGER.debug('New pooled connection to %s', uri)
+                    break
+        finally:
+            with self._cond:
+                self._pending -= 1
+                if conn is not None:
+                    self._conns.append(conn)
+                self._cond.notify()
+
+        if conn is None:
+            raise ldap_exceptions.LDAPBindError(
+                'Failed to connect to any LDAP server: {}'.format(
+                    ', '.join(self._uris)
+                )
+            )
+        return conn
+
+    def put(self, conn):
+        """Return a connection to the pool."""
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        """Unbind all the connections."""
+        with self._cond:
+            conns, self._conns, self._idle = self._conns, [], []
+
+        for conn in conns:
+            try:
+                conn.unbind()
+            except ldap_exceptions.LDAPCommunicationError:
+                _LOGGER.exception('cannot close connection.')
+
+
+class _SearchCache:
+    """Read-through cache of LDAP search results.
+
+    Results are keyed by search base, filter, scope and attributes, and the
+    entries are also indexed by DN. Cached data is dropped when it is older
+    than the TTL, when the entry is written through the admin connection, or
+    when polling the entries by modifyTimestamp reports it was modified.
+
+    Each poll looks back one TTL before the previous poll, which covers the
+    replication delays and clock skew between the servers and the client.
+    """
+
+    __slots__ = (
+        '_ttl',
+        '_poll_interval',
+        '_poll',
+        '_searches',
+        '_entries',
+        '_last_poll',
+        '_lock',
+    )
+
+    def __init__(self, ttl, poll_interval, poll):
+        self._ttl = ttl
+        self._poll_interval = poll_interval
+        self._poll = poll
+        self._searches = {}
+        self._entries = {}
+        self._last_poll = time.time()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get cached search results, None if not cached."""
+        self._poll_changes()
+        with self._lock:
+            cached = self._searches.get(key)
+            if cached is None:
+                return None
+            results, timestamp = cached
+            if time.time() - timestamp > self._ttl:
+                del self._searches[key]
+                return None
+            return results
+
+    def put(self, key, results, attributes):
+        """Cache search results."""
+        now = time.time()
+        attrs = (
+            None if attributes is None
+            else frozenset(attr.lower() for attr in attributes)
+        )
+        with self._lock:
+            self._searches[key] = (results, now)
+            for dn, entry in results:
+                self._entries[dn.lower()] = (entry, attrs, now)
+
+    def entry(self, dn, attributes):
+        """Get the cached entry of a DN, restricted to the given attributes.
+
+        Returns None unless the entry is cached with all the attributes.
+        """
+        self._poll_changes()
+        with self._lock:
+            cached = self._entries.get(dn.lower())
+        if cached is None:
+            return None
+
+        entry, attrs, timestamp = cached
+        if time.time() - timestamp > self._ttl:
+            return None
+
+        wanted = set(attr.lower() for attr in attributes)
+        if attrs is not None and not wanted <= attrs:
+            return None
+
+        # Values with options (attr;opt) are returned with their attribute.
+        return {
+            attr: value
+            for attr, value in six.iteritems(entry)
+            if attr.split(';', 1)[0].lower() in wanted
+        }
+
+    def invalidate(self, dn):
+        """Drop the entry of a DN and the searches that may return it."""
+        dn = dn.lower()
+        with self._lock:
+            self._entries.pop(dn, None)
+            for key in list(self._searches):
+                base = key[0]
+                if dn == base or dn.endswith(',' + base):
+                    del self._searches[key]
+
+    def _poll_changes(self):
+        """Invalidate the entries modified since the last poll."""
+        with self._lock:
+            now = time.time()
+            if now - self._last_poll < self._poll_interval:
+                return
+            since = generalized_time(self._last_poll - self._ttl)
+            self._last_poll = now
+
+        try:
+            changed = self._poll(since)
+        except ldap_exceptions.LDAPException:
+            _LOGGER.warning('Failed to poll LDAP changes, clearing cache.',
+                            exc_info=True)
+            with self._lock:
+                self._searches.clear()
+                self._entries.clear()
+            return
+
+        for dn in changed:
+            _LOGGER.debug('Modified: %s', dn)
+            self.invalidate(dn)
+
+
 class Admin:
     """Manages Treadmill objects in ldap.
     """
@@ -493,7 +727,9 @@ class Admin:
     # pylint: disable=too-many-statements
 
     def __init__(self, uri, ldap_suffix,
-                 user=None, password=None, connect_timeout=5, write_uri=None):
+                 user=None, password=None, connect_timeout=5, write_uri=None,
+                 pool_size=1, page_size=_PAGE_SIZE_MAX, cache_ttl=0,
+                 cache_poll_interval=_CACHE_POLL_INTERVAL):
         self.uri = uri
         self.write_uri = write_uri
 
@@ -502,20 +738,35 @@ class Admin:
         self.user = user
         self.password = password
         self._connect_timeout = connect_timeout
+        self._pool_size = pool_size
+        self._page_size = max(page_size, _PAGE_SIZE_MIN)
 
         self.ldap = None
         self.write_ldap = None
+        self._pool = None
+        # The write connection is shared by all threads, its users take turns.
+        self._write_lock = threading.RLock()
+
+        self._cache = None
+        if cache_ttl:
+            self._cache = _SearchCache(
+                cache_ttl, cache_poll_interval, self._changed_since
+            )
 
     def close(self):
         """Closes ldap connection."""
-        try:
-            if self.ldap:
-                self.ldap.unbind()
-        except ldap_exceptions.LDAPCommunicationError:
-            _LOGGER.exception('cannot close connection.')
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        else:
+            try:
+                if self.ldap:
+                    self.ldap.unbind()
+            except ldap_exceptions.LDAPCommunicationError:
+                _LOGGER.exception('cannot close connection.')
 
         try:
-            if self.write_ldap:
+            if self.write_ldap and self.write_ldap is not self.ldap:
                 self.write_ldap.unbind()
         except ldap_exceptions.LDAPCommunicationError:
             _LOGGER.exception('cannot close connection.')
@@ -572,24 +823,19 @@ class Admin:
             _LOGGER.debug('Closing existing connections before connect')
             self.close()
 
-        for uri in self.uri:
-            ldap_connection = self._connect_to_uri(uri)
-            if ldap_connection is not None:
-                self.ldap = ldap_connection
-                break
-
-        if not self.ldap:
-            raise ldap_exceptions.LDAPBindError(
-                'Failed to connect to any LDAP server: {}'.format(
-                    ', '.join(self.uri)
-                )
-            )
-
-        if not self.write_uri:
-            self.write_ldap = self.ldap
-            return
+        # The first connection is created eagerly, the others when searches
+        # run concurrently.
+        self._pool = _ConnectionPool(
+            self._connect_to_uri, self.uri, self._pool_size
+        )
+        self.ldap = self._pool.get()
+        self._pool.put(self.ldap)
 
-        for write_uri in self.write_uri:
+        # Writes (and dirty searches) use their own connection, kept out of
+        # the pool, so that pooled searches never run on it concurrently.
+        write_uris = self.write_uri or self.uri
+        self.write_ldap = None
+        for write_uri in write_uris:
             ldap_connection = self._connect_to_uri(write_uri)
             if ldap_connection is not None:
                 self.write_ldap = ldap_connection
@@ -598,56 +844,144 @@ class Admin:
         if not self.write_ldap:
             raise ldap_exceptions.LDAPBindError(
                 'Failed to connect to any LDAP server: {}'.format(
-                    ', '.join(self.write_uri)
+                    ', '.join(write_uris)
                 )
             )
 
+    @contextlib.contextmanager
+    def _connection(self, dirty):
+        """Borrow a connection to run a search."""
+        # If entries in the potential search results were written or modified
+        # recently, we use the connection to the write server to avoid problems
+        # with replication delays between provider and consumer
+        if dirty:
+            with self._write_lock:
+                yield self.write_ldap
+        elif self._pool is None:
+            yield self.ldap
+        else:
+            ldap = self._pool.get()
+            try:
+                yield ldap
+            finally:
+                self._pool.put(ldap)
+
     def search(self, search_base, search_filter,
                search_scope=ldap3.SUBTREE, attributes=None, dirty=False):
         """Call ldap search and return a generator of dn, entry tuples.
         """
-        # If entries in the potential search results were written or modified
-        # recently, we use the connection to the write server to avoid problems
-        # with replication delays between provider and consumer
-        ldap = self.write_ldap if dirty else self.ldap
-
-        ldap.result = None
-        ldap.search(
-            search_base=search_base,
-            search_filter=search_filter,
-            search_scope=search_scope,
-            attributes=attributes,
-            dereference_aliases=ldap3.DEREF_NEVER
-        )
-        self._test_raise_exceptions(ldap)
+        with self._connection(dirty) as ldap:
+            ldap.result = None
+            ldap.search(
+                search_base=search_base,
+                search_filter=search_filter,
+                search_scope=search_scope,
+                attributes=attributes,
+                dereference_aliases=ldap3.DEREF_NEVER
+            )
+            self._test_raise_exceptions(ldap)
 
-        for entry in ldap.response:
-            yield entry['dn'], entry['attributes']
+            for entry in ldap.response:
+                yield entry['dn'], entry['attributes']
 
     def paged_search(self, search_base, search_filter,
                      search_scope=ldap3.SUBTREE, attributes=None, dirty=False):
-        """Call ldap paged search and return a generator of dn, entry tuples.
+        """Call ldap paged search and return an iterator of dn, entry tuples.
+
+        Results are served from the search cache, if enabled, unless dirty.
         """
-        # If entries in the potential search results were written or modified
-        # recently, we use the connection to the write server to avoid problems
-        # with replication delays between provider and consumer
-        ldap = self.write_ldap if dirty else self.ldap
-
-        ldap.result = None
-        res_gen = ldap.extend.standard.paged_search(
-            search_base=search_base,
-            search_filter=search_filter,
-            search_scope=search_scope,
-            attributes=attributes,
-            dereference_aliases=ldap3.DEREF_NEVER,
-            paged_size=50,
-            paged_criticality=True,
-            generator=True
+        if dirty or self._cache is None:
+            return self._paged_search(search_base, search_filter,
+                                      search_scope, attributes, dirty)
+
+        key = (
+            search_base.lower(),
+            six.text_type(search_filter),
+            search_scope,
+            tuple(attributes) if attributes is not None else None,
         )
-        self._test_raise_exceptions(ldap)
+        result = self._cache.get(key)
+        if result is None:
+            result = list(self._paged_search(search_base, search_filter,
+                                             search_scope, attributes))
+            self._cache.put(key, result, attributes)
+        return iter(result)
+
+    def _paged_search(self, search_base, search_filter,
+                      search_scope=ldap3.SUBTREE, attributes=None,
+                      dirty=False):
+        """Paged search, generator of dn, entry tuples.
+
+        The page size starts at _PAGE_SIZE_MIN and doubles with each page,
+        up to the configured page size.
+        """
+        with self._connection(dirty) as ldap:
+            ldap.result = None
+            paged_size = _PAGE_SIZE_MIN
+            cookie = None
+            while True:
+                ldap.search(
+                    search_base=search_base,
+                    search_filter=search_filter,
+                    search_scope=search_scope,
+                    attributes=attributes,
+                    dereference_aliases=ldap3.DEREF_NEVER,
+                    paged_size=paged_size,
+                    paged_criticality=True,
+                    paged_cookie=cookie
+                )
+                response, result = ldap.response or [], ldap.result or {}
+
+                for entry in response:
+                    if entry.get('type', 'searchResEntry') == 'searchResEntry':
+                        yield entry['dn'], entry['attributes']
+
+                try:
+                    cookie = result['controls'][_PAGED_RESULTS_CONTROL][
+                        'value']['cookie']
+                except KeyError:
+                    cookie = None
+                if not cookie:
+                    break
+
+                paged_size = min(paged_size * 2, self._page_size)
+
+            ldap.response = None
+
+    def _changed_since(self, since):
+        """List the DNs of the entries modified since the given time."""
+        return [
+            dn
+            for dn, _entry in self._paged_search(
+                search_base=self.root_ou,
+                search_filter='(modifyTimestamp>={})'.format(since),
+                attributes=['modifyTimestamp'],
+            )
+        ]
+
+    def _invalidate(self, dn):
+        """Drop cached data of a DN that was written."""
+        if self._cache is not None:
+            self._cache.invalidate(dn)
+
+    def search_many(self, searches, dirty=False):
+        """Run independent paged searches concurrently.
+
+        :param searches:
+            List of paged_search keyword arguments.
+        :returns:
+            List of lists of dn, entry tuples, in the order of the searches.
+        """
+        def _search(kwargs):
+            return list(self.paged_search(dirty=dirty, **kwargs))
 
-        for entry in res_gen:
-            yield entry['dn'], entry['attributes']
+        # Dirty searches all go to the write server connection.
+        if dirty or self._pool is None or len(searches) < 2:
+            return [_search(kwargs) for kwargs in searches]
+
+        workers = min(self._pool.size, len(searches))
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_search, searches))
 
     def _test_raise_exceptions(self, ldap=None):
         """
@@ -681,8 +1015,10 @@ class Admin:
     def modify(self, dn, changes):
         """Call ldap modify and raise exception on non-success."""
         if changes:
-            self.write_ldap.modify(dn, changes)
-            self._test_raise_exceptions(self.write_ldap)
+            with self._write_lock:
+                self.write_ldap.modify(dn, changes)
+                self._invalidate(dn)
+                self._test_raise_exceptions(self.write_ldap)
 
     def add(self, dn, object_class=None, attributes=None):
         """Call ldap add and raise exception on non-success."""
@@ -690,13 +1026,17 @@ class Admin:
             (k, v)
             for k, v in six.iteritems(attributes)
         )) if attributes else None
-        self.write_ldap.add(dn, object_class, sorted_attributes)
-        self._test_raise_exceptions(self.write_ldap)
+        with self._write_lock:
+            self.write_ldap.add(dn, object_class, sorted_attributes)
+            self._invalidate(dn)
+            self._test_raise_exceptions(self.write_ldap)
 
     def delete(self, dn):
         """Call ldap delete and raise exception on non-success."""
-        self.write_ldap.delete(dn)
-        self._test_raise_exceptions(self.write_ldap)
+        with self._write_lock:
+            self.write_ldap.delete(dn)
+            self._invalidate(dn)
+            self._test_raise_exceptions(self.write_ldap)
 
     def list(self, root=None, dirty=False):
         """Lists all objects in the database."""
@@ -1032,11 +1372,15 @@ class Admin:
     def update(self, dn, new_entry):
         """Creates LDAP record."""
         _LOGGER.debug('update: %s - %s', dn, new_entry)
-        old_entry = self.get(
-            dn,
-            '(objectClass=*)',
-            _entry_plain_keys(new_entry)
-        )
+        old_entry = None
+        if self._cache is not None:
+            old_entry = self._cache.entry(dn, _entry_plain_keys(new_entry))
+        if old_entry is None:
+            old_entry = self.get(
+                dn,
+                '(objectClass=*)',
+                _entry_plain_keys(new_entry)
+            )
         diff = _diff_entries(old_entry, new_entry)
 
         self.modify(dn, diff)
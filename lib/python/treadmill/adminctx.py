@@ -17,12 +17,25 @@ from treadmill import context
 
 _LOGGER = logging.getLogger(__name__)
 
+# Maximum number of concurrent read connections, created on demand.
+_POOL_SIZE = 4
+
+# TTL of the search cache of new connections, disabled if 0.
+_CACHE_TTL = 0
+
+
+def enable_cache(ttl):
+    """Enable the search cache of the connections, with the given TTL."""
+    global _CACHE_TTL  # pylint: disable=global-statement
+    _CACHE_TTL = ttl
+
 
 def connect(uri, write_uri, ldap_suffix, user, password):
     """Connect to from parent context parameters."""
     _LOGGER.debug('Connecting to LDAP %s, %s', uri, ldap_suffix)
     conn = admin.Admin(uri, ldap_suffix, write_uri=write_uri,
-                       user=user, password=password)
+                       user=user, password=password, pool_size=_POOL_SIZE,
+                       cache_ttl=_CACHE_TTL)
     conn.connect()
     return conn
 
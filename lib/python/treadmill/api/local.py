@@ -19,6 +19,7 @@ import re
 import shutil
 import tarfile
 import tempfile
+import threading
 
 import six
 from six.moves import _thread
@@ -30,6 +31,17 @@ from treadmill import rrdutils
 
 _LOGGER = lc.ContainerAdapter(logging.getLogger(__name__))
 
+# Size of the blocks read when seeking and streaming log files.
+_BLOCK_SIZE = 64 * 1024
+
+# The line index of a log file records the offset of every _INDEX_STRIDE-th
+# line. Indexes of the last _MAX_INDEXES files read are kept.
+_INDEX_STRIDE = 1000
+_MAX_INDEXES = 128
+
+_LINE_INDEXES = collections.OrderedDict()
+_LINE_INDEXES_LOCK = threading.Lock()
+
 
 def _app_path(tm_env, instance, uniq):
     """Return application path given app env, app id and uniq."""
@@ -140,24 +152,119 @@ def _abs_log_dir_path(tm_env, instance, uniq, rel_log_dir_path):
 
 
 def _concat_files(file_lst):
-    """Concatenate the files in file_lst and return a file-like obj."""
+    """Stream the files in file_lst, in order, as text blocks."""
     _LOGGER.info('Concatenating files: {}'.format(file_lst))
-    concatenated = io.BytesIO()
     for file_ in file_lst:
         # Do not abort if a file cannot be opened eg. when the oldest log
         # file is "rotated out" while this log retrieval op. is running
         try:
-            with io.open(file_, 'rb') as f:
-                shutil.copyfileobj(f, concatenated)
+            with io.open(file_, 'rt', encoding='utf-8', errors='ignore') as f:
+                for block in iter(functools.partial(f.read, _BLOCK_SIZE), ''):
+                    yield block
         except IOError as err:
             if err.errno == errno.ENOENT:
                 _LOGGER.info('File {} cannot be opened: {}'.format(file_, err))
             else:
                 raise
 
-    concatenated.seek(0)
 
-    return io.TextIOWrapper(concatenated, errors='ignore')
+def _lines_in_reverse(f):
+    """Iterate over the lines of a binary file, from the last one.
+
+    The file is read backwards in _BLOCK_SIZE blocks so that only the blocks
+    holding the lines consumed are read.
+    """
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    buf = b''
+    while pos > 0:
+        size = min(_BLOCK_SIZE, pos)
+        pos -= size
+        f.seek(pos)
+        buf = f.read(size) + buf
+
+        # The first line of the buffer may start in the previous block.
+        end = len(buf)
+        newline = buf.rfind(b'\n', 0, end - 1)
+        while newline >= 0:
+            yield buf[newline + 1:end].decode('utf-8', 'ignore')
+            end = newline + 1
+            newline = buf.rfind(b'\n', 0, end - 1)
+        buf = buf[:end]
+
+    if buf:
+        yield buf.decode('utf-8', 'ignore')
+
+
+class _LineIndex:
+    """Sparse index of the lines of a log file.
+
+    Records the offset of every _INDEX_STRIDE-th line, the index is extended
+    as the file grows.
+    """
+
+    __slots__ = (
+        'ident',
+        'lines',
+        'lock',
+        'offsets',
+        'size',
+    )
+
+    def __init__(self, ident):
+        self.ident = ident
+        self.lines = 0
+        self.lock = threading.Lock()
+        self.offsets = [0]
+        self.size = 0
+
+    def extend(self, f, line):
+        """Index the lines of the file up to line (or its end)."""
+        f.seek(self.size)
+        while self.lines < line:
+            block = f.read(_BLOCK_SIZE)
+            if not block:
+                break
+
+            pos = 0
+            needed = _INDEX_STRIDE - self.lines % _INDEX_STRIDE
+            while block.count(b'\n', pos) >= needed:
+                for _ in six.moves.range(needed):
+                    pos = block.index(b'\n', pos) + 1
+                self.lines += needed
+                self.offsets.append(self.size + pos)
+                needed = _INDEX_STRIDE
+
+            self.lines += block.count(b'\n', pos)
+            self.size += len(block)
+
+    def seek(self, f, line):
+        """Seek to the closest indexed line before line, return its number.
+        """
+        with self.lock:
+            self.extend(f, line)
+            mark = min(line // _INDEX_STRIDE, len(self.offsets) - 1)
+            f.seek(self.offsets[mark])
+            return mark * _INDEX_STRIDE
+
+
+def _line_index(f, path):
+    """Get the line index of an open log file.
+
+    The index is dropped if the file is replaced (rotated) or truncated.
+    """
+    stat = os.fstat(f.fileno())
+    ident = (stat.st_dev, stat.st_ino)
+    with _LINE_INDEXES_LOCK:
+        index = _LINE_INDEXES.pop(path, None)
+        if (index is None or index.ident != ident or
+                index.size > stat.st_size):
+            index = _LineIndex(ident)
+        _LINE_INDEXES[path] = index
+        while len(_LINE_INDEXES) > _MAX_INDEXES:
+            _LINE_INDEXES.popitem(last=False)
+
+    return index
 
 
 def _fragment(iterable, start=0, limit=None):
@@ -167,9 +274,6 @@ def _fragment(iterable, start=0, limit=None):
     The lowest index is 0 and designates the first line of the file.
     'Limit' specifies the number of lines to return.
     """
-    # TODO: Naive implementation. Needs to be rewritten to a solution with
-    # file pointer moving around etc. if it turns out that this isn't
-    # performant enough.
     if limit is not None and limit >= 0:
         try:
             fragment = collections.deque(maxlen=limit)
@@ -199,32 +303,6 @@ def _fragment(iterable, start=0, limit=None):
     return list(iterable)
 
 
-def _fragment_in_reverse(iterable, start=0, limit=None):
-    """
-    Selects a fragment of the iterable and returns the items in reverse order.
-
-    The lowest index is 0 and designates the last line of the file.
-    'Limit' specifies the number of lines to return.
-    """
-    # TODO: Naive implementation. Needs to be rewritten to a solution with
-    # file pointer moving around etc. if it turns out that this isn't
-    # performant enough.
-    maxlen = None
-    if limit is not None and limit >= 0:
-        maxlen = start + limit
-
-    fragment = collections.deque(iterable, maxlen)
-    try:
-        for _ in six.moves.range(start):
-            fragment.pop()
-    except IndexError:
-        raise exc.InvalidInputError(
-            __name__, 'Index start=%s is out of range.' % str(start))
-
-    fragment.reverse()
-    return fragment
-
-
 def mk_metrics_api(tm_env):
     """Factory to create metrics api.
     """
@@ -349,15 +427,19 @@ def mk_logapi(tm_env):
                             'Index cannot be less than 0, got: {}'.format(
                                 start))
 
-                    with io.open(log_f, 'rt', errors='ignore') as log:
+                    with io.open(log_f, 'rb') as log:
                         if order == 'desc':
-                            return _fragment_in_reverse(log, start, limit)
+                            return _fragment(_lines_in_reverse(log),
+                                             start, limit)
 
-                        return _fragment(log, start, limit)
+                        line = _line_index(log, log_f).seek(log, start)
+                        return _fragment(
+                            io.TextIOWrapper(log, encoding='utf-8',
+                                             errors='ignore'),
+                            start - line, limit)
 
             def _get_all(log_id):
-                """Return a file-like object with all the log entries including
-                the rotated ones.
+                """Stream all the log entries including the rotated ones.
                 """
                 instance, uniq, logtype, component = log_id.split('/')
 
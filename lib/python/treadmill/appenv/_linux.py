@@ -45,6 +45,8 @@ class LinuxAppEnvironment(appenv.AppEnvironment):
         'svc_localdisk_dir',
         'svc_network',
         'svc_network_dir',
+        'svc_port',
+        'svc_port_dir',
         'svc_presence',
         'svc_presence_dir',
     )
@@ -58,6 +60,7 @@ class LinuxAppEnvironment(appenv.AppEnvironment):
     SVC_CGROUP_DIR = 'cgroup_svc'
     SVC_LOCALDISK_DIR = 'localdisk_svc'
     SVC_NETWORK_DIR = 'network_svc'
+    SVC_PORT_DIR = 'port_svc'
     SVC_PRESENCE_DIR = 'presence_svc'
     RULES_DIR = 'rules'
     CTL_DIR = 'ctl'
@@ -81,6 +84,8 @@ class LinuxAppEnvironment(appenv.AppEnvironment):
                                               self.SVC_LOCALDISK_DIR)
         self.svc_network_dir = os.path.join(self.root,
                                             self.SVC_NETWORK_DIR)
+        self.svc_port_dir = os.path.join(self.root,
+                                         self.SVC_PORT_DIR)
         self.svc_presence_dir = os.path.join(self.root,
                                              self.SVC_PRESENCE_DIR)
 
@@ -100,6 +105,10 @@ class LinuxAppEnvironment(appenv.AppEnvironment):
             service_dir=self.svc_network_dir,
             impl='network'
         )
+        self.svc_port = services.ResourceService(
+            service_dir=self.svc_port_dir,
+            impl='port'
+        )
         self.svc_presence = services.ResourceService(
             service_dir=self.svc_presence_dir,
             impl='presence'
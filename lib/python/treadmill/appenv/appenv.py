@@ -34,6 +34,7 @@ class AppEnvironment:
         'app_events_dir',
         'app_types',
         'archives_dir',
+        'archiving_dir',
         'bin_dir',
         'cache_dir',
         'cleaning_dir',
@@ -57,6 +58,7 @@ class AppEnvironment:
     APPS_DIR = 'apps'
     BIN_DIR = 'bin'
     ARCHIVES_DIR = 'archives'
+    ARCHIVING_DIR = 'archiving'
     CACHE_DIR = 'cache'
     CLEANING_DIR = 'cleaning'
     CLEANUP_DIR = 'cleanup'
@@ -85,6 +87,7 @@ class AppEnvironment:
         self.configs_dir = os.path.join(self.root, self.CONFIG_DIR)
         self.app_events_dir = os.path.join(self.root, self.APP_EVENTS_DIR)
         self.archives_dir = os.path.join(self.root, self.ARCHIVES_DIR)
+        self.archiving_dir = os.path.join(self.root, self.ARCHIVING_DIR)
         self.images_dir = os.path.join(self.root, self.IMAGES_DIR)
         self.init_dir = os.path.join(self.root, self.INIT_DIR)
         self.init1_dir = os.path.join(self.root, self.INIT1_DIR)
@@ -6,7 +6,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
+import functools
+import json
 import logging
+import threading
+import time
+
+from concurrent import futures
 
 import decorator
 
@@ -14,6 +21,20 @@ from treadmill import restclient
 
 _LOGGER = logging.getLogger(__name__)
 
+# Time to live of cached authorization decisions, in seconds. Denials are
+# cached for a shorter time, so that granted permissions apply quickly.
+_CACHE_TTL = 60
+_NEGATIVE_CACHE_TTL = 5
+
+# Maximum number of cached decisions, the least recently used are evicted.
+_CACHE_SIZE = 10000
+
+# Number of concurrent requests to the authorizer when prefetching.
+_PREFETCH_WORKERS = 8
+
+# Interval between reports of the decision cache statistics, in seconds.
+_CACHE_STATS_INTERVAL = 300
+
 
 class AuthorizationError(Exception):
     """Authorization error."""
@@ -33,22 +54,95 @@ class NullAuthorizer:
         """Null authorization - always succeeds."""
         pass
 
+    def prefetch(self, _resource, _action, _args_list):
+        """Null authorization - nothing to prefetch."""
+        pass
+
+
+class _DecisionCache:
+    """Bounded LRU cache of authorization decisions with expiration."""
+
+    __slots__ = (
+        '_size',
+        '_decisions',
+        '_lock',
+        'hits',
+        'misses',
+    )
+
+    def __init__(self, size):
+        self._size = size
+        self._decisions = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._decisions)
+
+    def __contains__(self, key):
+        """Whether a decision is cached, without counting a hit or miss."""
+        with self._lock:
+            cached = self._decisions.get(key)
+            return cached is not None and cached[1] >= time.time()
+
+    def get(self, key):
+        """Get a cached decision, None if not cached or expired."""
+        with self._lock:
+            cached = self._decisions.pop(key, None)
+            if cached is None or cached[1] < time.time():
+                self.misses += 1
+                return None
+            # Reinsert as most recently used.
+            self._decisions[key] = cached
+            self.hits += 1
+            return cached[0]
+
+    def put(self, key, authd, ttl):
+        """Cache a decision for ttl seconds."""
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._decisions.pop(key, None)
+            self._decisions[key] = (authd, time.time() + ttl)
+            while len(self._decisions) > self._size:
+                self._decisions.popitem(last=False)
+
+    def clear(self):
+        """Drop all the cached decisions."""
+        with self._lock:
+            self._decisions.clear()
+
 
 class ClientAuthorizer:
-    """Loads authorizer implementation plugin."""
+    """Loads authorizer implementation plugin.
 
-    def __init__(self, user_clbk, auth=None):
+    Decisions of the remote authorizer are cached by user, action, resource,
+    primary key and payload.
+    """
+
+    def __init__(self, user_clbk, auth=None, cache_ttl=_CACHE_TTL,
+                 negative_cache_ttl=_NEGATIVE_CACHE_TTL,
+                 cache_size=_CACHE_SIZE):
         self.user_clbk = user_clbk
         self.remote = auth
+        self.cache_ttl = cache_ttl
+        self.negative_cache_ttl = negative_cache_ttl
+        self._cache = _DecisionCache(cache_size)
+        self._stats_reported = time.time()
 
-    def authorize(self, resource, action, args, _kwargs):
-        """Delegate authorization to the plugin."""
-        resource = resource.split('.').pop()
-
+    def _user(self):
+        """Current user."""
         user = self.user_clbk()
         # PGE API can't handle None.
         if user is None:
             user = ''
+        return user
+
+    @staticmethod
+    def _request(user, resource, action, args):
+        """Authorizer url and payload, and decision cache key."""
+        resource = resource.split('.').pop()
 
         # Defaults for primary key and payload.
         url = '/%s/%s/%s' % (user, action, resource)
@@ -61,6 +155,11 @@ class ClientAuthorizer:
         if nargs > 1:
             data['payload'] = args[1]
 
+        key = (url, json.dumps(data, sort_keys=True, default=str))
+        return url, data, key
+
+    def _fetch(self, url, data, key):
+        """Get the decision from the remote authorizer and cache it."""
         response = restclient.post(
             [self.remote],
             url,
@@ -69,11 +168,88 @@ class ClientAuthorizer:
         authd = response.json()
         _LOGGER.debug('client authorize ressult %r', authd)
 
+        self._cache.put(
+            key, authd,
+            self.cache_ttl if authd['auth'] else self.negative_cache_ttl
+        )
+        return authd
+
+    def authorize(self, resource, action, args, _kwargs):
+        """Delegate authorization to the plugin."""
+        url, data, key = self._request(self._user(), resource, action, args)
+
+        authd = self._cache.get(key)
+        if authd is None:
+            authd = self._fetch(url, data, key)
+        self._report_cache_stats()
+
         if not authd['auth']:
             raise AuthorizationError(authd['annotations'])
 
         return authd
 
+    def prefetch(self, resource, action, args_list):
+        """Fetch the decisions of a list of calls, concurrently.
+
+        Decisions already cached are not fetched again. Errors are logged,
+        the calls are then authorized when they are made.
+        """
+        user = self._user()
+        requests = {}
+        for args in args_list:
+            url, data, key = self._request(user, resource, action, args)
+            if key not in requests and key not in self._cache:
+                requests[key] = (url, data, key)
+
+        if not requests:
+            return
+
+        workers = min(_PREFETCH_WORKERS, len(requests))
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = [
+                executor.submit(self._fetch, *request)
+                for request in requests.values()
+            ]
+            for result in results:
+                try:
+                    result.result()
+                except Exception:  # pylint: disable=W0703
+                    _LOGGER.warning('Failed to prefetch authorization.',
+                                    exc_info=True)
+
+    def cache_stats(self):
+        """Decision cache hits, misses and size."""
+        return {
+            'hits': self._cache.hits,
+            'misses': self._cache.misses,
+            'size': len(self._cache),
+        }
+
+    def _report_cache_stats(self):
+        """Log the decision cache statistics periodically."""
+        now = time.time()
+        if now - self._stats_reported < _CACHE_STATS_INTERVAL:
+            return
+        self._stats_reported = now
+        _LOGGER.info('Authorization cache: %r', self.cache_stats())
+
+
+def prefetch(func, args_list):
+    """Prefetch the decisions of a list of calls to a wrapped API function.
+
+    Functions that are not wrapped with an authorizer are ignored.
+    """
+    prefetcher = getattr(func, 'auth_prefetch', None)
+    if prefetcher is not None:
+        prefetcher(args_list)
+
+
+def _auth_target(func):
+    """Resource and action authorized for an API function."""
+    action = getattr(func, 'auth_action', func.__name__.strip('_'))
+    resource = getattr(func, 'auth_resource', func.__module__.strip('_'))
+    return resource, action
+
 
 def _authorize(authorizer):
     """Constructs authorizer decorator."""
@@ -81,8 +257,7 @@ def _authorize(authorizer):
     @decorator.decorator
     def decorated(func, *args, **kwargs):
         """Decorated function."""
-        action = getattr(func, 'auth_action', func.__name__.strip('_'))
-        resource = getattr(func, 'auth_resource', func.__module__.strip('_'))
+        resource, action = _auth_target(func)
         _LOGGER.debug('Authorize: %s %s %r %r', resource, action, args, kwargs)
         authorizer.authorize(resource, action, args, kwargs)
         return func(*args, **kwargs)
@@ -100,7 +275,11 @@ def wrap(api, authorizer):
             auth = _authorize(authorizer)
             attr = getattr(api, action)
             if hasattr(attr, '__call__'):
-                setattr(api, action, auth(attr))
+                wrapped = auth(attr)
+                wrapped.auth_prefetch = functools.partial(
+                    authorizer.prefetch, *_auth_target(attr)
+                )
+                setattr(api, action, wrapped)
             elif hasattr(attr, '__init__'):
                 setattr(api, action, wrap(attr, authorizer))
             else:
@@ -7,23 +7,269 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import collections
+import copy
 import hashlib
 import json
 import io
 import logging
 import sqlite3
 import tempfile
+import time
+
+import kazoo.exceptions
+import six
 
 from treadmill import admin
 from treadmill import context
 from treadmill import fs
 from treadmill import utils
+from treadmill import yamlwrapper as yaml
 from treadmill import zknamespace as z
 from treadmill import zkutils
 from treadmill.scheduler import masterapi
 
 _LOGGER = logging.getLogger(__name__)
 
+# Maximum number of operations committed in a single Zookeeper transaction.
+_TXN_BATCH = 100
+
+# Maximum number of concurrent reads when comparing Zookeeper content.
+_READ_WINDOW = 100
+
+# Seconds the LDAP high-water mark looks back before the previous search,
+# covering the replication delays and clock skew between the servers and the
+# client.
+_HWM_LOOKBACK = 300
+
+# Content hashes of the children written to Zookeeper, by parent path and
+# node name. Set when running in incremental mode, None otherwise.
+_MANIFEST = None
+
+# Content hashes of the single nodes written to Zookeeper, by path. Set when
+# running in incremental mode, None otherwise.
+_DIGESTS = None
+
+# Entities read from LDAP, by search base and filter: (entities by DN,
+# high-water mark). Set when running in incremental mode, None otherwise.
+_ENTITIES = None
+
+
+def enable_incremental():
+    """Enable incremental sync.
+
+    Only the LDAP entries modified since the previous sync are read, and
+    nodes are only written to Zookeeper when their content changed since the
+    last sync, according to the content hash manifest.
+    """
+    global _MANIFEST, _DIGESTS, _ENTITIES  # pylint: disable=global-statement
+    if _MANIFEST is None:
+        _MANIFEST = {}
+        _DIGESTS = {}
+        _ENTITIES = {}
+
+
+def reset_manifest():
+    """Forget the content read and written so far, forcing a full sync."""
+    if _MANIFEST is not None:
+        _MANIFEST.clear()
+        _DIGESTS.clear()
+        _ENTITIES.clear()
+
+
+def _search(ldap_obj, search_base=None, search_filter=None):
+    """Search the LDAP entities of an object type.
+
+    In incremental mode, only the entries modified (modifyTimestamp) since the
+    high-water mark of the previous search are read in full, the others are
+    only listed to detect deletions.
+
+    :returns:
+        ``list`` -- Entities found.
+    """
+    if search_base is None:
+        search_base = ldap_obj.dn()
+    if search_filter is None:
+        search_filter = admin.AndQuery('objectClass', ldap_obj.oc()).to_str()
+    ldap_admin = ldap_obj.admin
+
+    if _ENTITIES is None:
+        return [
+            ldap_obj.from_entry(entry, dn)
+            for dn, entry in ldap_admin.paged_search(
+                search_base=search_base,
+                search_filter=search_filter,
+                attributes=ldap_obj.attrs()
+            )
+        ]
+
+    key = (search_base, search_filter)
+    entities, hwm = _ENTITIES.get(key, ({}, None))
+    now = time.time()
+    if hwm is not None:
+        found = set(
+            dn for dn, _entry in ldap_admin.paged_search(
+                search_base=search_base,
+                search_filter=search_filter,
+                attributes=[]
+            )
+        )
+        for dn in set(entities) - found:
+            del entities[dn]
+        search_filter = '(&{}(modifyTimestamp>={}))'.format(
+            search_filter, hwm
+        )
+
+    modified = 0
+    for dn, entry in ldap_admin.paged_search(search_base=search_base,
+                                             search_filter=search_filter,
+                                             attributes=ldap_obj.attrs()):
+        entities[dn] = ldap_obj.from_entry(entry, dn)
+        modified += 1
+
+    _LOGGER.info('Search %s: %d entries, %d modified',
+                 search_base, len(entities), modified)
+    _ENTITIES[key] = (entities,
+                      admin.generalized_time(now - _HWM_LOOKBACK))
+    # Callers alter the entities, keep the cached ones intact.
+    return copy.deepcopy(list(six.itervalues(entities)))
+
+
+def _payload(data):
+    """Serialize data the way it is stored in Zookeeper."""
+    return yaml.dump(data).encode()
+
+
+def _digest(payload):
+    """Content hash of a serialized payload."""
+    return hashlib.sha1(payload).hexdigest()
+
+
+def _changed(zkpath, data):
+    """Check if a node content differs from what was last written.
+
+    :returns:
+        Digest of the new content, None if the node is up to date.
+    """
+    digest = _digest(_payload(data))
+    if _DIGESTS is not None and _DIGESTS.get(zkpath) == digest:
+        return None
+    return digest
+
+
+def _record(zkpath, digest):
+    """Record the digest of a node content written to Zookeeper."""
+    if _DIGESTS is not None:
+        _DIGESTS[zkpath] = digest
+
+
+def _unchanged_in_zk(zkclient, zkpath, payloads):
+    """Return the names of the nodes whose Zookeeper content is current.
+
+    Reads are pipelined, at most _READ_WINDOW at a time.
+    """
+    names = list(payloads)
+    unchanged = set()
+    for idx in six.moves.range(0, len(names), _READ_WINDOW):
+        window = names[idx:idx + _READ_WINDOW]
+        results = [
+            zkclient.get_async(z.join_zookeeper_path(zkpath, name))
+            for name in window
+        ]
+        for name, result in zip(window, results):
+            try:
+                current, _metadata = result.get()
+            except kazoo.exceptions.NoNodeError:
+                continue
+            if current == payloads[name]:
+                unchanged.add(name)
+    return unchanged
+
+
+def _commit(zkclient, zkpath, ops):
+    """Commit create/set/delete operations in a single transaction.
+
+    If the transaction is rejected, the operations are applied one by one.
+    """
+    acl = zkclient.make_default_acl(None)
+    txn = zkclient.transaction()
+    for op, name, payload in ops:
+        path = z.join_zookeeper_path(zkpath, name)
+        if op == 'create':
+            txn.create(path, payload, acl=acl)
+        elif op == 'set':
+            txn.set_data(path, payload)
+        else:
+            txn.delete(path)
+
+    results = txn.commit()
+    if not any(isinstance(res, Exception) for res in results):
+        return
+
+    _LOGGER.warning('Transaction on %s failed, applying %d changes one by '
+                    'one: %r', zkpath, len(ops), results)
+    for op, name, payload in ops:
+        path = z.join_zookeeper_path(zkpath, name)
+        if op == 'delete':
+            zkutils.ensure_deleted(zkclient, path)
+        else:
+            zkutils.put(zkclient, path, payload)
+
+
+def _sync_nodes(zkclient, zkpath, nodes):
+    """Incrementally sync the children of a Zookeeper node.
+
+    Only the nodes whose content hash changed since the last sync are
+    considered. Nodes not in the manifest (first sync, or after a reset) are
+    read back and compared with the new content, so that up to date nodes are
+    not rewritten. Changes are committed in transactions of _TXN_BATCH
+    operations.
+    """
+    manifest = _MANIFEST.setdefault(zkpath, {})
+    in_zk = set(zkclient.get_children(zkpath))
+
+    # Forget the nodes that were removed behind our back.
+    for name in set(manifest) - in_zk:
+        del manifest[name]
+
+    ops = []
+    for name in sorted(in_zk - set(nodes)):
+        _LOGGER.info('Delete: %s', name)
+        ops.append(('delete', name, None))
+        manifest.pop(name, None)
+
+    payloads = {}
+    digests = {}
+    for name, data in six.iteritems(nodes):
+        payload = _payload(data)
+        digest = _digest(payload)
+        if manifest.get(name) == digest:
+            continue
+        payloads[name] = payload
+        digests[name] = digest
+
+    unknown = {
+        name: payload
+        for name, payload in six.iteritems(payloads)
+        if name in in_zk and name not in manifest
+    }
+    unchanged = _unchanged_in_zk(zkclient, zkpath, unknown)
+
+    for name in sorted(payloads):
+        if name in unchanged:
+            _LOGGER.debug('Up to date: %s', name)
+            continue
+        _LOGGER.info('Update: %s', name)
+        ops.append(
+            ('set' if name in in_zk else 'create', name, payloads[name])
+        )
+
+    for idx in six.moves.range(0, len(ops), _TXN_BATCH):
+        _commit(zkclient, zkpath, ops[idx:idx + _TXN_BATCH])
+
+    manifest.update(digests)
+    _LOGGER.info('Sync %s: %d nodes, %d changes',
+                 zkpath, len(nodes), len(ops))
+
 
 def _match_appgroup(group):
     """Match if appgroup belongs to the cell.
@@ -47,6 +293,10 @@ def _sync_collection(zkclient, entities, zkpath, match=None):
             continue
         to_sync[name] = entity
 
+    if _MANIFEST is not None:
+        _sync_nodes(zkclient, zkpath, to_sync)
+        return
+
     for to_del in set(in_zk) - set(to_sync):
         _LOGGER.info('Delete: %s', to_del)
         zkutils.ensure_deleted(zkclient, z.join_zookeeper_path(zkpath, to_del))
@@ -171,8 +421,7 @@ def _remove_extra_appgroup_lookup(zkclient, proid, digest):
 def sync_appgroups():
     """Sync app-groups from LDAP to Zookeeper."""
     _LOGGER.info('Sync appgroups.')
-    admin_app_group = admin.AppGroup(context.GLOBAL.ldap.conn)
-    app_groups = admin_app_group.list({})
+    app_groups = _search(admin.AppGroup(context.GLOBAL.ldap.conn))
     cell_app_groups = [group for group in app_groups if _match_appgroup(group)]
     _sync_collection(context.GLOBAL.zk.conn,
                      cell_app_groups, z.path.appgroup())
@@ -186,10 +435,32 @@ def sync_partitions():
     zkclient = context.GLOBAL.zk.conn
 
     admin_cell = admin.Cell(context.GLOBAL.ldap.conn)
-    partitions = admin_cell.partitions(context.GLOBAL.cell)
+    partitions = _search(
+        admin.Partition(context.GLOBAL.ldap.conn),
+        search_base=admin_cell.dn(context.GLOBAL.cell),
+        search_filter='(objectclass=%s)' % admin.Partition.oc()
+    )
 
     zkclient.ensure_path(z.path.partition())
 
+    for partition in partitions:
+        if 'reboot-schedule' in partition:
+            try:
+                partition['reboot-schedule'] = utils.reboot_schedule(
+                    partition['reboot-schedule']
+                )
+            except ValueError:
+                _LOGGER.info('Invalid reboot schedule, ignoring.')
+                del partition['reboot-schedule']
+
+    if _MANIFEST is not None:
+        _sync_nodes(
+            zkclient,
+            z.path.partition(),
+            {partition['_id']: partition for partition in partitions}
+        )
+        return
+
     in_zk = zkclient.get_children(z.path.partition())
     names = [partition['_id'] for partition in partitions]
 
@@ -201,15 +472,6 @@ def sync_partitions():
     for partition in partitions:
         zkname = partition['_id']
 
-        if 'reboot-schedule' in partition:
-            try:
-                partition['reboot-schedule'] = utils.reboot_schedule(
-                    partition['reboot-schedule']
-                )
-            except ValueError:
-                _LOGGER.info('Invalid reboot schedule, ignoring.')
-                del partition['reboot-schedule']
-
         if zkutils.put(zkclient, z.path.partition(zkname),
                        partition, check_content=True):
             _LOGGER.info('Update: %s', zkname)
@@ -233,19 +495,32 @@ def sync_allocations():
         alloc['name'] = name
         filtered.append(alloc)
 
+    digest = _changed(z.path.allocation(), filtered)
+    if digest is None:
+        _LOGGER.info('Allocations up to date.')
+        return
+
     masterapi.update_allocations(zkclient, filtered)
+    _record(z.path.allocation(), digest)
 
 
 def sync_servers():
     """Sync global servers list."""
     _LOGGER.info('Sync servers.')
-    admin_srv = admin.Server(context.GLOBAL.ldap.conn)
-    global_servers = admin_srv.list({})
+    global_servers = _search(admin.Server(context.GLOBAL.ldap.conn))
+    servers = sorted(server['_id'] for server in global_servers)
+
+    digest = _changed(z.path.globals('servers'), servers)
+    if digest is None:
+        _LOGGER.info('Servers up to date.')
+        return
+
     zkutils.ensure_exists(
         context.GLOBAL.zk.conn,
         z.path.globals('servers'),
-        data=[server['_id'] for server in global_servers]
+        data=servers
     )
+    _record(z.path.globals('servers'), digest)
 
 
 def sync_traits():
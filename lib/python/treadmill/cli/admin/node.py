@@ -13,6 +13,7 @@ import click
 
 from treadmill import diskbenchmark
 from treadmill import localdiskutils
+from treadmill import netbenchmark
 from treadmill import subproc
 
 from treadmill.fs import linux as fs_linux
@@ -193,6 +194,35 @@ def benchmark_group(parent):
     del benchmark
 
 
+def net_benchmark_group(parent):
+    """Benchmark node network setup performance"""
+
+    @parent.command(name='net-benchmark')
+    @click.option('--count', required=False, type=int,
+                  default=netbenchmark.BENCHMARK_CONTAINERS,
+                  help='Number of containers to set up')
+    @click.option('--bridge', required=False,
+                  help='Add the devices to this bridge')
+    @click.option('--mtu', required=False, type=int,
+                  default=netbenchmark.BENCHMARK_MTU,
+                  help='MTU of the devices')
+    def net_benchmark(count, bridge, mtu):
+        """Benchmark container network setup time, ip vs rtnetlink"""
+        for use_netlink in (False, True):
+            result = netbenchmark.benchmark(count, bridge, mtu,
+                                            use_netlink=use_netlink)
+            click.echo(
+                '{backend}: {containers} containers in {total:.3f}s '
+                '({per_container_ms:.2f}ms per container)'.format(
+                    backend='rtnetlink' if use_netlink else 'ip',
+                    per_container_ms=result['per_container'] * 1000,
+                    **result
+                )
+            )
+
+    del net_benchmark
+
+
 def init():
     """Return top level command handler."""
 
@@ -207,5 +237,6 @@ def init():
 
     lvm_group(node_group)
     benchmark_group(node_group)
+    net_benchmark_group(node_group)
 
     return node_group
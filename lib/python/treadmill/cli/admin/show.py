@@ -16,6 +16,7 @@ import click
 
 from treadmill import cli
 from treadmill import context
+from treadmill import endpoints as tm_endpoints
 from treadmill import zknamespace as z
 from treadmill import zkutils
 
@@ -94,9 +95,11 @@ def init():
 
         discovery = zkclient.get_children(z.DISCOVERY)
         all_endpoints = []
-        for hostname in discovery:
+        for node in discovery:
+            # Sharded nodes share the state of their publisher instance.
+            hostname = tm_endpoints.discovery_instance(node)
             endpoints = []
-            for entry in zkutils.get(zkclient, z.path.discovery(hostname)):
+            for entry in zkutils.get(zkclient, z.path.discovery(node)):
                 app, endpoint, proto, port = entry.split(':')
                 port = int(port)
                 endpoint_state = state[hostname].get(port)
@@ -11,6 +11,7 @@ import collections
 import logging
 import os
 import sys
+import time
 
 import enum
 
@@ -30,6 +31,80 @@ class DirWatcherEvent(enum.Enum):
     #: Fake event returned when more events where received than allowed to
     #: process in ``process_events``
     MORE_PENDING = 'more events pending'
+    #: Fake event read when the system event queue overflowed, events were
+    #: lost
+    OVERFLOW = 'event queue overflow'
+
+
+def _mtime(path):
+    """Modification time of a path, None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _scan(directories):
+    """Modification time of the entries of directories, by path."""
+    entries = {}
+    for directory in directories:
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            continue
+        for name in names:
+            path = os.path.join(directory, name)
+            mtime = _mtime(path)
+            if mtime is not None:
+                entries[path] = mtime
+    return entries
+
+
+class _Changes:
+    """Net changes of paths, coalesced from a sequence of events.
+
+    A path created then deleted is dropped, a path deleted then created again
+    is reported as created, modifications of created paths are dropped.
+    """
+
+    __slots__ = (
+        '_paths',
+    )
+
+    def __init__(self):
+        # path -> [existed before, exists, replaced]
+        self._paths = collections.OrderedDict()
+
+    def add(self, event, path):
+        """Add an event."""
+        state = self._paths.get(path)
+        if state is None:
+            state = self._paths[path] = [
+                event != DirWatcherEvent.CREATED, True, False
+            ]
+
+        if event == DirWatcherEvent.DELETED:
+            state[1] = False
+        elif not state[1] or event == DirWatcherEvent.CREATED:
+            # Path exists again.
+            state[1] = True
+            state[2] = state[2] or state[0]
+
+    def clear(self):
+        """Drop all the changes."""
+        self._paths.clear()
+
+    def events(self):
+        """Net events, in the order the paths first changed."""
+        events = []
+        for path, (existed, exists, replaced) in six.iteritems(self._paths):
+            if exists and (replaced or not existed):
+                events.append((DirWatcherEvent.CREATED, path))
+            elif exists:
+                events.append((DirWatcherEvent.MODIFIED, path))
+            elif existed:
+                events.append((DirWatcherEvent.DELETED, path))
+        return events
 
 
 # TODO: new pylint circular complains about useless None return and then about
@@ -46,10 +121,13 @@ class DirWatcher:
     """Directory watcher base, invoking callbacks on file create/delete events.
     """
     __slots__ = (
+        'batch_window',
         'event_list',
+        'on_batch',
         'on_created',
         'on_deleted',
         'on_modified',
+        '_snapshot',
         '_watches'
     )
 
@@ -58,6 +136,13 @@ class DirWatcher:
         self.on_created = self._noop
         self.on_deleted = self._noop
         self.on_modified = self._noop
+        #: Batch callback, invoked with the list of ``(DirWatcherEvent,
+        #: <path>)`` coalesced by ``process_events``. Setting it enables the
+        #: batching mode, the per event callbacks are then not invoked.
+        self.on_batch = None
+        #: Time in seconds to wait for more events to coalesce in a batch.
+        self.batch_window = 0
+        self._snapshot = None
         self._watches = {}
 
         if watch_dir is not None:
@@ -80,6 +165,8 @@ class DirWatcher:
         wid = self._add_dir(watch_dir)
         _LOGGER.info('Watching directory %r (id: %r)', watch_dir, wid)
         self._watches[wid] = watch_dir
+        if self._snapshot is not None:
+            self._snapshot.update(_scan([watch_dir]))
 
     @abc.abstractmethod
     def _remove_dir(self, watch_id):
@@ -104,6 +191,10 @@ class DirWatcher:
         _LOGGER.info('Unwatching directory %r (id: %r)', watch_dir, wid)
         del self._watches[wid]
         self._remove_dir(wid)
+        if self._snapshot is not None:
+            for path in list(self._snapshot):
+                if os.path.dirname(path) == watch_dir:
+                    del self._snapshot[path]
 
     @staticmethod
     def _noop(event_src):
@@ -163,6 +254,9 @@ class DirWatcher:
         if max_events <= 0:
             max_events = sys.maxsize
 
+        if self.on_batch is not None:
+            return self._process_batch(max_events, resume)
+
         # If we are out of cached events, get more from inotify
         if not self.event_list and not resume:
             self.event_list.extend(self._read_events())
@@ -195,6 +289,10 @@ class DirWatcher:
             elif event == DirWatcherEvent.CREATED:
                 res = self.on_created(src_path)  # pylint: disable=E1128
 
+            elif event == DirWatcherEvent.OVERFLOW:
+                _LOGGER.warning('Events lost, set on_batch to recover them')
+                continue
+
             else:
                 continue
 
@@ -207,3 +305,77 @@ class DirWatcher:
             )
 
         return results
+
+    def _rescan(self):
+        """Diff the watched directories with the last delivered state.
+
+        :returns: List of ``(DirWatcherEvent, <path>)``
+        """
+        watched = set(six.itervalues(self._watches))
+        current = _scan(watched)
+
+        events = []
+        for path, mtime in six.iteritems(self._snapshot):
+            if os.path.dirname(path) not in watched:
+                continue
+            if path not in current:
+                events.append((DirWatcherEvent.DELETED, path))
+            elif current[path] != mtime:
+                events.append((DirWatcherEvent.MODIFIED, path))
+        for path in six.viewkeys(current) - six.viewkeys(self._snapshot):
+            events.append((DirWatcherEvent.CREATED, path))
+
+        return events
+
+    def _process_batch(self, max_events, resume):
+        """Coalesce the events received and invoke the batch callback.
+
+        Events received within ``batch_window`` seconds are coalesced to one
+        event per path. On event queue overflow, the watched directories are
+        rescanned and the changes since the last batch are synthesized.
+        """
+        if self._snapshot is None:
+            self._snapshot = _scan(six.itervalues(self._watches))
+
+        if not self.event_list and not resume:
+            self.event_list.extend(self._read_events())
+            deadline = time.time() + self.batch_window
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self._wait_for_events(
+                        int(remaining * 1000)):
+                    break
+                self.event_list.extend(self._read_events())
+
+        changes = _Changes()
+        while self.event_list:
+            event, src_path = self.event_list.popleft()
+            if event == DirWatcherEvent.OVERFLOW:
+                _LOGGER.warning('Events lost, rescanning watched directories')
+                changes.clear()
+                for rescan_event, path in self._rescan():
+                    changes.add(rescan_event, path)
+            elif event in (DirWatcherEvent.CREATED,
+                           DirWatcherEvent.DELETED,
+                           DirWatcherEvent.MODIFIED):
+                changes.add(event, src_path)
+
+        batch = changes.events()
+        # Keep the events over max_events, already coalesced, for later.
+        self.event_list.extendleft(reversed(batch[max_events:]))
+        batch = batch[:max_events]
+
+        for event, src_path in batch:
+            if event == DirWatcherEvent.DELETED:
+                self._snapshot.pop(src_path, None)
+            else:
+                self._snapshot[src_path] = _mtime(src_path)
+
+        if batch:
+            self.on_batch(batch)
+
+        results = [(event, src_path, None) for event, src_path in batch]
+        if self.event_list:
+            results.append((DirWatcherEvent.MORE_PENDING, None, None))
+
+        return results
@@ -88,8 +88,17 @@ class LinuxDirWatcher(dirwatch_base.DirWatcher):
         events = self.inotify.read_events()
 
         for event in events:
-            if (event.is_modify or
-                    event.is_attrib):
+            if event.mask & inotify.IN_Q_OVERFLOW:
+                _LOGGER.warning('Inotify event queue overflow')
+                results.append(
+                    (
+                        dirwatch_base.DirWatcherEvent.OVERFLOW,
+                        None
+                    )
+                )
+
+            elif (event.is_modify or
+                  event.is_attrib):
                 results.append(
                     (
                         dirwatch_base.DirWatcherEvent.MODIFIED,
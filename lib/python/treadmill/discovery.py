@@ -6,8 +6,12 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import fnmatch
 import logging
+import socket
+import threading
+import time
 
 import kazoo.exceptions
 
@@ -17,6 +21,13 @@ from treadmill import zknamespace as z
 
 _LOGGER = logging.getLogger(__name__)
 
+# Max number of concurrent outstanding Zookeeper reads when resolving
+# endpoints.
+_RESOLVE_WINDOW = 500
+
+# Default TTL (seconds) of resolved hostnames in HostCache.
+_HOST_CACHE_TTL = 300
+
 
 def _join_prefix(prefix, arg):
     """Return arg with the provided prefix joined."""
@@ -50,14 +61,40 @@ class Discovery:
 
     def iteritems(self, block=True, timeout=None):
         """List matching endpoints."""
+        for batch in self.iterbatches(block, timeout):
+            for endpoint, hostport in batch:
+                yield (endpoint, hostport)
+
+    def iterbatches(self, block=True, timeout=None):
+        """List matching endpoint changes in batches.
+
+        All batches already queued are coalesced into one, keeping the last
+        change of every endpoint. Each batch is a list of (endpoint, hostport)
+        pairs, hostport is None for deleted endpoints.
+        """
         while True:
             try:
-                endpoint, hostport = self.queue.get(block, timeout)
-                if (endpoint, hostport) == (None, None):
-                    break
-                yield (endpoint, hostport)
+                batch = self.queue.get(block, timeout)
             except queue.Empty:
                 break
+            if batch is None:
+                break
+
+            changes = collections.OrderedDict(batch)
+            done = False
+            while True:
+                try:
+                    batch = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if batch is None:
+                    done = True
+                    break
+                changes.update(batch)
+
+            yield list(changes.items())
+            if done:
+                break
 
     def apps_watcher(self, event):
         """Watch for created/deleted apps that match monitored pattern."""
@@ -82,14 +119,18 @@ class Discovery:
         created = match - state
         deleted = state - match
 
+        batch = []
+        hostports = self.resolve_endpoints(created)
         for endpoint in created:
             _LOGGER.debug('added endpoint: %s', endpoint)
-            hostport = self.resolve_endpoint(endpoint)
-            self.queue.put((endpoint, hostport))
+            batch.append((endpoint, hostports[endpoint]))
 
         for endpoint in deleted:
             _LOGGER.debug('deleted endpoint: %s', endpoint)
-            self.queue.put((endpoint, None))
+            batch.append((endpoint, None))
+
+        if batch:
+            self.queue.put(batch)
 
         self.state = match
 
@@ -99,13 +140,13 @@ class Discovery:
 
     def exit_loop(self):
         """Put termination event on the queue."""
-        self.queue.put((None, None))
+        self.queue.put(None)
 
     def get_endpoints(self):
         """Returns the current list of endpoints in host:port format"""
         endpoints = self.get_endpoints_zk()
-        hostports = [self.resolve_endpoint(endpoint) for endpoint in endpoints]
-        return hostports
+        hostports = self.resolve_endpoints(endpoints)
+        return [hostports[endpoint] for endpoint in endpoints]
 
     def get_endpoints_zk(self, watch_cb=None):
         """
@@ -149,17 +190,81 @@ class Discovery:
 
     def resolve_endpoint(self, endpoint):
         """Resolves a endpoint to a hostport"""
-        # Endpoint is assumed to be in the form of <proid>.endpoint_filename
-        prefix, endpoint_fname = _split_prefix(endpoint)
-        fullpath = z.join_zookeeper_path(z.ENDPOINTS, prefix, endpoint_fname)
         try:
-            hostport, _metadata = self.zkclient.get(fullpath)
+            hostport, _metadata = self.zkclient.get(_endpoint_path(endpoint))
             hostport = hostport.decode()
         except kazoo.exceptions.NoNodeError:
             hostport = None
 
         return hostport
 
+    def resolve_endpoints(self, endpoints):
+        """Resolves endpoints to hostports.
+
+        Zookeeper reads are issued asynchronously, in windows of at most
+        _RESOLVE_WINDOW outstanding requests.
+
+        :returns:
+            ``dict`` -- endpoint to hostport, None if endpoint does not exist.
+        """
+        endpoints = list(endpoints)
+        hostports = {}
+        for idx in range(0, len(endpoints), _RESOLVE_WINDOW):
+            window = [
+                (endpoint, self.zkclient.get_async(_endpoint_path(endpoint)))
+                for endpoint in endpoints[idx:idx + _RESOLVE_WINDOW]
+            ]
+            for endpoint, async_result in window:
+                try:
+                    hostport, _metadata = async_result.get()
+                    hostports[endpoint] = hostport.decode()
+                except kazoo.exceptions.NoNodeError:
+                    hostports[endpoint] = None
+
+        return hostports
+
+
+class HostCache:
+    """Hostname to IP address cache, with entries expiring after ttl seconds.
+    """
+
+    def __init__(self, ttl=_HOST_CACHE_TTL):
+        self.ttl = ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, hostname):
+        """Resolve hostname to IP address.
+
+        Failures are not cached, socket.gaierror is raised as with
+        socket.gethostbyname.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(hostname)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        ipaddr = socket.gethostbyname(hostname)
+        with self._lock:
+            self._cache[hostname] = (ipaddr, now + self.ttl)
+        return ipaddr
+
+    def invalidate(self, hostname=None):
+        """Drop hostname (or all entries) from the cache."""
+        with self._lock:
+            if hostname is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(hostname, None)
+
+
+def _endpoint_path(endpoint):
+    """Return Zookeeper path of an endpoint."""
+    # Endpoint is assumed to be in the form of <proid>.endpoint_filename
+    prefix, endpoint_fname = _split_prefix(endpoint)
+    return z.join_zookeeper_path(z.ENDPOINTS, prefix, endpoint_fname)
+
 
 def iterator(zkclient, pattern, endpoint, watch):
     """Returns app discovery iterator based on native zk discovery.
@@ -12,6 +12,9 @@ import errno
 import logging
 import os
 import time
+import zlib
+
+import six
 
 from treadmill import fs
 from treadmill import dirwatch
@@ -33,6 +36,12 @@ _SEP = '~'
 
 _GC_INTERVAL = 60
 
+# Seconds endpoint changes are accumulated before being published.
+DEBOUNCE_INTERVAL = 1
+
+# Separator of the shard number in sharded discovery node names.
+_SHARD_SEP = '@'
+
 
 class EndpointsMgr:
     """Endpoints rule manager.
@@ -187,6 +196,13 @@ class EndpointsMgr:
                     raise
 
 
+def discovery_instance(node):
+    """Returns the publisher instance, ``<hostname>[#<instance>]``, of a
+    discovery node, removing the shard number of sharded nodes.
+    """
+    return node.split(_SHARD_SEP, 1)[0]
+
+
 def _namify(appname, proto, endpoint, real_port, pid, port):
     """Create filename given all the parameters."""
     return _SEP.join([appname,
@@ -208,6 +224,7 @@ class PortScanner:
         self.state = collections.defaultdict(dict)
         self.node_acl = self.zkclient.make_host_acl(self.hostname, 'rwcd')
         self.instance = instance
+        self.listen_scanner = netutils.ListenScanner()
 
     def _publish(self, result):
         """Publish network info to Zookeeper."""
@@ -258,23 +275,25 @@ class PortScanner:
                 continue
 
             _LOGGER.debug('Entry: %s', entry)
-            appname, endpoint, proto, real_port, pid, port = entry.split(_SEP)
+            appname, proto, _endpoint, real_port, pid, port = entry.split(_SEP)
 
             container_pids[appname] = pid
 
             port = int(port)
             real_port = int(real_port)
-            container_ports[appname][port] = real_port
+            container_ports[appname][(proto, port)] = real_port
+
+        self.listen_scanner.retain(container_pids.values())
 
         real_port_status = dict()
         for appname, pid in container_pids.items():
-            open_ports = netutils.netstat(pid)
+            open_ports = self.listen_scanner.scan(pid)
             _LOGGER.debug(
                 'Container %s listens on %r',
-                appname, list(open_ports)
+                appname, open_ports
             )
-            for port, real_port in container_ports[appname].items():
-                if port in open_ports:
+            for (proto, port), real_port in container_ports[appname].items():
+                if port in open_ports.get(proto, ()):
                     real_port_status[real_port] = 1
                 else:
                     real_port_status[real_port] = 0
@@ -283,11 +302,18 @@ class PortScanner:
 
 
 class EndpointPublisher:
-    """Manages publishing endpoints to Zookeeper."""
+    """Manages publishing endpoints to Zookeeper.
 
-    _MAX_REQUEST_PER_CYCLE = 10
+    Changes are debounced: once the state changes, events keep being drained
+    for ``debounce`` seconds before the state is published.
 
-    def __init__(self, endpoints_dir, zkclient, instance):
+    If ``shards`` is set, endpoints are partitioned by app name into that
+    many nodes, ``<instance>@<shard>``, and only shards whose content changed
+    are rewritten.
+    """
+
+    def __init__(self, endpoints_dir, zkclient, instance,
+                 debounce=DEBOUNCE_INTERVAL, shards=None):
         self.endpoints_dir = endpoints_dir
         self.zkclient = zkclient
         self.up_to_date = True
@@ -295,6 +321,9 @@ class EndpointPublisher:
         self.hostname = sysinfo.hostname()
         self.node_acl = self.zkclient.make_host_acl(self.hostname, 'rwcd')
         self.instance = instance
+        self.debounce = debounce
+        self.shards = shards
+        self.published = {}
 
     def _on_created(self, path):
         """Add entry to the discovery set and mark set as not up to date."""
@@ -314,16 +343,36 @@ class EndpointPublisher:
         self.up_to_date = False
 
     def _publish(self):
-        """Publish updated discovery info to Zookeeper."""
-        _LOGGER.info('Publishing discovery info')
-        state = list(sorted(self.state))
+        """Publish updated discovery info to Zookeeper.
+
+        Only nodes whose content differs from what was last published are
+        written.
+        """
         if self.instance:
             instance = '#'.join([self.hostname, self.instance])
         else:
             instance = self.hostname
-        zkutils.put(self.zkclient, z.path.discovery(instance),
-                    state,
-                    ephemeral=True, acl=[self.node_acl])
+
+        if self.shards:
+            nodes = {
+                _SHARD_SEP.join([instance, str(shard)]): []
+                for shard in range(self.shards)
+            }
+            for entry in sorted(self.state):
+                appname = entry.split(':', 1)[0]
+                shard = zlib.crc32(appname.encode()) % self.shards
+                nodes[_SHARD_SEP.join([instance, str(shard)])].append(entry)
+        else:
+            nodes = {instance: list(sorted(self.state))}
+
+        for node, state in six.iteritems(nodes):
+            if self.published.get(node) == state:
+                continue
+            _LOGGER.info('Publishing discovery info: %s', node)
+            zkutils.put(self.zkclient, z.path.discovery(node),
+                        state,
+                        ephemeral=True, acl=[self.node_acl])
+            self.published[node] = state
 
     def _endpoint_info(self, path):
         """Create endpoint info string from file path."""
@@ -347,13 +396,28 @@ class EndpointPublisher:
         self._publish()
         self.up_to_date = True
 
+        changed_since = None
         while True:
-            if watcher.wait_for_events(timeout=1):
-                watcher.process_events(max_events=self._MAX_REQUEST_PER_CYCLE)
+            if changed_since is None:
+                timeout = -1
+            else:
+                timeout = max(
+                    0, changed_since + self.debounce - time.time()
+                )
+
+            if watcher.wait_for_events(timeout=timeout):
+                watcher.process_events()
+
+            if self.up_to_date:
+                continue
+
+            if changed_since is None:
+                changed_since = time.time()
 
-            if not self.up_to_date:
+            if time.time() - changed_since >= self.debounce:
                 self._publish()
                 self.up_to_date = True
+                changed_since = None
 
 
 def garbage_collect(endpoints_dir):
@@ -40,7 +40,11 @@ _LOGGER = logging.getLogger(__name__)
 _HEARTBEAT_SEC = 30
 _WATCHDOG_TIMEOUT_SEC = _HEARTBEAT_SEC * 4
 
+# Max number of apps with outstanding Zookeeper reads when caching manifests.
+_CACHE_WINDOW = 100
+
 READY_FILE = '.ready'
+INDEX_FILE = '.index'
 
 
 class EventMgr:
@@ -49,6 +53,7 @@ class EventMgr:
     __slots__ = (
         'tm_env',
         '_hostname',
+        '_index',
     )
 
     def __init__(self, root):
@@ -56,6 +61,8 @@ class EventMgr:
         self.tm_env = appenv.AppEnvironment(root=root)
 
         self._hostname = sysinfo.hostname()
+        # Placement (mzxid, ctime) of the cached manifests, loaded lazily.
+        self._index = None
 
     @property
     def name(self):
@@ -169,14 +176,18 @@ class EventMgr:
             manifest = os.path.join(self.tm_env.cache_dir, app)
             os.unlink(manifest)
 
+        index = self._get_index()
+        for app in set(index) - expected_set:
+            del index[app]
+
         # If app is missing, fetch its manifest in the cache
-        for app in missing:
-            self._cache(zkclient, app)
+        self._cache_many(zkclient, missing)
 
         if check_existing:
             _LOGGER.info('existing : %s', ','.join(existing))
-            for app in existing:
-                self._cache(zkclient, app, check_existing=True)
+            self._cache_many(zkclient, existing, check_existing=True)
+
+        self._save_index()
 
     def _cache(self, zkclient, app, check_existing=False):
         """Read the manifest and placement data from Zk and store it as YAML in
@@ -187,47 +198,145 @@ class EventMgr:
         :param ``bool`` check_existing:
             Whether to check if the file already exists and is up to date.
         """
-        placement_node = z.path.placement(self._hostname, app)
+        self._cache_many(zkclient, [app], check_existing=check_existing)
+        self._save_index()
+
+    def _cache_many(self, zkclient, apps, check_existing=False):
+        """Read the manifests and placement data of apps from Zk and store them
+        as YAML in <cache>/<app>.
+
+        The Zookeeper reads are pipelined, in windows of at most _CACHE_WINDOW
+        apps, and each manifest is written as soon as its data is read.
+
+        :param ``list`` apps:
+            Instance names.
+        :param ``bool`` check_existing:
+            Whether to check if the files are up to date, comparing the
+            placement nodes with the index.
+        """
+        apps = list(apps)
+        for idx in range(0, len(apps), _CACHE_WINDOW):
+            window = apps[idx:idx + _CACHE_WINDOW]
+            if check_existing:
+                window = self._outdated(zkclient, window)
+
+            pending = [
+                (
+                    app,
+                    zkclient.get_async(z.path.placement(self._hostname, app)),
+                    zkclient.get_async(z.path.scheduled(app)),
+                )
+                for app in window
+            ]
+            for app, placement_result, manifest_result in pending:
+                self._store(app, placement_result, manifest_result)
+
+    def _outdated(self, zkclient, apps):
+        """Filter the apps whose cached manifest is not up to date.
+        """
+        index = self._get_index()
+        pending = [
+            (app, zkclient.exists_async(
+                z.path.placement(self._hostname, app)))
+            for app in apps
+        ]
+
+        outdated = []
+        for app, stat_result in pending:
+            placement_stat = stat_result.get()
+            if placement_stat is None:
+                _LOGGER.info('Placement %s/%s not found', self._hostname, app)
+                continue
+
+            manifest_file = os.path.join(self.tm_env.cache_dir, app)
+            if app in index:
+                up_to_date = index[app] == [placement_stat.mzxid,
+                                            placement_stat.ctime]
+            else:
+                # Not indexed yet, compare with the file change time.
+                try:
+                    manifest_time = os.stat(manifest_file).st_ctime
+                except FileNotFoundError:
+                    manifest_time = None
+                up_to_date = bool(
+                    manifest_time and
+                    manifest_time >= placement_stat.ctime / 1000.0
+                )
+                if up_to_date:
+                    index[app] = [placement_stat.mzxid, placement_stat.ctime]
+
+            if up_to_date:
+                _LOGGER.info('%s is up to date', manifest_file)
+            else:
+                outdated.append(app)
+
+        return outdated
+
+    def _store(self, app, placement_result, manifest_result):
+        """Store the manifest of an app from the results of the placement and
+        manifest reads.
+        """
         try:
-            placement_data, placement_metadata = zkutils.get_with_metadata(
-                zkclient, placement_node
-            )
-            placement_time = placement_metadata.ctime / 1000.0
+            placement_data, placement_metadata = placement_result.get()
         except kazoo.exceptions.NoNodeError:
             _LOGGER.info('Placement %s/%s not found', self._hostname, app)
             return
 
         manifest_file = os.path.join(self.tm_env.cache_dir, app)
-        if check_existing:
+        try:
+            manifest_data, _metadata = manifest_result.get()
+        except kazoo.exceptions.NoNodeError:
+            _LOGGER.info('App %s not found', app)
+            return
+
+        manifest = yaml.load(manifest_data)
+        # TODO: need a function to parse instance id from name.
+        manifest['task'] = app[app.index('#') + 1:]
+
+        if placement_data is not None:
+            placement = yaml.load(placement_data)
+            if placement is not None:
+                manifest.update(placement)
+
+        fs.write_safe(
+            manifest_file,
+            lambda f: yaml.dump(manifest, stream=f),
+            prefix='.%s-' % app,
+            mode='w',
+            permission=0o644
+        )
+        self._get_index()[app] = [placement_metadata.mzxid,
+                                  placement_metadata.ctime]
+        _LOGGER.info('Created cache manifest: %s', manifest_file)
+
+    def _get_index(self):
+        """Return the placement index of the cached manifests.
+        """
+        if self._index is None:
+            index_file = os.path.join(self.tm_env.cache_dir, INDEX_FILE)
             try:
-                manifest_time = os.stat(manifest_file).st_ctime
+                with io.open(index_file) as f:
+                    self._index = yaml.load(stream=f)
             except FileNotFoundError:
-                manifest_time = None
+                pass
+            except yaml.YAMLError:
+                _LOGGER.warning('Invalid cache index: %s', index_file)
 
-            if manifest_time and manifest_time >= placement_time:
-                _LOGGER.info('%s is up to date', manifest_file)
-                return
+            if not isinstance(self._index, dict):
+                self._index = {}
 
-        app_node = z.path.scheduled(app)
-        try:
-            manifest = zkutils.get(zkclient, app_node)
-            # TODO: need a function to parse instance id from name.
-            manifest['task'] = app[app.index('#') + 1:]
-
-            if placement_data is not None:
-                manifest.update(placement_data)
-
-            fs.write_safe(
-                manifest_file,
-                lambda f: yaml.dump(manifest, stream=f),
-                prefix='.%s-' % app,
-                mode='w',
-                permission=0o644
-            )
-            _LOGGER.info('Created cache manifest: %s', manifest_file)
+        return self._index
 
-        except kazoo.exceptions.NoNodeError:
-            _LOGGER.info('App %s not found', app)
+    def _save_index(self):
+        """Persist the placement index of the cached manifests.
+        """
+        fs.write_safe(
+            os.path.join(self.tm_env.cache_dir, INDEX_FILE),
+            lambda f: yaml.dump(self._get_index(), stream=f),
+            prefix='.index-',
+            mode='w',
+            permission=0o644
+        )
 
     def _cache_notify(self, is_ready):
         """Send a cache status notification event.
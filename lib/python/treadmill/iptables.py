@@ -862,6 +862,67 @@ def delete_rule(rule, chain=None):
         raise ValueError('Unknown rule type %r' % (type(rule)))
 
 
+def _rule_format(rule):
+    """Format a rule as an iptables rule.
+
+    :param ``DNATRule|SNATRule|PassThroughRule`` rule:
+        Rule to format
+    :returns:
+        ``str`` -- Iptables rule.
+    """
+    if isinstance(rule, firewall.DNATRule):
+        return _dnat_rule_format(rule)
+
+    elif isinstance(rule, firewall.SNATRule):
+        return _snat_rule_format(rule)
+
+    elif isinstance(rule, firewall.PassThroughRule):
+        return _PASSTHROUGH_RULE_PATTERN.format(
+            src_ip=rule.src_ip,
+            dst_ip=rule.dst_ip,
+        )
+    else:
+        raise ValueError('Unknown rule type %r' % (type(rule)))
+
+
+def update_rules(add=(), delete=()):
+    """Add and delete a batch of nat rules in a single transaction.
+
+    All the changes are applied with one iptables-restore invocation. If the
+    transaction is rejected (e.g. one of the rules to delete is already gone),
+    the rules are added/deleted one by one.
+
+    :param ``iterable`` add:
+        (chain, rule) tuples to add
+    :param ``iterable`` delete:
+        (chain, rule) tuples to delete
+    """
+    add = list(add)
+    delete = list(delete)
+    if not add and not delete:
+        return
+
+    lines = ['*nat']
+    lines.extend(
+        '-D {chain} {rule}'.format(chain=chain, rule=_rule_format(rule))
+        for chain, rule in delete
+    )
+    lines.extend(
+        '-A {chain} {rule}'.format(chain=chain, rule=_rule_format(rule))
+        for chain, rule in add
+    )
+    lines.extend(['COMMIT', ''])
+
+    try:
+        _iptables_restore('\n'.join(lines), noflush=True)
+    except subproc.CalledProcessError:
+        _LOGGER.warning('Batch update rejected, applying rules one by one.')
+        for chain, rule in delete:
+            delete_rule(rule, chain=chain)
+        for chain, rule in add:
+            add_rule(rule, chain=chain)
+
+
 def create_set(new_set, set_type='hash:ip', **set_options):
     """Create a new IPSet set"""
     _ipset(
@@ -76,8 +76,12 @@ def cgrp_meminfo(cgrp, *pseudofiles):
     return metrics
 
 
-def read_psmem_stats(appname, allpids):
-    """Reads per-proc memory details stats."""
+def read_psmem_stats(appname, allpids, workers=None):
+    """Reads per-proc memory details stats.
+
+    If workers is set, processes are sampled concurrently (see
+    psmem.get_memory_usage).
+    """
     cgrp = os.path.join('treadmill/apps', appname)
     group_pids = set(cgutils.pids_in_cgroup('memory', cgrp))
 
@@ -85,7 +89,9 @@ def read_psmem_stats(appname, allpids):
     # the set we are interested in.
     #
     # "tasks" contain thread pids that we want to filter out.
-    meminfo = psmem.get_memory_usage(allpids & group_pids, use_pss=True)
+    meminfo = psmem.get_memory_usage(
+        allpids & group_pids, use_pss=True, workers=workers
+    )
     return meminfo
 
 
@@ -0,0 +1,78 @@
+"""Benchmark container network setup time.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+import time
+
+from treadmill import netdev
+
+_LOGGER = logging.getLogger(__name__)
+
+BENCHMARK_CONTAINERS = 50
+BENCHMARK_MTU = 1500
+
+_VETH_PREFIX = 'tmbench'
+
+
+def _container_setup(idx, bridge, mtu):
+    """Host side network setup of a container, as done by the network
+    service.
+    """
+    veth0 = '{prefix}{idx}.0'.format(prefix=_VETH_PREFIX, idx=idx)
+    veth1 = '{prefix}{idx}.1'.format(prefix=_VETH_PREFIX, idx=idx)
+    alias = 'benchmark-{idx}'.format(idx=idx)
+
+    netdev.link_add_veth(veth0, veth1)
+    netdev.link_set_mtu(veth0, mtu)
+    netdev.link_set_mtu(veth1, mtu)
+    netdev.link_set_alias(veth0, alias)
+    netdev.link_set_alias(veth1, alias)
+    if bridge is not None:
+        netdev.bridge_addif(bridge, veth0)
+    netdev.link_set_up(veth0)
+
+    return veth0
+
+
+def benchmark(count=BENCHMARK_CONTAINERS, bridge=None, mtu=BENCHMARK_MTU,
+              use_netlink=True):
+    """Time the network setup of `count` containers.
+
+    Each container's setup is applied as a netdev batch (see
+    :func:`treadmill.netdev.batch`). The devices are removed afterwards.
+
+    :param ``str`` bridge:
+        Name of an existing bridge to add the devices to.
+    :param ``bool`` use_netlink:
+        Apply the batches through rtnetlink (``True``) or ip(8).
+    :returns ``dict``:
+        Total and per container setup time, in seconds.
+    """
+    veths = []
+    start_time = time.time()
+    try:
+        for idx in range(count):
+            with netdev.batch(use_netlink=use_netlink):
+                veths.append(_container_setup(idx, bridge, mtu))
+        setup_time = time.time() - start_time
+
+    finally:
+        try:
+            with netdev.batch(use_netlink=use_netlink):
+                for veth in veths:
+                    netdev.link_del_veth(veth)
+        except Exception:  # pylint: disable=W0703
+            _LOGGER.exception('Unable to remove benchmark devices')
+
+    _LOGGER.info('Setup of %d containers (netlink: %s): %.3fs',
+                 count, use_netlink, setup_time)
+    return {
+        'containers': count,
+        'total': setup_time,
+        'per_container': setup_time / count if count else 0,
+    }
@@ -6,15 +6,20 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import contextlib
 import errno
 import io
 import logging
 import os
+import socket
+import threading
 
 import enum
 import six
 
 from treadmill import subproc
+from treadmill.syscall import netlink
+from treadmill.syscall import rtnetlink
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -26,6 +31,217 @@ _PROC_CONF_FORWARDING = '/proc/sys/net/ipv4/conf/{dev}/forwarding'
 _PROC_CONF_ARP_IGNORE = '/proc/sys/net/ipv4/conf/{dev}/arp_ignore'
 _PROC_CONF_ROUTE_LOCALNET = '/proc/sys/net/ipv4/conf/{dev}/route_localnet'
 
+# Operations recorded by the current thread's batch (see `batch`).
+_BATCH = threading.local()
+
+
+@contextlib.contextmanager
+def batch(use_netlink=True):
+    """Batch network device operations.
+
+    The link, address and route operations invoked in the context are recorded
+    and applied on exit, in order, as a single rtnetlink transaction. If
+    rtnetlink is not available (or `use_netlink` is not set), they are applied
+    one by one through ip(8) instead.
+
+    Other operations (sysfs reads, sysctl settings) are not recorded and are
+    applied immediately.
+
+    Note that the kernel processes all the messages of a transaction, the
+    first error is raised.
+
+    The operations are not atomic: if the batch fails, the veth pairs it
+    created are deleted and the error is raised.
+
+    :raises ``OSError``:
+        If an rtnetlink operation fails.
+    :raises ``subproc.CalledProcessError``:
+        If an ip(8) operation fails.
+    """
+    assert getattr(_BATCH, 'ops', None) is None, 'Nested netdev batch'
+    _BATCH.ops = []
+    try:
+        yield
+        ops = _BATCH.ops
+    finally:
+        _BATCH.ops = None
+
+    if not ops:
+        return
+
+    created = _created_links(ops)
+    try:
+        if use_netlink:
+            try:
+                _netlink_apply(ops)
+                return
+            except _NetlinkUnavailableError as err:
+                _LOGGER.warning('rtnetlink unavailable, using ip: %s', err)
+
+        for func, args, kwargs in ops:
+            func(*args, **kwargs)
+
+    except (subproc.CalledProcessError, OSError):
+        for devname in created:
+            _LOGGER.warning('Batch failed, deleting created link %r',
+                            devname)
+            try:
+                link_del_veth(devname)
+            except (subproc.CalledProcessError, OSError) as err:
+                _LOGGER.warning('Unable to delete %r: %s', devname, err)
+        raise
+
+
+def _record(func, *args, **kwargs):
+    """Record an operation in the current batch, if any.
+
+    :returns ``bool``:
+        ``True`` if the operation was recorded.
+    """
+    ops = getattr(_BATCH, 'ops', None)
+    if ops is None:
+        return False
+
+    ops.append((func, args, kwargs))
+    return True
+
+
+def _created_links(ops):
+    """Names of the veth pairs created by batched operations.
+
+    Devices that exist before the batch is applied are not included, the
+    names follow the renames of the batch.
+    """
+    created = []
+    for func, args, _kwargs in ops:
+        if func is link_add_veth:
+            if not os.path.exists(os.path.join(_SYSFS_NET, args[0])):
+                created.append(args[0])
+        elif func is link_set_name and args[0] in created:
+            created[created.index(args[0])] = args[1]
+    return created
+
+
+class _NetlinkUnavailableError(Exception):
+    """The operations cannot be applied through rtnetlink.
+    """
+
+
+class _NetlinkBatch:
+    """Translate network device operations into rtnetlink messages.
+
+    The methods mirror the module functions. Links are addressed by name so
+    that links created earlier in the batch can be configured, addresses and
+    routes require the link index.
+    """
+
+    __slots__ = (
+        'messages',
+        'seq',
+        '_indexes',
+    )
+
+    def __init__(self, seq):
+        self.messages = []
+        self.seq = seq
+        self._indexes = {}
+
+    def _index(self, devname):
+        """Index of a link, following the renames of the batch."""
+        if devname not in self._indexes:
+            try:
+                self._indexes[devname] = socket.if_nametoindex(devname)
+            except (OSError, socket.error) as err:
+                raise _NetlinkUnavailableError(
+                    'Unknown device %r: %s' % (devname, err)
+                )
+        return self._indexes[devname]
+
+    def _add(self, builder, *args, **kwargs):
+        self.messages.append(
+            builder(self.seq + len(self.messages), *args, **kwargs)
+        )
+
+    def link_set_up(self, devname):
+        """Bring a network device up."""
+        self._add(rtnetlink.link_set, devname, up=True)
+
+    def link_set_down(self, devname):
+        """Bring a network device down."""
+        self._add(rtnetlink.link_set, devname, up=False)
+
+    def link_set_name(self, devname, newname):
+        """Set a network device's name."""
+        index = self._index(devname)
+        self._indexes[newname] = index
+        self._add(rtnetlink.link_set, devname, index=index, name=newname)
+
+    def link_set_alias(self, devname, alias):
+        """Set a network device's alias."""
+        self._add(rtnetlink.link_set, devname, alias=alias)
+
+    def link_set_mtu(self, devname, mtu):
+        """Set a network device's MTU."""
+        self._add(rtnetlink.link_set, devname, mtu=int(mtu))
+
+    def link_set_netns(self, devname, namespace):
+        """Set a network device's namespace."""
+        self._add(rtnetlink.link_set, devname, netns_pid=int(namespace))
+
+    def link_set_addr(self, devname, macaddr):
+        """Set mac address of the link."""
+        self._add(rtnetlink.link_set, devname, address=macaddr)
+
+    def link_add_veth(self, veth0, veth1):
+        """Create a virtual ethernet device pair."""
+        self._add(rtnetlink.link_add_veth, veth0, veth1)
+
+    def link_del_veth(self, devname):
+        """Delete a virtual ethernet device."""
+        self._add(rtnetlink.link_del, devname)
+
+    def addr_add(self, addr, devname, addr_scope='link'):
+        """Add an IP address to a network device."""
+        self._add(rtnetlink.addr_add, addr, self._index(devname),
+                  scope=addr_scope)
+
+    def route_add(self, dest, via=None, devname=None, src=None,
+                  route_scope=None):
+        """Define a new entry in the routing table."""
+        index = self._index(devname) if devname is not None else None
+        self._add(rtnetlink.route_add, dest, via=via, index=index, src=src,
+                  scope=route_scope)
+
+    def bridge_addif(self, brname, interface):
+        """Add an interface to a bridge device."""
+        self._add(rtnetlink.link_set, interface, master=self._index(brname))
+
+    def bridge_delif(self, interface):
+        """Remove an interface from a bridge device."""
+        self._add(rtnetlink.link_set, interface, master=0)
+
+
+def _netlink_apply(ops):
+    """Apply recorded operations in a single rtnetlink transaction.
+
+    :raises ``_NetlinkUnavailableError``:
+        If the operations cannot be applied through rtnetlink. None of them
+        were applied then.
+    """
+    seq = 1
+    nl_batch = _NetlinkBatch(seq)
+    for func, args, kwargs in ops:
+        getattr(nl_batch, func.__name__)(*args, **kwargs)
+
+    try:
+        sock = rtnetlink.rtnetlink_socket()
+    except (OSError, socket.error) as err:
+        raise _NetlinkUnavailableError(err)
+
+    with contextlib.closing(sock):
+        _LOGGER.debug('Applying %d netdev operations', len(ops))
+        netlink.transact(sock, nl_batch.messages, seq)
+
 
 def dev_mtu(devname):
     """Read a device's MTU.
@@ -119,6 +335,9 @@ def link_set_up(devname):
     :param ``str`` devname:
         The name of the network device.
     """
+    if _record(link_set_up, devname):
+        return
+
     subproc.check_call(
         [
             'ip', 'link',
@@ -135,6 +354,9 @@ def link_set_down(devname):
     :param ``str`` devname:
         The name of the network device.
     """
+    if _record(link_set_down, devname):
+        return
+
     subproc.check_call(
         [
             'ip', 'link',
@@ -151,6 +373,9 @@ def link_set_name(devname, newname):
     :param ``str`` devname:
         The current name of the network device.
     """
+    if _record(link_set_name, devname, newname):
+        return
+
     subproc.check_call(
         [
             'ip', 'link',
@@ -167,6 +392,9 @@ def link_set_alias(devname, alias):
     :param ``str`` devname:
         The name of the network device.
     """
+    if _record(link_set_alias, devname, alias):
+        return
+
     subproc.check_call(
         [
             'ip', 'link',
@@ -183,6 +411,9 @@ def link_set_mtu(devname, mtu):
     :param ``str`` devname:
         The name of the network device.
     """
+    if _record(link_set_mtu, devname, mtu):
+        return
+
     subproc.check_call(
         [
             'ip', 'link',
@@ -199,6 +430,9 @@ def link_set_netns(devname, namespace):
     :param ``str`` devname:
         The name of the network device.
     """
+    if _record(link_set_netns, devname, namespace):
+        return
+
     subproc.check_call(
         [
             'ip', 'link',
@@ -217,6 +451,9 @@ def link_set_addr(devname, macaddr):
     :param ``str`` macaddr:
         The mac address.
     """
+    if _record(link_set_addr, devname, macaddr):
+        return
+
     subproc.check_call(
         [
             'ip', 'link',
@@ -235,6 +472,9 @@ def link_add_veth(veth0, veth1):
     :param ``str`` veth1:
         The name of the second network device.
     """
+    if _record(link_add_veth, veth0, veth1):
+        return
+
     subproc.check_call(
         [
             'ip', 'link',
@@ -251,6 +491,9 @@ def link_del_veth(devname):
     :param ``str`` devname:
         The name of the network device.
     """
+    if _record(link_del_veth, devname):
+        return
+
     subproc.check_call(
         [
             'ip', 'link',
@@ -269,6 +512,9 @@ def addr_add(addr, devname, addr_scope='link'):
     :param ``str`` devname:
         The name of the network device.
     """
+    if _record(addr_add, addr, devname, addr_scope=addr_scope):
+        return
+
     subproc.check_call(
         [
             'ip', 'addr',
@@ -287,6 +533,10 @@ def route_add(dest, via=None, devname=None, src=None, route_scope=None):
         The name of the network device.
     """
     assert devname or via
+    if _record(route_add, dest, via=via, devname=devname, src=src,
+               route_scope=route_scope):
+        return
+
     route = [
         'ip', 'route',
         'add', dest,
@@ -360,6 +610,9 @@ def bridge_addif(brname, interface):
     :param ``str`` interface:
         The name of the network device.
     """
+    if _record(bridge_addif, brname, interface):
+        return
+
     subproc.check_call(
         [
             'ip', 'link',
@@ -376,6 +629,9 @@ def bridge_delif(interface):
     :param ``str`` brname:
         The name of the network device.
     """
+    if _record(bridge_delif, interface):
+        return
+
     subproc.check_call(
         [
             'ip', 'link',
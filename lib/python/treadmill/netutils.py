@@ -7,12 +7,21 @@ from __future__ import unicode_literals
 
 import io
 import logging
+import os
+import socket
+
+if os.name == 'posix':
+    from treadmill.syscall import setns
+    from treadmill.syscall import sock_diag
 
 _LOGGER = logging.getLogger(__name__)
 
 # Loopback - 127.0.0.1 IP
 _LOOPBACK_IP = '0100007F'
 
+# Loopback addresses, as reported by sock_diag.
+_LOOPBACK_ADDRS = frozenset(['127.0.0.1', '::1'])
+
 
 def netstat(pid):
     """Parse /proc/net/tcp and return list of ports in listen state."""
@@ -43,3 +52,132 @@ def netstat(pid):
         return set()
 
     return result
+
+
+class ListenScanner:
+    """Scan listening ports in the network namespaces of processes.
+
+    Listening sockets are queried with NETLINK_SOCK_DIAG, filtered to the
+    listen state in the kernel, so the cost of a scan does not depend on the
+    number of established connections.
+
+    The network namespace file descriptor and the sock_diag socket created in
+    it are cached per pid across scans, see :meth:`retain`.
+    """
+    __slots__ = (
+        '_netns',
+        '_seq',
+        '_self_ns',
+    )
+
+    def __init__(self):
+        self._netns = {}
+        self._seq = 0
+        self._self_ns = None
+
+    def scan(self, pid):
+        """Return listening ports in the network namespace of the pid.
+
+        Sockets bound to loopback addresses are not reported. Falls back to
+        :func:`netstat` (TCP/IPv4 only) if sock_diag cannot be used.
+
+        :returns:
+            ``dict`` -- ``{'tcp': set(ports), 'udp': set(ports)}``.
+        """
+        try:
+            sock = self._netns_socket(pid)
+            return {
+                proto: self._listening(sock, proto)
+                for proto in ('tcp', 'udp')
+            }
+        except OSError as err:
+            _LOGGER.warning('sock_diag scan failed, pid %s: %s', pid, err)
+            self._close(pid)
+            return {
+                'tcp': netstat(pid),
+                'udp': set(),
+            }
+
+    def retain(self, pids):
+        """Close cached namespaces of all pids not in the given list.
+        """
+        pids = set(str(pid) for pid in pids)
+        for pid in list(self._netns):
+            if pid not in pids:
+                self._close(pid)
+
+    def close(self):
+        """Close all cached namespaces.
+        """
+        self.retain([])
+        if self._self_ns is not None:
+            os.close(self._self_ns)
+            self._self_ns = None
+
+    def _listening(self, sock, proto):
+        """Return set of non-loopback listening ports on the socket."""
+        ports = set()
+        for family in (socket.AF_INET, socket.AF_INET6):
+            self._seq += 1
+            for addr, port in sock_diag.listening(sock, proto, family,
+                                                  seq=self._seq):
+                if addr not in _LOOPBACK_ADDRS:
+                    ports.add(port)
+        return ports
+
+    def _netns_socket(self, pid):
+        """Return cached sock_diag socket in the pid network namespace.
+
+        Entries are validated against the current namespace inode of the
+        pid, to handle pid reuse.
+        """
+        pid = str(pid)
+        ns_ino = os.stat(_netns_path(pid)).st_ino
+        cached = self._netns.get(pid)
+        if cached is not None:
+            cached_ino, _ns_fd, sock = cached
+            if cached_ino == ns_ino:
+                return sock
+            self._close(pid)
+
+        ns_fd = os.open(_netns_path(pid), os.O_RDONLY)
+        try:
+            sock = self._create_socket(ns_fd, ns_ino)
+        except OSError:
+            os.close(ns_fd)
+            raise
+
+        self._netns[pid] = (ns_ino, ns_fd, sock)
+        return sock
+
+    def _create_socket(self, ns_fd, ns_ino):
+        """Create sock_diag socket in the given network namespace.
+
+        The socket stays bound to the namespace it was created in, the thread
+        switches back to its own namespace right after.
+        """
+        if self._self_ns is None:
+            self._self_ns = os.open(_netns_path('self'), os.O_RDONLY)
+
+        if os.fstat(self._self_ns).st_ino == ns_ino:
+            return sock_diag.sock_diag_socket()
+
+        setns.setns(ns_fd, setns.CLONE_NEWNET)
+        try:
+            return sock_diag.sock_diag_socket()
+        finally:
+            setns.setns(self._self_ns, setns.CLONE_NEWNET)
+
+    def _close(self, pid):
+        """Close cached namespace of the pid."""
+        cached = self._netns.pop(str(pid), None)
+        if cached is None:
+            return
+        _ns_ino, ns_fd, sock = cached
+        sock.close()
+        os.close(ns_fd)
+
+
+def _netns_path(pid):
+    """Return path to the network namespace of the pid."""
+    return '/proc/{}/ns/net'.format(pid)
@@ -15,6 +15,7 @@ import multiprocessing
 from . import utils
 from . import iptables
 from . import netdev
+from . import subproc
 from .syscall import unshare
 
 
@@ -104,50 +105,65 @@ def _configure_veth(veth, dev_ip, gateway_ip, service_ip=None):
     _LOGGER.info('configure container: %s ip = %r(%r), gateway_ip = %r',
                  veth, dev_ip, service_ip, gateway_ip)
 
-    # Bring up loopback
-    netdev.link_set_up('lo')
-
-    # Rename the container's interface to 'eth0'
-    netdev.link_set_name(veth, 'eth0')
-
-    # Configure ARP on container network device
+    # Configure ARP on container network device (the setting follows the
+    # device through the rename below).
     netdev.dev_conf_arp_ignore_set(
-        'eth0',
+        veth,
         netdev.ARP_IGNORE_DO_NOT_REPLY_ANY_ON_HOST
     )
 
-    # Configure the IP address of the container network device
-    if service_ip is not None:
-        # Add the service IP first so that it is what we see in ifconfig
-        netdev.addr_add(
-            '{ip}/32'.format(ip=service_ip),
-            'eth0',
-            addr_scope='host'
-        )
-    netdev.addr_add(
-        '{ip}/32'.format(ip=dev_ip),
-        'eth0',
-        addr_scope='link'
-    )
-
-    netdev.link_set_up('eth0')
-
-    netdev.route_add(
-        gateway_ip,
-        devname='eth0',
-        route_scope='link'
-    )
-
     if service_ip is None:
         route_src = dev_ip
     else:
         route_src = service_ip
 
-    netdev.route_add(
-        'default',
-        via=gateway_ip,
-        src=route_src,
-    )
+    # Apply the links, addresses and routes configuration in one transaction
+    try:
+        with netdev.batch():
+            # Bring up loopback
+            netdev.link_set_up('lo')
+
+            # Rename the container's interface to 'eth0'
+            netdev.link_set_name(veth, 'eth0')
+
+            # Configure the IP address of the container network device
+            if service_ip is not None:
+                # Add the service IP first so that it is what we see in
+                # ifconfig
+                netdev.addr_add(
+                    '{ip}/32'.format(ip=service_ip),
+                    'eth0',
+                    addr_scope='host'
+                )
+            netdev.addr_add(
+                '{ip}/32'.format(ip=dev_ip),
+                'eth0',
+                addr_scope='link'
+            )
+
+            netdev.link_set_up('eth0')
+
+            netdev.route_add(
+                gateway_ip,
+                devname='eth0',
+                route_scope='link'
+            )
+
+            netdev.route_add(
+                'default',
+                via=gateway_ip,
+                src=route_src,
+            )
+
+    except (subproc.CalledProcessError, OSError):
+        # Delete the partially configured device, which also deletes its peer
+        # in the node network namespace.
+        for devname in ('eth0', veth):
+            try:
+                netdev.link_del_veth(devname)
+            except (subproc.CalledProcessError, OSError):
+                pass
+        raise
 
     iptables.initialize_container()
     if service_ip is not None:
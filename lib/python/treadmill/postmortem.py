@@ -143,6 +143,8 @@ def collect_services(approot, archive):
               os.path.join(approot, 'localdisk_svc', '*'))
     _add_glob(archive,
               os.path.join(approot, 'cgroup_svc', '*'))
+    _add_glob(archive,
+              os.path.join(approot, 'port_svc', '*'))
     _add_glob(archive,
               os.path.join(approot, 'presence_svc', '*'))
 
@@ -16,6 +16,8 @@ import logging
 import os
 import sys
 
+from concurrent import futures
+
 from treadmill import sysinfo
 
 _LOGGER = logging.getLogger(__name__)
@@ -32,11 +34,11 @@ def proc_path(*args):
     return os.path.join('/proc', *(str(a) for a in args))
 
 
-def proc_open(*args):
+def proc_open(*args, **kwargs):
     """Helper function to open /proc path.
     """
     try:
-        return io.open(proc_path(*args))
+        return io.open(proc_path(*args), **kwargs)
     except (IOError, OSError):
         val = sys.exc_info()[1]
         # kernel thread or process gone
@@ -66,16 +68,79 @@ def proc_read(*args):
         return f.read()
 
 
+def proc_read_bytes(*args):
+    """Read raw content of /proc file.
+    """
+    with proc_open(*args, mode='rb') as f:
+        return f.read()
+
+
+def _proc_status_field(pid, name):
+    """Read field value from /proc/<pid>/status.
+
+    Fields are looked up by name, as their position depends on the kernel
+    version.
+    """
+    prefix = name + ':'
+    for line in proc_readlines(pid, 'status'):
+        if line.startswith(prefix):
+            return line[len(prefix):].strip()
+    raise LookupError(name)
+
+
 def get_thread_id(pid):
     """Read thread group id designated in /proc/<pid>/status.
     """
-    return proc_readlines(pid, 'status')[2][6:-1]
+    return _proc_status_field(pid, 'Tgid')
 
 
 def get_threads(pid):
     """Read number of threads designated in /proc/<pid>/status.
     """
-    return int(proc_readlines(pid, 'status')[26][8:-1].strip())
+    return int(_proc_status_field(pid, 'Threads'))
+
+
+def _parse_smaps(data):
+    """Sum Shared*, Private* and Pss fields of smaps/smaps_rollup content.
+
+    Single pass over the raw bytes, only lines starting with one of the
+    interesting prefixes are split.
+
+    Returns (private, shared, pss, pss_lines), values in Kbytes.
+    """
+    private = 0
+    shared = 0
+    pss = 0
+    pss_lines = 0
+    for line in data.split(b'\n'):
+        first = line[:1]
+        if first == b'S':
+            if line.startswith(b'Shared'):
+                shared += int(line.split()[1])
+        elif first == b'P':
+            if line.startswith(b'Private'):
+                private += int(line.split()[1])
+            elif line.startswith(b'Pss:'):
+                pss += int(line.split()[1])
+                pss_lines += 1
+
+    return private, shared, pss, pss_lines
+
+
+def _read_smaps(pid):
+    """Read smaps totals for the pid, prefer smaps_rollup if available.
+
+    smaps_rollup (Linux 4.14+) contains the already summed values of all
+    mappings, which is much cheaper to read for processes with large number
+    of mappings (e.g. JVMs).
+    """
+    if os.path.exists(proc_path(pid, 'smaps_rollup')):
+        try:
+            return _parse_smaps(proc_read_bytes(pid, 'smaps_rollup'))
+        except LookupError:
+            _LOGGER.debug('smaps_rollup not readable: %s', pid)
+
+    return _parse_smaps(proc_read_bytes(pid, 'smaps'))
 
 
 def get_mem_stats(pid, use_pss=True):
@@ -86,32 +151,18 @@ def get_mem_stats(pid, use_pss=True):
     statm = proc_readline(pid, 'statm').split()
     rss = int(statm[1]) * _PAGESIZE
 
-    private_lines = []
-    shared_lines = []
-    pss_lines = []
     have_pss = False
 
     if use_pss and os.path.exists(proc_path(pid, 'smaps')):
-        for line in proc_readlines(pid, 'smaps'):
-            if line.startswith('Shared'):
-                shared_lines.append(line)
-            elif line.startswith('Private'):
-                private_lines.append(line)
-            elif line.startswith('Pss'):
-                have_pss = True
-                pss_lines.append(line)
-
-        shared = sum([int(line.split()[1]) for line in shared_lines])
-        private = sum([int(line.split()[1]) for line in private_lines])
+        private, shared, pss, pss_lines = _read_smaps(pid)
 
         # shared + private = rss above
         # the Rss in smaps includes video card mem etc.
-        if have_pss:
+        if pss_lines:
+            have_pss = True
             # add 0.5KiB as this avg error due to trunctation
             pss_adjust = 0.5
-            pss = sum([float(line.split()[1]) + pss_adjust
-                       for line in pss_lines])
-            shared = pss - private
+            shared = pss + pss_lines * pss_adjust - private
     else:
         shared = int(statm[2]) * _PAGESIZE
         private = rss - shared
@@ -164,55 +215,59 @@ def get_cmd_name(pid, verbose):
     return cmd
 
 
-def get_memory_usage(pids, verbose=False, exclude=None, use_pss=True):
-    """Returns memory stats for list of pids, aggregated by cmd line."""
-    # TODO: pylint complains about too many branches, need to refactor.
-    # pylint: disable=R0912
-    meminfos = []
+def _get_meminfo(pid, verbose, exclude, use_pss):
+    """Returns memory stats for a single pid, None if it is to be skipped."""
+    thread_id = int(get_thread_id(pid))
+    if not pid or thread_id != pid:
+        return None
 
-    for pid in pids:
-        thread_id = int(get_thread_id(pid))
-        if not pid or thread_id != pid:
-            continue
+    try:
+        cmd = get_cmd_name(pid, verbose)
+    except LookupError:
+        # kernel threads don't have exe links or
+        # process gone
+        return None
+    except OSError:
+        # operation not permitted
+        return None
+
+    if exclude:
+        for pattern in exclude:
+            if fnmatch.fnmatch(cmd, pattern):
+                return None
+
+    meminfo = {}
+    meminfo['name'] = cmd
+    meminfo['tgid'] = thread_id
+    try:
+        private, shared, _have_pss = get_mem_stats(pid, use_pss=use_pss)
+    except RuntimeError:
+        return None  # process gone
 
-        try:
-            cmd = get_cmd_name(pid, verbose)
-        except LookupError:
-            # kernel threads don't have exe links or
-            # process gone
-            continue
-        except OSError:
-            # operation not permitted
-            continue
-
-        if exclude:
-            match = False
-            for pattern in exclude:
-                if fnmatch.fnmatch(cmd, pattern):
-                    match = True
-                    break
-            if match:
-                continue
-
-        meminfo = {}
-        meminfo['name'] = cmd
-        meminfo['tgid'] = thread_id
-        try:
-            private, shared, have_pss = get_mem_stats(pid, use_pss=use_pss)
-        except RuntimeError:
-            continue  # process gone
+    meminfo['shared'] = shared
+    meminfo['private'] = private
+    meminfo['threads'] = get_threads(pid)
+    meminfo['total'] = meminfo['private'] + meminfo['shared']
+    return meminfo
 
-        if 'shared' in meminfo:
-            if have_pss:
-                meminfo['shared'] += shared
-            else:
-                meminfo['shared'] = max(meminfo['shared'], shared)
-        else:
-            meminfo['shared'] = shared
 
-        meminfo['private'] = meminfo.setdefault('private', 0) + private
-        meminfo['threads'] = get_threads(pid)
-        meminfo['total'] = meminfo['private'] + meminfo['shared']
-        meminfos.append(meminfo)
+def get_memory_usage(pids, verbose=False, exclude=None, use_pss=True,
+                     workers=None):
+    """Returns memory stats for list of pids, aggregated by cmd line.
+
+    If workers is set, processes are sampled concurrently using a thread pool
+    with at most that many threads.
+    """
+    if workers and workers > 1:
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda pid: _get_meminfo(pid, verbose, exclude, use_pss),
+                pids
+            ))
+    else:
+        results = [
+            _get_meminfo(pid, verbose, exclude, use_pss)
+            for pid in pids
+        ]
 
-    return meminfos
+    return [meminfo for meminfo in results if meminfo is not None]
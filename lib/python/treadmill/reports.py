@@ -7,12 +7,19 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 import bz2
+import collections
+import csv
 import datetime
 import fnmatch
 import io
 import itertools
+import json
 import logging
+import math
+import operator
+import struct
 import time
+import zlib
 
 import numpy as np
 import pandas as pd
@@ -25,16 +32,139 @@ from treadmill import traits
 _LOGGER = logging.getLogger(__name__)
 
 
-def servers(cell, trait_codes):
-    """Prepare DataFrame with server information."""
+_SERVERS_COLUMNS = [
+    'name', 'location', 'partition', 'traits',
+    'state', 'valid_until',
+    'mem', 'cpu', 'disk',
+    'mem_free', 'cpu_free', 'disk_free'
+]
+_SERVERS_DTYPES = {
+    'mem': 'int',
+    'cpu': 'int',
+    'disk': 'int',
+    'mem_free': 'int',
+    'cpu_free': 'int',
+    'disk_free': 'int'
+}
 
-    # Hard-code order of columns
-    columns = [
-        'name', 'location', 'partition', 'traits',
-        'state', 'valid_until',
-        'mem', 'cpu', 'disk',
-        'mem_free', 'cpu_free', 'disk_free'
-    ]
+_ALLOCATIONS_COLUMNS = [
+    'partition', 'name', 'mem', 'cpu', 'disk',
+    'rank', 'rank_adj', 'traits', 'max_util'
+]
+_ALLOCATIONS_DTYPES = {
+    'mem': 'int',
+    'cpu': 'int',
+    'disk': 'int'
+}
+
+_APPS_COLUMNS = [
+    'instance', 'allocation', 'rank', 'affinity', 'partition',
+    'identity_group', 'identity',
+    'order', 'lease', 'expires', 'data_retention',
+    'pending', 'server', 'util0', 'util1',
+    'mem', 'cpu', 'disk'
+]
+_APPS_DTYPES = {
+    'mem': 'int',
+    'cpu': 'int',
+    'disk': 'int',
+    'order': 'int',
+    'expires': 'int',
+    'data_retention': 'int',
+    'identity': 'int'
+}
+
+_EXPLAIN_COLUMNS = [
+    'alloc', 'rank', 'util0', 'util1', 'memory', 'cpu', 'disk', 'name', 'pos'
+]
+
+# Header of the binary serialization of reports.
+_REPORT_MAGIC = b'\x93TMREPORT\x01'
+
+
+class Report:
+    """Columnar report.
+
+    The values of each column are kept in a list (or an array), the report is
+    only turned into a DataFrame when it is formatted.
+    """
+
+    __slots__ = (
+        'columns',
+        'data',
+        'dtypes',
+    )
+
+    def __init__(self, columns, data=None, dtypes=None):
+        self.columns = list(columns)
+        if data is None:
+            data = [[] for _ in self.columns]
+        self.data = data
+        self.dtypes = dict(dtypes or {})
+
+    def __len__(self):
+        return len(self.data[0]) if self.data else 0
+
+    @classmethod
+    def from_rows(cls, columns, rows, dtypes=None):
+        """Create a report from row tuples."""
+        data = [list(column) for column in six.moves.zip(*rows)]
+        return cls(columns, data or None, dtypes)
+
+    def column(self, name):
+        """Values of a column."""
+        return self.data[self.columns.index(name)]
+
+    def extend(self, other):
+        """Append the rows of another report with the same columns."""
+        for column, values in six.moves.zip(self.data, other.data):
+            column.extend(values)
+
+    def _values(self, name, values):
+        """Values of a column converted to the dtype of the column."""
+        dtype = self.dtypes.get(name)
+        if dtype is not None:
+            return np.asarray(values, dtype=dtype)
+        if not len(values):  # pylint: disable=len-as-condition
+            return np.array([], dtype=object)
+        return values
+
+    def to_dataframe(self):
+        """Convert the report to a DataFrame."""
+        return pd.DataFrame(
+            collections.OrderedDict(
+                (name, self._values(name, values))
+                for name, values in six.moves.zip(self.columns, self.data)
+            ),
+            columns=self.columns
+        )
+
+    def to_csv(self):
+        """Convert the report to CSV, as serialize_dataframe does."""
+        output = six.StringIO()
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(self.columns)
+        writer.writerows(six.moves.zip(*[
+            [_csv_value(value) for value in self._values(name, values)]
+            for name, values in six.moves.zip(self.columns, self.data)
+        ]))
+        return output.getvalue()
+
+
+def _csv_value(value):
+    """Missing values are written as empty fields, as pandas does."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return value
+
+
+def _partition_name(label):
+    """Name of the partition of a label in the reports."""
+    return label if label else '-'
+
+
+def servers_report(cell, trait_codes):
+    """Prepare columnar report with server information."""
 
     def _server_location(node):
         """Recursively yield the node's parents."""
@@ -42,45 +172,41 @@ def servers(cell, trait_codes):
             yield node.name
             node = node.parent
 
-    def _server_row(server):
-        """Transform server into a DataFrame-ready dict."""
-        partition = list(server.labels)[0]
-        traitz = traits.format_traits(trait_codes, server.traits.traits)
-        row = {
-            'name': server.name,
-            'location': '/'.join(reversed(list(
-                _server_location(server.parent)
-            ))),
-            'partition': partition if partition else '-',
-            'traits': traitz,
-            'state': server.state.value,
-            'valid_until': server.valid_until,
-            'mem': server.init_capacity[0],
-            'cpu': server.init_capacity[1],
-            'disk': server.init_capacity[2],
-            'mem_free': server.free_capacity[0],
-            'cpu_free': server.free_capacity[1],
-            'disk_free': server.free_capacity[2]
-        }
+    def _server_row(server, partition):
+        """Transform server into a report row."""
+        return (
+            server.name,
+            '/'.join(reversed(list(_server_location(server.parent)))),
+            partition,
+            traits.format_traits(trait_codes, server.traits.traits),
+            server.state.value,
+            server.valid_until,
+            server.init_capacity[0],
+            server.init_capacity[1],
+            server.init_capacity[2],
+            server.free_capacity[0],
+            server.free_capacity[1],
+            server.free_capacity[2],
+        )
 
-        return row
+    partitions = collections.defaultdict(list)
+    for server in six.itervalues(cell.members()):
+        partitions[_partition_name(list(server.labels)[0])].append(server)
 
-    rows = [_server_row(server) for server in cell.members().values()]
-    frame = pd.DataFrame.from_dict(rows)
-    if frame.empty:
-        frame = pd.DataFrame(columns=columns)
+    report = Report(_SERVERS_COLUMNS, dtypes=_SERVERS_DTYPES)
+    for partition in sorted(partitions):
+        report.extend(Report.from_rows(_SERVERS_COLUMNS, [
+            _server_row(server, partition)
+            for server in sorted(partitions[partition],
+                                 key=operator.attrgetter('name'))
+        ]))
 
-    frame = frame.astype({
-        'mem': 'int',
-        'cpu': 'int',
-        'disk': 'int',
-        'mem_free': 'int',
-        'cpu_free': 'int',
-        'disk_free': 'int'
-    })
+    return report
 
-    return frame[columns].sort_values(
-        by=['partition', 'name']).reset_index(drop=True)
+
+def servers(cell, trait_codes):
+    """Prepare DataFrame with server information."""
+    return servers_report(cell, trait_codes).to_dataframe()
 
 
 def iterate_allocations(path, alloc):
@@ -103,118 +229,101 @@ def iterate_allocations(path, alloc):
         )
 
 
-def allocations(cell, trait_codes):
-    """Prepare DataFrame with allocation information."""
-
-    # Hard-code order of columns
-    columns = [
-        'partition', 'name', 'mem', 'cpu', 'disk',
-        'rank', 'rank_adj', 'traits', 'max_util'
-    ]
+def allocations_report(cell, trait_codes):
+    """Prepare columnar report with allocation information."""
 
     def _alloc_row(partition, name, alloc):
-        """Transform allocation into a DataFrame-ready dict."""
-        if not name:
-            name = 'root'
-        if not partition:
-            partition = '-'
+        """Transform allocation into a report row."""
+        return (
+            partition,
+            name if name else 'root',
+            alloc.reserved[0],
+            alloc.reserved[1],
+            alloc.reserved[2],
+            alloc.rank,
+            alloc.rank_adjustment,
+            traits.format_traits(trait_codes, alloc.traits),
+            alloc.max_utilization,
+        )
 
-        traitz = traits.format_traits(trait_codes, alloc.traits)
+    report = Report(_ALLOCATIONS_COLUMNS, dtypes=_ALLOCATIONS_DTYPES)
+    for label, partition in sorted(six.iteritems(cell.partitions),
+                                   key=lambda item: _partition_name(item[0])):
+        report.extend(Report.from_rows(_ALLOCATIONS_COLUMNS, sorted(
+            (
+                _alloc_row(_partition_name(label), name, alloc)
+                for name, alloc in iterate_allocations(
+                    [], partition.allocation
+                )
+            ),
+            key=operator.itemgetter(1)
+        )))
 
-        return {
-            'partition': partition,
-            'name': name,
-            'mem': alloc.reserved[0],
-            'cpu': alloc.reserved[1],
-            'disk': alloc.reserved[2],
-            'rank': alloc.rank,
-            'rank_adj': alloc.rank_adjustment,
-            'traits': traitz,
-            'max_util': alloc.max_utilization,
-        }
+    return report
 
-    frame = pd.DataFrame.from_dict(
-        [
-            _alloc_row(label, name, alloc)
-            for label, partition in six.iteritems(cell.partitions)
-            for name, alloc in iterate_allocations(
-                [], partition.allocation
-            )
-        ]
-    )
-    if frame.empty:
-        frame = pd.DataFrame(columns=columns)
 
-    return frame[columns].astype({
-        'mem': 'int',
-        'cpu': 'int',
-        'disk': 'int'
-    }).sort_values(by=['partition', 'name']).reset_index(drop=True)
+def allocations(cell, trait_codes):
+    """Prepare DataFrame with allocation information."""
+    return allocations_report(cell, trait_codes).to_dataframe()
 
 
-def apps(cell, _trait_codes):
-    """Prepare DataFrame with app and queue information."""
+def apps_report(cell, _trait_codes):
+    """Prepare columnar report with app and queue information."""
 
-    # Hard-code order of columns
-    columns = [
-        'instance', 'allocation', 'rank', 'affinity', 'partition',
-        'identity_group', 'identity',
-        'order', 'lease', 'expires', 'data_retention',
-        'pending', 'server', 'util0', 'util1',
-        'mem', 'cpu', 'disk'
-    ]
+    def _na(value):
+        """Replace missing integer values with -1."""
+        return -1 if value is None else value
 
     def _app_row(item):
-        """Transform app into a DataFrame-ready dict."""
+        """Transform app queue entry into a report row."""
         rank, util0, util1, pending, order, app = item
-        return {
-            'instance': app.name,
-            'affinity': app.affinity.name,
-            'allocation': app.allocation.name,
-            'rank': rank,
-            'partition': app.allocation.label or '-',
-            'util0': util0,
-            'util1': util1,
-            'pending': pending,
-            'order': order,
-            'identity_group': app.identity_group,
-            'identity': app.identity,
-            'mem': app.demand[0],
-            'cpu': app.demand[1],
-            'disk': app.demand[2],
-            'lease': app.lease,
-            'expires': app.placement_expiry,
-            'data_retention': app.data_retention_timeout,
-            'server': app.server
-        }
+        return (
+            app.name,
+            app.allocation.name,
+            rank,
+            app.affinity.name,
+            _partition_name(app.allocation.label),
+            app.identity_group,
+            _na(app.identity),
+            order,
+            app.lease,
+            _na(app.placement_expiry),
+            _na(app.data_retention_timeout),
+            pending,
+            app.server,
+            util0,
+            util1,
+            app.demand[0],
+            app.demand[1],
+            app.demand[2],
+        )
 
-    queue = []
-    for partition in cell.partitions.values():
+    report = Report(_APPS_COLUMNS, dtypes=_APPS_DTYPES)
+    for _label, partition in sorted(six.iteritems(cell.partitions),
+                                    key=lambda item: _partition_name(item[0])):
         allocation = partition.allocation
-        queue += allocation.utilization_queue(cell.size(allocation.label))
-
-    frame = pd.DataFrame.from_dict([_app_row(item) for item in queue]).fillna({
-        'expires': -1,
-        'identity': -1,
-        'data_retention': -1
-    })
-    if frame.empty:
-        frame = pd.DataFrame(columns=columns)
-
-    return frame[columns].astype({
-        'mem': 'int',
-        'cpu': 'int',
-        'disk': 'int',
-        'order': 'int',
-        'expires': 'int',
-        'data_retention': 'int',
-        'identity': 'int'
-    }).sort_values(by=['partition',
-                       'rank',
-                       'util0',
-                       'util1',
-                       'pending',
-                       'order']).reset_index(drop=True)
+        queue = sorted(
+            allocation.utilization_queue(cell.size(allocation.label)),
+            key=operator.itemgetter(0, 1, 2, 3, 4)
+        )
+        report.extend(Report.from_rows(
+            _APPS_COLUMNS, [_app_row(item) for item in queue]
+        ))
+
+    return report
+
+
+def apps(cell, trait_codes):
+    """Prepare DataFrame with app and queue information."""
+    return apps_report(cell, trait_codes).to_dataframe()
+
+
+# Columnar builders of the scheduler reports saved in ZooKeeper.
+REPORTS = {
+    'servers': servers_report,
+    'allocations': allocations_report,
+    'apps': apps_report,
+}
 
 
 def utilization(prev_utilization, apps_df):
@@ -223,27 +332,41 @@ def utilization(prev_utilization, apps_df):
     prev_utilization - utilization dataframe before current.
     apps - app queue dataframe.
     """
-    # Passed by ref.
-    row = apps_df.reset_index()
-    if row.empty:
-        return row
-
-    row['count'] = 1
-    row['name'] = row['instance'].apply(lambda x: x.split('#')[0])
-    row = row.groupby('name').agg({'cpu': np.sum,
-                                   'mem': np.sum,
-                                   'disk': np.sum,
-                                   'count': np.sum,
-                                   'util0': np.max,
-                                   'util1': np.max})
-    row = row.stack()
+    if apps_df.empty:
+        return apps_df.reset_index()
+
+    # Aggregate the columns of the apps by name: cpu, mem, disk and count are
+    # summed, util0 and util1 are the max.
+    stats = {}
+    for instance, cpu, mem, disk, util0, util1 in six.moves.zip(
+            apps_df['instance'], apps_df['cpu'], apps_df['mem'],
+            apps_df['disk'], apps_df['util0'], apps_df['util1']):
+        name = instance.split('#')[0]
+        entry = stats.get(name)
+        if entry is None:
+            stats[name] = [cpu, mem, disk, 1, util0, util1]
+        else:
+            entry[0] += cpu
+            entry[1] += mem
+            entry[2] += disk
+            entry[3] += 1
+            entry[4] = max(entry[4], util0)
+            entry[5] = max(entry[5], util1)
+
+    metrics = ['cpu', 'mem', 'disk', 'count', 'util0', 'util1']
+    names = sorted(stats)
+    row = pd.Series(
+        [value for name in names for value in stats[name]],
+        index=pd.MultiIndex.from_product([names, metrics],
+                                         names=['name', None])
+    )
     dt_now = datetime.datetime.fromtimestamp(time.time())
     current = pd.DataFrame([row], index=pd.DatetimeIndex([dt_now]))
 
     if prev_utilization is None:
         return current
     else:
-        return prev_utilization.append(current)
+        return pd.concat([prev_utilization, current])
 
 
 def reboots(cell):
@@ -284,34 +407,29 @@ class ExplainVisitor:
         rank, util_before, util_after, _pending, _order, app = entry
 
         alloc_name = ':'.join(alloc.path)
-        self.result.append({
-            'alloc': alloc_name,
-            'rank': rank,
-            'util0': util_before,
-            'util1': util_after,
-            'memory': int(acc_demand[0]),
-            'cpu': int(acc_demand[1]),
-            'disk': int(acc_demand[2]),
-            'name': app.name,
-        })
+        self.result.append((
+            alloc_name,
+            rank,
+            util_before,
+            util_after,
+            int(acc_demand[0]),
+            int(acc_demand[1]),
+            int(acc_demand[2]),
+            app.name,
+        ))
 
     def finish(self):
         """Post-process result array"""
-        def _sort_order(entry):
-            return (entry['alloc'],
-                    entry['util0'],
-                    entry['util1'])
-
-        result = sorted(self.result, key=_sort_order)
+        result = sorted(self.result, key=operator.itemgetter(0, 2, 3))
 
         # annotate with position in alloc queue
         pos = 1
         alloc = ''
-        for row in result:
-            if row['alloc'] != alloc:
-                alloc = row['alloc']
+        for idx, row in enumerate(result):
+            if row[0] != alloc:
+                alloc = row[0]
                 pos = 1
-            row['pos'] = pos
+            result[idx] = row + (pos,)
             pos = pos + 1
 
         self.result = result
@@ -319,7 +437,7 @@ class ExplainVisitor:
     def filter(self, pattern):
         """Filter result to rows with matching app instances"""
         self.result = [row for row in self.result
-                       if fnmatch.fnmatch(row['name'], pattern)]
+                       if fnmatch.fnmatch(row[7], pattern)]
 
 
 def explain_queue(cell, partition, pattern=None):
@@ -339,7 +457,7 @@ def explain_queue(cell, partition, pattern=None):
     if pattern:
         visitor.filter(pattern)
 
-    return pd.DataFrame(visitor.result)
+    return Report.from_rows(_EXPLAIN_COLUMNS, visitor.result).to_dataframe()
 
 
 def _preorder_walk(node, _app=None):
@@ -418,11 +536,88 @@ def serialize_dataframe(report, compressed=True):
     return result
 
 
+def serialize_report_csv(report):
+    """Serialize a columnar report in the format of serialize_dataframe.
+
+    Readers that do not understand the binary format can still load it.
+    """
+    return bz2.compress(report.to_csv().encode())
+
+
+def _json_default(value):
+    """Serialize the numpy scalars of report columns to JSON."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+def serialize_report(report):
+    """Serialize a columnar report for storing.
+
+    Integer and float columns are stored as arrays of 64 bit values, the other
+    columns as JSON lists. The whole is compressed with zlib.
+    """
+    columns = []
+    blobs = []
+    for name, values in six.moves.zip(report.columns, report.data):
+        array = np.asarray(values)
+        if len(array) and array.dtype.kind in 'iuf':
+            kind = '<f8' if array.dtype.kind == 'f' else '<i8'
+            blob = array.astype(kind).tobytes()
+        else:
+            kind = 'json'
+            blob = json.dumps(
+                list(values), default=_json_default
+            ).encode()
+        columns.append([name, kind, len(blob)])
+        blobs.append(blob)
+
+    header = json.dumps(
+        {'columns': columns, 'dtypes': report.dtypes}
+    ).encode()
+    return _REPORT_MAGIC + zlib.compress(
+        struct.pack('<I', len(header)) + header + b''.join(blobs)
+    )
+
+
+def is_report(data):
+    """Check if data is a report serialized with serialize_report."""
+    return data[:len(_REPORT_MAGIC)] == _REPORT_MAGIC
+
+
+def deserialize_report(data):
+    """Deserialize a columnar report.
+
+    Numeric columns are returned as read-only numpy arrays.
+    """
+    content = zlib.decompress(data[len(_REPORT_MAGIC):])
+    size, = struct.unpack_from('<I', content)
+    header = json.loads(content[4:4 + size].decode())
+
+    offset = 4 + size
+    columns = []
+    values = []
+    for name, kind, length in header['columns']:
+        blob = content[offset:offset + length]
+        offset += length
+        columns.append(name)
+        if kind == 'json':
+            values.append(json.loads(blob.decode()))
+        else:
+            values.append(np.frombuffer(blob, dtype=kind))
+
+    return Report(columns, values, header['dtypes'])
+
+
 def deserialize_dataframe(report):
     """Deserialize a dataframe.
 
-    The dataframe is serialized as CSV and compressed with bzip2.
+    The dataframe is serialized as CSV and compressed with bzip2, or is a
+    report serialized with serialize_report.
     """
+    if is_report(report):
+        return deserialize_report(report).to_dataframe()
+
     try:
         content = bz2.decompress(report)
     except IOError:
@@ -7,15 +7,26 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import abc
+import itertools
+import json
 import logging
 import os
+import sys
+import threading
+
+from concurrent import futures
+
+import tornado
+import tornado.escape
 import tornado.httpserver
+import tornado.httputil
 import tornado.ioloop
 import tornado.web
 import tornado.wsgi
 import tornado.netutil
 
 import flask
+import six
 
 from treadmill import fs
 from treadmill import plugin_manager
@@ -26,6 +37,16 @@ FLASK_APP.config['BUNDLE_ERRORS'] = True
 
 _LOGGER = logging.getLogger(__name__)
 
+# Default number of requests waiting for a thread, in threaded mode, before
+# new requests are rejected.
+_QUEUE_SIZE = 64
+
+# Retry-After of the requests rejected when overloaded, in seconds.
+_RETRY_AFTER = 1
+
+# Interval between reports of the request queue metrics, in milliseconds.
+_STATS_INTERVAL = 60 * 1000
+
 
 class CompliantJsonEncoder(flask.json.JSONEncoder):
     """A JSONEncoder that forces NaN and Infinity into null values.
@@ -47,9 +68,261 @@ class CompliantJsonEncoder(flask.json.JSONEncoder):
 FLASK_APP.json_encoder = CompliantJsonEncoder
 
 
+def _route(path):
+    """Route of a request path, its first path component."""
+    return '/' + path.lstrip('/').split('/', 1)[0]
+
+
+class _Admission:
+    """Admission control of the requests, by total and by route."""
+
+    __slots__ = (
+        '_limit',
+        '_route_limits',
+        '_inflight',
+        '_routes',
+        '_rejected',
+        '_lock',
+    )
+
+    def __init__(self, limit, route_limits=None):
+        self._limit = limit
+        self._route_limits = dict(route_limits or {})
+        self._inflight = 0
+        self._routes = {}
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, route):
+        """Admit a request, False if the server or the route is full."""
+        with self._lock:
+            route_count = self._routes.get(route, 0)
+            route_limit = self._route_limits.get(route)
+            if (self._inflight >= self._limit or
+                    (route_limit is not None and route_count >= route_limit)):
+                self._rejected += 1
+                return False
+
+            self._inflight += 1
+            self._routes[route] = route_count + 1
+            return True
+
+    def release(self, route):
+        """Release an admitted request."""
+        with self._lock:
+            self._inflight -= 1
+            self._routes[route] -= 1
+            if not self._routes[route]:
+                del self._routes[route]
+
+    def stats(self):
+        """Admitted requests, in total and by route, and rejections."""
+        with self._lock:
+            return {
+                'inflight': self._inflight,
+                'routes': dict(self._routes),
+                'rejected': self._rejected,
+            }
+
+
+class ThreadedWSGIContainer(tornado.wsgi.WSGIContainer):
+    """WSGI container running the application on a thread pool.
+
+    The IOLoop keeps serving while requests run. Requests beyond the threads
+    wait in a bounded queue, and are rejected with 503 and Retry-After when
+    the queue, or the concurrency limit of their route, is full.
+    """
+
+    def __init__(self, wsgi_application, threads, queue_size=_QUEUE_SIZE,
+                 route_limits=None, retry_after=_RETRY_AFTER):
+        super(ThreadedWSGIContainer, self).__init__(wsgi_application)
+        self.threads = threads
+        self.retry_after = retry_after
+        self._pool = futures.ThreadPoolExecutor(max_workers=threads)
+        self._admission = _Admission(threads + queue_size, route_limits)
+
+    def stats(self):
+        """Request queue metrics."""
+        stats = self._admission.stats()
+        stats['active'] = min(stats['inflight'], self.threads)
+        stats['queued'] = stats['inflight'] - stats['active']
+        return stats
+
+    def report_stats(self):
+        """Log the request queue metrics."""
+        _LOGGER.info('Requests: %r', self.stats())
+
+    def __call__(self, request):
+        route = _route(request.path)
+        if not self._admission.acquire(route):
+            _LOGGER.warning('Overloaded, rejecting: %s %s',
+                            request.method, request.path)
+            body = json.dumps({'message': 'Server overloaded, retry later.'})
+            self._write(request, '503 Service Unavailable', [
+                ('Content-Type', 'application/json'),
+                ('Retry-After', str(self.retry_after)),
+            ], body.encode())
+            return
+
+        ioloop = tornado.ioloop.IOLoop.current()
+        try:
+            future = self._pool.submit(
+                self._run, request, self.environ(request), ioloop
+            )
+        except Exception:
+            self._admission.release(route)
+            raise
+
+        def _done(_future):
+            """Release the request once its response is written."""
+            self._admission.release(route)
+
+        future.add_done_callback(_done)
+
+    def _run(self, request, environ, ioloop):
+        """Run the application and write its response from the IOLoop.
+
+        A response body of a single chunk is written at once. Longer bodies
+        are streamed, each chunk is written once the previous one was
+        flushed, so that streamed responses are not buffered in memory.
+        """
+        data = {}
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            """WSGI start_response."""
+            if exc_info and data:
+                six.reraise(*exc_info)
+            data['status'] = status
+            data['headers'] = headers
+            return response.append
+
+        app_response = None
+        try:
+            app_response = self.wsgi_application(environ, start_response)
+            chunks = iter(app_response)
+            # Read ahead until the body is known to have more than one chunk.
+            for chunk in chunks:
+                response.append(chunk)
+                if len(response) > 1:
+                    break
+            if not data:
+                raise Exception('WSGI app did not call start_response')
+        except Exception:  # pylint: disable=W0703
+            _LOGGER.error('Request failed.', exc_info=sys.exc_info())
+            _close(app_response)
+            ioloop.add_callback(
+                self._write, request, '500 Internal Server Error', [], b''
+            )
+            return
+
+        status, headers = data['status'], list(data['headers'])
+        if len(response) < 2:
+            _close(app_response)
+            ioloop.add_callback(
+                self._write, request, status, headers, b''.join(response)
+            )
+            return
+
+        try:
+            if _flush(ioloop, self._write_headers, request, status, headers,
+                      response.pop(0), False):
+                for chunk in itertools.chain(response, chunks):
+                    if chunk and not _flush(ioloop, request.connection.write,
+                                            tornado.escape.utf8(chunk)):
+                        break
+        except Exception:  # pylint: disable=W0703
+            _LOGGER.error('Streaming the response failed.',
+                          exc_info=sys.exc_info())
+        finally:
+            _close(app_response)
+            ioloop.add_callback(self._finish, request, status)
+
+    def _write_headers(self, request, status, headers, body,
+                       content_length=True):
+        """Write the response headers and first body chunk."""
+        status_code, reason = status.split(' ', 1)
+        status_code = int(status_code)
+        header_set = {key.lower() for key, _value in headers}
+        body = tornado.escape.utf8(body)
+        if status_code != 304:
+            if content_length and 'content-length' not in header_set:
+                headers.append(('Content-Length', str(len(body))))
+            if 'content-type' not in header_set:
+                headers.append(('Content-Type', 'text/html; charset=UTF-8'))
+        if 'server' not in header_set:
+            headers.append(('Server', 'TornadoServer/%s' % tornado.version))
+
+        start_line = tornado.httputil.ResponseStartLine(
+            'HTTP/1.1', status_code, reason
+        )
+        header_obj = tornado.httputil.HTTPHeaders()
+        for key, value in headers:
+            header_obj.add(key, value)
+        return request.connection.write_headers(start_line, header_obj,
+                                                chunk=body)
+
+    def _finish(self, request, status):
+        """Finish the response."""
+        request.connection.finish()
+        self._log(int(status.split(' ', 1)[0]), request)
+
+    def _write(self, request, status, headers, body):
+        """Write the response to the request connection."""
+        self._write_headers(request, status, headers, body)
+        self._finish(request, status)
+
+
+def _close(app_response):
+    """Close a WSGI application response, if it can be closed."""
+    if hasattr(app_response, 'close'):
+        app_response.close()
+
+
+def _flush(ioloop, func, *args):
+    """Call a write function on the IOLoop, wait until it is flushed.
+
+    :returns ``bool``:
+        ``False`` if the write failed, e.g. if the client went away.
+    """
+    flushed = threading.Event()
+    failed = []
+
+    def _done(future):
+        """Record the write result."""
+        try:
+            if future.exception() is not None:
+                failed.append(future.exception())
+        except Exception as err:  # pylint: disable=W0703
+            failed.append(err)
+        flushed.set()
+
+    def _call():
+        """Write from the IOLoop."""
+        try:
+            future = func(*args)
+        except Exception as err:  # pylint: disable=W0703
+            failed.append(err)
+            flushed.set()
+            return
+        if future is None:
+            flushed.set()
+        else:
+            future.add_done_callback(_done)
+
+    ioloop.add_callback(_call)
+    flushed.wait()
+    return not failed
+
+
 class RestServer:
     """REST Server."""
 
+    # Threaded mode settings, synchronous if threads is 0.
+    threads = 0
+    queue_size = _QUEUE_SIZE
+    route_limits = None
+
     @abc.abstractmethod
     def _setup_auth(self):
         """Setup the http authentication."""
@@ -66,11 +339,22 @@ class RestServer:
 
         FLASK_APP.config['REST_SERVER'] = self
 
-        container = tornado.wsgi.WSGIContainer(FLASK_APP)
+        if self.threads:
+            container = ThreadedWSGIContainer(
+                FLASK_APP, self.threads, queue_size=self.queue_size,
+                route_limits=self.route_limits
+            )
+        else:
+            container = tornado.wsgi.WSGIContainer(FLASK_APP)
         http_server = tornado.httpserver.HTTPServer(container)
 
         self._setup_endpoint(http_server)
 
+        if self.threads:
+            tornado.ioloop.PeriodicCallback(
+                container.report_stats, _STATS_INTERVAL
+            ).start()
+
         tornado.ioloop.IOLoop.current().start()
 
 
@@ -78,7 +362,8 @@ class TcpRestServer(RestServer):
     """TCP based REST Server."""
 
     def __init__(self, port, host='0.0.0.0', auth_type=None, protect=None,
-                 workers=1, backlog=128):
+                 workers=1, backlog=128, threads=0, queue_size=_QUEUE_SIZE,
+                 route_limits=None):
         """Init methods
 
         :param int port: port number to listen on (required)
@@ -87,6 +372,10 @@ class TcpRestServer(RestServer):
         :param str protect: which URLs to protect, default is None
         :param int workers: the number of workers to be forked, default is 1
         :param int backlog: the connection backlog, default is 128
+        :param int threads: the number of request threads, default is 0
+            (requests run synchronously in the IOLoop)
+        :param int queue_size: the number of requests waiting for a thread
+        :param dict route_limits: maximum concurrent requests by route
         """
         self.port = int(port)
         self.host = host
@@ -94,6 +383,9 @@ class TcpRestServer(RestServer):
         self.protect = protect
         self.workers = workers
         self.backlog = backlog
+        self.threads = threads
+        self.queue_size = queue_size
+        self.route_limits = route_limits
 
     def _setup_auth(self):
         """Setup the http authentication."""
@@ -124,12 +416,16 @@ class TcpRestServer(RestServer):
 class UdsRestServer(RestServer):
     """UNIX domain socket based REST Server."""
 
-    def __init__(self, socket, auth_type=None, workers=1, backlog=128):
+    def __init__(self, socket, auth_type=None, workers=1, backlog=128,
+                 threads=0, queue_size=_QUEUE_SIZE, route_limits=None):
         """Init method."""
         self.socket = socket
         self.auth_type = auth_type
         self.workers = workers
         self.backlog = backlog
+        self.threads = threads
+        self.queue_size = queue_size
+        self.route_limits = route_limits
 
     def _setup_auth(self):
         """Setup the http authentication."""
@@ -9,6 +9,7 @@ from __future__ import unicode_literals
 import flask_restplus as restplus
 from flask_restplus import fields, inputs
 
+from treadmill import authz
 from treadmill import exc
 from treadmill import webutils
 
@@ -85,6 +86,9 @@ def init(api, cors, impl):
             """Returns state of the instance list."""
             args = inst_parser.parse_args()
             instances = args.get('instances')
+            authz.prefetch(
+                impl.get, [(instance_id,) for instance_id in instances]
+            )
             states = [impl.get(instance_id) for instance_id in instances]
             return [state for state in states if state is not None]
 
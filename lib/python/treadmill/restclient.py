@@ -8,15 +8,22 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import logging
 import os
+import random
 import re
+import threading
 import time
+
+from concurrent import futures
+
 import requests
 import requests_kerberos
 import simplejson.scanner
 
 from six.moves import http_client
+from six.moves import urllib_parse
 
 from treadmill import restclientopts
 
@@ -35,6 +42,31 @@ _DEFAULT_CONNECT_TIMEOUT = .5
 
 _CONNECTION_ERROR_STATUS_CODE = 599
 
+# Maximum number of idle sessions kept per API endpoint.
+_SESSION_POOL_SIZE = 8
+
+# Retries are delayed by a jittered exponential backoff, in seconds.
+_BACKOFF_BASE = 0.5
+_BACKOFF_MAX = 8
+
+# Hedged requests are sent to the next endpoint when the first one does not
+# respond within this percentile of its recent latencies, or within the
+# default delay until enough latencies are known.
+_HEDGE_PERCENTILE = 95
+_HEDGE_MIN_SAMPLES = 10
+_HEDGE_DEFAULT_DELAY = 0.5
+_LATENCY_SAMPLES = 100
+_HEDGE_WORKERS = 8
+
+_SESSIONS = collections.defaultdict(collections.deque)
+_SESSIONS_LOCK = threading.Lock()
+
+_LATENCIES = collections.defaultdict(
+    lambda: collections.deque(maxlen=_LATENCY_SAMPLES)
+)
+
+_HEDGE_EXECUTOR = []
+
 
 def _krb_auth():
     """Returns kerberos auth object."""
@@ -50,6 +82,67 @@ def _krb_auth():
     )
 
 
+def _endpoint(url):
+    """API endpoint (scheme and location) of a URL."""
+    parsed = urllib_parse.urlsplit(url)
+    return '{}://{}'.format(parsed.scheme, parsed.netloc)
+
+
+def _new_session():
+    """Create a session, authenticating with kerberos by default."""
+    session = requests.Session()
+    session.auth = _krb_auth()
+    if os.name == 'posix':
+        session.mount(requests_unixsocket.DEFAULT_SCHEME,
+                      requests_unixsocket.UnixAdapter())
+    return session
+
+
+def _get_session(endpoint):
+    """Get an idle session to the endpoint.
+
+    Sessions keep their connections alive and their authentication context,
+    and are used by a single request at a time.
+    """
+    with _SESSIONS_LOCK:
+        if _SESSIONS[endpoint]:
+            return _SESSIONS[endpoint].pop()
+    return _new_session()
+
+
+def _put_session(endpoint, session):
+    """Return a session to the pool of the endpoint."""
+    with _SESSIONS_LOCK:
+        if len(_SESSIONS[endpoint]) < _SESSION_POOL_SIZE:
+            _SESSIONS[endpoint].append(session)
+            return
+    session.close()
+
+
+def _backoff(retry):
+    """Delay before the given retry, exponential with jitter."""
+    delay = min(_BACKOFF_MAX, _BACKOFF_BASE * (2 ** retry))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _hedge_delay(url):
+    """Delay before hedging a request to the endpoint of the URL."""
+    latencies = sorted(_LATENCIES[_endpoint(url)])
+    if len(latencies) < _HEDGE_MIN_SAMPLES:
+        return _HEDGE_DEFAULT_DELAY
+    return latencies[(len(latencies) - 1) * _HEDGE_PERCENTILE // 100]
+
+
+def _hedge_executor():
+    """Executor running the hedged requests."""
+    with _SESSIONS_LOCK:
+        if not _HEDGE_EXECUTOR:
+            _HEDGE_EXECUTOR.append(
+                futures.ThreadPoolExecutor(max_workers=_HEDGE_WORKERS)
+            )
+        return _HEDGE_EXECUTOR[0]
+
+
 def _msg(response):
     """Get response error message."""
     try:
@@ -176,26 +269,32 @@ def _call(url, method, payload=None, headers=None, auth=None,
     _LOGGER.debug('http: %s %s, payload: %s, headers: %s, timeout: %s',
                   method, url, payload, headers, timeout)
 
-    if auth is None:
-        auth = _krb_auth()
-
+    # Session auth (kerberos) is used if auth is None.
     method_kwargs = dict(auth=auth, proxies=proxies, headers=headers,
                          timeout=timeout, stream=stream, verify=verify,
                          allow_redirects=allow_redirects)
 
     method_kwargs['json' if payload_to_json else 'data'] = payload
 
+    endpoint = _endpoint(url)
+    session = _get_session(endpoint)
+    start = time.time()
     try:
         # pylint: disable=not-callable
-        response = getattr(requests, method.lower())(url, **method_kwargs)
+        response = getattr(session, method.lower())(url, **method_kwargs)
         _LOGGER.debug('response: %r', response)
     except requests.exceptions.ConnectionError:
         _LOGGER.debug('Connection error: %r', url)
+        session.close()
         return False, None, _CONNECTION_ERROR_STATUS_CODE
     except requests.exceptions.Timeout:
         _LOGGER.debug('Request timeout: %r', timeout)
+        session.close()
         return False, None, http_client.REQUEST_TIMEOUT
 
+    _LATENCIES[endpoint].append(time.time() - start)
+    _put_session(endpoint, session)
+
     if _is_success(response.status_code) or _is_info(response.status_code):
         return True, response, response.status_code
 
@@ -232,10 +331,58 @@ def _call_list(urls, method, payload=None, headers=None, auth=None,
     return False, attempts
 
 
+def _call_list_hedged(urls, method, payload=None, headers=None, auth=None,
+                      proxies=None, timeout=None, stream=None, verify=True,
+                      payload_to_json=True, allow_redirects=True):
+    """Call list of supplied URLs, hedging slow requests.
+
+    If a request does not complete within the usual latency of its endpoint,
+    the next URL is called as well and the first successful response wins.
+    """
+    _LOGGER.debug('Call %s on %r, hedged', method, urls)
+    executor = _hedge_executor()
+    urls = list(urls)
+    attempts = []
+    pending = {}
+    while urls or pending:
+        delay = None
+        if urls:
+            url = urls.pop(0)
+            pending[executor.submit(
+                _call, url, method, payload, headers, auth, proxies,
+                timeout=timeout, stream=stream, verify=verify,
+                payload_to_json=payload_to_json,
+                allow_redirects=allow_redirects,
+            )] = url
+            if urls:
+                delay = _hedge_delay(url)
+
+        done, _not_done = futures.wait(
+            pending, timeout=delay, return_when=futures.FIRST_COMPLETED
+        )
+        for future in done:
+            url = pending.pop(future)
+            success, response, status_code = future.result()
+            if success:
+                return success, response
+
+            attempts.append((time.time(), url, status_code, _msg(response)))
+
+    return False, attempts
+
+
 def _call_list_with_retry(urls, method, payload, headers, auth, proxies,
                           retries, timeout=None, stream=None, verify=True,
-                          payload_to_json=True, allow_redirects=True):
-    """Call list of supplied URLs with retry."""
+                          payload_to_json=True, allow_redirects=True,
+                          hedge=False):
+    """Call list of supplied URLs with retry.
+
+    Only idempotent (get) requests are hedged.
+    """
+    call_list = _call_list
+    if hedge and method == 'get' and len(urls) > 1:
+        call_list = _call_list_hedged
+
     if timeout is None:
         if method == 'get':
             timeout = _DEFAULT_REQUEST_TIMEOUT
@@ -245,7 +392,7 @@ def _call_list_with_retry(urls, method, payload, headers, auth, proxies,
     retry = 0
     attempts = []
     while True:
-        success, response = _call_list(
+        success, response = call_list(
             urls, method, payload, headers, auth, proxies,
             timeout=(_DEFAULT_CONNECT_TIMEOUT + retry, timeout),
             stream=stream, verify=verify,
@@ -260,12 +407,13 @@ def _call_list_with_retry(urls, method, payload, headers, auth, proxies,
         if retry >= retries:
             raise MaxRequestRetriesError(attempts)
 
-        time.sleep(1)
+        time.sleep(_backoff(retry))
 
 
 def call(api, url, method, payload=None, headers=None, auth=None,
          proxies=None, retries=_NUM_OF_RETRIES, timeout=None, stream=None,
-         verify=True, payload_to_json=True, allow_redirects=True):
+         verify=True, payload_to_json=True, allow_redirects=True,
+         hedge=False):
     """Call url(s) with retry."""
     if not api:
         raise NoApiEndpointsError()
@@ -278,17 +426,17 @@ def call(api, url, method, payload=None, headers=None, auth=None,
         method, payload, headers, auth, proxies, retries, timeout=timeout,
         stream=stream, verify=verify,
         payload_to_json=payload_to_json,
-        allow_redirects=allow_redirects)
+        allow_redirects=allow_redirects, hedge=hedge)
 
 
 def get(api, url, headers=None, auth=None, proxies=None,
         retries=_NUM_OF_RETRIES, timeout=None, stream=None, verify=True,
-        allow_redirects=True):
+        allow_redirects=True, hedge=False):
     """Convenience function to get a resoure"""
     return call(api, url, 'get',
                 headers=headers, auth=auth, proxies=proxies, retries=retries,
                 timeout=timeout, stream=stream, verify=verify,
-                allow_redirects=allow_redirects)
+                allow_redirects=allow_redirects, hedge=hedge)
 
 
 def post(api, url, payload, headers=None, auth=None, proxies=None,
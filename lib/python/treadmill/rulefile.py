@@ -278,6 +278,76 @@ class RuleMgr:
                                   rule_file)
                 raise
 
+    def create_rules(self, chain_rules, owner):
+        """Creates the rule symlinks of a batch of rules.
+
+        :param ``iterable`` chain_rules:
+            (chain, rule) tuples
+        :param ``str`` owner:
+            Unique container ID of the owner of the rules
+        """
+        for chain, rule in chain_rules:
+            self.create_rule(chain=chain, rule=rule, owner=owner)
+
+    def unlink_rules(self, chain_rules, owner):
+        """Unlinks the rule symlinks of a batch of rules.
+
+        :param ``iterable`` chain_rules:
+            (chain, rule) tuples
+        :param ``str`` owner:
+            Unique container ID of the owner of the rules
+        """
+        for chain, rule in chain_rules:
+            self.unlink_rule(chain=chain, rule=rule, owner=owner)
+
+    def get_owner_rules(self, owner, chains=None):
+        """Return the rules owned by owner.
+
+        :param ``str`` owner:
+            Unique container ID of the owner of the rules
+        :param ``iterable`` chains:
+            Only return rules of these chains (default: all chains)
+        :returns:
+            ``set`` -- Set of chain/rule tuples
+        """
+        rules = set()
+        for entry in self._list_rules():
+            chain_rule = self.get_rule(entry)
+            if chain_rule is None:
+                continue
+            if chains is not None and chain_rule[0] not in chains:
+                continue
+            try:
+                existing_owner = os.readlink(
+                    os.path.join(self._base_path, entry)
+                )
+            except OSError as err:
+                if err.errno == errno.ENOENT:
+                    continue
+                raise
+            if os.path.basename(existing_owner) == owner:
+                rules.add(chain_rule)
+
+        return rules
+
+    def sync_rules(self, chain_rules, owner, chains):
+        """Make the rules owned by owner in chains match chain_rules.
+
+        The rules directory is listed once, then only the differences are
+        created/unlinked.
+
+        :param ``iterable`` chain_rules:
+            Desired (chain, rule) tuples
+        :param ``str`` owner:
+            Unique container ID of the owner of the rules
+        :param ``iterable`` chains:
+            Chains managed by this owner, rules of other chains are untouched
+        """
+        target = set(chain_rules)
+        current = self.get_owner_rules(owner, chains=set(chains))
+        self.unlink_rules(current - target, owner)
+        self.create_rules(target - current, owner)
+
     def garbage_collect(self):
         """Garbage collect all rules without owner.
         """
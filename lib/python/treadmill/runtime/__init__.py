@@ -7,11 +7,14 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 
+import contextlib
 import errno
 import glob
+import io
 import logging
 import os
 import random
+import shutil
 import socket
 import tarfile
 
@@ -25,6 +28,7 @@ from treadmill import exc
 from treadmill import fs
 from treadmill import utils
 from treadmill import plugin_manager
+from treadmill import services
 
 from treadmill.appcfg import abort as app_abort
 from treadmill.appcfg import manifest as app_manifest
@@ -34,6 +38,20 @@ STATE_JSON = 'state.json'
 _LOGGER = logging.getLogger(__name__)
 
 _ARCHIVE_LIMIT = utils.size_to_bytes('1G')
+_ARCHIVES_INDEX = '.index'
+# Files of the container directory stored in the sys and services archives.
+_SYS_ARCHIVE_FILES = (
+    os.path.join('sys', '*', 'data', 'log', 'current'),
+    '*.rrd',
+    '*.yml',
+    '*.json',
+    os.path.join('log', 'current'),
+)
+_APP_ARCHIVE_FILES = (
+    os.path.join('services', '*', 'data', 'log', 'current'),
+)
+# Number of port service allocations tried before giving up.
+_PORT_BIND_ATTEMPTS = 5
 _RUNTIME_NAMESPACE = 'treadmill.runtime'
 
 if os.name == 'posix':
@@ -129,6 +147,31 @@ def save_app(manifest, container_dir, app_json=STATE_JSON):
     return utils.to_obj(manifest)
 
 
+def _bind_socket(host_ip, sock_type, real_port):
+    """Return a socket bound to `real_port`.
+
+    :returns:
+        The socket, or ``None`` if the port is already in use.
+    """
+    socket_ = socket.socket(socket.AF_INET, sock_type)
+    try:
+        socket_.bind((host_ip, real_port))
+        if sock_type == socket.SOCK_STREAM:
+            socket_.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            socket_.listen(0)
+    except socket.error as err:
+        socket_.close()
+        if err.errno == errno.EADDRINUSE:
+            return None
+        raise
+
+    if six.PY3:
+        # We want the sockets to survive an execv
+        socket_.set_inheritable(True)
+
+    return socket_
+
+
 def _allocate_sockets(environment, host_ip, sock_type, count):
     """Return a list of `count` socket bound to an ephemeral port.
     """
@@ -148,22 +191,9 @@ def _allocate_sockets(environment, host_ip, sock_type, count):
         if len(sockets) == count:
             break
 
-        socket_ = socket.socket(socket.AF_INET, sock_type)
-        try:
-            socket_.bind((host_ip, real_port))
-            if sock_type == socket.SOCK_STREAM:
-                socket_.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                socket_.listen(0)
-        except socket.error as err:
-            if err.errno == errno.EADDRINUSE:
-                continue
-            raise
-
-        if six.PY3:
-            # We want the sockets to survive an execv
-            socket_.set_inheritable(True)
-
-        sockets.append(socket_)
+        socket_ = _bind_socket(host_ip, sock_type, real_port)
+        if socket_ is not None:
+            sockets.append(socket_)
     else:
         raise exc.ContainerSetupError('{0} < {1}'.format(len(sockets), count),
                                       app_abort.AbortedReason.PORTS)
@@ -171,20 +201,18 @@ def _allocate_sockets(environment, host_ip, sock_type, count):
     return sockets
 
 
-def _allocate_network_ports_proto(host_ip, manifest, proto, so_type):
-    """Allocate ports for named and unnamed endpoints given protocol."""
-    ephemeral_count = manifest['ephemeral_ports'].get(proto, 0)
+def _endpoints(manifest, proto):
+    """Endpoints of the manifest for the given protocol."""
+    return [ep for ep in manifest['endpoints']
+            if ep.get('proto', 'tcp') == proto]
 
-    endpoints = [ep for ep in manifest['endpoints']
-                 if ep.get('proto', 'tcp') == proto]
-    endpoints_count = len(endpoints)
 
-    sockets = _allocate_sockets(
-        manifest['environment'],
-        host_ip,
-        so_type,
-        endpoints_count + ephemeral_count
-    )
+def _assign_network_ports(manifest, proto, sockets):
+    """Assign the ports of the bound sockets to the endpoints and ephemeral
+    ports of the manifest.
+    """
+    endpoints = _endpoints(manifest, proto)
+    endpoints_count = len(endpoints)
 
     for idx, endpoint in enumerate(endpoints):
         sock = sockets[idx]
@@ -205,6 +233,20 @@ def _allocate_network_ports_proto(host_ip, manifest, proto, so_type):
         for sock in sockets[endpoints_count:]
     ]
 
+
+def _allocate_network_ports_proto(host_ip, manifest, proto, so_type):
+    """Allocate ports for named and unnamed endpoints given protocol."""
+    ephemeral_count = manifest['ephemeral_ports'].get(proto, 0)
+    endpoints_count = len(_endpoints(manifest, proto))
+
+    sockets = _allocate_sockets(
+        manifest['environment'],
+        host_ip,
+        so_type,
+        endpoints_count + ephemeral_count
+    )
+    _assign_network_ports(manifest, proto, sockets)
+
     return sockets
 
 
@@ -225,36 +267,234 @@ def allocate_network_ports(host_ip, manifest):
     return tcp_sockets + udp_sockets
 
 
-def _cleanup_archive_dir(tm_env):
-    """Delete old files from archive directory if space exceeds the threshold.
+def port_request(manifest):
+    """Port service request of the endpoints and ephemeral ports of the
+    manifest.
+    """
+    ephemeral_ports = manifest.get('ephemeral_ports', {})
+    return {
+        'environment': manifest['environment'],
+        'tcp': (len(_endpoints(manifest, 'tcp')) +
+                ephemeral_ports.get('tcp', 0)),
+        'udp': (len(_endpoints(manifest, 'udp')) +
+                ephemeral_ports.get('udp', 0)),
+    }
+
+
+def bind_network_ports(host_ip, manifest, port_client, rsrc_id,
+                       port_req=None):
+    """Bind the ports allocated by the port service to the endpoints and
+    ephemeral ports.
+
+    The ports the service allocated but that are in use on the host are
+    excluded from the request, and new ports are requested in their place.
+
+    :param port_client:
+        Port service client, the request `rsrc_id` was put already.
+    :param ``dict`` port_req:
+        The port service request, see :func:`port_request`.
+    :returns:
+        ``list`` of bound sockets
+    """
+    if port_req is None:
+        port_req = port_request(manifest)
+    port_req = dict(port_req, exclude={'tcp': [], 'udp': []})
+
+    for _attempt in six.moves.range(_PORT_BIND_ATTEMPTS):
+        try:
+            ports = port_client.wait(rsrc_id)
+        except services.ResourceServiceRequestError as err:
+            raise exc.ContainerSetupError(str(err),
+                                          app_abort.AbortedReason.PORTS)
+
+        sockets = {'tcp': [], 'udp': []}
+        in_use = False
+        for proto, so_type in (('tcp', socket.SOCK_STREAM),
+                               ('udp', socket.SOCK_DGRAM)):
+            for real_port in ports[proto]:
+                socket_ = _bind_socket(host_ip, so_type, real_port)
+                if socket_ is None:
+                    _LOGGER.info('Allocated port in use: %s/%s',
+                                 real_port, proto)
+                    port_req['exclude'][proto].append(real_port)
+                    in_use = True
+                else:
+                    sockets[proto].append(socket_)
+
+        if not in_use:
+            _assign_network_ports(manifest, 'tcp', sockets['tcp'])
+            _assign_network_ports(manifest, 'udp', sockets['udp'])
+            return sockets['tcp'] + sockets['udp']
+
+        for socket_ in sockets['tcp'] + sockets['udp']:
+            socket_.close()
+        port_client.put(rsrc_id, port_req)
+
+    raise exc.ContainerSetupError(
+        'Allocated ports in use: {}'.format(port_req['exclude']),
+        app_abort.AbortedReason.PORTS
+    )
+
+
+def _read_archives_index(index_file):
+    """Read the archives index.
+
+    :returns:
+        ``list`` of ``(name, size)``, oldest first, or ``None`` if there is no
+        valid index.
+    """
+    try:
+        with io.open(index_file) as f:
+            return [
+                (name, int(size))
+                for size, name in (
+                    line.split(' ', 1) for line in f.read().splitlines()
+                )
+            ]
+    except IOError as err:
+        if err.errno == errno.ENOENT:
+            return None
+        raise
+    except ValueError:
+        _LOGGER.warning('Invalid archives index: %s', index_file)
+        return None
+
+
+def _scan_archives(archives_dir):
+    """List the archives with their size, oldest first.
     """
-    archives = glob.glob(os.path.join(tm_env.archives_dir, '*'))
     infos = []
-    dir_size = 0
-    for archive in archives:
+    for archive in glob.glob(os.path.join(archives_dir, '*')):
         archive_stat = os.stat(archive)
-        dir_size += archive_stat.st_size
-        infos.append((archive_stat.st_mtime, archive_stat.st_size, archive))
+        infos.append(
+            (archive_stat.st_mtime, os.path.basename(archive),
+             archive_stat.st_size)
+        )
+
+    return [(name, size) for _mtime, name, size in sorted(infos)]
+
+
+@contextlib.contextmanager
+def _archives_index_lock(index_file):
+    """Serialize the archives index updates."""
+    if os.name == 'posix':
+        with utils.FileLock(index_file):
+            yield
+    else:
+        yield
+
 
-    if dir_size <= _ARCHIVE_LIMIT:
-        _LOGGER.info('Archive directory below threshold: %s', dir_size)
-        return
+def _cleanup_archive_dir(tm_env, new_archives=()):
+    """Delete old files from archive directory if space exceeds the threshold.
+
+    The archive sizes are accounted for in an index, so only the new archives
+    are stat'ed. The index is rebuilt from the directory if missing, or if it
+    does not list the same archives as the directory.
+
+    :param ``list`` new_archives:
+        Paths of the archives created since the last call.
+    """
+    index_file = os.path.join(tm_env.archives_dir, _ARCHIVES_INDEX)
+    with _archives_index_lock(index_file):
+        infos = _read_archives_index(index_file)
+        if infos is not None:
+            for archive in new_archives:
+                name = os.path.basename(archive)
+                infos = [info for info in infos if info[0] != name]
+                try:
+                    infos.append((name, os.stat(archive).st_size))
+                except OSError as err:
+                    if err.errno != errno.ENOENT:
+                        raise
+
+            # Archives added or removed behind our back.
+            names = set(
+                os.path.basename(archive)
+                for archive in glob.glob(os.path.join(tm_env.archives_dir,
+                                                      '*'))
+            )
+            if names != set(name for name, _size in infos):
+                _LOGGER.info('Archives index out of date, rescanning.')
+                infos = None
+
+        if infos is None:
+            infos = _scan_archives(tm_env.archives_dir)
+
+        dir_size = sum(size for _name, size in infos)
+        if dir_size <= _ARCHIVE_LIMIT:
+            _LOGGER.info('Archive directory below threshold: %s', dir_size)
+        else:
+            _LOGGER.info('Archive directory above threshold: %s gt %s',
+                         dir_size, _ARCHIVE_LIMIT)
+            while infos and dir_size > _ARCHIVE_LIMIT:
+                name, size = infos.pop(0)
+                dir_size -= size
+                _LOGGER.info('Unlink old archive %s: size: %s', name, size)
+                fs.rm_safe(os.path.join(tm_env.archives_dir, name))
+
+        fs.write_safe(
+            index_file,
+            lambda f: f.writelines(
+                '{} {}\n'.format(size, name) for name, size in infos
+            ),
+            mode='w',
+            permission=0o644
+        )
 
-    _LOGGER.info('Archive directory above threshold: %s gt %s',
-                 dir_size, _ARCHIVE_LIMIT)
-    infos.sort()
-    while dir_size > _ARCHIVE_LIMIT:
-        ctime, size, archive = infos.pop(0)
-        dir_size -= size
-        _LOGGER.info('Unlink old archive %s: ctime: %s, size: %s',
-                     archive, ctime, size)
-        fs.rm_safe(archive)
 
+def _archived_files(container_dir, patterns):
+    """List the files of the container directory matching the patterns.
+    """
+    files = []
+    for pattern in patterns:
+        files.extend(glob.glob(os.path.join(container_dir, pattern)))
+    return files
 
-def archive_logs(tm_env, name, container_dir):
-    """Archive latest sys and services logs."""
-    _cleanup_archive_dir(tm_env)
 
+def queue_archive(tm_env, name, container_dir):
+    """Queue the logs of a container to be archived in the background.
+
+    The files to archive are hard linked (copied across filesystems) into the
+    archiving queue, so the container directory can be removed right away.
+    """
+    queued_dir = os.path.join(tm_env.archiving_dir, name)
+    tmp_dir = os.path.join(tm_env.archiving_dir, '.' + name)
+    fs.rmtree_safe(tmp_dir)
+    fs.mkdir_safe(tmp_dir)
+
+    for filename in _archived_files(container_dir,
+                                    _SYS_ARCHIVE_FILES + _APP_ARCHIVE_FILES):
+        queued = os.path.join(tmp_dir, filename[len(container_dir) + 1:])
+        fs.mkdir_safe(os.path.dirname(queued))
+        try:
+            os.link(filename, queued)
+        except OSError as err:
+            if err.errno != errno.EXDEV:
+                raise
+            shutil.copy2(filename, queued)
+
+    fs.rmtree_safe(queued_dir)
+    os.rename(tmp_dir, queued_dir)
+    _LOGGER.info('Queued archive: %s', queued_dir)
+
+
+def archive_queued(tm_env, queued_dir, executor=None):
+    """Archive the logs of a container queued by `queue_archive`, then
+    remove them from the queue.
+    """
+    try:
+        archive_logs(tm_env, os.path.basename(queued_dir), queued_dir,
+                     executor=executor)
+    finally:
+        fs.rmtree_safe(queued_dir)
+
+
+def archive_logs(tm_env, name, container_dir, executor=None):
+    """Archive latest sys and services logs.
+
+    :param ``concurrent.futures.Executor`` executor:
+        Create the sys and services archives concurrently on this executor.
+    """
     sys_archive_name = os.path.join(tm_env.archives_dir, name + '.sys.tar.gz')
     app_archive_name = os.path.join(tm_env.archives_dir, name + '.app.tar.gz')
 
@@ -268,26 +508,29 @@ def archive_logs(tm_env, name, container_dir):
             else:
                 raise
 
-    with tarfile.open(sys_archive_name, 'w:gz') as f:
-        logs = glob.glob(
-            os.path.join(container_dir, 'sys', '*', 'data', 'log', 'current'))
-        for log in logs:
-            _add(f, log)
-
-        metrics = glob.glob(os.path.join(container_dir, '*.rrd'))
-        for metric in metrics:
-            _add(f, metric)
-
-        yml_cfgs = glob.glob(os.path.join(container_dir, '*.yml'))
-        json_cfgs = glob.glob(os.path.join(container_dir, '*.json'))
-        for cfg in yml_cfgs + json_cfgs:
-            _add(f, cfg)
-
-        _add(f, os.path.join(container_dir, 'log', 'current'))
-
-    with tarfile.open(app_archive_name, 'w:gz') as f:
-        logs = glob.glob(
-            os.path.join(container_dir, 'services', '*', 'data', 'log',
-                         'current'))
-        for log in logs:
-            _add(f, log)
+    def _archive_sys():
+        """Archive the system services logs, metrics and configuration."""
+        with tarfile.open(sys_archive_name, 'w:gz') as f:
+            for filename in _archived_files(container_dir,
+                                            _SYS_ARCHIVE_FILES):
+                _add(f, filename)
+
+    def _archive_app():
+        """Archive the services logs."""
+        with tarfile.open(app_archive_name, 'w:gz') as f:
+            for filename in _archived_files(container_dir,
+                                            _APP_ARCHIVE_FILES):
+                _add(f, filename)
+
+    if executor is None:
+        _archive_sys()
+        _archive_app()
+    else:
+        futures = [
+            executor.submit(_archive_sys),
+            executor.submit(_archive_app),
+        ]
+        for future in futures:
+            future.result()
+
+    _cleanup_archive_dir(tm_env, [sys_archive_name, app_archive_name])
@@ -34,6 +34,11 @@ _LOGGER = logging.getLogger(__name__)
 
 def finish(tm_env, container_dir):
     """Frees allocated resources and mark then as available.
+
+    The cleanup is done in two phases. The critical phase releases the
+    resources visible to the scheduler and other containers, then the finish
+    events are posted. The deferred phase then queues the metrics and the
+    logs, which are archived in the background by the archive service.
     """
     container = os.path.basename(container_dir)
     with lc.LogContext(_LOGGER, container, lc.ContainerAdapter):
@@ -69,6 +74,9 @@ def finish(tm_env, container_dir):
             if exitinfo is not None:
                 _post_exit_event(tm_env, appname, exitinfo)
 
+        if app:
+            _cleanup_deferred(tm_env, data_dir, app)
+
 
 def _collect_finish_info(container_dir):
     """Read exitinfo, aborted, oom and terminated files to check how container
@@ -152,7 +160,7 @@ def _post_exit_event(tm_env, appname, exitinfo):
 
 
 def _cleanup(tm_env, container_dir, app):
-    """Cleanup a container that actually ran.
+    """Release the resources of a container that actually ran.
     """
     # Generate a unique name for the app
     unique_name = appcfg.app_unique_name(app)
@@ -166,6 +174,9 @@ def _cleanup(tm_env, container_dir, app):
     network_client = tm_env.svc_network.make_client(
         os.path.join(container_dir, 'resources', 'network')
     )
+    port_client = tm_env.svc_port.make_client(
+        os.path.join(container_dir, 'resources', 'port')
+    )
     presence_client = tm_env.svc_presence.make_client(
         os.path.join(container_dir, 'resources', 'presence')
     )
@@ -185,6 +196,25 @@ def _cleanup(tm_env, container_dir, app):
     if hasattr(app, 'shared_network') and not app.shared_network:
         _cleanup_network(tm_env, container_dir, app, network_client)
 
+    # Release the ports (their firewall rules are cleaned up with the network)
+    port_client.delete(unique_name)
+
+    # Cleanup our cgroup resources
+    try:
+        cgroup_client.delete(unique_name)
+    except (IOError, OSError) as err:
+        if err.errno == errno.ENOENT:
+            pass
+        else:
+            raise
+
+
+def _cleanup_deferred(tm_env, container_dir, app):
+    """Queue the metrics and the logs of a container that actually ran to
+    be archived.
+
+    This is not needed to release the container resources.
+    """
     # Add metrics to archive
     rrd_file = os.path.join(
         tm_env.metrics_dir,
@@ -198,18 +228,9 @@ def _cleanup(tm_env, container_dir, app):
     rrdutils.flush_noexc(rrd_file)
     _copy_metrics(rrd_file, container_dir)
 
-    # Cleanup our cgroup resources
-    try:
-        cgroup_client.delete(unique_name)
-    except (IOError, OSError) as err:
-        if err.errno == errno.ENOENT:
-            pass
-        else:
-            raise
-
     try:
-        runtime.archive_logs(tm_env, appcfg.app_unique_name(app),
-                             container_dir)
+        runtime.queue_archive(tm_env, appcfg.app_unique_name(app),
+                              container_dir)
     except Exception:  # pylint: disable=W0703
         _LOGGER.exception('Unexpected exception storing local logs.')
 
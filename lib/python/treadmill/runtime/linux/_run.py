@@ -6,9 +6,13 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import contextlib
 import logging
 import os
 import socket
+import time
+
+from concurrent import futures
 
 from treadmill import appcfg
 from treadmill import apphook
@@ -19,6 +23,7 @@ from treadmill import iptables
 from treadmill import newnet
 from treadmill import plugin_manager
 from treadmill import runtime
+from treadmill import services
 from treadmill import subproc
 
 from treadmill.fs import linux as fs_linux
@@ -34,6 +39,8 @@ def run(tm_env, runtime_config, container_dir, manifest):
     """Creates container environment and prepares to exec root supervisor.
     """
     _LOGGER.info('Running %r', container_dir)
+    timings = {}
+    start_time = time.time()
 
     unique_name = appcfg.manifest_unique_name(manifest)
 
@@ -41,13 +48,20 @@ def run(tm_env, runtime_config, container_dir, manifest):
     fs.mkdir_safe(os.path.join(container_dir, 'resources'))
 
     cgroup_client = tm_env.svc_cgroup.make_client(
-        os.path.join(container_dir, 'resources', 'cgroups')
+        os.path.join(container_dir, 'resources', 'cgroups'),
+        fast=True
     )
     localdisk_client = tm_env.svc_localdisk.make_client(
-        os.path.join(container_dir, 'resources', 'localdisk')
+        os.path.join(container_dir, 'resources', 'localdisk'),
+        fast=True
     )
     network_client = tm_env.svc_network.make_client(
-        os.path.join(container_dir, 'resources', 'network')
+        os.path.join(container_dir, 'resources', 'network'),
+        fast=True
+    )
+    port_client = tm_env.svc_port.make_client(
+        os.path.join(container_dir, 'resources', 'port'),
+        fast=True
     )
     presence_client = tm_env.svc_presence.make_client(
         os.path.join(container_dir, 'resources', 'presence')
@@ -66,21 +80,33 @@ def run(tm_env, runtime_config, container_dir, manifest):
     network_req = {
         'environment': manifest['environment'],
     }
+    # Ports
+    port_req = runtime.port_request(manifest)
 
     cgroup_client.put(unique_name, cgroup_req)
     localdisk_client.put(unique_name, localdisk_req)
     if not manifest['shared_network']:
         network_client.put(unique_name, network_req)
+    port_client.put(unique_name, port_req)
 
     # Apply memory limits first thing, so that app_run does not consume memory
     # from treadmill/core.
-    app_cgroups = cgroup_client.wait(unique_name)
+    with _timed(timings, 'cgroups'):
+        app_cgroups = cgroup_client.wait(unique_name)
     _apply_cgroup_limits(app_cgroups)
-    localdisk = localdisk_client.wait(unique_name)
-    # TODO: should it wait for network client reply if shared_network is true?
-    app_network = network_client.wait(unique_name)
 
-    img_impl = image.get_image(tm_env, manifest)
+    # Fetch the image while waiting for the local disk and network, the
+    # executor is shut down (its thread is gone) before unsharing namespaces.
+    with futures.ThreadPoolExecutor(max_workers=1) as executor:
+        img_future = executor.submit(_get_image, tm_env, manifest, timings)
+        with _timed(timings, 'resources'):
+            # TODO: should it wait for network client reply if shared_network
+            #       is true?
+            localdisk, app_network = services.wait_all([
+                (localdisk_client, unique_name),
+                (network_client, unique_name),
+            ])
+        img_impl = img_future.result()
 
     manifest['network'] = app_network
     # FIXME: backward compatibility for TM 2.0. Remove in 3.0
@@ -91,27 +117,32 @@ def run(tm_env, runtime_config, container_dir, manifest):
 
     # Allocate dynamic ports
     #
-    # Ports are taken from ephemeral range, by binding to socket to port 0.
+    # Ports are allocated by the port service from the ephemeral range, and
+    # bound to make sure they are not in use outside of Treadmill.
     #
     # Sockets are then put into global list, so that they are not closed
     # at gc time, and address remains in use for the lifetime of the
     # supervisor.
-    sockets = runtime.allocate_network_ports(
-        app_network['external_ip'], manifest
+    sockets = runtime.bind_network_ports(
+        app_network['external_ip'], manifest,
+        port_client, unique_name, port_req
     )
 
     app = runtime.save_app(manifest, container_dir)
 
     if not app.shared_network:
-        _unshare_network(tm_env, container_dir, app)
+        with _timed(timings, 'network'):
+            _unshare_network(tm_env, container_dir, app)
 
     # Create and format the container root volume.
-    root_dir = _create_root_dir(container_dir, localdisk)
+    with _timed(timings, 'root_dir'):
+        root_dir = _create_root_dir(container_dir, localdisk)
 
     # NOTE: below here, MOUNT namespace is private
 
     # Unpack the image to the root directory.
-    img_impl.unpack(container_dir, root_dir, app)
+    with _timed(timings, 'unpack'):
+        img_impl.unpack(container_dir, root_dir, app)
 
     # clean mounts.
     wanted_mounts = runtime_config.host_mount_whitelist
@@ -137,8 +168,14 @@ def run(tm_env, runtime_config, container_dir, manifest):
     if manifest.get('identity') is not None:
         presence_req['identity'] = manifest['identity']
 
-    presence_client.put(unique_name, presence_req)
-    presence_client.wait(unique_name)
+    with _timed(timings, 'presence'):
+        presence_client.put(unique_name, presence_req)
+        presence_client.wait(unique_name)
+
+    # Record the start phases breakdown in the container state.
+    timings['total'] = round(time.time() - start_time, 3)
+    _LOGGER.info('Start timings: %r', timings)
+    runtime.save_app(dict(manifest, start_timings=timings), container_dir)
 
     subproc.exec_pid1(
         [
@@ -152,6 +189,24 @@ def run(tm_env, runtime_config, container_dir, manifest):
     )
 
 
+@contextlib.contextmanager
+def _timed(timings, phase):
+    """Record the duration (in seconds) of a start phase into `timings`.
+    """
+    phase_start = time.time()
+    try:
+        yield
+    finally:
+        timings[phase] = round(time.time() - phase_start, 3)
+
+
+def _get_image(tm_env, manifest, timings):
+    """Get the image of the app, recording the time it took.
+    """
+    with _timed(timings, 'image'):
+        return image.get_image(tm_env, manifest)
+
+
 def _apply_cgroup_limits(app_cgroups):
     """Join cgroups."""
     _LOGGER.info('Joining cgroups: %r', app_cgroups)
@@ -317,7 +372,11 @@ def _create_root_dir(container_dir, localdisk):
     # container_dir/<subdir>
     root_dir = os.path.join(container_dir, 'root')
 
-    already_initialized = fs_linux.blk_fs_test(localdisk['block_dev'])
+    # Volumes claimed from the localdisk warm pool are already formatted.
+    already_initialized = (
+        localdisk.get('formatted') or
+        fs_linux.blk_fs_test(localdisk['block_dev'])
+    )
     if not already_initialized:
         # Format the block device
         fs_linux.blk_fs_create(localdisk['block_dev'])
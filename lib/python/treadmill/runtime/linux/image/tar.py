@@ -6,20 +6,26 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import errno
 import hashlib
 import io
 import logging
 import os
+import re
 import shutil
 import tarfile
 import tempfile
+import time
 
 import requests
 import requests_kerberos
+import six
 
 from six.moves import urllib_parse
 
 from treadmill import fs
+from treadmill import utils
+from treadmill.fs import linux as fs_linux
 
 from . import _image_base
 from . import _repository_base
@@ -29,6 +35,25 @@ _LOGGER = logging.getLogger(__name__)
 
 TAR_DIR = 'tar'
 
+#: Default disk budget of the extracted images cache.
+DEFAULT_CACHE_SIZE = 10 * 1024 ** 3
+
+#: Extracted images (layers), named after the image sha256.
+_LAYERS_DIR = 'layers'
+#: Containers using a layer, as links to their container dir.
+_REFS_DIR = 'refs'
+#: Per image locks serializing the fetches of an image.
+_LOCKS_DIR = 'locks'
+
+#: Layers used more recently than this (in seconds) are not evicted, their
+#: container may not have mounted them yet.
+_EVICT_GRACE = 600
+
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+#: Container root directory holding the overlay upper and work directories.
+_OVERLAY_DIR = '.image'
+
 
 def _download(url, temp):
     """Downloads the image."""
@@ -62,40 +87,137 @@ def _sha256sum(path):
     return sha256.hexdigest()
 
 
+def _layer_size(layer_dir):
+    """Recorded size of an extracted layer."""
+    try:
+        with io.open(layer_dir + '.size') as f:
+            return int(f.read())
+    except (IOError, OSError, ValueError):
+        return 0
+
+
+def _rm_layer(layer_dir):
+    """Remove a layer, atomically invalidating it first."""
+    trash = tempfile.mkdtemp(dir=os.path.dirname(layer_dir), prefix='.del')
+    os.rename(layer_dir, os.path.join(trash, 'layer'))
+    fs.rm_safe(layer_dir + '.size')
+    shutil.rmtree(trash)
+
+
+def _layer_in_use(images_dir, sha256):
+    """Whether a layer is referenced by a container, pruning stale references.
+    """
+    refs_dir = os.path.join(images_dir, _REFS_DIR, sha256)
+    try:
+        refs = os.listdir(refs_dir)
+    except OSError as err:
+        if err.errno == errno.ENOENT:
+            return False
+        raise
+
+    in_use = False
+    for ref in refs:
+        ref_link = os.path.join(refs_dir, ref)
+        if os.path.exists(ref_link):
+            in_use = True
+        else:
+            # The container is gone.
+            fs.rm_safe(ref_link)
+
+    return in_use
+
+
 class TarImage(_image_base.Image):
-    """Represents a TAR image."""
+    """Represents a TAR image, extracted in the node images cache."""
 
     __slots__ = (
         'tm_env',
-        'image_path',
+        'layer_dir',
     )
 
-    def __init__(self, tm_env, image_path):
+    def __init__(self, tm_env, layer_dir):
         self.tm_env = tm_env
-        self.image_path = image_path
+        self.layer_dir = layer_dir
 
     def unpack(self, container_dir, root_dir, app):
-        _LOGGER.debug('Extracting tar file %r to %r.', self.image_path,
+        sha256 = os.path.basename(self.layer_dir)
+        images_dir = os.path.dirname(os.path.dirname(self.layer_dir))
+
+        # Reference the layer so that it is not evicted while in use.
+        refs_dir = os.path.join(images_dir, _REFS_DIR, sha256)
+        fs.mkdir_safe(refs_dir)
+        fs.symlink_safe(
+            os.path.join(refs_dir, os.path.basename(container_dir)),
+            container_dir
+        )
+
+        # The container root volume holds the writable layer.
+        upper_dir = os.path.join(root_dir, _OVERLAY_DIR, 'upper')
+        work_dir = os.path.join(root_dir, _OVERLAY_DIR, 'work')
+        fs.mkdir_safe(upper_dir)
+        fs.mkdir_safe(work_dir)
+
+        _LOGGER.debug('Mounting image layer %r on %r.', self.layer_dir,
                       root_dir)
-        with tarfile.open(self.image_path) as tar:
-            tar.extractall(path=root_dir)
+        fs_linux.mount_filesystem(
+            'overlay', root_dir, 'overlay',
+            lowerdir=self.layer_dir,
+            upperdir=upper_dir,
+            workdir=work_dir,
+        )
 
         native.NativeImage(self.tm_env).unpack(container_dir, root_dir, app)
 
-        # TODO: cache instead of removing TAR files.
-        fs.rm_safe(self.image_path)
-
 
 class TarImageRepository(_repository_base.ImageRepository):
-    """A collection of TAR images."""
+    """A collection of TAR images.
+
+    Images are cached on the node, extracted and named after their sha256, and
+    evicted least recently used first when over `cache_size` bytes.
+    """
+
+    __slots__ = (
+        'cache_size',
+    )
+
+    def __init__(self, tm_env, cache_size=DEFAULT_CACHE_SIZE):
+        super(TarImageRepository, self).__init__(tm_env)
+        self.cache_size = cache_size
 
     def get(self, url):
         images_dir = os.path.join(self.tm_env.images_dir, TAR_DIR)
-        fs.mkdir_safe(images_dir)
+        layers_dir = os.path.join(images_dir, _LAYERS_DIR)
+        locks_dir = os.path.join(images_dir, _LOCKS_DIR)
+        fs.mkdir_safe(layers_dir)
+        fs.mkdir_safe(locks_dir)
 
         image = urllib_parse.urlparse(url)
         sha256 = urllib_parse.parse_qs(image.query).get('sha256', None)
+        if sha256 is not None:
+            sha256 = sha256[0]
+        if sha256 is not None and _SHA256_RE.match(sha256):
+            lock_key = sha256
+        else:
+            lock_key = hashlib.sha256(url.encode()).hexdigest()
+
+        # Concurrent fetches of the same image wait for the first one.
+        with utils.FileLock(os.path.join(locks_dir, lock_key)):
+            if lock_key == sha256 and os.path.isdir(
+                    os.path.join(layers_dir, sha256)):
+                _LOGGER.debug('Image %r found in cache.', url)
+                layer_dir = os.path.join(layers_dir, sha256)
+            else:
+                layer_dir = self._fetch(url, image, sha256, images_dir)
+
+            # Record the use for the LRU eviction.
+            os.utime(layer_dir, None)
+
+        self._evict(images_dir, keep=layer_dir)
+        return TarImage(self.tm_env, layer_dir)
 
+    def _fetch(self, url, image, sha256, images_dir):
+        """Fetch and extract an image in the cache.
+        """
         with tempfile.NamedTemporaryFile(dir=images_dir, delete=False,
                                          prefix='.tmp') as temp:
             if image.scheme == 'http':
@@ -103,16 +225,82 @@ class TarImageRepository(_repository_base.ImageRepository):
             else:
                 _copy(image.path, temp)
 
-        if not tarfile.is_tarfile(temp.name):
-            _LOGGER.error('File %r is not a tar file.', url)
-            raise Exception('File {0} is not a tar file.'.format(url))
-
-        new_sha256 = _sha256sum(temp.name)
-
-        if sha256 is not None and sha256[0] != new_sha256:
-            _LOGGER.error('Hash does not match %r - %r', sha256[0], new_sha256)
-            raise Exception(
-                'Hash of {0} does not match {1}.'.format(new_sha256, url))
-
-        # TODO: rename tar file to sha256 to allow for caching.
-        return TarImage(self.tm_env, temp.name)
+        try:
+            if not tarfile.is_tarfile(temp.name):
+                _LOGGER.error('File %r is not a tar file.', url)
+                raise Exception('File {0} is not a tar file.'.format(url))
+
+            new_sha256 = _sha256sum(temp.name)
+
+            if sha256 is not None and sha256 != new_sha256:
+                _LOGGER.error('Hash does not match %r - %r', sha256,
+                              new_sha256)
+                raise Exception(
+                    'Hash of {0} does not match {1}.'.format(new_sha256, url))
+
+            layer_dir = os.path.join(images_dir, _LAYERS_DIR, new_sha256)
+            if os.path.isdir(layer_dir):
+                # Same content fetched from another url.
+                return layer_dir
+
+            extract_dir = tempfile.mkdtemp(
+                dir=os.path.join(images_dir, _LAYERS_DIR), prefix='.tmp'
+            )
+            _LOGGER.debug('Extracting tar file %r to %r.', temp.name,
+                          extract_dir)
+            try:
+                with tarfile.open(temp.name) as tar:
+                    size = sum(member.size for member in tar)
+                    tar.extractall(path=extract_dir)
+
+                os.chmod(extract_dir, 0o755)
+                with io.open(layer_dir + '.size', 'w') as f:
+                    f.write(six.text_type(size))
+                os.rename(extract_dir, layer_dir)
+
+            except Exception:
+                shutil.rmtree(extract_dir, ignore_errors=True)
+                raise
+
+        finally:
+            fs.rm_safe(temp.name)
+
+        return layer_dir
+
+    def _evict(self, images_dir, keep):
+        """Evict least recently used layers not in use, down to the cache
+        budget.
+        """
+        layers_dir = os.path.join(images_dir, _LAYERS_DIR)
+        layers = []
+        total_size = 0
+        for name in os.listdir(layers_dir):
+            layer_dir = os.path.join(layers_dir, name)
+            if name[0] == '.' or not os.path.isdir(layer_dir):
+                continue
+            size = _layer_size(layer_dir)
+            total_size += size
+            layers.append((os.stat(layer_dir).st_mtime, size, name))
+
+        if total_size <= self.cache_size:
+            return
+
+        now = time.time()
+        for last_used, size, name in sorted(layers):
+            if total_size <= self.cache_size:
+                break
+
+            layer_dir = os.path.join(layers_dir, name)
+            if layer_dir == keep or now - last_used < _EVICT_GRACE:
+                continue
+
+            with utils.FileLock(os.path.join(images_dir, _LOCKS_DIR, name)):
+                if _layer_in_use(images_dir, name):
+                    continue
+                if os.stat(layer_dir).st_mtime != last_used:
+                    # Used since listed.
+                    continue
+
+                _LOGGER.info('Evicting image %r (%d bytes).', name, size)
+                _rm_layer(layer_dir)
+                total_size -= size
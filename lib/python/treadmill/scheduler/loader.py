@@ -73,10 +73,12 @@ class Loader:
         'partitions',
         'trait_codes',
         'apps_blacklist',
+        'binary_reports',
     )
 
-    def __init__(self, backend, cellname):
+    def __init__(self, backend, cellname, binary_reports=False):
         self.backend = backend
+        self.binary_reports = binary_reports
         self.cell = scheduler.Cell(cellname)
         self.buckets = dict()
         self.servers = dict()
@@ -681,8 +683,10 @@ class Loader:
         for report_type in ('servers', 'allocations', 'apps'):
             _LOGGER.info('Saving scheduler report "%s" to ZooKeeper',
                          report_type)
-            report = getattr(reports, report_type)(self.cell, self.trait_codes)
-            self.backend.put(
-                z.path.state_report(report_type),
-                reports.serialize_dataframe(report)
-            )
+            report = reports.REPORTS[report_type](self.cell,
+                                                  self.trait_codes)
+            if self.binary_reports:
+                data = reports.serialize_report(report)
+            else:
+                data = reports.serialize_report_csv(report)
+            self.backend.put(z.path.state_report(report_type), data)
@@ -65,9 +65,10 @@ _APP_START_INTERVAL = 5 * 60
 class Master(loader.Loader):
     """Treadmill master scheduler."""
 
-    def __init__(self, backend, cellname, events_dir=None):
+    def __init__(self, backend, cellname, events_dir=None,
+                 binary_reports=False):
 
-        super(Master, self).__init__(backend, cellname)
+        super(Master, self).__init__(backend, cellname, binary_reports)
 
         self.backend = backend
         self.events_dir = events_dir
@@ -13,6 +13,7 @@ from ._base_service import (
     ResourceServiceError,
     ResourceServiceRequestError,
     ResourceServiceTimeoutError,
+    wait_all,
 )
 
 if os.name == 'nt':
@@ -32,4 +33,5 @@ __all__ = [
     'ResourceServiceError',
     'ResourceServiceRequestError',
     'ResourceServiceTimeoutError',
+    'wait_all',
 ]
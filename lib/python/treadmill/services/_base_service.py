@@ -50,29 +50,96 @@ def wait_for_file(filename, timeout=None):
     :returns ``bool``:
         ``True`` if there was an event, ``False`` otherwise (timeout).
     """
+    return wait_for_files([filename], timeout=timeout)
+
+
+def wait_for_files(filenames, timeout=None):
+    """Wait at least ``timeout`` seconds for all the files to appear, using a
+    single watcher.
+
+    :param ``int`` timeout:
+        Minimum amount of seconds to wait for the files.
+    :returns ``bool``:
+        ``True`` if all the files exist, ``False`` otherwise (timeout).
+    """
     if timeout is None:
         timeout = DEFAULT_TIMEOUT
 
-    elif timeout == 0:
-        return os.path.exists(filename)
+    missing = [
+        filename
+        for filename in filenames
+        if not os.path.exists(filename)
+    ]
+    if not missing or timeout == 0:
+        return not missing
 
-    filedir = os.path.dirname(filename)
     # TODO: Fine tune the watcher mask for efficiency.
-    watcher = dirwatch.DirWatcher(filedir)
+    watcher = dirwatch.DirWatcher()
+    for filedir in set(os.path.dirname(filename) for filename in missing):
+        watcher.add_dir(filedir)
 
     now = time.time()
     end_time = now + timeout
-    while not os.path.exists(filename):
+    while missing:
         if watcher.wait_for_events(timeout=max(0, end_time - now)):
             watcher.process_events()
 
+        missing = [
+            filename
+            for filename in missing
+            if not os.path.exists(filename)
+        ]
+
         now = time.time()
-        if now > end_time:
+        if missing and now > end_time:
             return False
 
     return True
 
 
+def wait_all(requests, timeout=None):
+    """Wait for several resource requests to be ready, sharing one watcher.
+
+    :param ``list`` requests:
+        List of ``(ResourceServiceClient, rsrc_id)``.
+    :returns ``list``:
+        The replies, in the order of the requests.
+    :raises ``ResourceServiceRequestError``:
+        If any of the requests resulted in error.
+    :raises ``ResourceServiceTimeoutError``:
+        If the requests were not all available before timeout.
+    """
+    # pylint: disable=protected-access
+    rep_files = [
+        client._rep_filename(rsrc_id)
+        for client, rsrc_id in requests
+        if not client._is_fast_pending(rsrc_id)
+    ]
+    if not wait_for_files(rep_files, timeout):
+        raise ResourceServiceTimeoutError(
+            'Resources %r not available in time' % (
+                [rsrc_id for _client, rsrc_id in requests],
+            )
+        )
+
+    # Replies of the requests sent over the fast path are read from the
+    # service connections (the services process them concurrently).
+    return [
+        client.wait(
+            rsrc_id,
+            timeout=(timeout if client._is_fast_pending(rsrc_id) else 0)
+        )
+        for client, rsrc_id in requests
+    ]
+
+
+def _request_version(req_file):
+    """Return a token identifying the content version of a request file.
+    """
+    req_stat = os.stat(req_file)
+    return (req_stat.st_ino, req_stat.st_size, req_stat.st_mtime)
+
+
 class ResourceServiceError(exc.TreadmillError):
     """Base Resource Service error.
     """
@@ -104,6 +171,10 @@ class ResourceServiceClient:
         request.yml
         reply.yml
         svc_req_id
+
+    With `fast` set, requests are also sent to the service over its socket
+    and replies are read back from it. The request directory is still written
+    and serves as the journal of the request.
     """
 
     _REQ_UID_FILE = 'svc_req_id'
@@ -111,12 +182,18 @@ class ResourceServiceClient:
     __slots__ = (
         '_serviceinst',
         '_clientdir',
+        '_channel',
+        '_fast',
+        '_fast_pending',
     )
 
-    def __init__(self, serviceinst, clientdir):
+    def __init__(self, serviceinst, clientdir, fast=False):
         self._serviceinst = serviceinst
         fs.mkdir_safe(clientdir)
         self._clientdir = os.path.realpath(clientdir)
+        self._channel = None
+        self._fast = fast
+        self._fast_pending = {}
 
     def put(self, rsrc_id, rsrc_data):
         """Request creation/update of a resource.
@@ -164,8 +241,14 @@ class ResourceServiceClient:
                     fs.rmtree_safe(req_dir)
 
             else:
+                # Do not let wait() return the reply to the previous version.
+                fs.rm_safe(self._rep_filename(rsrc_id))
                 self._serviceinst.clt_update_request(svc_req_uuid)
 
+            if svc_req_uuid is not None and self._fast_send(
+                    {'op': 'create', 'id': svc_req_uuid}):
+                self._fast_pending[rsrc_id] = svc_req_uuid
+
     def delete(self, rsrc_id):
         """Delete an existing resource.
 
@@ -188,6 +271,8 @@ class ResourceServiceClient:
                 req_dir,
                 self._bck_dirname(svc_req_uuid)
             )
+            self._fast_pending.pop(rsrc_id, None)
+            self._fast_send({'op': 'delete', 'id': svc_req_uuid})
 
     def get(self, rsrc_id):
         """Get the result of a resource request.
@@ -213,24 +298,28 @@ class ResourceServiceClient:
         :raises ``ResourceServiceTimeoutError``:
             If the request was not available before timeout.
         """
-        req_dir = self._req_dirname(rsrc_id)
-        rep_file = os.path.join(req_dir, REP_FILE)
+        rep_file = self._rep_filename(rsrc_id)
 
-        if not wait_for_file(rep_file, timeout):
-            raise ResourceServiceTimeoutError(
-                'Resource %r not available in time' % rsrc_id
-            )
+        reply = None
+        if self._is_fast_pending(rsrc_id):
+            reply = self._fast_wait(rsrc_id, timeout)
 
-        try:
-            with io.open(rep_file) as f:
-                reply = yaml.load(stream=f)
-
-        except (IOError, OSError) as err:
-            if err.errno == errno.ENOENT:
+        if reply is None:
+            if not wait_for_file(rep_file, timeout):
                 raise ResourceServiceTimeoutError(
                     'Resource %r not available in time' % rsrc_id
                 )
 
+            try:
+                with io.open(rep_file) as f:
+                    reply = yaml.load(stream=f)
+
+            except (IOError, OSError) as err:
+                if err.errno == errno.ENOENT:
+                    raise ResourceServiceTimeoutError(
+                        'Resource %r not available in time' % rsrc_id
+                    )
+
         if isinstance(reply, dict) and '_error' in reply:
             raise ResourceServiceRequestError(reply['_error']['why'],
                                               reply['_error']['input'])
@@ -255,6 +344,76 @@ class ResourceServiceClient:
         req_dir = os.path.join(self._clientdir, req_dir_name)
         return req_dir
 
+    def _is_fast_pending(self, rsrc_id):
+        """Whether the reply of `rsrc_id` is expected over the fast path.
+        """
+        return rsrc_id in self._fast_pending
+
+    def _fast_send(self, message):
+        """Send a request message over the fast path.
+
+        :returns ``bool``:
+            ``True`` if the message was sent.
+        """
+        if not self._fast:
+            return False
+
+        try:
+            if self._channel is None:
+                self._channel = self._serviceinst.clt_connect()
+            if self._channel is None:
+                # The service does not support the fast path.
+                self._fast = False
+                return False
+
+            self._channel.send(message)
+            return True
+
+        except (socket.error, ValueError) as err:
+            _LOGGER.warning('Fast path to %r unavailable: %s',
+                            self._serviceinst.name, err)
+            self._close_channel()
+            return False
+
+    def _fast_wait(self, rsrc_id, timeout):
+        """Wait for the reply of a request sent over the fast path.
+
+        :returns:
+            The reply, or ``None`` if it should be read from the request
+            directory instead.
+        """
+        svc_req_uuid = self._fast_pending[rsrc_id]
+        if timeout is None:
+            timeout = DEFAULT_TIMEOUT
+
+        try:
+            reply = self._channel.wait(svc_req_uuid, timeout)
+
+        except (socket.error, ValueError) as err:
+            _LOGGER.warning('Fast path to %r lost: %s',
+                            self._serviceinst.name, err)
+            self._close_channel()
+            return None
+
+        if reply is not None:
+            del self._fast_pending[rsrc_id]
+
+        return reply
+
+    def _close_channel(self):
+        """Close the fast path channel and fall back to the slow path.
+        """
+        if self._channel is not None:
+            self._channel.close()
+        self._channel = None
+        self._fast = False
+        self._fast_pending.clear()
+
+    def _rep_filename(self, rsrc_id):
+        """Reply file name for a given resource id.
+        """
+        return os.path.join(self._req_dirname(rsrc_id), REP_FILE)
+
     def _bck_dirname(self, req_uuid):
         """Return a unique backup directory name.
         """
@@ -288,6 +447,8 @@ class ResourceService:
         '_service_impl',
         '_service_class',
         '_service_name',
+        '_requests',
+        '_fast_deleted',
     )
 
     _IO_EVENT_PENDING = struct.pack('@Q', 1)
@@ -300,6 +461,10 @@ class ResourceService:
         self._is_dead = False
         self._service_impl = impl
         self._service_class = None
+        # Version of the request file and reply of each processed request.
+        self._requests = {}
+        # Requests deleted over the fast path.
+        self._fast_deleted = set()
         # Figure out the service's name
         if isinstance(self._service_impl, six.string_types):
             svc_name = self._service_impl.rsplit('.', 1)[-1]
@@ -312,10 +477,26 @@ class ResourceService:
         """Name of the service."""
         return self._service_name
 
-    def make_client(self, client_dir):
+    def make_client(self, client_dir, fast=False):
         """Create a client using `clientdir` as request dir location.
+
+        :param ``bool`` fast:
+            Also send the requests over the service fast path (if the service
+            supports it).
         """
-        return ResourceServiceClient(self, client_dir)
+        return ResourceServiceClient(self, client_dir, fast=fast)
+
+    def clt_connect(self):
+        """Connect to the service fast path.
+
+        This should only be called by the client instance.
+
+        :returns:
+            A channel object (with `send`, `wait` and `close` methods) or
+            ``None`` if the fast path is not supported.
+        """
+        # pylint: disable=no-self-use
+        return None
 
     @abc.abstractmethod
     def status(self, timeout=30):
@@ -483,13 +664,17 @@ class ResourceService:
             return False
 
         req_file = os.path.join(filepath, REQ_FILE)
-        rep_file = os.path.join(filepath, REP_FILE)
 
         try:
+            version = _request_version(req_file)
+            if self._is_processed(req_id, version):
+                # Already processed over the fast path.
+                return False
+
             with io.open(req_file) as f:
                 req_data = yaml.load(stream=f)
 
-        except IOError as err:
+        except (IOError, OSError) as err:
             if (err.errno == errno.ENOENT or
                     err.errno == errno.ENOTDIR):
                 _LOGGER.exception('Removing invalid request: %r', req_id)
@@ -503,6 +688,28 @@ class ResourceService:
                 return False
             raise
 
+        res = self._process_request(impl, req_id, req_data, version)
+        if res is None:
+            # Request was not actioned
+            return False
+
+        # Return True if there were no error
+        return not bool(res.get('_error', False))
+
+    def _is_processed(self, req_id, version):
+        """Whether the given version of a request was already processed.
+        """
+        processed_version, res = self._requests.get(req_id, (None, None))
+        return res is not None and processed_version == version
+
+    def _process_request(self, impl, req_id, req_data, version):
+        """Process a request and journal its reply.
+
+        :returns:
+            The reply, or ``None`` if the request was not actioned.
+        """
+        rep_file = os.path.join(self._rsrc_dir, req_id, REP_FILE)
+
         # TODO: We should also validate the req_id format
         with lc.LogContext(_LOGGER, req_id,
                            adapter_cls=lc.ContainerAdapter) as log:
@@ -523,9 +730,9 @@ class ResourceService:
                               req_id, req_data)
                 res = {'_error': {'input': req_data, 'why': str(err)}}
 
+        self._requests[req_id] = (version, res)
         if res is None:
-            # Request was not actioned
-            return False
+            return None
 
         fs.write_safe(
             rep_file,
@@ -536,9 +743,14 @@ class ResourceService:
             mode='w',
             permission=0o644
         )
+        self._on_reply(req_id, res)
 
-        # Return True if there were no error
-        return not bool(res.get('_error', False))
+        return res
+
+    def _on_reply(self, req_id, res):
+        """Hook called when the reply of a request is available.
+        """
+        pass
 
     def _on_deleted(self, impl, filepath):
         """Private handler for request deletion events.
@@ -549,6 +761,12 @@ class ResourceService:
         if req_id[0] == '.':
             return None
 
+        if req_id in self._fast_deleted:
+            # Already deleted over the fast path.
+            self._fast_deleted.discard(req_id)
+            return None
+        self._requests.pop(req_id, None)
+
         # TODO: We should also validate the req_id format
         with lc.LogContext(_LOGGER, req_id,
                            adapter_cls=lc.ContainerAdapter) as log:
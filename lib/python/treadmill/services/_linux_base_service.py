@@ -10,6 +10,8 @@ import abc
 import contextlib
 import errno
 import functools
+import io
+import json
 import logging
 import os
 import select
@@ -21,6 +23,7 @@ import six
 
 from treadmill import dirwatch
 from treadmill import fs
+from treadmill import logcontext as lc
 from treadmill import yamlwrapper as yaml
 from treadmill.syscall import eventfd
 
@@ -32,6 +35,112 @@ _LOGGER = logging.getLogger(__name__)
 #: Name of service status file
 _STATUS_SOCK = 'status.sock'
 
+#: Name of the service fast path socket
+_FAST_SOCK = 'fast.sock'
+
+#: Maximum number of open fast path connections
+_MAX_SESSIONS = 64
+
+#: Idle fast path connections are closed after this many seconds
+_SESSION_IDLE_TIMEOUT = 600
+
+#: Layout of the SO_PEERCRED socket option (pid, uid, gid)
+_PEERCRED_FMT = '3i'
+
+
+class _Connection:
+    """JSON lines messages over a unix stream socket.
+    """
+
+    __slots__ = (
+        'sock',
+        'last_active',
+        '_buffer',
+    )
+
+    def __init__(self, sock, buf=b''):
+        self.sock = sock
+        self.last_active = time.time()
+        self._buffer = buf
+
+    def fileno(self):
+        """The socket file descriptor."""
+        return self.sock.fileno()
+
+    def send(self, message):
+        """Send a message."""
+        self.sock.sendall(
+            json.dumps(message, separators=(',', ':')).encode() + b'\n'
+        )
+
+    def recv(self):
+        """Receive the available messages.
+
+        :returns ``list``:
+            The received messages or ``None`` when the peer is gone.
+        """
+        data = self.sock.recv(65536)
+        if not data:
+            return None
+
+        self.last_active = time.time()
+
+        lines = (self._buffer + data).split(b'\n')
+        self._buffer = lines.pop()
+        return [
+            json.loads(line.decode())
+            for line in lines
+            if line
+        ]
+
+    def close(self):
+        """Close the connection."""
+        self.sock.close()
+
+
+class _FastChannel(_Connection):
+    """Client side of the service fast path.
+    """
+
+    __slots__ = (
+        '_replies',
+    )
+
+    def __init__(self, sock, buf=b''):
+        super(_FastChannel, self).__init__(sock, buf)
+        self._replies = {}
+
+    def wait(self, req_id, timeout):
+        """Wait for the reply to `req_id`.
+
+        :returns:
+            The reply or ``None`` if the reply should be read from the request
+            directory instead.
+        :raises ``ResourceServiceTimeoutError``:
+            If the reply did not arrive before timeout.
+        """
+        end_time = time.time() + timeout
+        while req_id not in self._replies:
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                if timeout == 0:
+                    return None
+                raise _base_service.ResourceServiceTimeoutError(
+                    'Resource %r not available in time' % req_id
+                )
+            self.sock.settimeout(remaining)
+            try:
+                messages = self.recv()
+            except socket.timeout:
+                continue
+            if messages is None:
+                raise socket.error(errno.ECONNRESET, 'Service disconnected')
+            for message in messages:
+                self._replies[message['id']] = message
+
+        message = self._replies.pop(req_id)
+        return message.get('reply')
+
 
 class LinuxResourceService(_base_service.ResourceService):
     """Linux server class for all Treadmill services.
@@ -48,6 +157,9 @@ class LinuxResourceService(_base_service.ResourceService):
 
     __slots__ = (
         '_io_eventfd',
+        '_sessions',
+        '_sessions_changed',
+        '_waiters',
     )
 
     _IO_EVENT_PENDING = struct.pack('@Q', 1)
@@ -55,6 +167,11 @@ class LinuxResourceService(_base_service.ResourceService):
     def __init__(self, service_dir, impl):
         super(LinuxResourceService, self).__init__(service_dir, impl)
         self._io_eventfd = None
+        # Open fast path connections, by fd: (connection, event handler)
+        self._sessions = {}
+        self._sessions_changed = False
+        # Fast path connections waiting for the reply of a request
+        self._waiters = {}
 
     @property
     def status_sock(self):
@@ -62,6 +179,12 @@ class LinuxResourceService(_base_service.ResourceService):
         """
         return os.path.join(self._dir, _STATUS_SOCK)
 
+    @property
+    def fast_sock(self):
+        """fast path socket of the service.
+        """
+        return os.path.join(self._dir, _FAST_SOCK)
+
     def status(self, timeout=30):
         """Query the status of the resource service.
 
@@ -102,11 +225,26 @@ class LinuxResourceService(_base_service.ResourceService):
 
         return status
 
+    def clt_connect(self):
+        """Connect to the service fast path.
+
+        The requests and replies are exchanged as JSON lines.
+        """
+        sock = socket.socket(socket.AF_UNIX, type=socket.SOCK_STREAM, proto=0)
+        try:
+            sock.connect(self.fast_sock)
+        except socket.error:
+            sock.close()
+            raise
+
+        return _FastChannel(sock)
+
     def _run(self, impl, watchdog_lease):
         """Linux implementation of run.
         """
-        # Create the status socket
+        # Create the status and fast path sockets
         ss = self._create_status_socket()
+        fs_sock = self._create_fast_socket()
 
         # Run initialization
         impl.initialize(self._dir)
@@ -166,6 +304,14 @@ class LinuxResourceService(_base_service.ResourceService):
                     status_info=status_info,
                 )
             ),
+            (
+                fs_sock,
+                select.POLLIN,
+                functools.partial(
+                    self._accept_session,
+                    fast_socket=fs_sock,
+                )
+            ),
         ]
         # Initial collection of implementation' event handlers
         impl_event_handlers = impl.event_handlers()
@@ -191,16 +337,23 @@ class LinuxResourceService(_base_service.ResourceService):
                 status_info.clear()
                 status_info.update(impl.report_status())
 
+            if updated or self._sessions_changed:
+                self._sessions_changed = False
                 # Update poll registration if needed
                 impl_event_handlers = impl.event_handlers()
                 self._update_poll_registration(
                     loop_poll, loop_callbacks,
-                    base_event_handlers + impl_event_handlers,
+                    base_event_handlers +
+                    self._session_handlers(impl) +
+                    impl_event_handlers,
                 )
 
             # Clean up stale requests
             self._check_requests()
 
+            # Close idle fast path connections
+            self._expire_sessions()
+
             # Heartbeat
             watchdog_lease.heartbeat()
 
@@ -221,6 +374,170 @@ class LinuxResourceService(_base_service.ResourceService):
                 else:
                     raise
 
+    def _accept_session(self, fast_socket):
+        """Accept a fast path connection.
+
+        Only connections from the service user are accepted, up to
+        `_MAX_SESSIONS` at a time.
+        """
+        clt = fast_socket.accept()[0]
+        _pid, uid, _gid = struct.unpack(
+            _PEERCRED_FMT,
+            clt.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                           struct.calcsize(_PEERCRED_FMT))
+        )
+        if uid != os.geteuid():
+            _LOGGER.warning('Rejecting fast path connection from uid %d', uid)
+            clt.close()
+            return
+
+        if len(self._sessions) >= _MAX_SESSIONS:
+            _LOGGER.warning('Too many fast path connections, rejecting')
+            clt.close()
+            return
+
+        self._sessions[clt.fileno()] = (_Connection(clt), None)
+        self._sessions_changed = True
+
+    def _close_session(self, conn):
+        """Close a fast path connection and forget its pending replies.
+        """
+        del self._sessions[conn.fileno()]
+        self._sessions_changed = True
+        for waiters in six.itervalues(self._waiters):
+            if conn in waiters:
+                waiters.remove(conn)
+        conn.close()
+
+    def _expire_sessions(self):
+        """Close the fast path connections idle for too long.
+
+        Connections still waiting on a reply are kept.
+        """
+        waiting = set()
+        for waiters in six.itervalues(self._waiters):
+            waiting.update(waiters)
+
+        cutoff = time.time() - _SESSION_IDLE_TIMEOUT
+        for conn, _callback in list(six.itervalues(self._sessions)):
+            if conn.last_active < cutoff and conn not in waiting:
+                _LOGGER.info('Closing idle fast path connection')
+                self._close_session(conn)
+
+    def _session_handlers(self, impl):
+        """Returns the event handlers of the fast path connections.
+        """
+        handlers = []
+        for fd, (conn, callback) in six.iteritems(self._sessions):
+            if callback is None:
+                callback = functools.partial(
+                    self._handle_session, impl=impl, conn=conn
+                )
+                self._sessions[fd] = (conn, callback)
+            handlers.append((fd, select.POLLIN, callback))
+        return handlers
+
+    def _handle_session(self, impl, conn):
+        """Process the fast path requests received on a connection.
+
+        :returns ``bool``:
+            ``True`` if any of the requests was actioned.
+        """
+        try:
+            messages = conn.recv()
+        except (socket.error, ValueError) as err:
+            _LOGGER.warning('Invalid fast path connection: %s', err)
+            messages = None
+
+        if messages is None:
+            # Client is gone
+            self._close_session(conn)
+            return False
+
+        updated = False
+        for message in messages:
+            req_id = message.get('id')
+            if not _is_valid_req_id(req_id):
+                _LOGGER.warning('Invalid fast path request: %r', message)
+            elif message.get('op') == 'create':
+                updated |= self._fast_create(impl, conn, req_id)
+            elif message.get('op') == 'delete':
+                updated |= bool(self._fast_delete(impl, req_id))
+            else:
+                _LOGGER.warning('Invalid fast path request: %r', message)
+
+        return updated
+
+    def _fast_create(self, impl, conn, req_id):
+        """Process a fast path creation request.
+
+        The request payload is always read from the request journal.
+        """
+        req_file = os.path.join(self._rsrc_dir, req_id,
+                                _base_service.REQ_FILE)
+        try:
+            version = _base_service._request_version(req_file)
+            processed = self._is_processed(req_id, version)
+            if not processed:
+                with io.open(req_file) as f:
+                    req_data = yaml.load(stream=f)
+        except (IOError, OSError):
+            # No journal, let the client use the slow path.
+            _LOGGER.warning('Fast path request without journal: %r', req_id)
+            self._reply(conn, req_id, None)
+            return False
+
+        if processed:
+            _version, res = self._requests[req_id]
+        else:
+            res = self._process_request(impl, req_id, req_data, version)
+
+        if res is None:
+            # Not actioned yet, reply once processed.
+            self._waiters.setdefault(req_id, []).append(conn)
+            return False
+
+        self._reply(conn, req_id, res)
+        return not bool(res.get('_error', False))
+
+    def _fast_delete(self, impl, req_id):
+        """Process a fast path deletion request.
+
+        The request is only deleted once its journal is gone.
+        """
+        if req_id not in self._requests:
+            # Already deleted.
+            return None
+
+        if os.path.lexists(os.path.join(self._rsrc_dir, req_id)):
+            # The request still exists, let the journal event handle it.
+            _LOGGER.warning('Fast path deletion of live request: %r', req_id)
+            return None
+
+        del self._requests[req_id]
+        self._waiters.pop(req_id, None)
+        self._fast_deleted.add(req_id)
+
+        with lc.LogContext(_LOGGER, req_id,
+                           adapter_cls=lc.ContainerAdapter) as log:
+            log.debug('deleted %r', req_id)
+            res = impl.on_delete_request(req_id)
+
+        return res
+
+    def _on_reply(self, req_id, res):
+        for conn in self._waiters.pop(req_id, []):
+            self._reply(conn, req_id, res)
+
+    @staticmethod
+    def _reply(conn, req_id, res):
+        """Send a reply on a fast path connection.
+        """
+        try:
+            conn.send({'id': req_id, 'reply': res})
+        except socket.error as err:
+            _LOGGER.warning('Unable to reply to %r: %s', req_id, err)
+
     @staticmethod
     def _run_events(loop_poll, loop_timeout, loop_callbacks):
         """Wait for events up to `loop_timeout` and execute each of the
@@ -316,6 +633,21 @@ class LinuxResourceService(_base_service.ResourceService):
         status_socket.listen(5)
         return status_socket
 
+    def _create_fast_socket(self):
+        """Create a listening socket, restricted to the service user, to
+        process fast path requests.
+        """
+        fs.rm_safe(self.fast_sock)
+        fast_socket = socket.socket(
+            family=socket.AF_UNIX,
+            type=socket.SOCK_STREAM,
+            proto=0
+        )
+        fast_socket.bind(self.fast_sock)
+        os.chmod(self.fast_sock, 0o600)
+        fast_socket.listen(_MAX_SESSIONS)
+        return fast_socket
+
     def _handle_queued_io_events(self, watcher, impl):
         """Process queued IO events.
         Base service IO event handler (dispatches to on_created/on_deleted.
@@ -355,6 +687,17 @@ class LinuxResourceService(_base_service.ResourceService):
         )
 
 
+def _is_valid_req_id(req_id):
+    """Whether `req_id` is a plain request directory name.
+    """
+    return (
+        isinstance(req_id, six.string_types) and
+        bool(req_id) and
+        req_id == os.path.basename(req_id) and
+        not req_id.startswith('.')
+    )
+
+
 class LinuxBaseResourceServiceImpl(_base_service.BaseResourceServiceImpl):
     """Base interface of Resource Service implementations.
     """
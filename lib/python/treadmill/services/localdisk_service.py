@@ -6,9 +6,15 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import logging
 import math
 import os
+import select
+import struct
+import uuid
+
+from concurrent import futures
 
 import six
 
@@ -20,12 +26,25 @@ from treadmill import lvm
 from treadmill import subproc
 from treadmill import utils
 
+from treadmill.fs import linux as fs_linux
+from treadmill.syscall import eventfd
+from treadmill.syscall import timerfd
+
 from . import BaseResourceServiceImpl
 
 _LOGGER = logging.getLogger(__name__)
 
 TREADMILL_LV_PREFIX = 'tm-'
 
+#: Prefix of the pre-formatted volumes of the warm pool.
+TREADMILL_POOL_LV_PREFIX = TREADMILL_LV_PREFIX + 'pool-'
+
+#: Prefix of the pool volumes being created (stale if found at startup).
+_POOL_FILL_LV_PREFIX = TREADMILL_LV_PREFIX + 'fill-'
+
+#: Interval (in seconds) between reconciliations with the LVM state.
+_RECONCILE_INTERVAL = 300
+
 
 def _uniqueid(app_unique_name):
     """Create unique volume name based on unique app name.
@@ -34,6 +53,55 @@ def _uniqueid(app_unique_name):
     return TREADMILL_LV_PREFIX + uniqueid
 
 
+def _lv_info(vg_name, volume, extents):
+    """Build the LV info of a volume from its device node.
+    """
+    block_dev = os.path.join('/dev', vg_name, volume)
+    dev_stat = os.stat(block_dev)
+    return {
+        'name': volume,
+        'block_dev': block_dev,
+        'dev_major': os.major(dev_stat.st_rdev),
+        'dev_minor': os.minor(dev_stat.st_rdev),
+        'extent_size': extents,
+    }
+
+
+def _fill_volume(vg_name, extents, size_in_bytes):
+    """Create and format a new pool volume.
+
+    The volume is created under a temporary name and only renamed into the
+    pool once formatted. A volume whose creation fails is removed, so that
+    its extents are not lost; if the removal fails too, it is cleaned up as
+    stale on restart and the extents are recovered by the reconciliation.
+
+    :returns:
+        ``dict`` -- LV info of the new pool volume.
+    """
+    pool_id = uuid.uuid4().hex
+    fill_name = _POOL_FILL_LV_PREFIX + pool_id
+    pool_name = TREADMILL_POOL_LV_PREFIX + pool_id
+
+    lvm.lvcreate(
+        volume=fill_name,
+        group=vg_name,
+        size_in_bytes=size_in_bytes,
+    )
+    volume = fill_name
+    try:
+        fs_linux.blk_fs_create(os.path.join('/dev', vg_name, fill_name))
+        lvm.lvrename(fill_name, pool_name, group=vg_name)
+        volume = pool_name
+        return _lv_info(vg_name, pool_name, extents)
+
+    except (subproc.CalledProcessError, OSError):
+        try:
+            lvm.lvremove(volume, group=vg_name)
+        except subproc.CalledProcessError as err:
+            _LOGGER.warning('Unable to remove volume %r: %s', volume, err)
+        raise
+
+
 class LocalDiskResourceService(BaseResourceServiceImpl):
     """LocalDisk service implementation.
     """
@@ -49,10 +117,18 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         '_default_write_bps',
         '_default_write_iops',
         '_pending',
+        '_admitted',
+        '_reconcile_timerfd',
         '_vg_name',
         '_vg_status',
         '_volumes',
         '_extent_reserved',
+        '_pool',
+        '_pool_sizes',
+        '_pool_depth',
+        '_pool_executor',
+        '_pool_eventfd',
+        '_pool_fills',
     )
 
     PAYLOAD_SCHEMA = (
@@ -62,7 +138,8 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
     def __init__(self, block_dev, vg_name,
                  read_bps, write_bps, read_iops, write_iops,
                  default_read_bps='20M', default_write_bps='20M',
-                 default_read_iops=100, default_write_iops=100):
+                 default_read_iops=100, default_write_iops=100,
+                 pool_sizes=(), pool_depth=0):
         super(LocalDiskResourceService, self).__init__()
 
         self._block_dev = block_dev
@@ -74,7 +151,11 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         self._vg_status = {}
         self._volumes = {}
         self._extent_reserved = 0
-        self._pending = []
+        # Delayed requests and the extents they need, in arrival order.
+        self._pending = collections.OrderedDict()
+        # Extents held for the pending requests admitted for retry.
+        self._admitted = {}
+        self._reconcile_timerfd = None
         # TODO: temp solution - throttle read/writes to
         #                20M/s. In the future, IO will become part
         #                of app manifest spec and managed by
@@ -84,6 +165,15 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         self._default_write_bps = default_write_bps
         self._default_read_iops = default_read_iops
         self._default_write_iops = default_write_iops
+        # Warm pool of pre-formatted volumes, indexed by size in extents.
+        self._pool = {}
+        self._pool_sizes = [
+            utils.size_to_bytes(pool_size) for pool_size in pool_sizes
+        ]
+        self._pool_depth = pool_depth
+        self._pool_executor = None
+        self._pool_eventfd = None
+        self._pool_fills = []
 
     def initialize(self, service_dir):
         super(LocalDiskResourceService, self).initialize(service_dir)
@@ -94,8 +184,19 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         # Finally retrieve the LV info
         lvs_info = lvm.lvsdisplay(group=self._vg_name)
 
-        # Mark all retrived volumes that were created by treadmill as 'stale'
-        for lv in lvs_info:
+        self._vg_status = localdiskutils.refresh_vg_status(self._vg_name)
+
+        # Keep the pool volumes of the configured sizes, and mark all other
+        # retrived volumes that were created by treadmill as 'stale'
+        pool_extents = set(self._pool_extents())
+        self._pool = {}
+        for lv in lvs_info[:]:
+            if (lv['name'].startswith(TREADMILL_POOL_LV_PREFIX) and
+                    lv['extent_size'] in pool_extents and
+                    not lv['open_count']):
+                self._pool.setdefault(lv['extent_size'], []).append(lv)
+                lvs_info.remove(lv)
+                continue
             lv['stale'] = lv['name'].startswith(TREADMILL_LV_PREFIX)
             if lv['open_count']:
                 _LOGGER.warning('Logical volume in use: %r', lv['block_dev'])
@@ -118,7 +219,21 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
             for lv in lvs_info
         }
         self._volumes = volumes
-        self._vg_status = localdiskutils.refresh_vg_status(self._vg_name)
+
+        if pool_extents:
+            self._pool_executor = futures.ThreadPoolExecutor(max_workers=1)
+            self._pool_eventfd = eventfd.eventfd(0, eventfd.EFD_CLOEXEC)
+
+        # From now on, the extent accounting is done in process and only
+        # periodically reconciled with LVM.
+        self._reconcile_timerfd = timerfd.timerfd_create(
+            timerfd.CLOCK_MONOTONIC, timerfd.TFD_CLOEXEC
+        )
+        timerfd.timerfd_settime(
+            self._reconcile_timerfd,
+            _RECONCILE_INTERVAL,
+            interval=_RECONCILE_INTERVAL
+        )
 
     def synchronize(self):
         """Make sure that all stale volumes are removed.
@@ -130,18 +245,24 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
                 # This is a stale volume, destroy it.
                 self._destroy_volume(uniqueid)
 
-        if not modified:
-            return
+        if modified:
+            # Now that we successfully removed volumes, retry the pending
+            # resources that fit.
+            self._admit_pending()
 
-        # Now that we successfully removed a volume, retry all the pending
-        # resources.
-        for pending_id in self._pending:
-            self.retry_request(pending_id)
-        self._pending = []
+        self._refill_pool()
 
-        # We just destroyed a volume, refresh cached status from LVM and notify
-        # the service of the availability of the new status.
-        self._vg_status = localdiskutils.refresh_vg_status(self._vg_name)
+    def event_handlers(self):
+        handlers = []
+        if self._reconcile_timerfd is not None:
+            handlers.append(
+                (self._reconcile_timerfd, select.POLLIN, self._reconcile)
+            )
+        if self._pool_eventfd is not None:
+            handlers.append(
+                (self._pool_eventfd, select.POLLIN, self._on_pool_filled)
+            )
+        return handlers
 
     def report_status(self):
         status = self._vg_status.copy()
@@ -172,18 +293,31 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
 
             # Create the logical volume
             existing_volume = uniqueid in self._volumes
-            if not existing_volume:
-                needed = math.ceil(
+            reserved = self._admitted.pop(rsrc_id, 0)
+            lv_info = None
+            if existing_volume:
+                lv_info = self._volumes[uniqueid]
+            else:
+                needed = int(math.ceil(
                     size_in_bytes / self._vg_status['extent_size']
-                )
-                if needed > self._vg_status['extent_free']:
+                ))
+                lv_info = self._claim_pool_volume(needed, uniqueid)
+                if lv_info is not None:
+                    log.info('Claimed pool volume %r', lv_info['block_dev'])
+
+            if lv_info is None:
+                if needed > self._free_extents() + reserved:
+                    # Reclaim idle pool volumes before giving up.
+                    self._shrink_pool(needed - reserved)
+
+                if needed > self._free_extents() + reserved:
                     # If we do not have enough space, delay the creation until
                     # another volume is deleted.
                     log.info(
                         'Delaying request %r until %d extents are free.'
                         ' Current volumes: %r',
                         rsrc_id, needed, self._volumes)
-                    self._pending.append(rsrc_id)
+                    self._pending[rsrc_id] = needed
                     return None
 
                 lvm.lvcreate(
@@ -191,15 +325,9 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
                     group=self._vg_name,
                     size_in_bytes=size_in_bytes,
                 )
-                # We just created a volume, refresh cached status from LVM
-                self._vg_status = localdiskutils.refresh_vg_status(
-                    self._vg_name
-                )
-
-            lv_info = lvm.lvdisplay(
-                volume=uniqueid,
-                group=self._vg_name
-            )
+                # We just created a volume, account for it
+                self._vg_status['extent_free'] -= needed
+                lv_info = _lv_info(self._vg_name, uniqueid, needed)
 
             # Configure block device using cgroups (this is idempotent)
             # FIXME(boysson): The unique id <-> cgroup relation should be
@@ -248,11 +376,16 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
                 k: lv_info[k]
                 for k in ['name', 'block_dev',
                           'dev_major', 'dev_minor', 'extent_size']
+                if k in lv_info
             }
+            if lv_info.get('formatted'):
+                # Pool volumes already carry a filesystem.
+                volume_data['formatted'] = True
 
             # Record existence of the volume.
             self._volumes[lv_info['name']] = volume_data
 
+        self._refill_pool()
         return volume_data
 
     def on_delete_request(self, rsrc_id):
@@ -261,19 +394,18 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         with lc.LogContext(_LOGGER, rsrc_id):
             uniqueid = _uniqueid(app_unique_name)
 
+            # Forget about the request if it was still waiting for space
+            self._pending.pop(rsrc_id, None)
+            self._admitted.pop(rsrc_id, None)
+
             # Remove it from state (if present)
             if not self._destroy_volume(uniqueid):
                 return False
 
-            # Now that we successfully removed a volume, retry all the pending
-            # resources.
-            for pending_id in self._pending:
-                self.retry_request(pending_id)
-            self._pending = []
-
-            # We just destroyed a volume, refresh cached status from LVM and
-            # notify the service of the availability of the new status.
-            self._vg_status = localdiskutils.refresh_vg_status(self._vg_name)
+            # Now that we successfully removed a volume, retry the pending
+            # resources that fit.
+            self._admit_pending()
+            self._refill_pool()
 
         return True
 
@@ -281,15 +413,180 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         """Try destroy a volume from LVM.
         """
         # Remove it from state (if present)
-        self._volumes.pop(uniqueid, None)
-        try:
-            lvm.lvdisplay(uniqueid, group=self._vg_name)
-        except subproc.CalledProcessError:
-            _LOGGER.warning('Ignoring unknown volume %r', uniqueid)
-            return False
+        volume = self._volumes.pop(uniqueid, None)
+        if volume is None:
+            # Not a volume we know about, ask LVM.
+            try:
+                volume = lvm.lvdisplay(uniqueid, group=self._vg_name)
+            except subproc.CalledProcessError:
+                _LOGGER.warning('Ignoring unknown volume %r', uniqueid)
+                return False
 
         # This should not fail.
         lvm.lvremove(uniqueid, group=self._vg_name)
         _LOGGER.info('Destroyed volume %r', uniqueid)
+        self._vg_status['extent_free'] += volume['extent_size']
+
+        return True
+
+    def _admit_pending(self):
+        """Retry, in order, as many pending requests as currently fit.
+        """
+        free = self._free_extents()
+        for rsrc_id, needed in list(six.iteritems(self._pending)):
+            if needed > free:
+                continue
+            free -= needed
+            del self._pending[rsrc_id]
+            self._admitted[rsrc_id] = needed
+            self.retry_request(rsrc_id)
+
+    def _reconcile(self):
+        """Reconcile the in-process accounting with the LVM state.
+        """
+        timerfd.timerfd_read(self._reconcile_timerfd)
+        if self._pool_fills:
+            # Volumes are being created in the background, try again later.
+            return False
+
+        vg_status = localdiskutils.refresh_vg_status(self._vg_name)
+        lvs = {
+            lv['name']
+            for lv in lvm.lvsdisplay(group=self._vg_name)
+        }
+        for uniqueid in list(self._volumes):
+            if uniqueid not in lvs:
+                _LOGGER.warning('Volume %r vanished', uniqueid)
+                del self._volumes[uniqueid]
+        for extents, pool in six.iteritems(self._pool):
+            self._pool[extents] = [
+                pool_info for pool_info in pool
+                if pool_info['name'] in lvs
+            ]
+
+        if vg_status['extent_free'] != self._vg_status['extent_free']:
+            _LOGGER.warning('Free extents drift: %d, LVM reports %d',
+                            self._vg_status['extent_free'],
+                            vg_status['extent_free'])
+        self._vg_status = vg_status
+
+        self._admit_pending()
+        self._refill_pool()
+        return True
+
+    def _pool_extents(self):
+        """Return the configured pool size classes, in extents.
+        """
+        if not self._pool_depth or not self._vg_status:
+            return []
+
+        return [
+            int(math.ceil(pool_size / self._vg_status['extent_size']))
+            for pool_size in self._pool_sizes
+        ]
+
+    def _free_extents(self):
+        """Number of free extents, minus those promised to in-flight pool
+        fills and to admitted pending requests.
+        """
+        return (
+            self._vg_status['extent_free'] -
+            sum(extents for extents, _future in self._pool_fills) -
+            sum(six.itervalues(self._admitted))
+        )
+
+    def _claim_pool_volume(self, needed, uniqueid):
+        """Claim a pool volume of exactly `needed` extents, renaming it
+        `uniqueid`.
+
+        :returns:
+            ``dict`` -- LV info of the claimed volume or ``None``.
+        """
+        pool = self._pool.get(needed)
+        while pool:
+            pool_info = pool.pop()
+            try:
+                lvm.lvrename(pool_info['name'], uniqueid,
+                             group=self._vg_name)
+            except subproc.CalledProcessError:
+                _LOGGER.warning('Unable to claim pool volume %r',
+                                pool_info['name'])
+                continue
+
+            lv_info = dict(pool_info)
+            lv_info['name'] = uniqueid
+            lv_info['block_dev'] = os.path.join(
+                os.path.dirname(pool_info['block_dev']), uniqueid
+            )
+            lv_info['formatted'] = True
+            return lv_info
+
+        return None
+
+    def _shrink_pool(self, needed):
+        """Remove idle pool volumes until `needed` extents are free.
+        """
+        for extents in sorted(six.viewkeys(self._pool), reverse=True):
+            pool = self._pool[extents]
+            while pool and needed > self._free_extents():
+                pool_info = pool.pop()
+                _LOGGER.info('Reclaiming pool volume %r', pool_info['name'])
+                lvm.lvremove(pool_info['name'], group=self._vg_name)
+                self._vg_status['extent_free'] += extents
+
+    def _refill_pool(self):
+        """Schedule the creation of missing pool volumes in the background.
+        """
+        if self._pool_executor is None or self._pending or self._admitted:
+            return
+
+        for extents in self._pool_extents():
+            in_flight = [
+                future
+                for fill_extents, future in self._pool_fills
+                if fill_extents == extents
+            ]
+            missing = (
+                self._pool_depth -
+                len(self._pool.get(extents, ())) -
+                len(in_flight)
+            )
+            for _ in range(missing):
+                if extents > self._free_extents():
+                    return
+
+                future = self._pool_executor.submit(
+                    _fill_volume,
+                    self._vg_name,
+                    extents,
+                    extents * self._vg_status['extent_size'],
+                )
+                self._pool_fills.append((extents, future))
+                future.add_done_callback(self._notify_pool_filled)
+
+    def _notify_pool_filled(self, _future):
+        """Wake up the service loop (called from the pool worker thread).
+        """
+        os.write(self._pool_eventfd, struct.pack('@Q', 1))
+
+    def _on_pool_filled(self):
+        """Move the completed pool fills into the pool.
+        """
+        os.read(self._pool_eventfd, 8)
+
+        fills = []
+        for extents, future in self._pool_fills:
+            if not future.done():
+                fills.append((extents, future))
+                continue
+            try:
+                lv_info = future.result()
+            except (subproc.CalledProcessError, OSError) as err:
+                _LOGGER.warning('Unable to create pool volume: %s', err)
+                continue
+            _LOGGER.info('Added pool volume %r', lv_info['block_dev'])
+            self._pool.setdefault(extents, []).append(lv_info)
+            self._vg_status['extent_free'] -= extents
+        self._pool_fills = fills
 
         return True
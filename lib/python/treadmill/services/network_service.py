@@ -218,18 +218,20 @@ class NetworkResourceService(BaseResourceServiceImpl):
                 ip = self._devices[app_unique_name]['ip']
 
             if 'device' not in self._devices[app_unique_name]:
-                # Create the interface pair
-                netdev.link_add_veth(veth0, veth1)
-                # Configure the links
-                netdev.link_set_mtu(veth0, self.ext_mtu)
-                netdev.link_set_mtu(veth1, self.ext_mtu)
-                # Tag the interfaces
-                netdev.link_set_alias(veth0, rsrc_id)
-                netdev.link_set_alias(veth1, rsrc_id)
-                # Add interface to the bridge
-                netdev.bridge_addif(self._TMBR_DEV, veth0)
-                netdev.link_set_up(veth0)
-                # We keep veth1 down until inside the container
+                # Create and configure the interface pair in one transaction
+                with netdev.batch():
+                    # Create the interface pair
+                    netdev.link_add_veth(veth0, veth1)
+                    # Configure the links
+                    netdev.link_set_mtu(veth0, self.ext_mtu)
+                    netdev.link_set_mtu(veth1, self.ext_mtu)
+                    # Tag the interfaces
+                    netdev.link_set_alias(veth0, rsrc_id)
+                    netdev.link_set_alias(veth1, rsrc_id)
+                    # Add interface to the bridge
+                    netdev.bridge_addif(self._TMBR_DEV, veth0)
+                    netdev.link_set_up(veth0)
+                    # We keep veth1 down until inside the container
 
             # Record the new device in our state
             self._devices[app_unique_name] = _device_info(veth0)
@@ -0,0 +1,277 @@
+"""Port allocation service.
+
+Allocates the real ports of the container endpoints and ephemeral ports from
+the environment's port range. The allocations are kept in memory, indexed by
+port, and persisted in the replies of the container requests.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import errno
+import glob
+import io
+import logging
+import os
+import random
+
+import six
+
+from treadmill import iptables
+from treadmill import logcontext as lc
+from treadmill import yamlwrapper as yaml
+
+from . import BaseResourceServiceImpl
+from ._base_service import REP_FILE
+
+_LOGGER = logging.getLogger(__name__)
+
+_PROTOS = ('tcp', 'udp')
+
+_RANGES = {
+    'prod': (iptables.PROD_PORT_LOW, iptables.PROD_PORT_HIGH),
+    'nonprod': (iptables.NONPROD_PORT_LOW, iptables.NONPROD_PORT_HIGH),
+}
+
+
+class PortsExhaustedError(Exception):
+    """No more ports available in the range."""
+
+
+def _port_range(environment):
+    """Name of the port range of an environment."""
+    return 'prod' if environment == 'prod' else 'nonprod'
+
+
+class _PortPool:
+    """Allocation index of a port range.
+
+    The allocated ports are flagged in a bitmap and the free ports are queued,
+    in random order, so that allocating and releasing a port is O(1). Released
+    ports are reused last.
+    """
+
+    __slots__ = (
+        'low',
+        'high',
+        '_allocated',
+        '_count',
+        '_free',
+    )
+
+    def __init__(self, low, high, allocated=()):
+        self.low = low
+        self.high = high
+        self._allocated = bytearray(high - low + 1)
+        for port in allocated:
+            if low <= port <= high:
+                self._allocated[port - low] = 1
+        self._count = sum(self._allocated)
+
+        free = [
+            low + idx
+            for idx, flag in enumerate(self._allocated)
+            if not flag
+        ]
+        random.shuffle(free)
+        self._free = collections.deque(free)
+
+    def __contains__(self, port):
+        return (
+            self.low <= port <= self.high and
+            bool(self._allocated[port - self.low])
+        )
+
+    @property
+    def allocated(self):
+        """Number of allocated ports."""
+        return self._count
+
+    @property
+    def size(self):
+        """Number of ports in the range."""
+        return len(self._allocated)
+
+    def alloc(self):
+        """Allocate a free port.
+
+        :raises ``PortsExhaustedError``:
+            If all the ports of the range are allocated.
+        """
+        if not self._free:
+            raise PortsExhaustedError(
+                'No free port in {}-{}'.format(self.low, self.high)
+            )
+        port = self._free.popleft()
+        self._allocated[port - self.low] = 1
+        self._count += 1
+        return port
+
+    def release(self, port):
+        """Release an allocated port, noop if it is not allocated."""
+        if port not in self:
+            return
+        self._allocated[port - self.low] = 0
+        self._count -= 1
+        self._free.append(port)
+
+
+class PortResourceService(BaseResourceServiceImpl):
+    """Port allocation service implementation.
+    """
+
+    __slots__ = (
+        '_allocs',
+        '_pools',
+    )
+
+    PAYLOAD_SCHEMA = (
+        ('environment', True, str),
+        ('tcp', False, int),
+        ('udp', False, int),
+        ('exclude', False, dict),
+    )
+
+    def __init__(self):
+        super(PortResourceService, self).__init__()
+        self._allocs = {}
+        self._pools = {}
+
+    def initialize(self, service_dir):
+        super(PortResourceService, self).initialize(service_dir)
+
+        # Reload the allocations from the replies to the current requests.
+        self._allocs = {}
+        for rep_file in glob.glob(
+                os.path.join(self._service_rsrc_dir, '*', REP_FILE)):
+            try:
+                with io.open(rep_file) as f:
+                    reply = yaml.load(stream=f)
+            except (IOError, OSError) as err:
+                if err.errno == errno.ENOENT:
+                    continue
+                raise
+
+            if not isinstance(reply, dict) or 'environment' not in reply:
+                continue
+            rsrc_id = os.path.basename(os.path.dirname(rep_file))
+            self._allocs[rsrc_id] = {
+                'environment': reply['environment'],
+                'stale': True,
+            }
+            for proto in _PROTOS:
+                self._allocs[rsrc_id][proto] = list(reply.get(proto, []))
+
+        self._pools = {}
+        for port_range, (low, high) in six.iteritems(_RANGES):
+            for proto in _PROTOS:
+                allocated = [
+                    port
+                    for alloc in six.itervalues(self._allocs)
+                    if _port_range(alloc['environment']) == port_range
+                    for port in alloc[proto]
+                ]
+                self._pools[(port_range, proto)] = _PortPool(
+                    low, high, allocated
+                )
+
+        _LOGGER.info('Port service initialized: %d allocations',
+                     len(self._allocs))
+
+    def synchronize(self):
+        """Release the allocations that no longer have a request.
+        """
+        for rsrc_id, alloc in list(six.iteritems(self._allocs)):
+            if alloc.get('stale', False):
+                _LOGGER.info('Releasing stale ports of %r', rsrc_id)
+                self._release(rsrc_id)
+
+    def report_status(self):
+        status = {}
+        for port_range, (low, high) in six.iteritems(_RANGES):
+            range_status = {'low': low, 'high': high}
+            for proto in _PROTOS:
+                pool = self._pools[(port_range, proto)]
+                range_status[proto] = {
+                    'allocated': pool.allocated,
+                    'utilization': round(pool.allocated / pool.size, 4),
+                }
+            status[port_range] = range_status
+        status['ready'] = True
+        return status
+
+    def on_create_request(self, rsrc_id, rsrc_data):
+        """
+        :returns ``dict``:
+            Allocated `tcp` and `udp` ports.
+        """
+        with lc.LogContext(_LOGGER, rsrc_id,
+                           adapter_cls=lc.ContainerAdapter) as log:
+            log.debug('req: %r', rsrc_data)
+
+            environment = rsrc_data['environment']
+            port_range = _port_range(environment)
+            exclude = rsrc_data.get('exclude', {})
+
+            alloc = self._allocs.get(rsrc_id)
+            if alloc is not None and (
+                    _port_range(alloc['environment']) != port_range):
+                self._release(rsrc_id)
+                alloc = None
+
+            new_alloc = {'environment': environment}
+            allocated = []
+            try:
+                for proto in _PROTOS:
+                    pool = self._pools[(port_range, proto)]
+                    count = rsrc_data.get(proto, 0)
+                    excluded = set(exclude.get(proto, []))
+
+                    ports = []
+                    for port in (alloc[proto] if alloc else []):
+                        if port in excluded or len(ports) >= count:
+                            # Failed to bind or no longer needed, requeue
+                            # the port.
+                            pool.release(port)
+                        else:
+                            ports.append(port)
+
+                    while len(ports) < count:
+                        port = pool.alloc()
+                        allocated.append((pool, port))
+                        ports.append(port)
+
+                    new_alloc[proto] = ports
+
+            except PortsExhaustedError:
+                for pool, port in allocated:
+                    pool.release(port)
+                self._release(rsrc_id)
+                raise
+
+            self._allocs[rsrc_id] = new_alloc
+            log.info('Allocated ports: tcp: %r, udp: %r',
+                     new_alloc['tcp'], new_alloc['udp'])
+
+        return dict(new_alloc)
+
+    def on_delete_request(self, rsrc_id):
+        with lc.LogContext(_LOGGER, rsrc_id):
+            self._release(rsrc_id)
+
+        return True
+
+    def _release(self, rsrc_id):
+        """Release all the ports allocated to a resource."""
+        alloc = self._allocs.pop(rsrc_id, None)
+        if alloc is None:
+            return
+
+        port_range = _port_range(alloc['environment'])
+        for proto in _PROTOS:
+            pool = self._pools[(port_range, proto)]
+            for port in alloc[proto]:
+                pool.release(port)
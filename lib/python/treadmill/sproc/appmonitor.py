@@ -12,6 +12,8 @@ import logging
 import math
 import time
 
+from concurrent import futures
+
 import click
 
 import six
@@ -35,6 +37,11 @@ _INTERVAL = float(60 * 60)
 # Delay monitoring for non-existent apps.
 _DELAY_INTERVAL = float(5 * 60)
 
+# Max number of concurrent instance create requests.
+_CREATE_WORKERS = 16
+
+_TRUSTED_HEADERS = {'X-Treadmill-Trusted-Agent': 'monitor'}
+
 
 def make_alerter(alerts_dir, cell):
     """Create alert function."""
@@ -52,6 +59,72 @@ def make_alerter(alerts_dir, cell):
     return send_alert
 
 
+def _appname(instancename):
+    """App name of an instance."""
+    return instancename.rpartition('#')[0]
+
+
+def _update_scheduled(scheduled, children):
+    """Update the scheduled instances grouped by app.
+
+    Only the groups of the apps with added or removed instances are sorted
+    again, the updated groups are returned in a new dict.
+    """
+    current = set(children)
+    previous = set(itertools.chain.from_iterable(six.itervalues(scheduled)))
+
+    added = collections.defaultdict(list)
+    for instance in current - previous:
+        added[_appname(instance)].append(instance)
+    changed = set(added)
+    changed.update(_appname(instance) for instance in previous - current)
+
+    grouped = dict(scheduled)
+    for name in changed:
+        instances = [
+            instance for instance in grouped.get(name, [])
+            if instance in current
+        ]
+        instances.extend(added.get(name, []))
+        if instances:
+            grouped[name] = sorted(instances)
+        else:
+            grouped.pop(name, None)
+
+    return grouped
+
+
+def _create(api_url, name, count):
+    """Create instances of an app."""
+    return restclient.post(
+        [api_url],
+        '/instance/{}?count={}'.format(name, count),
+        payload={},
+        headers=_TRUSTED_HEADERS
+    )
+
+
+def _create_all(api_url, creates):
+    """Create the instances of the apps concurrently.
+
+    Returns the error of each app, None if the instances were created.
+    """
+    if not creates:
+        return {}
+
+    workers = min(_CREATE_WORKERS, len(creates))
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {
+            name: executor.submit(_create, api_url, name, count)
+            for name, count in six.iteritems(creates)
+        }
+
+    return {
+        name: future.exception()
+        for name, future in six.iteritems(pending)
+    }
+
+
 def reevaluate(api_url, alert_f, state, zkclient, last_waited):
     """Evaluate state and adjust app count based on monitor"""
     # Disable too many branches/statements warning.
@@ -96,6 +169,11 @@ def reevaluate(api_url, alert_f, state, zkclient, last_waited):
 
         conf['last_update'] = now
 
+    # Gather the instances to create and to delete of all the monitors, the
+    # deletes are batched by proid.
+    creates = collections.OrderedDict()
+    deletes = collections.defaultdict(list)
+
     for name, conf in six.iteritems(monitors):
 
         if suspended.get(name, 0) > now:
@@ -127,39 +205,7 @@ def reevaluate(api_url, alert_f, state, zkclient, last_waited):
 
                 continue
 
-            try:
-                # scheduled, remove app from waited list
-                _scheduled = restclient.post(
-                    [api_url],
-                    '/instance/{}?count={}'.format(name, allowed),
-                    payload={},
-                    headers={'X-Treadmill-Trusted-Agent': 'monitor'}
-                )
-
-                if name in last_waited:
-                    # this means app jump out of wait, need to clear it from zk
-                    alert_f(name, 'Monitor active again', status='clear')
-                    modified = True
-
-                conf['available'] -= allowed
-            except restclient.NotFoundError:
-                _LOGGER.info('App not configured: %s', name)
-                suspended[name] = now + _DELAY_INTERVAL
-                alert_f(name, 'Monitor suspended: App not configured')
-                modified = True
-            except restclient.BadRequestError:
-                _LOGGER.exception('Unable to start: %s', name)
-                suspended[name] = now + _DELAY_INTERVAL
-                alert_f(name, 'Monitor suspended: Unable to start')
-                modified = True
-            except restclient.ValidationError:
-                _LOGGER.exception('Invalid manifest: %s', name)
-                suspended[name] = now + _DELAY_INTERVAL
-                alert_f(name, 'Monitor suspended: Invalid manifest')
-                modified = True
-            except Exception:  # pylint: disable=W0703
-                _LOGGER.exception('Unable to create instances: %s: %s',
-                                  name, needed)
+            creates[name] = allowed
 
         elif count < current_count:
             extra = []
@@ -175,19 +221,50 @@ def reevaluate(api_url, alert_f, state, zkclient, last_waited):
                 _LOGGER.warning('Invalid scale policy: %s', policy)
                 continue
 
-            try:
-                response = restclient.post(
-                    [api_url], '/instance/_bulk/delete',
-                    payload=dict(instances=list(extra)),
-                    headers={'X-Treadmill-Trusted-Agent': 'monitor'}
-                )
-                _LOGGER.info('deleted: %r - %s', extra, response)
+            deletes[name.partition('.')[0]].extend(extra)
 
-                # this means we reduce the count number, no need to wait
+    for name, err in six.iteritems(_create_all(api_url, creates)):
+        if err is None:
+            # scheduled, remove app from waited list
+            if name in last_waited:
+                # this means app jump out of wait, need to clear it from zk
+                alert_f(name, 'Monitor active again', status='clear')
                 modified = True
 
-            except Exception:  # pylint: disable=W0703
-                _LOGGER.exception('Unable to delete instances: %r', extra)
+            monitors[name]['available'] -= creates[name]
+        elif isinstance(err, restclient.NotFoundError):
+            _LOGGER.info('App not configured: %s', name)
+            suspended[name] = now + _DELAY_INTERVAL
+            alert_f(name, 'Monitor suspended: App not configured')
+            modified = True
+        elif isinstance(err, restclient.BadRequestError):
+            _LOGGER.error('Unable to start: %s: %s', name, err)
+            suspended[name] = now + _DELAY_INTERVAL
+            alert_f(name, 'Monitor suspended: Unable to start')
+            modified = True
+        elif isinstance(err, restclient.ValidationError):
+            _LOGGER.error('Invalid manifest: %s: %s', name, err)
+            suspended[name] = now + _DELAY_INTERVAL
+            alert_f(name, 'Monitor suspended: Invalid manifest')
+            modified = True
+        else:
+            _LOGGER.error('Unable to create instances: %s: %s: %s',
+                          name, creates[name], err)
+
+    for instances in six.itervalues(deletes):
+        try:
+            response = restclient.post(
+                [api_url], '/instance/_bulk/delete',
+                payload=dict(instances=instances),
+                headers=_TRUSTED_HEADERS
+            )
+            _LOGGER.info('deleted: %r - %s', instances, response)
+
+            # this means we reduce the count number, no need to wait
+            modified = True
+
+        except Exception:  # pylint: disable=W0703
+            _LOGGER.exception('Unable to delete instances: %r', instances)
 
     # total inactive means
     waited.update(suspended)
@@ -215,19 +292,7 @@ def _run_sync(api_url, alerts_dir, once):
     @utils.exit_on_unhandled
     def _scheduled_watch(children):
         """Watch scheduled instances."""
-        scheduled = sorted(children)
-
-        def _appname_fn(instancename):
-            return instancename.rpartition('#')[0]
-
-        grouped = collections.defaultdict(
-            list,
-            {
-                k: list(v)
-                for k, v in itertools.groupby(scheduled, _appname_fn)
-            }
-        )
-        state['scheduled'] = grouped
+        state['scheduled'] = _update_scheduled(state['scheduled'], children)
         return True
 
     def _watch_monitor(name):
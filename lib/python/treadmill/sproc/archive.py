@@ -0,0 +1,85 @@
+"""Archives the logs of the finished containers in the background.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import glob
+import logging
+import os
+
+from concurrent import futures
+
+import click
+
+from treadmill import appenv
+from treadmill import dirwatch
+from treadmill import runtime
+
+
+_LOGGER = logging.getLogger(__name__)
+
+_WATCHDOG_HEARTBEAT_SEC = 5 * 60
+
+# Number of archives created concurrently for a container.
+_ARCHIVE_WORKERS = 2
+
+_SERVICE_NAME = 'Archive'
+
+
+def _archive(tm_env, executor, path):
+    """Archive the logs of a queued container."""
+    if os.path.basename(path).startswith('.'):
+        return
+
+    if not os.path.isdir(path):
+        # Already archived.
+        return
+
+    _LOGGER.info('Archiving: %s', path)
+    try:
+        runtime.archive_queued(tm_env, path, executor=executor)
+    except Exception:  # pylint: disable=W0703
+        _LOGGER.exception('Unexpected exception storing local logs.')
+
+
+def init():
+    """Top level command handler."""
+
+    @click.command(name='archive')
+    @click.option('--approot', type=click.Path(exists=True),
+                  envvar='TREADMILL_APPROOT', required=True)
+    def archive_cmd(approot):
+        """Archive the logs queued by the container finish."""
+        tm_env = appenv.AppEnvironment(root=approot)
+
+        watchdog_lease = tm_env.watchdogs.create(
+            name='svc-{svc_name}'.format(svc_name=_SERVICE_NAME),
+            timeout='{hb:d}s'.format(hb=_WATCHDOG_HEARTBEAT_SEC),
+            content='Service {svc_name!r} failed'.format(
+                svc_name=_SERVICE_NAME),
+        )
+
+        with futures.ThreadPoolExecutor(
+                max_workers=_ARCHIVE_WORKERS) as executor:
+            watcher = dirwatch.DirWatcher(tm_env.archiving_dir)
+            watcher.on_created = lambda path: _archive(tm_env, executor, path)
+
+            # Archive what was queued while the service was down.
+            for path in sorted(glob.glob(os.path.join(tm_env.archiving_dir,
+                                                      '*'))):
+                _archive(tm_env, executor, path)
+
+            loop_timeout = _WATCHDOG_HEARTBEAT_SEC // 2
+            while True:
+                if watcher.wait_for_events(timeout=loop_timeout):
+                    watcher.process_events(max_events=1)
+
+                watchdog_lease.heartbeat()
+
+        _LOGGER.info('service shutdown.')
+        watchdog_lease.remove()
+
+    return archive_cmd
@@ -11,6 +11,7 @@ import time
 
 import click
 
+from treadmill import cellsync
 from treadmill import cli
 from treadmill import context
 from treadmill import plugin_manager
@@ -20,10 +21,15 @@ from treadmill import zkutils
 _LOGGER = logging.getLogger(__name__)
 
 
-def _run_sync(cellsync_plugins, once):
+def _run_sync(cellsync_plugins, once, full_sync_interval=0):
     """Sync Zookeeper with LDAP, runs with lock held.
     """
+    cycle = 0
     while True:
+        if full_sync_interval and cycle % full_sync_interval == 0:
+            cellsync.reset_manifest()
+        cycle += 1
+
         # Sync app groups
         if not cellsync_plugins:
             cellsync_plugins = plugin_manager.names('treadmill.cellsync')
@@ -51,17 +57,26 @@ def init():
                   help='List of plugins to run.')
     @click.option('--once', is_flag=True, default=False,
                   help='Run once.')
-    def top(no_lock, sync_plugins, once):
+    @click.option('--incremental', is_flag=True, default=False,
+                  help='Only write the data changed since the last sync.')
+    @click.option('--full-sync-interval', type=int, default=60,
+                  help='Number of incremental cycles between full syncs.')
+    def top(no_lock, sync_plugins, once, incremental, full_sync_interval):
         """Sync LDAP data with Zookeeper data.
         """
+        if incremental:
+            cellsync.enable_incremental()
+        else:
+            full_sync_interval = 0
+
         if not no_lock:
             _LOGGER.info('Waiting for leader lock.')
             lock = zkutils.make_lock(context.GLOBAL.zk.conn,
                                      z.path.election(__name__))
             with lock:
-                _run_sync(sync_plugins, once)
+                _run_sync(sync_plugins, once, full_sync_interval)
         else:
             _LOGGER.info('Running without lock.')
-            _run_sync(sync_plugins, once)
+            _run_sync(sync_plugins, once, full_sync_interval)
 
     return top
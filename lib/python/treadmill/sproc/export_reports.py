@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import bz2
 import io
 import logging
 import os.path
@@ -20,6 +21,7 @@ from twisted.internet import reactor, task
 
 from treadmill import context
 from treadmill import fs
+from treadmill import reports as tm_reports
 from treadmill import zknamespace as z
 from treadmill import zkutils
 
@@ -41,6 +43,11 @@ def export_reports(out_dir, zkclient):
     for report_type in reports:
         # Write the byte contents from ZK, reports are already compressed
         report, _ = zkclient.get(z.path.state_report(report_type))
+        if tm_reports.is_report(report):
+            # Binary reports are exported as CSV.
+            report = bz2.compress(
+                tm_reports.deserialize_report(report).to_csv().encode()
+            )
         filename = '{}_{}.csv.bz2'.format(start_iso, report_type)
         with io.open(os.path.join(out_dir, filename), 'wb') as out:
             out.write(report)
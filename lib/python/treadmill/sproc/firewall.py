@@ -17,6 +17,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import functools
 import logging
 import os
@@ -41,6 +42,8 @@ _DEFAULT_RULES_DIR = 'rules'
 _DEFAULT_CONTAINER_DIR = 'apps'
 _DEFAULT_WATCHDOR_DIR = 'watchdogs'
 _FW_WATCHER_HEARTBEAT = 60
+# Maximum time spent draining rule events into a single batch, in seconds.
+_FW_BATCH_TIME = 10
 
 
 def _update_nodes_change(data):
@@ -148,6 +151,9 @@ def _watcher(root_dir, rules_dir, containers_dir, watchdogs_dir):
 
     rulemgr = rulefile.RuleMgr(rules_dir, containers_dir)
     passthrough = {}
+    # Changes accumulated while processing a batch of events:
+    # (chain, rule) -> True (add) / False (delete).
+    pending = collections.OrderedDict()
 
     def on_created(path):
         """Invoked when a network rule is created."""
@@ -156,15 +162,11 @@ def _watcher(root_dir, rules_dir, containers_dir, watchdogs_dir):
         # The rule is the filename
         chain_rule = rulemgr.get_rule(rule_file)
         if chain_rule is not None:
-            chain, rule = chain_rule
-            iptables.add_rule(rule, chain=chain)
-            if isinstance(rule, fw.PassThroughRule):
-                passthrough[rule.src_ip] = (
-                    passthrough.setdefault(rule.src_ip, 0) + 1
-                )
-                _LOGGER.info('Adding passthrough %r', rule.src_ip)
-                iptables.add_ip_set(iptables.SET_PASSTHROUGHS, rule.src_ip)
-                iptables.flush_pt_conntrack_table(rule.src_ip)
+            if pending.get(chain_rule) is False:
+                # Deleted and recreated within the batch, nothing to do.
+                del pending[chain_rule]
+            else:
+                pending[chain_rule] = True
         else:
             _LOGGER.warning('Ignoring unparseable rule %r', rule_file)
 
@@ -182,8 +184,38 @@ def _watcher(root_dir, rules_dir, containers_dir, watchdogs_dir):
         _LOGGER.info('Removing %r', rule_file)
         chain_rule = rulemgr.get_rule(rule_file)
         if chain_rule is not None:
-            chain, rule = chain_rule
-            iptables.delete_rule(rule, chain=chain)
+            if pending.get(chain_rule) is True:
+                # Created and deleted within the batch, never applied.
+                del pending[chain_rule]
+            else:
+                pending[chain_rule] = False
+        else:
+            _LOGGER.warning('Ignoring unparseable file %r', rule_file)
+
+    def apply_pending():
+        """Apply all accumulated rule changes in a single transaction."""
+        if not pending:
+            return
+
+        added = [chain_rule for chain_rule, add in pending.items() if add]
+        deleted = [
+            chain_rule for chain_rule, add in pending.items() if not add
+        ]
+        pending.clear()
+        _LOGGER.info('Applying rules: %d added, %d removed',
+                     len(added), len(deleted))
+        iptables.update_rules(add=added, delete=deleted)
+
+        for _chain, rule in added:
+            if isinstance(rule, fw.PassThroughRule):
+                passthrough[rule.src_ip] = (
+                    passthrough.setdefault(rule.src_ip, 0) + 1
+                )
+                _LOGGER.info('Adding passthrough %r', rule.src_ip)
+                iptables.add_ip_set(iptables.SET_PASSTHROUGHS, rule.src_ip)
+                iptables.flush_pt_conntrack_table(rule.src_ip)
+
+        for _chain, rule in deleted:
             if isinstance(rule, fw.PassThroughRule):
                 if passthrough[rule.src_ip] == 1:
                     # Remove the IPs from the passthrough set
@@ -193,15 +225,7 @@ def _watcher(root_dir, rules_dir, containers_dir, watchdogs_dir):
                     iptables.flush_pt_conntrack_table(rule.src_ip)
                 else:
                     passthrough[rule.src_ip] -= 1
-            elif isinstance(rule, fw.DNATRule):
-                if rule.proto == 'udp':
-                    iptables.flush_conntrack_table(
-                        src_ip=rule.src_ip,
-                        src_port=rule.src_port,
-                        dst_ip=rule.dst_ip,
-                        dst_port=rule.dst_port,
-                    )
-            elif isinstance(rule, fw.SNATRule):
+            elif isinstance(rule, (fw.DNATRule, fw.SNATRule)):
                 if rule.proto == 'udp':
                     iptables.flush_conntrack_table(
                         src_ip=rule.src_ip,
@@ -209,8 +233,6 @@ def _watcher(root_dir, rules_dir, containers_dir, watchdogs_dir):
                         dst_ip=rule.dst_ip,
                         dst_port=rule.dst_port,
                     )
-        else:
-            _LOGGER.warning('Ignoring unparseable file %r', rule_file)
 
     _LOGGER.info('Monitoring fw rules changes in %r', rulemgr.path)
     watch = dirwatch.DirWatcher(rulemgr.path)
@@ -237,8 +259,14 @@ def _watcher(root_dir, rules_dir, containers_dir, watchdogs_dir):
     _LOGGER.info('Current rules: %r', current_rules)
     while True:
         if watch.wait_for_events(timeout=_FW_WATCHER_HEARTBEAT):
-            # Process no more than 5 events between heartbeats
-            watch.process_events(max_events=5)
+            # Drain the pending events and apply them as one batch. Draining
+            # is bounded in time so that the watchdog keeps being fed.
+            deadline = time.time() + _FW_BATCH_TIME
+            watch.process_events()
+            while (time.time() < deadline and
+                   watch.wait_for_events(timeout=0)):
+                watch.process_events()
+            apply_pending()
 
         rulemgr.garbage_collect()
         wd.heartbeat()
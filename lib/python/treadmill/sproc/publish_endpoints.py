@@ -12,6 +12,7 @@ import click
 from treadmill import appenv
 from treadmill import context
 from treadmill import endpoints
+from treadmill import zkutils
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -24,12 +25,21 @@ def init():
     @click.option('--approot', type=click.Path(exists=True),
                   envvar='TREADMILL_APPROOT', required=True)
     @click.option('--instance', help='Publisher instance.')
-    def run(approot, instance):
+    @click.option('--debounce-interval', type=float,
+                  default=endpoints.DEBOUNCE_INTERVAL,
+                  help='Seconds to accumulate changes before publishing.')
+    @click.option('--shards', type=int,
+                  help='Partition discovery info into that many nodes.')
+    def run(approot, instance, debounce_interval, shards):
         """Starts discovery publisher process."""
+        # Published content is cached, restart to republish on session loss.
+        context.GLOBAL.zk.conn.add_listener(zkutils.exit_on_lost)
         tm_env = appenv.AppEnvironment(approot)
         publisher = endpoints.EndpointPublisher(tm_env.endpoints_dir,
                                                 context.GLOBAL.zk.conn,
-                                                instance=instance)
+                                                instance=instance,
+                                                debounce=debounce_interval,
+                                                shards=shards)
         publisher.run()
 
     return run
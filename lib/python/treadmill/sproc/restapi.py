@@ -14,6 +14,7 @@ import socket as sock
 
 import click
 
+from treadmill import adminctx
 from treadmill import cli
 from treadmill import context
 from treadmill import rest
@@ -46,11 +47,22 @@ def init():
     @click.option('--backlog', help='Maximum ', default=128)
     @click.option('-A', '--authz', help='Authoriztion argument',
                   required=False)
+    @click.option('--ldap-cache-ttl', type=int, default=0,
+                  help='TTL in seconds of cached LDAP objects, 0 to disable.')
+    @click.option('--threads', type=int, default=0,
+                  help='Number of request threads, 0 to serve synchronously.')
+    @click.option('--queue-size', type=int, default=64,
+                  help='Number of requests waiting for a thread.')
+    @click.option('--route-limit', multiple=True,
+                  help='Maximum concurrent requests of a route, ROUTE=N.')
     def top(port, socket, auth, title, modules, config, cors_origin, workers,
-            backlog, authz):
+            backlog, authz, ldap_cache_ttl, threads, queue_size, route_limit):
         """Run Treadmill API server."""
         context.GLOBAL.zk.add_listener(zkutils.exit_on_lost)
 
+        if ldap_cache_ttl:
+            adminctx.enable_cache(ldap_cache_ttl)
+
         api_modules = {module: None for module in modules}
         for module, cfg in config:
             if module not in api_modules:
@@ -60,6 +72,15 @@ def init():
             api_modules[module] = yaml.load(stream=cfg)
             cfg.close()
 
+        route_limits = {}
+        for limit in route_limit:
+            route, _sep, count = limit.rpartition('=')
+            if not route or not count.isdigit():
+                raise click.BadParameter(
+                    'Invalid route limit: %s' % limit
+                )
+            route_limits['/' + route.strip('/')] = int(count)
+
         api_paths = api.init(api_modules, title.replace('_', ' '), cors_origin,
                              authz)
 
@@ -67,12 +88,18 @@ def init():
             rest_server = rest.TcpRestServer(port, auth_type=auth,
                                              protect=api_paths,
                                              workers=workers,
-                                             backlog=backlog)
+                                             backlog=backlog,
+                                             threads=threads,
+                                             queue_size=queue_size,
+                                             route_limits=route_limits)
         # TODO: need to rename that - conflicts with import socket.
         elif socket:
             rest_server = rest.UdsRestServer(socket, auth_type=auth,
                                              workers=workers,
-                                             backlog=backlog)
+                                             backlog=backlog,
+                                             threads=threads,
+                                             queue_size=queue_size,
+                                             route_limits=route_limits)
         else:
             click.echo('port or socket must be specified')
             sys.exit(1)
@@ -21,13 +21,17 @@ def init():
     @click.option('--once', is_flag=True, default=False,
                   help='Run once.')
     @click.option('--events-dir', type=click.Path(exists=True))
-    def run(once, events_dir):
+    @click.option('--binary-reports', is_flag=True, default=False,
+                  help='Save state reports in the binary format, readable '
+                  'only by upgraded clients.')
+    def run(once, events_dir, binary_reports):
         """Run Treadmill master scheduler."""
         scheduler.DIMENSION_COUNT = 3
         cell_master = master.Master(
             zkbackend.ZkBackend(context.GLOBAL.zk.conn),
             context.GLOBAL.cell,
-            events_dir
+            events_dir,
+            binary_reports
         )
         cell_master.run(once)
 
@@ -87,12 +87,19 @@ def init():
         @click.option('--default-write-iops', required=True, type=int,
                       help='Default write IO per second value.',
                       envvar='TREADMILL_LOCALDISK_DEFAULT_WRITE_IOPS')
+        @click.option('--pool-size', multiple=True,
+                      help='Size class of pre-formatted volumes to keep.',
+                      envvar='TREADMILL_LOCALDISK_POOL_SIZES')
+        @click.option('--pool-depth', type=int, default=0,
+                      help='Number of pre-formatted volumes per size class.',
+                      envvar='TREADMILL_LOCALDISK_POOL_DEPTH')
         def localdisk(img_location, img_size, block_dev, vg_name,
                       block_dev_configuration,
                       block_dev_read_bps, block_dev_write_bps,
                       block_dev_read_iops, block_dev_write_iops,
                       default_read_bps, default_write_bps,
-                      default_read_iops, default_write_iops):
+                      default_read_iops, default_write_iops,
+                      pool_size, pool_depth):
             """Runs localdisk service."""
 
             root_dir = local_ctx['root-dir']
@@ -186,6 +193,8 @@ def init():
                 default_write_bps=default_write_bps,
                 default_read_iops=default_read_iops,
                 default_write_iops=default_write_iops,
+                pool_sizes=pool_size,
+                pool_depth=pool_depth,
             )
 
         @service.command()
@@ -233,9 +242,26 @@ def init():
                 ext_speed=ext_speed
             )
 
+        @service.command()
+        def port():
+            """Runs the port allocation service.
+            """
+            root_dir = local_ctx['root-dir']
+            watchdogs_dir = local_ctx['watchdogs-dir']
+
+            svc = services.ResourceService(
+                service_dir=os.path.join(root_dir, 'port_svc'),
+                impl='port',
+            )
+
+            svc.run(
+                watchdogs_dir=os.path.join(root_dir, watchdogs_dir),
+            )
+
         del localdisk
         del cgroup
         del network
+        del port
 
     @service.command()
     @click.option('--zkid', help='Zookeeper session ID file.')
@@ -490,8 +490,12 @@ class Inotify:
         event_list = []
         for wd, mask, cookie, name in _parse_buffer(event_buffer):
             name = name.decode()
-            wd_path = self._paths[wd]
-            src_path = os.path.normpath(os.path.join(wd_path, name))
+            if mask & IN_Q_OVERFLOW:
+                # Not related to any watch (wd is -1).
+                src_path = None
+            else:
+                wd_path = self._paths[wd]
+                src_path = os.path.normpath(os.path.join(wd_path, name))
             inotify_event = InotifyEvent(wd, mask, cookie, src_path)
             _LOGGER.debug('Received event %r', inotify_event)
 
@@ -0,0 +1,171 @@
+"""Minimal netlink(7) socket protocol helpers.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import errno
+import logging
+import os
+import socket
+import struct
+
+_LOGGER = logging.getLogger(__name__)
+
+
+###############################################################################
+# Constants copied from linux/netlink.h
+#
+# See man netlink(7) for more details.
+#
+NETLINK_ROUTE = 0
+NETLINK_SOCK_DIAG = 4
+
+NLMSG_NOOP = 1
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+NLM_F_REQUEST = 0x01
+NLM_F_MULTI = 0x02
+NLM_F_ACK = 0x04
+NLM_F_ROOT = 0x100
+NLM_F_MATCH = 0x200
+NLM_F_DUMP = NLM_F_ROOT | NLM_F_MATCH
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+# struct nlmsghdr {
+#     __u32 nlmsg_len;
+#     __u16 nlmsg_type;
+#     __u16 nlmsg_flags;
+#     __u32 nlmsg_seq;
+#     __u32 nlmsg_pid;
+# };
+NLMSGHDR = struct.Struct('=IHHII')
+
+# struct nlmsgerr {
+#     int error;
+#     struct nlmsghdr msg;
+# };
+_NLMSGERR = struct.Struct('=i')
+
+_RECV_BUFSIZE = 65536
+
+
+def align(length):
+    """Align length to NLMSG_ALIGNTO (4 bytes)."""
+    return (length + 3) & ~3
+
+
+def netlink_socket(protocol):
+    """Create netlink socket for the given netlink protocol family.
+    """
+    sock = socket.socket(
+        socket.AF_NETLINK,  # pylint: disable=no-member
+        socket.SOCK_RAW,
+        protocol
+    )
+    sock.bind((0, 0))
+    return sock
+
+
+def pack_message(msg_type, flags, seq, payload):
+    """Pack netlink message with the given payload.
+    """
+    length = NLMSGHDR.size + len(payload)
+    return b''.join([
+        NLMSGHDR.pack(length, msg_type, flags, seq, 0),
+        payload,
+        b'\0' * (align(length) - length),
+    ])
+
+
+def unpack_messages(data):
+    """Iterate over netlink messages in a buffer.
+
+    :returns:
+        ``iterator`` -- (msg_type, flags, seq, payload) tuples.
+    """
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        (length, msg_type, flags, seq, _pid) = NLMSGHDR.unpack_from(
+            data, offset
+        )
+        if length < NLMSGHDR.size:
+            break
+        yield (msg_type, flags, seq,
+               data[offset + NLMSGHDR.size:offset + length])
+        offset += align(length)
+
+
+def _check_error(payload):
+    """Raise OSError if NLMSG_ERROR payload carries an error."""
+    (error,) = _NLMSGERR.unpack_from(payload)
+    if error:
+        raise OSError(-error, os.strerror(-error))
+
+
+def transact(sock, messages, seq):
+    """Send messages and collect replies until all are acknowledged.
+
+    Messages are sent in a single sendmsg. Each message must have been packed
+    with a sequence number in [seq, seq + len(messages)) and be either a
+    dump request or request an ACK.
+
+    :returns:
+        ``list`` -- (msg_type, payload) of all data replies, in order.
+    """
+    sock.sendall(b''.join(messages))
+    pending = set(range(seq, seq + len(messages)))
+    replies = []
+    while pending:
+        data = sock.recv(_RECV_BUFSIZE)
+        if not data:
+            raise OSError(errno.EIO, 'netlink socket closed')
+
+        for msg_type, _flags, msg_seq, payload in unpack_messages(data):
+            if msg_seq not in pending:
+                _LOGGER.debug('Ignoring stale netlink message: %d', msg_seq)
+                continue
+            if msg_type == NLMSG_DONE:
+                pending.discard(msg_seq)
+            elif msg_type == NLMSG_ERROR:
+                pending.discard(msg_seq)
+                _check_error(payload)
+            elif msg_type != NLMSG_NOOP:
+                replies.append((msg_type, payload))
+
+    return replies
+
+
+def dump(sock, msg_type, payload, seq):
+    """Send a dump request and return all reply payloads.
+    """
+    request = pack_message(
+        msg_type, NLM_F_REQUEST | NLM_F_DUMP, seq, payload
+    )
+    return [
+        reply_payload
+        for _type, reply_payload in transact(sock, [request], seq)
+    ]
+
+
+__all__ = [
+    'NETLINK_ROUTE',
+    'NETLINK_SOCK_DIAG',
+    'NLM_F_ACK',
+    'NLM_F_CREATE',
+    'NLM_F_DUMP',
+    'NLM_F_EXCL',
+    'NLM_F_REPLACE',
+    'NLM_F_REQUEST',
+    'align',
+    'dump',
+    'netlink_socket',
+    'pack_message',
+    'transact',
+    'unpack_messages',
+]
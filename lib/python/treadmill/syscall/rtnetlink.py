@@ -0,0 +1,296 @@
+"""Network device configuration through NETLINK_ROUTE (rtnetlink(7)).
+
+The functions in this module build rtnetlink request messages. They are sent
+with :func:`treadmill.syscall.netlink.transact`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import binascii
+import logging
+import socket
+import struct
+
+from treadmill.syscall import netlink
+
+_LOGGER = logging.getLogger(__name__)
+
+
+###############################################################################
+# Constants copied from linux/rtnetlink.h, linux/if_link.h, linux/if_addr.h,
+# linux/veth.h and net/if.h
+#
+# See man rtnetlink(7) for more details.
+#
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+RTM_NEWROUTE = 24
+
+IFF_UP = 0x1
+
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_MASTER = 10
+IFLA_LINKINFO = 18
+IFLA_NET_NS_PID = 19
+IFLA_IFALIAS = 20
+
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+
+VETH_INFO_PEER = 1
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PREFSRC = 7
+
+RT_TABLE_MAIN = 254
+RTPROT_BOOT = 3
+RTN_UNICAST = 1
+
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_LINK = 253
+RT_SCOPE_HOST = 254
+
+_SCOPES = {
+    'global': RT_SCOPE_UNIVERSE,
+    'universe': RT_SCOPE_UNIVERSE,
+    'link': RT_SCOPE_LINK,
+    'host': RT_SCOPE_HOST,
+}
+
+# struct rtattr {
+#     unsigned short rta_len;
+#     unsigned short rta_type;
+# };
+_RTATTR = struct.Struct('=HH')
+
+# struct ifinfomsg {
+#     unsigned char ifi_family;
+#     unsigned char __ifi_pad;
+#     unsigned short ifi_type;
+#     int ifi_index;
+#     unsigned ifi_flags;
+#     unsigned ifi_change;
+# };
+_IFINFOMSG = struct.Struct('=BxHiII')
+
+# struct ifaddrmsg {
+#     __u8 ifa_family;
+#     __u8 ifa_prefixlen;
+#     __u8 ifa_flags;
+#     __u8 ifa_scope;
+#     __u32 ifa_index;
+# };
+_IFADDRMSG = struct.Struct('=BBBBI')
+
+# struct rtmsg {
+#     unsigned char rtm_family;
+#     unsigned char rtm_dst_len;
+#     unsigned char rtm_src_len;
+#     unsigned char rtm_tos;
+#     unsigned char rtm_table;
+#     unsigned char rtm_protocol;
+#     unsigned char rtm_scope;
+#     unsigned char rtm_type;
+#     unsigned rtm_flags;
+# };
+_RTMSG = struct.Struct('=BBBBBBBBI')
+
+_U32 = struct.Struct('=I')
+
+_NEW_FLAGS = (
+    netlink.NLM_F_REQUEST | netlink.NLM_F_ACK |
+    netlink.NLM_F_CREATE | netlink.NLM_F_EXCL
+)
+_SET_FLAGS = netlink.NLM_F_REQUEST | netlink.NLM_F_ACK
+
+
+def _attr(attr_type, data):
+    """Pack a route attribute."""
+    length = _RTATTR.size + len(data)
+    return b''.join([
+        _RTATTR.pack(length, attr_type),
+        data,
+        b'\0' * (netlink.align(length) - length),
+    ])
+
+
+def _attr_str(attr_type, value):
+    """Pack a NUL terminated string route attribute."""
+    return _attr(attr_type, value.encode() + b'\0')
+
+
+def _attr_u32(attr_type, value):
+    """Pack an unsigned 32 bits route attribute."""
+    return _attr(attr_type, _U32.pack(value))
+
+
+def _ifinfomsg(index=0, flags=0, change=0):
+    return _IFINFOMSG.pack(socket.AF_UNSPEC, 0, index, flags, change)
+
+
+def _link(devname, index, flags=0, change=0):
+    """Header and attributes selecting a link by index or name.
+
+    Links created in the same transaction do not have a known index yet, the
+    kernel then looks them up by name.
+    """
+    header = _ifinfomsg(index=index, flags=flags, change=change)
+    if index:
+        return header
+    return header + _attr_str(IFLA_IFNAME, devname)
+
+
+def _inet_addr(addr):
+    """Parse an `addr[/prefixlen]` IPv4 address.
+    """
+    if '/' in addr:
+        addr, prefixlen = addr.split('/', 1)
+        prefixlen = int(prefixlen)
+    else:
+        prefixlen = 32
+    return socket.inet_pton(socket.AF_INET, addr), prefixlen
+
+
+def link_set(seq, devname, index=0, up=None, mtu=None, alias=None,
+             name=None, address=None, master=None, netns_pid=None):
+    """Build a link attributes update message.
+
+    :param ``int`` index:
+        Link index, ``0`` to select the link by `devname`. Required to change
+        the link `name`.
+    :param ``bool`` up:
+        Bring the link up (``True``) or down (``False``).
+    :param ``str`` address:
+        Link layer address (``aa:bb:cc:dd:ee:ff``).
+    :param ``int`` master:
+        Index of the master (bridge) device.
+    :param ``int`` netns_pid:
+        Move the link to the network namespace of this process.
+    """
+    flags = change = 0
+    if up is not None:
+        flags, change = (IFF_UP if up else 0), IFF_UP
+
+    attrs = [_link(devname, index, flags=flags, change=change)]
+    if name is not None:
+        assert index, 'Renaming a link requires its index'
+        attrs.append(_attr_str(IFLA_IFNAME, name))
+    if mtu is not None:
+        attrs.append(_attr_u32(IFLA_MTU, mtu))
+    if alias is not None:
+        attrs.append(_attr_str(IFLA_IFALIAS, alias))
+    if address is not None:
+        attrs.append(
+            _attr(IFLA_ADDRESS, binascii.unhexlify(address.replace(':', '')))
+        )
+    if master is not None:
+        attrs.append(_attr_u32(IFLA_MASTER, master))
+    if netns_pid is not None:
+        attrs.append(_attr_u32(IFLA_NET_NS_PID, netns_pid))
+
+    return netlink.pack_message(
+        RTM_NEWLINK, _SET_FLAGS, seq, b''.join(attrs)
+    )
+
+
+def link_add_veth(seq, veth0, veth1):
+    """Build a virtual ethernet device pair creation message.
+    """
+    peer = _ifinfomsg() + _attr_str(IFLA_IFNAME, veth1)
+    linkinfo = b''.join([
+        _attr_str(IFLA_INFO_KIND, 'veth'),
+        _attr(IFLA_INFO_DATA, _attr(VETH_INFO_PEER, peer)),
+    ])
+    payload = b''.join([
+        _ifinfomsg(),
+        _attr_str(IFLA_IFNAME, veth0),
+        _attr(IFLA_LINKINFO, linkinfo),
+    ])
+    return netlink.pack_message(RTM_NEWLINK, _NEW_FLAGS, seq, payload)
+
+
+def link_del(seq, devname, index=0):
+    """Build a link deletion message.
+    """
+    return netlink.pack_message(
+        RTM_DELLINK, _SET_FLAGS, seq, _link(devname, index)
+    )
+
+
+def addr_add(seq, addr, index, scope='link'):
+    """Build an IPv4 address creation message.
+
+    :param ``str`` addr:
+        Address, with optional prefix length (``10.0.0.1/32``).
+    :param ``int`` index:
+        Index of the link to add the address to.
+    """
+    addr, prefixlen = _inet_addr(addr)
+    payload = b''.join([
+        _IFADDRMSG.pack(socket.AF_INET, prefixlen, 0, _SCOPES[scope], index),
+        _attr(IFA_LOCAL, addr),
+        _attr(IFA_ADDRESS, addr),
+    ])
+    return netlink.pack_message(RTM_NEWADDR, _NEW_FLAGS, seq, payload)
+
+
+def route_add(seq, dest, via=None, index=None, src=None, scope=None):
+    """Build an IPv4 main table route creation message.
+
+    :param ``str`` dest:
+        Destination, with optional prefix length, or ``default``.
+    :param ``int`` index:
+        Index of the output link.
+    """
+    attrs = []
+    if dest == 'default':
+        dst_len = 0
+    else:
+        dst, dst_len = _inet_addr(dest)
+        attrs.append(_attr(RTA_DST, dst))
+    if via is not None:
+        attrs.append(_attr(RTA_GATEWAY, _inet_addr(via)[0]))
+    if index is not None:
+        attrs.append(_attr_u32(RTA_OIF, index))
+    if src is not None:
+        attrs.append(_attr(RTA_PREFSRC, _inet_addr(src)[0]))
+
+    if scope is None:
+        # Same default as ip-route(8)
+        scope = 'universe' if via is not None else 'link'
+
+    header = _RTMSG.pack(
+        socket.AF_INET, dst_len, 0, 0,
+        RT_TABLE_MAIN, RTPROT_BOOT, _SCOPES[scope], RTN_UNICAST,
+        0
+    )
+    return netlink.pack_message(
+        RTM_NEWROUTE, _NEW_FLAGS, seq, header + b''.join(attrs)
+    )
+
+
+def rtnetlink_socket():
+    """Create NETLINK_ROUTE socket in the current network namespace.
+    """
+    return netlink.netlink_socket(netlink.NETLINK_ROUTE)
+
+
+__all__ = [
+    'addr_add',
+    'link_add_veth',
+    'link_del',
+    'link_set',
+    'route_add',
+    'rtnetlink_socket',
+]
@@ -0,0 +1,107 @@
+"""Listening socket queries through NETLINK_SOCK_DIAG (sock_diag(7)).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+import socket
+import struct
+
+from treadmill.syscall import netlink
+
+_LOGGER = logging.getLogger(__name__)
+
+
+###############################################################################
+# Constants copied from linux/sock_diag.h, linux/inet_diag.h and
+# netinet/tcp.h
+#
+SOCK_DIAG_BY_FAMILY = 20
+
+TCP_CLOSE = 7
+TCP_LISTEN = 10
+
+# struct inet_diag_req_v2 {
+#     __u8 sdiag_family;
+#     __u8 sdiag_protocol;
+#     __u8 idiag_ext;
+#     __u8 pad;
+#     __u32 idiag_states;
+#     struct inet_diag_sockid id;
+# };
+#
+# struct inet_diag_sockid {
+#     __be16 idiag_sport;
+#     __be16 idiag_dport;
+#     __be32 idiag_src[4];
+#     __be32 idiag_dst[4];
+#     __u32 idiag_if;
+#     __u32 idiag_cookie[2];
+# };
+_INET_DIAG_REQ_V2 = struct.Struct('=BBBBI48s')
+
+# struct inet_diag_msg {
+#     __u8 idiag_family;
+#     __u8 idiag_state;
+#     __u8 idiag_timer;
+#     __u8 idiag_retrans;
+#     struct inet_diag_sockid id;
+#     ...
+# };
+_INET_DIAG_MSG_SPORT = struct.Struct('>H')
+_INET_DIAG_MSG_SRC_OFFSET = 8
+
+_PROTOCOLS = {
+    'tcp': (socket.IPPROTO_TCP, TCP_LISTEN),
+    # Unconnected UDP sockets are reported in the TCP_CLOSE state.
+    'udp': (socket.IPPROTO_UDP, TCP_CLOSE),
+}
+
+
+def listening(sock, proto, family, seq=1):
+    """Query listening sockets of a protocol and address family.
+
+    The state filter is applied by the kernel, so cost does not depend on the
+    number of established connections.
+
+    :param sock:
+        NETLINK_SOCK_DIAG socket (see :func:`sock_diag_socket`).
+    :param ``str`` proto:
+        ``tcp`` or ``udp``.
+    :param ``int`` family:
+        ``socket.AF_INET`` or ``socket.AF_INET6``.
+    :returns:
+        ``list`` -- (local address, local port) tuples.
+    """
+    protocol, state = _PROTOCOLS[proto]
+    request = _INET_DIAG_REQ_V2.pack(
+        family, protocol, 0, 0, 1 << state, b'\0' * 48
+    )
+    result = []
+    addr_len = 4 if family == socket.AF_INET else 16
+    src_start = _INET_DIAG_MSG_SRC_OFFSET
+    for payload in netlink.dump(sock, SOCK_DIAG_BY_FAMILY, request, seq):
+        (sport,) = _INET_DIAG_MSG_SPORT.unpack_from(payload, 4)
+        addr = socket.inet_ntop(
+            family, payload[src_start:src_start + addr_len]
+        )
+        result.append((addr, sport))
+
+    return result
+
+
+def sock_diag_socket():
+    """Create NETLINK_SOCK_DIAG socket in the current network namespace.
+    """
+    return netlink.netlink_socket(netlink.NETLINK_SOCK_DIAG)
+
+
+__all__ = [
+    'TCP_CLOSE',
+    'TCP_LISTEN',
+    'listening',
+    'sock_diag_socket',
+]
@@ -0,0 +1,136 @@
+"""Wrapper for timerfd_create(2) and timerfd_settime(2) system calls.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+import os
+import struct
+
+import ctypes
+from ctypes import (
+    c_int,
+    c_long,
+    c_void_p,
+)
+from ctypes.util import find_library
+
+_LOGGER = logging.getLogger(__name__)
+
+
+###############################################################################
+# Map the C interface
+
+_LIBC_PATH = find_library('c')
+_LIBC = ctypes.CDLL(_LIBC_PATH, use_errno=True)
+
+if getattr(_LIBC, 'timerfd_create', None) is None:
+    raise ImportError('Unsupported libc version found: %s' % _LIBC_PATH)
+
+
+class timespec(ctypes.Structure):
+    """struct timespec from time.h."""
+    # pylint: disable=C0103,R0903
+    _fields_ = [
+        ('tv_sec', c_long),
+        ('tv_nsec', c_long),
+    ]
+
+
+class itimerspec(ctypes.Structure):
+    """struct itimerspec from time.h."""
+    # pylint: disable=C0103,R0903
+    _fields_ = [
+        ('it_interval', timespec),
+        ('it_value', timespec),
+    ]
+
+
+# int timerfd_create(int clockid, int flags);
+_TIMERFD_CREATE_DECL = ctypes.CFUNCTYPE(c_int, c_int, c_int, use_errno=True)
+_TIMERFD_CREATE = _TIMERFD_CREATE_DECL(('timerfd_create', _LIBC))
+
+# int timerfd_settime(int fd, int flags,
+#                     const struct itimerspec *new_value,
+#                     struct itimerspec *old_value);
+_TIMERFD_SETTIME_DECL = ctypes.CFUNCTYPE(
+    c_int, c_int, c_int, ctypes.POINTER(itimerspec), c_void_p,
+    use_errno=True
+)
+_TIMERFD_SETTIME = _TIMERFD_SETTIME_DECL(('timerfd_settime', _LIBC))
+
+
+def _timespec(seconds):
+    """Convert float seconds into a timespec."""
+    sec = int(seconds)
+    return timespec(sec, int((seconds - sec) * 10**9))
+
+
+def timerfd_create(clockid, flags):
+    """create a timer that delivers timer expiration notifications via a file
+    descriptor.
+    """
+    fileno = _TIMERFD_CREATE(clockid, flags)
+    if fileno < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno),
+                      'timerfd_create(%r, %r)' % (clockid, flags))
+    return fileno
+
+
+def timerfd_settime(fileno, value, interval=0):
+    """Arm (or disarm when `value` is 0) the timer referred to by `fileno`.
+
+    :param ``float`` value:
+        Seconds until the first expiration.
+    :param ``float`` interval:
+        Seconds between subsequent expirations (0 for a single shot).
+    """
+    new_value = itimerspec(_timespec(interval), _timespec(value))
+    res = _TIMERFD_SETTIME(fileno, 0, ctypes.byref(new_value), None)
+    if res < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno),
+                      'timerfd_settime(%r, %r, %r)' % (fileno, value,
+                                                       interval))
+
+
+def timerfd_read(fileno):
+    """Consume the timer expirations, returning their count.
+    """
+    (expirations,) = struct.unpack('@Q', os.read(fileno, 8))
+    return expirations
+
+
+###############################################################################
+# Constants copied from sys/timerfd.h and time.h
+#
+# See man timerfd_create(2) for more details.
+#
+
+#: A settable system-wide real-time clock.
+CLOCK_REALTIME = 0
+
+#: A nonsettable monotonically increasing clock.
+CLOCK_MONOTONIC = 1
+
+#: Set the O_NONBLOCK file status flag on the new open file description.
+TFD_NONBLOCK = 0o4000
+
+#: Set the close-on-exec (FD_CLOEXEC) flag on the new file descriptor.
+TFD_CLOEXEC = 0o2000000
+
+
+###############################################################################
+__all__ = [
+    'CLOCK_MONOTONIC',
+    'CLOCK_REALTIME',
+    'TFD_CLOEXEC',
+    'TFD_NONBLOCK',
+    'timerfd_create',
+    'timerfd_read',
+    'timerfd_settime',
+]
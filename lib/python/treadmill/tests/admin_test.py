@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import time
 import unittest
 
 import ldap3
@@ -770,6 +771,190 @@ class AdminTest(unittest.TestCase):
             [('bar', ['z', 'a']), ('exp', [3, 4]), ('foo', 1), ('lot', 2)]
         )
 
+    def test_paged_search(self):
+        """Tests the page size grows with each page."""
+        admin_obj = admin.Admin(None, 'dc=test,dc=com', page_size=150)
+        admin_obj.ldap = mock.Mock()
+
+        pages = [(['a', 'b'], b'1'), (['c'], b'2'), (['d'], b'3'), ([], b'')]
+
+        def _search(**_kwargs):
+            names, cookie = pages.pop(0)
+            admin_obj.ldap.response = [
+                {'type': 'searchResEntry', 'dn': name, 'attributes': {}}
+                for name in names
+            ] + [{'type': 'searchResRef', 'uri': ['ldap://x']}]
+            admin_obj.ldap.result = {
+                'result': 0,
+                'controls': {
+                    admin._PAGED_RESULTS_CONTROL: {
+                        'value': {'cookie': cookie}
+                    }
+                }
+            }
+
+        admin_obj.ldap.search.side_effect = _search
+
+        result = admin_obj.paged_search('ou=treadmill,dc=test,dc=com',
+                                        '(objectClass=*)')
+
+        self.assertEqual([dn for dn, _ in result], ['a', 'b', 'c', 'd'])
+        self.assertEqual(
+            [
+                (kwargs['paged_size'], kwargs['paged_cookie'])
+                for _args, kwargs in admin_obj.ldap.search.call_args_list
+            ],
+            [(50, None), (100, b'1'), (150, b'2'), (150, b'3')]
+        )
+
+    @mock.patch('treadmill.admin.Admin._connect_to_uri')
+    def test_connection_pool(self, connect_mock):
+        """Tests connections are created on demand across the servers."""
+        connect_mock.side_effect = lambda uri: (
+            None if uri == 'ldap://b' else mock.Mock(uri=uri)
+        )
+        admin_obj = admin.Admin(
+            ['ldap://a', 'ldap://b', 'ldap://c'], 'dc=test,dc=com',
+            pool_size=3
+        )
+        admin_obj.connect()
+        self.assertEqual(admin_obj.ldap.uri, 'ldap://a')
+        # The write connection is not shared with the pool.
+        self.assertEqual(admin_obj.write_ldap.uri, 'ldap://a')
+        self.assertIsNot(admin_obj.write_ldap, admin_obj.ldap)
+
+        # pylint: disable=protected-access
+        pool = admin_obj._pool
+        conns = [pool.get(), pool.get(), pool.get()]
+        self.assertEqual(
+            [conn.uri for conn in conns],
+            # ldap://b is down, fail over to the next server.
+            ['ldap://a', 'ldap://c', 'ldap://c']
+        )
+        for conn in conns:
+            pool.put(conn)
+        self.assertIn(pool.get(), conns)
+
+        self.assertNotIn(admin_obj.write_ldap, conns)
+
+        admin_obj.close()
+        for conn in conns:
+            conn.unbind.assert_called_once_with()
+        admin_obj.write_ldap.unbind.assert_called_once_with()
+
+    @mock.patch('treadmill.admin.Admin._connect_to_uri', mock.Mock())
+    @mock.patch('treadmill.admin.Admin.paged_search')
+    def test_search_many(self, search_mock):
+        """Tests searches run concurrently return results in order."""
+        search_mock.side_effect = lambda search_base, **_kw: iter(
+            [(search_base, {})]
+        )
+        admin_obj = admin.Admin(['ldap://a'], 'dc=test,dc=com', pool_size=2)
+        admin_obj.connect()
+
+        self.assertEqual(
+            admin_obj.search_many([
+                {'search_base': 'ou=%d' % idx, 'search_filter': '(x=*)'}
+                for idx in range(5)
+            ]),
+            [[('ou=%d' % idx, {})] for idx in range(5)]
+        )
+        search_mock.assert_any_call(
+            search_base='ou=4', search_filter='(x=*)', dirty=False
+        )
+
+    @mock.patch('time.time', mock.Mock(return_value=100))
+    @mock.patch('treadmill.admin.Admin._paged_search')
+    def test_search_cache(self, search_mock):
+        """Tests searches are cached until the entries are written."""
+        search_mock.side_effect = lambda *_args, **_kw: iter([
+            ('cn=foo,ou=apps,ou=treadmill,dc=test,dc=com', {'cn': ['foo']}),
+        ])
+        admin_obj = admin.Admin(None, 'dc=test,dc=com', cache_ttl=60,
+                                cache_poll_interval=3600)
+        admin_obj.write_ldap = mock.Mock(result=None)
+
+        def _list():
+            return list(admin_obj.paged_search(
+                'ou=apps,ou=treadmill,dc=test,dc=com', '(cn=*)',
+                attributes=['cn']
+            ))
+
+        self.assertEqual(_list(), _list())
+        self.assertEqual(search_mock.call_count, 1)
+
+        # Dirty searches are not cached.
+        list(admin_obj.paged_search(
+            'ou=apps,ou=treadmill,dc=test,dc=com', '(cn=*)',
+            attributes=['cn'], dirty=True
+        ))
+        self.assertEqual(search_mock.call_count, 2)
+
+        # Write through invalidation of the entry and parent searches.
+        admin_obj.delete('cn=foo,ou=apps,ou=treadmill,dc=test,dc=com')
+        _list()
+        self.assertEqual(search_mock.call_count, 3)
+
+        # Expired results are fetched again.
+        time.time.return_value = 161
+        _list()
+        self.assertEqual(search_mock.call_count, 4)
+
+    @mock.patch('time.time', mock.Mock(return_value=100))
+    @mock.patch('treadmill.admin.Admin._paged_search')
+    def test_search_cache_poll(self, search_mock):
+        """Tests the entries modified in LDAP are invalidated."""
+        search_mock.side_effect = lambda *_args, **_kw: iter([
+            ('cn=foo,ou=apps,ou=treadmill,dc=test,dc=com', {'cn': ['foo']}),
+        ])
+        admin_obj = admin.Admin(None, 'dc=test,dc=com', cache_ttl=60,
+                                cache_poll_interval=5)
+
+        admin_obj.get('cn=foo,ou=apps,ou=treadmill,dc=test,dc=com',
+                      '(objectClass=*)', ['cn'])
+        time.time.return_value = 106
+        admin_obj.get('cn=foo,ou=apps,ou=treadmill,dc=test,dc=com',
+                      '(objectClass=*)', ['cn'])
+
+        self.assertEqual(
+            search_mock.call_args_list[1],
+            mock.call(
+                search_base='ou=treadmill,dc=test,dc=com',
+                search_filter='(modifyTimestamp>=19700101000040Z)',
+                attributes=['modifyTimestamp']
+            )
+        )
+        self.assertEqual(search_mock.call_count, 3)
+
+    @mock.patch('treadmill.admin.Admin.modify', mock.Mock())
+    @mock.patch('treadmill.admin.Admin._paged_search')
+    def test_update_cached(self, search_mock):
+        """Tests update diffs against the cached entry."""
+        search_mock.return_value = iter([
+            ('cn=foo,dc=test,dc=com', {
+                'cn': ['foo'],
+                'memory': ['1G'],
+                'tm-service-name;tm-service-a': ['a'],
+            }),
+        ])
+        admin_obj = admin.Admin(None, 'dc=test,dc=com', cache_ttl=60)
+        admin_obj.get('cn=foo,dc=test,dc=com', '(objectClass=*)',
+                      ['cn', 'memory', 'tm-service-name'])
+
+        admin_obj.update('cn=foo,dc=test,dc=com', {
+            'memory': ['2G'], 'tm-service-name;tm-service-b': ['b'],
+        })
+
+        self.assertEqual(search_mock.call_count, 1)
+        admin.Admin.modify.assert_called_once_with(
+            'cn=foo,dc=test,dc=com',
+            {
+                'memory': [(ldap3.MODIFY_REPLACE, ['2G'])],
+                'tm-service-name;tm-service-b': [(ldap3.MODIFY_ADD, ['b'])],
+                'tm-service-name;tm-service-a': [(ldap3.MODIFY_DELETE, [])],
+            }
+        )
+
     @mock.patch('treadmill.admin.Admin.modify', mock.Mock())
     @mock.patch('treadmill.admin.Admin.paged_search', mock.Mock())
     def test_update(self):
@@ -95,17 +95,31 @@ class LogAPITest(unittest.TestCase):
 
     def test_get(self):
         """Test the _LogAPI.get() method."""
-        with mock.patch('treadmill.api.local._get_file'):
-            with mock.patch('io.open', mock.mock_open()):
-                with self.assertRaises(InvalidInputError):
-                    self.log.get('no/such/log/exists', start=-1)
-                with mock.patch('treadmill.api.local._fragment',
-                                mock.Mock(spec_set=True,
-                                          return_value='invoked')):
-                    self.assertEqual(
-                        self.log.get('no/such/log/exists', start=0, limit=3),
-                        'invoked'
-                    )
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as temp:
+            temp.write(b''.join(b'%d\n' % i for i in six.moves.range(10)))
+
+        with mock.patch('treadmill.api.local._get_file',
+                        return_value=temp.name):
+            with self.assertRaises(InvalidInputError):
+                self.log.get('no/such/log/exists', start=-1)
+            with mock.patch('treadmill.api.local._fragment',
+                            mock.Mock(spec_set=True,
+                                      return_value='invoked')):
+                self.assertEqual(
+                    self.log.get('no/such/log/exists', start=0, limit=3),
+                    'invoked'
+                )
+
+            self.assertEqual(
+                list(self.log.get('no/such/log/exists', start=2, limit=2)),
+                ['2\n', '3\n']
+            )
+            self.assertEqual(
+                list(self.log.get('no/such/log/exists', start=2, limit=2,
+                                  order='desc')),
+                ['7\n', '6\n']
+            )
+        os.remove(temp.name)
 
         # make sure that things don't break if the log file contains some
         # binary data with ord num > 128 (eg. \xc5 below) ie. not ascii
@@ -236,15 +250,16 @@ class HelperFuncTests(unittest.TestCase):
             with io.open(file_lst[-1], 'wb') as logs:
                 logs.write(bytearray('{}\n'.format(i), 'ascii'))
 
-        result = local._concat_files(file_lst)
-        self.assertTrue(isinstance(result, io.TextIOWrapper))
-        self.assertEqual(result.read(), u'0\n1\n2\n')
+        self.assertEqual(''.join(local._concat_files(file_lst)),
+                         u'0\n1\n2\n')
 
         # check that _concat_files() catches IOError for non existing file
-        file_lst.append('no_such_file')
-        local._concat_files(file_lst)
+        file_lst.insert(1, 'no_such_file')
+        self.assertEqual(''.join(local._concat_files(file_lst)),
+                         u'0\n1\n2\n')
+        file_lst.remove('no_such_file')
 
-        for f in file_lst[:-1]:
+        for f in file_lst:
             os.remove(f)
 
         # make sure that things don't break if the log file contains some
@@ -313,53 +328,87 @@ class HelperFuncTests(unittest.TestCase):
         with self.assertRaises(InvalidInputError):
             list(local._fragment(iter(six.moves.range(10)), 99, limit=5))
 
+    @mock.patch('treadmill.api.local._BLOCK_SIZE', 3)
     def test_fragment_in_reverse(self):
-        """Test the _fragment_in_reverse() func."""
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)),
-                                            limit=-1)),
-            list(reversed(six.moves.range(10))))
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)),
-                                            limit=2)),
-            [9, 8])
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 0,
-                                            limit=3)),
-            [9, 8, 7])
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 1, 4)),
-            list(six.moves.range(8, 4, -1)))
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)),
-                                            start=5, limit=-1)),
-            [4, 3, 2, 1, 0])
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 8,
-                                            limit=8)),
-            [1, 0])
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 8,
-                                            limit=40)),
-            [1, 0])
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 8, 1)),
-            [1])
+        """Test the _fragment() func. on the lines of a file in reverse."""
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as temp:
+            temp.write(b''.join(b'%d\n' % i for i in six.moves.range(10)))
+
+        def _fragment_in_reverse(start=0, limit=None):
+            """Fragment of the lines of the file in reverse."""
+            with io.open(temp.name, 'rb') as f:
+                return [
+                    int(line)
+                    for line in local._fragment(local._lines_in_reverse(f),
+                                                start, limit)
+                ]
+
+        self.assertEqual(_fragment_in_reverse(limit=-1),
+                         list(reversed(six.moves.range(10))))
+        self.assertEqual(_fragment_in_reverse(limit=2), [9, 8])
+        self.assertEqual(_fragment_in_reverse(0, limit=3), [9, 8, 7])
+        self.assertEqual(_fragment_in_reverse(1, 4),
+                         list(six.moves.range(8, 4, -1)))
+        self.assertEqual(_fragment_in_reverse(start=5, limit=-1),
+                         [4, 3, 2, 1, 0])
+        self.assertEqual(_fragment_in_reverse(8, limit=8), [1, 0])
+        self.assertEqual(_fragment_in_reverse(8, limit=40), [1, 0])
+        self.assertEqual(_fragment_in_reverse(8, 1), [1])
 
         with self.assertRaises(InvalidInputError):
-            list(local._fragment_in_reverse(iter(six.moves.range(10)),
-                                            start=99))
+            _fragment_in_reverse(start=99)
 
         with self.assertRaises(InvalidInputError):
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 99,
-                                            limit=9))
+            _fragment_in_reverse(99, limit=9)
+
+        os.remove(temp.name)
+
+    def test_lines_in_reverse(self):
+        """Test the _lines_in_reverse() func."""
+        for block_size in (1, 2, 4, 1024):
+            with mock.patch('treadmill.api.local._BLOCK_SIZE', block_size):
+                self.assertEqual(
+                    list(local._lines_in_reverse(
+                        io.BytesIO(b'a\n\nbc\xc5\x0ad\n\xc3\xa9f')
+                    )),
+                    [u'\xe9f', u'd\n', u'bc\n', u'\n', u'a\n']
+                )
+        self.assertEqual(list(local._lines_in_reverse(io.BytesIO())), [])
+
+    @mock.patch('treadmill.api.local._BLOCK_SIZE', 5)
+    @mock.patch('treadmill.api.local._INDEX_STRIDE', 3)
+    def test_line_index(self):
+        """Test seeking lines with the line index of a file."""
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as temp:
+            temp.write(b''.join(b'%d\n' % i for i in six.moves.range(10)))
+
+        with io.open(temp.name, 'rb') as f:
+            index = local._line_index(f, temp.name)
+            self.assertEqual(index.seek(f, 4), 3)
+            self.assertEqual(f.readline(), b'3\n')
+            # Only the blocks up to line 4 are indexed.
+            self.assertEqual(index.offsets, [0, 6])
+
+            self.assertEqual(index.seek(f, 99), 9)
+            self.assertEqual(f.read(), b'9\n')
+            self.assertEqual(index.offsets, [0, 6, 12, 18])
+
+        with io.open(temp.name, 'ab') as f:
+            f.write(b'10\n11\n12\n')
+
+        with io.open(temp.name, 'rb') as f:
+            self.assertIs(local._line_index(f, temp.name), index)
+            self.assertEqual(index.seek(f, 12), 12)
+            self.assertEqual(f.read(), b'12\n')
+
+        # The file is rotated.
+        os.remove(temp.name)
+        with io.open(temp.name, 'wb') as f:
+            f.write(b'0\n')
+        with io.open(temp.name, 'rb') as f:
+            self.assertIsNot(local._line_index(f, temp.name), index)
+
+        os.remove(temp.name)
 
     def test_archive_path(self):
         """Test the _archive_paths() func."""
@@ -0,0 +1,181 @@
+"""Unit test for treadmill.authz.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import time
+import unittest
+
+import mock
+
+from treadmill import authz
+from treadmill import restclient
+
+
+def _response(auth, annotations=()):
+    """Mock authorizer response."""
+    return mock.Mock(
+        json=mock.Mock(
+            return_value={'auth': auth, 'annotations': list(annotations)}
+        )
+    )
+
+
+class ClientAuthorizerTest(unittest.TestCase):
+    """Tests for treadmill.authz.ClientAuthorizer."""
+
+    def setUp(self):
+        self.authorizer = authz.ClientAuthorizer(
+            lambda: 'alice', 'http://authz:8080', cache_size=2
+        )
+
+    @mock.patch('time.time', mock.Mock(return_value=100))
+    @mock.patch('treadmill.restclient.post', mock.Mock())
+    def test_authorize_cached(self):
+        """Test decisions are cached until they expire."""
+        restclient.post.return_value = _response(True)
+
+        self.authorizer.authorize('treadmill.api.instance', 'create',
+                                  ('foo.bar', {'memory': '1G'}), {})
+        self.authorizer.authorize('treadmill.api.instance', 'create',
+                                  ('foo.bar', {'memory': '1G'}), {})
+
+        restclient.post.assert_called_once_with(
+            ['http://authz:8080'],
+            '/alice/create/instance',
+            payload={'pk': 'foo.bar', 'payload': {'memory': '1G'}},
+        )
+        self.assertEqual(
+            self.authorizer.cache_stats(),
+            {'hits': 1, 'misses': 1, 'size': 1}
+        )
+
+        # Different payload is a different decision.
+        self.authorizer.authorize('treadmill.api.instance', 'create',
+                                  ('foo.bar', {'memory': '2G'}), {})
+        self.assertEqual(restclient.post.call_count, 2)
+
+        time.time.return_value = 161
+        self.authorizer.authorize('treadmill.api.instance', 'create',
+                                  ('foo.bar', {'memory': '1G'}), {})
+        self.assertEqual(restclient.post.call_count, 3)
+
+    @mock.patch('time.time', mock.Mock(return_value=100))
+    @mock.patch('treadmill.restclient.post', mock.Mock())
+    def test_authorize_denied(self):
+        """Test denials are cached for a shorter time."""
+        restclient.post.return_value = _response(False, ['not owner'])
+
+        for _ in range(2):
+            with self.assertRaises(authz.AuthorizationError) as err:
+                self.authorizer.authorize('treadmill.api.instance', 'delete',
+                                          ('foo.bar',), {})
+            self.assertEqual(err.exception.annotations, ['not owner'])
+        self.assertEqual(restclient.post.call_count, 1)
+
+        time.time.return_value = 106
+        restclient.post.return_value = _response(True)
+        self.authorizer.authorize('treadmill.api.instance', 'delete',
+                                  ('foo.bar',), {})
+        self.assertEqual(restclient.post.call_count, 2)
+
+    @mock.patch('treadmill.restclient.post', mock.Mock())
+    def test_cache_size(self):
+        """Test the least recently used decisions are evicted."""
+        restclient.post.return_value = _response(True)
+
+        for pk in ('a', 'b', 'a', 'c', 'a', 'b'):
+            self.authorizer.authorize('treadmill.api.app', 'get', (pk,), {})
+
+        # 'b' was evicted by 'c', 'a' was kept as recently used.
+        self.assertEqual(
+            [call[0][1] for call in restclient.post.call_args_list],
+            ['/alice/get/app'] * 4
+        )
+        self.assertEqual(
+            [call[1]['payload'] for call in restclient.post.call_args_list],
+            [{'pk': 'a'}, {'pk': 'b'}, {'pk': 'c'}, {'pk': 'b'}]
+        )
+
+    @mock.patch('treadmill.restclient.post', mock.Mock())
+    def test_prefetch(self):
+        """Test prefetching the decisions of a list of calls."""
+        authorizer = authz.ClientAuthorizer(lambda: 'alice', 'http://authz')
+        restclient.post.side_effect = lambda _api, _url, payload: _response(
+            payload['pk'] != 'denied'
+        )
+
+        authorizer.prefetch('treadmill.api.app', 'delete',
+                            [('a',), ('b',), ('a',), ('denied',)])
+        self.assertEqual(restclient.post.call_count, 3)
+
+        authorizer.authorize('treadmill.api.app', 'delete', ('a',), {})
+        authorizer.authorize('treadmill.api.app', 'delete', ('b',), {})
+        self.assertRaises(
+            authz.AuthorizationError,
+            authorizer.authorize, 'treadmill.api.app', 'delete',
+            ('denied',), {}
+        )
+        self.assertEqual(restclient.post.call_count, 3)
+        # Prefetch probes are not counted as misses.
+        self.assertEqual(
+            authorizer.cache_stats(),
+            {'hits': 3, 'misses': 0, 'size': 3}
+        )
+
+    @mock.patch('time.time', mock.Mock(return_value=100))
+    @mock.patch('treadmill.authz._LOGGER', mock.Mock())
+    @mock.patch('treadmill.restclient.post',
+                mock.Mock(return_value=_response(True)))
+    def test_report_cache_stats(self):
+        """Test the cache statistics are logged periodically."""
+        # Access to a protected member
+        # pylint: disable=W0212
+        authorizer = authz.ClientAuthorizer(lambda: 'alice', 'http://authz')
+
+        authorizer.authorize('treadmill.api.app', 'get', ('a',), {})
+        authz._LOGGER.info.assert_not_called()
+
+        authorizer.authorize('treadmill.api.app', 'get', ('a',), {})
+        authz._LOGGER.info.assert_not_called()
+
+        time.time.return_value = 400
+        authorizer.authorize('treadmill.api.app', 'get', ('b',), {})
+        authz._LOGGER.info.assert_called_once_with(
+            'Authorization cache: %r', {'hits': 1, 'misses': 2, 'size': 2}
+        )
+
+    def test_wrap_prefetch(self):
+        """Test prefetching the decisions of calls to a wrapped API."""
+        authorizer = mock.Mock()
+
+        class _API:
+            """Test API."""
+
+            def __init__(self):
+                def get(rsrc_id):
+                    """Get resource."""
+                    return rsrc_id
+
+                self.get = get
+
+        api = authz.wrap(_API(), authorizer)
+        authz.prefetch(api.get, [('a',), ('b',)])
+        authorizer.prefetch.assert_called_once_with(
+            'treadmill.tests.authz_test', 'get', [('a',), ('b',)]
+        )
+
+        self.assertEqual(api.get('a'), 'a')
+        authorizer.authorize.assert_called_once_with(
+            'treadmill.tests.authz_test', 'get', ('a',), {}
+        )
+
+        # Unwrapped functions are ignored.
+        authz.prefetch(_API().get, [('a',)])
+
+
+if __name__ == '__main__':
+    unittest.main()
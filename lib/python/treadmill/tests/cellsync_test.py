@@ -54,6 +54,165 @@ class CellsyncTest(unittest.TestCase):
             makepath=True, ephemeral=False, acl=mock.ANY, sequence=False
         )
 
+    @mock.patch('treadmill.context.GLOBAL', mock.Mock(cell='test'))
+    @mock.patch('treadmill.cellsync._MANIFEST', {})
+    def test_sync_collection_incremental(self):
+        """Test incremental sync of ldap collection to Zookeeper."""
+        # pylint: disable=protected-access
+
+        payload = cellsync._payload({'cells': ['test']})
+        zkclient = mock.Mock()
+        zkclient.get_children.return_value = ['test.foo', 'test.bar']
+        zkclient.get_async.side_effect = lambda path: mock.Mock(
+            get=mock.Mock(return_value=({
+                '/app-groups/test.foo': payload,
+                '/app-groups/test.bar': cellsync._payload({'cells': []}),
+            }[path], None))
+        )
+        txn = zkclient.transaction.return_value
+        txn.commit.return_value = [True, True]
+
+        def _entities():
+            return [
+                {'_id': 'test.foo', 'cells': ['test']},
+                {'_id': 'test.bar', 'cells': ['test']},
+                {'_id': 'test.baz', 'cells': ['test']},
+            ]
+
+        cellsync._sync_collection(zkclient, _entities(), '/app-groups',
+                                  match=cellsync._match_appgroup)
+
+        # Up to date node is not rewritten, changes are batched.
+        self.assertEqual(zkclient.get_async.call_count, 2)
+        txn.set_data.assert_called_once_with('/app-groups/test.bar', payload)
+        txn.create.assert_called_once_with(
+            '/app-groups/test.baz', payload, acl=mock.ANY
+        )
+        txn.commit.assert_called_once_with()
+        zkclient.create.assert_not_called()
+        zkclient.set.assert_not_called()
+
+        # Nothing changed, nothing is read or written.
+        zkclient.reset_mock()
+        zkclient.get_children.return_value = [
+            'test.foo', 'test.bar', 'test.baz'
+        ]
+        cellsync._sync_collection(zkclient, _entities()[:2], '/app-groups',
+                                  match=cellsync._match_appgroup)
+
+        zkclient.get_async.assert_not_called()
+        txn.delete.assert_called_once_with('/app-groups/test.baz')
+        txn.set_data.assert_not_called()
+        txn.create.assert_not_called()
+
+    @mock.patch('treadmill.context.GLOBAL', mock.Mock(cell='test'))
+    @mock.patch('treadmill.cellsync._MANIFEST', {})
+    @mock.patch('treadmill.zkutils.put', mock.Mock(spec_set=True))
+    @mock.patch('treadmill.zkutils.ensure_deleted', mock.Mock(spec_set=True))
+    def test_sync_collection_txn_failed(self):
+        """Test changes are applied one by one if the transaction fails."""
+        # pylint: disable=protected-access
+
+        zkclient = mock.Mock()
+        zkclient.get_children.return_value = ['test.bar']
+        txn = zkclient.transaction.return_value
+        txn.commit.return_value = [
+            kazoo.exceptions.NotEmptyError(),
+            kazoo.exceptions.RolledBackError(),
+        ]
+
+        cellsync._sync_collection(zkclient, [{'_id': 'test.foo'}],
+                                  '/app-groups')
+
+        zkutils.ensure_deleted.assert_called_once_with(
+            zkclient, '/app-groups/test.bar'
+        )
+        zkutils.put.assert_called_once_with(
+            zkclient, '/app-groups/test.foo', cellsync._payload({})
+        )
+
+    @mock.patch('treadmill.admin.CellAllocation', mock.Mock(spec_set=True))
+    @mock.patch('treadmill.context.GLOBAL', mock.Mock(cell='test'))
+    @mock.patch('treadmill.scheduler.masterapi.update_allocations',
+                mock.Mock(spec_set=True))
+    def test_sync_allocations_incremental(self):
+        """Test unchanged allocations are not written to Zookeeper."""
+        mock_admalloc = treadmill.admin.CellAllocation.return_value
+        mock_admalloc.list.side_effect = lambda _attrs: [
+            {'_id': 'tenant/test', 'rank': 100},
+        ]
+
+        with mock.patch('treadmill.cellsync._DIGESTS', {}):
+            cellsync.sync_allocations()
+            cellsync.sync_allocations()
+            treadmill.scheduler.masterapi.update_allocations.\
+                assert_called_once_with(
+                    treadmill.context.GLOBAL.zk.conn,
+                    [{'_id': 'tenant/test', 'rank': 100, 'name': 'tenant'}]
+                )
+
+        # Without manifest, allocations are synced every time.
+        cellsync.sync_allocations()
+        self.assertEqual(
+            treadmill.scheduler.masterapi.update_allocations.call_count, 2
+        )
+
+    @mock.patch('treadmill.cellsync._ENTITIES', {})
+    @mock.patch('time.time', mock.Mock(return_value=3600))
+    def test_search_incremental(self):
+        """Test only the LDAP entries modified since the last search are
+        read.
+        """
+        # pylint: disable=protected-access
+        ldap_admin = mock.Mock()
+        ldap_admin.dn.return_value = 'ou=servers,ou=treadmill'
+        admin_srv = treadmill.admin.Server(ldap_admin)
+        ldap_admin.paged_search.return_value = [
+            ('server=foo,ou=servers,ou=treadmill', {'server': ['foo']}),
+            ('server=bar,ou=servers,ou=treadmill', {'server': ['bar']}),
+        ]
+
+        servers = cellsync._search(admin_srv)
+        self.assertEqual(
+            sorted(server['_id'] for server in servers), ['bar', 'foo']
+        )
+        ldap_admin.paged_search.assert_called_once_with(
+            search_base='ou=servers,ou=treadmill',
+            search_filter='(objectClass=tmServer)',
+            attributes=admin_srv.attrs()
+        )
+
+        # Entries are listed, only the modified ones are read.
+        ldap_admin.reset_mock()
+        ldap_admin.paged_search.side_effect = [
+            [
+                ('server=foo,ou=servers,ou=treadmill', {}),
+                ('server=baz,ou=servers,ou=treadmill', {}),
+            ],
+            [
+                ('server=baz,ou=servers,ou=treadmill', {'server': ['baz']}),
+            ],
+        ]
+        servers = cellsync._search(admin_srv)
+        self.assertEqual(
+            sorted(server['_id'] for server in servers), ['baz', 'foo']
+        )
+        ldap_admin.paged_search.assert_has_calls([
+            mock.call(
+                search_base='ou=servers,ou=treadmill',
+                search_filter='(objectClass=tmServer)',
+                attributes=[]
+            ),
+            mock.call(
+                search_base='ou=servers,ou=treadmill',
+                search_filter=(
+                    '(&(objectClass=tmServer)'
+                    '(modifyTimestamp>=19700101005500Z))'
+                ),
+                attributes=admin_srv.attrs()
+            ),
+        ])
+
     @mock.patch('treadmill.admin.Server', mock.Mock(spec_set=True))
     @mock.patch('treadmill.context.GLOBAL', mock.Mock(cell='test'))
     @mock.patch('treadmill.scheduler.masterapi.create_bucket',
@@ -87,6 +87,92 @@ class DirWatcherTest(unittest.TestCase):
                 res,
             )
 
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+    def test_batch(self):
+        """Tests coalescing the events in batches."""
+        batches = []
+        gone = os.path.join(self.root, 'gone')
+        io.open(gone, 'w').close()
+
+        watcher = dirwatch.DirWatcher(self.root)
+        watcher.on_batch = batches.append
+        watcher.on_created = mock.Mock()
+
+        test_file = os.path.join(self.root, 'a')
+        with io.open(test_file, 'w') as f:
+            f.write('hello')
+        with io.open(test_file, 'a') as f:
+            f.write(' world!')
+        temp_file = os.path.join(self.root, 'b')
+        io.open(temp_file, 'w').close()
+        os.unlink(temp_file)
+        os.unlink(gone)
+        new_file = os.path.join(self.root, 'c')
+        io.open(new_file, 'w').close()
+
+        self.assertTrue(watcher.wait_for_events(0))
+        res = watcher.process_events(max_events=2)
+
+        self.assertEqual(
+            batches,
+            [[
+                (dirwatch.DirWatcherEvent.CREATED, test_file),
+                (dirwatch.DirWatcherEvent.DELETED, gone),
+            ]]
+        )
+        self.assertEqual(
+            res[-1], (dirwatch.DirWatcherEvent.MORE_PENDING, None, None)
+        )
+        watcher.on_created.assert_not_called()
+
+        res = watcher.process_events(resume=True)
+        self.assertEqual(
+            batches[-1], [(dirwatch.DirWatcherEvent.CREATED, new_file)]
+        )
+        self.assertEqual(
+            res, [(dirwatch.DirWatcherEvent.CREATED, new_file, None)]
+        )
+
+    def test_batch_overflow(self):
+        """Tests the changes are recovered after an event queue overflow."""
+        batches = []
+        for name in ('a', 'b', 'c'):
+            io.open(os.path.join(self.root, name), 'w').close()
+
+        watcher = dirwatch.DirWatcher(self.root)
+        watcher.on_batch = batches.append
+        watcher_cls = type(watcher)
+        with mock.patch.object(watcher_cls, '_read_events', return_value=[]):
+            watcher.process_events()
+
+        os.unlink(os.path.join(self.root, 'a'))
+        os.utime(os.path.join(self.root, 'b'), (0, 0))
+        io.open(os.path.join(self.root, 'd'), 'w').close()
+
+        with mock.patch.object(
+                watcher_cls, '_read_events',
+                return_value=[
+                    (dirwatch.DirWatcherEvent.MODIFIED,
+                     os.path.join(self.root, 'c')),
+                    (dirwatch.DirWatcherEvent.OVERFLOW, None),
+                    (dirwatch.DirWatcherEvent.CREATED,
+                     os.path.join(self.root, 'd')),
+                ]):
+            watcher.process_events()
+
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(
+            sorted(batches[0], key=lambda event: event[1]),
+            [
+                (dirwatch.DirWatcherEvent.DELETED,
+                 os.path.join(self.root, 'a')),
+                (dirwatch.DirWatcherEvent.MODIFIED,
+                 os.path.join(self.root, 'b')),
+                (dirwatch.DirWatcherEvent.CREATED,
+                 os.path.join(self.root, 'd')),
+            ]
+        )
+
     @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
     @mock.patch('select.poll', mock.Mock())
     def test_signal(self):
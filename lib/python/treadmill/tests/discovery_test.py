@@ -6,6 +6,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import socket
+import time
 import unittest
 
 import kazoo
@@ -26,8 +28,7 @@ class DiscoveryTest(mockzk.MockZookeeperTestCase):
 
     @mock.patch('treadmill.zkutils.connect', mock.Mock(
         return_value=kazoo.client.KazooClient()))
-    @mock.patch('kazoo.client.KazooClient.get', mock.Mock(
-        return_value=('xxx:111', None)))
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('treadmill.utils.rootdir', mock.Mock(return_value='/some'))
@@ -43,7 +44,9 @@ class DiscoveryTest(mockzk.MockZookeeperTestCase):
             'bar.1#0:tcp:http'
         ]
 
-        kazoo.client.KazooClient.get.return_value = (b'xxx:123', None)
+        kazoo.client.KazooClient.get_async.return_value.get.return_value = (
+            b'xxx:123', None
+        )
 
         # Need to call sync first, then put 'exit' on the queue to terminate
         # the loop.
@@ -179,12 +182,74 @@ class DiscoveryTest(mockzk.MockZookeeperTestCase):
             else:
                 raise ValueError(fullpath)
 
-        zkclient.get = zk_get
+        def zk_get_async(fullpath):
+            """Mock the zkclient.get_async() method."""
+            async_result = mock.Mock()
+            async_result.get.side_effect = lambda: zk_get(fullpath)
+            return async_result
+
+        zkclient.get_async = zk_get_async
         self.assertEqual(
             set(app_discovery.get_endpoints()),
             set(('xxx:123', 'xxx:123', 'yyy:987'))
         )
 
+    def test_iterbatches(self):
+        """Checks that queued batches are coalesced."""
+        app_discovery = discovery.Discovery(None, 'appproid.foo.*', 'http')
+        app_discovery.queue.put([('a', 'xxx:1'), ('b', 'xxx:2')])
+        app_discovery.queue.put([('a', None), ('c', 'xxx:3')])
+        app_discovery.queue.put([('a', 'yyy:1')])
+        app_discovery.exit_loop()
+
+        self.assertEqual(
+            list(app_discovery.iterbatches()),
+            [[('a', 'yyy:1'), ('b', 'xxx:2'), ('c', 'xxx:3')]]
+        )
+
+    def test_resolve_endpoints(self):
+        """Checks concurrent endpoint resolution."""
+        zkclient = mock.Mock()
+
+        def zk_get_async(fullpath):
+            """Mock the zkclient.get_async() method."""
+            async_result = mock.Mock()
+            if fullpath.endswith('missing'):
+                async_result.get.side_effect = kazoo.exceptions.NoNodeError
+            else:
+                async_result.get.return_value = (b'xxx:123', None)
+            return async_result
+
+        zkclient.get_async.side_effect = zk_get_async
+        app_discovery = discovery.Discovery(zkclient, 'proid.foo', '*')
+
+        self.assertEqual(
+            app_discovery.resolve_endpoints(
+                ['proid.foo#1:tcp:http', 'proid.foo#1:tcp:missing']
+            ),
+            {
+                'proid.foo#1:tcp:http': 'xxx:123',
+                'proid.foo#1:tcp:missing': None,
+            }
+        )
+        zkclient.get_async.assert_has_calls([
+            mock.call('/endpoints/proid/foo#1:tcp:http'),
+            mock.call('/endpoints/proid/foo#1:tcp:missing'),
+        ])
+
+    @mock.patch('socket.gethostbyname', mock.Mock(return_value='1.1.1.1'))
+    @mock.patch('time.time', mock.Mock(return_value=100))
+    def test_host_cache(self):
+        """Checks hostname cache expiration."""
+        host_cache = discovery.HostCache(ttl=10)
+        self.assertEqual(host_cache.resolve('xxx'), '1.1.1.1')
+        self.assertEqual(host_cache.resolve('xxx'), '1.1.1.1')
+        self.assertEqual(socket.gethostbyname.call_count, 1)
+
+        time.time.return_value = 111
+        self.assertEqual(host_cache.resolve('xxx'), '1.1.1.1')
+        self.assertEqual(socket.gethostbyname.call_count, 2)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -45,18 +45,29 @@ class PortScannerTest(unittest.TestCase):
     @mock.patch('treadmill.sysinfo.hostname',
                 mock.Mock(return_value='x.x.com'))
     @mock.patch('treadmill.zkutils.put', mock.Mock())
-    @mock.patch('treadmill.netutils.netstat',
-                mock.Mock(return_value=set([8000])))
+    @mock.patch('treadmill.netutils.ListenScanner.scan',
+                mock.Mock(return_value={'tcp': set([8000]),
+                                        'udp': set([8001])}))
+    @mock.patch('treadmill.netutils.ListenScanner.retain', mock.Mock())
     def test_scan(self):
         """Test publishing endpoints status info."""
-        endp_files = ['x.y#001~http~tcp~45000~12345~8000']
+        endp_files = ['x.y#001~tcp~http~45000~12345~8000',
+                      'x.y#001~udp~dns~45001~12345~8000',
+                      'x.y#001~udp~ntp~45002~12345~8001']
         for end_p in endp_files:
             io.open(os.path.join(self.root, end_p), 'w').close()
         self.assertEqual(
-            {45000: 1},
+            {45000: 1, 45001: 0, 45002: 1},
             self.scanner._scan()
         )
-        treadmill.netutils.netstat.assert_called_with('12345')
+        treadmill.netutils.ListenScanner.scan.assert_called_with('12345')
+        treadmill.netutils.ListenScanner.retain.assert_called_with(
+            mock.ANY
+        )
+        self.assertEqual(
+            list(treadmill.netutils.ListenScanner.retain.call_args[0][0]),
+            ['12345']
+        )
 
 
 class EndpointPublisherTest(unittest.TestCase):
@@ -105,6 +116,62 @@ class EndpointPublisherTest(unittest.TestCase):
             acl=mock.ANY
         )
 
+    @mock.patch('treadmill.zkutils.put', mock.Mock())
+    def test_publish_unchanged(self):
+        """Test unchanged state is not republished."""
+        self.publisher.state = set(['x.y#001:http:tcp:45000'])
+        self.publisher._publish()
+        self.publisher._publish()
+        self.assertEqual(treadmill.zkutils.put.call_count, 1)
+
+        self.publisher.state.add('x.y#002:http:tcp:45001')
+        self.publisher._publish()
+        self.assertEqual(treadmill.zkutils.put.call_count, 2)
+
+    @mock.patch('treadmill.zkutils.put', mock.Mock())
+    def test_publish_shards(self):
+        """Test publishing endpoints in shards, only changed are written."""
+        self.publisher.shards = 4
+        self.publisher.state = set(['x.y#001:http:tcp:45000',
+                                    'a.b#001:http:tcp:55000'])
+        self.publisher._publish()
+        self.assertEqual(treadmill.zkutils.put.call_count, 4)
+        published = {
+            call[0][1]: call[0][2]
+            for call in treadmill.zkutils.put.call_args_list
+        }
+        self.assertEqual(
+            set(published),
+            set(['/discovery/x.x.com@%d' % shard for shard in range(4)])
+        )
+        self.assertEqual(
+            sorted(sum(published.values(), [])),
+            ['a.b#001:http:tcp:55000', 'x.y#001:http:tcp:45000']
+        )
+
+        treadmill.zkutils.put.reset_mock()
+        self.publisher.state.add('x.y#001:http:tcp:45001')
+        self.publisher._publish()
+        treadmill.zkutils.put.assert_called_once_with(
+            mock.ANY,
+            mock.ANY,
+            ['x.y#001:http:tcp:45000', 'x.y#001:http:tcp:45001'],
+            ephemeral=True,
+            acl=mock.ANY
+        )
+
+    def test_discovery_instance(self):
+        """Test the publisher instance of discovery nodes."""
+        self.assertEqual(
+            endpoints.discovery_instance('x.x.com'), 'x.x.com'
+        )
+        self.assertEqual(
+            endpoints.discovery_instance('x.x.com#1'), 'x.x.com#1'
+        )
+        self.assertEqual(
+            endpoints.discovery_instance('x.x.com#1@3'), 'x.x.com#1'
+        )
+
 
 class EndpointMgrTest(unittest.TestCase):
     """Mock test for endpoint manager."""
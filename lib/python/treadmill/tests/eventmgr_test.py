@@ -81,7 +81,9 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
             side_effect=lambda func: func({'valid_until': 123.0}, None, None)
         )
 
-        mock_zkclient.get.return_value = ('{}', mock.Mock(ctime=1000))
+        mock_zkclient.get_async.return_value.get.return_value = (
+            '{}', mock.Mock(ctime=1000, mzxid=1)
+        )
         mock_zkclient.exits.return_value = mock.Mock()
         # Decorator style watch
         mock_zkclient.DataWatch.return_value = mock_data_watch
@@ -120,7 +122,9 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
             side_effect=lambda func: func(None, None, None)
         )
 
-        mock_zkclient.get.return_value = ('{}', mock.Mock(ctime=1000))
+        mock_zkclient.get_async.return_value.get.return_value = (
+            '{}', mock.Mock(ctime=1000, mzxid=1)
+        )
         mock_zkclient.exits.return_value = mock.Mock()
         # Decorator style watch
         mock_zkclient.DataWatch.return_value = mock_data_watch
@@ -155,17 +159,28 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
 
         self.assertFalse(os.path.exists(os.path.join(self.cache, '.ready')))
 
-    @mock.patch('treadmill.zkutils.get', mock.Mock())
-    @mock.patch('treadmill.zkutils.get_with_metadata', mock.Mock())
+    def _mock_zk_apps(self, placement, scheduled):
+        """Mock the placement and scheduled apps Zookeeper content."""
+        self.evmgr._hostname = 'test.xx.com'
+        self.make_mock_zk({
+            'placement': {'test.xx.com': placement},
+            'scheduled': scheduled,
+        })
+
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     def test__cache(self):
         """Test application cache event.
         """
         # Access to a protected member _cache of a client class
         # pylint: disable=W0212
-        treadmill.zkutils.get.return_value = {}
-
-        treadmill.zkutils.get_with_metadata.return_value = (
-            {}, mock.Mock(ctime=1000)
+        self._mock_zk_apps(
+            placement={
+                'foo#001': {
+                    '.data': '{}\n',
+                    '.metadata': {'mzxid': 42, 'ctime': 1000},
+                },
+            },
+            scheduled={'foo#001': {'memory': '1G'}},
         )
 
         zkclient = kazoo.client.KazooClient()
@@ -173,18 +188,19 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
 
         appcache = os.path.join(self.cache, 'foo#001')
         self.assertTrue(os.path.exists(appcache))
+        with io.open(os.path.join(self.cache, '.index')) as f:
+            self.assertEqual(yaml.load(stream=f), {'foo#001': [42, 1000]})
 
-    @mock.patch('treadmill.zkutils.get', mock.Mock())
-    @mock.patch('treadmill.zkutils.get_with_metadata', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     def test__cache_placement_notfound(self):
         """Test application cache event when placement is not found.
         """
         # Access to a protected member _cache of a client class
         # pylint: disable=W0212
-        treadmill.zkutils.get.return_value = {}
-
-        treadmill.zkutils.get_with_metadata.side_effect = \
-            kazoo.exceptions.NoNodeError
+        self._mock_zk_apps(
+            placement={},
+            scheduled={'foo#001': {'memory': '1G'}},
+        )
 
         zkclient = kazoo.client.KazooClient()
         self.evmgr._cache(zkclient, 'foo#001')
@@ -192,18 +208,15 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
         appcache = os.path.join(self.cache, 'foo#001')
         self.assertFalse(os.path.exists(appcache))
 
-    @mock.patch('treadmill.zkutils.get', mock.Mock())
-    @mock.patch('treadmill.zkutils.get_with_metadata', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     def test__cache_app_notfound(self):
         """Test application cache event when app is not found.
         """
         # Access to a protected member _cache of a client class
         # pylint: disable=W0212
-        treadmill.zkutils.get.side_effect = \
-            kazoo.exceptions.NoNodeError
-
-        treadmill.zkutils.get_with_metadata.return_value = (
-            {}, mock.Mock(ctime=1000)
+        self._mock_zk_apps(
+            placement={'foo#001': {'.data': '{}\n'}},
+            scheduled={},
         )
 
         zkclient = kazoo.client.KazooClient()
@@ -212,19 +225,24 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
         appcache = os.path.join(self.cache, 'foo#001')
         self.assertFalse(os.path.exists(appcache))
 
-    @mock.patch('treadmill.zkutils.get', mock.Mock())
-    @mock.patch('treadmill.zkutils.get_with_metadata', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     @mock.patch('treadmill.fs.write_safe', mock.Mock())
     @mock.patch('os.stat', mock.Mock())
     def test__cache_check_existing(self):
         """Test checking if the file already exists in cache and is up to date.
         """
-        # Access to a protected member _cache of a client class
+        # Access to a protected member _cache_many of a client class
         # pylint: disable=W0212
-        treadmill.zkutils.get.return_value = {}
-
-        treadmill.zkutils.get_with_metadata.return_value = (
-            {}, mock.Mock(ctime=1000)
+        placement = {
+            'foo#001': {
+                '.data': '{}\n',
+                '.metadata': {'mzxid': 42, 'ctime': 1000},
+            },
+        }
+        self._mock_zk_apps(
+            placement=placement,
+            scheduled={'foo#001': {'memory': '1G'}},
         )
 
         zkclient = kazoo.client.KazooClient()
@@ -232,29 +250,84 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
         # File doesn't exist.
         os.stat.side_effect = FileNotFoundError
 
-        self.evmgr._cache(zkclient, 'foo#001', check_existing=True)
+        self.evmgr._cache_many(zkclient, ['foo#001'], check_existing=True)
 
         treadmill.fs.write_safe.assert_called()
 
         # File is up to date.
         treadmill.fs.write_safe.reset_mock()
-        os.stat.side_effect = None
+        os.stat.reset_mock()
+
+        self.evmgr._cache_many(zkclient, ['foo#001'], check_existing=True)
+
+        treadmill.fs.write_safe.assert_not_called()
+        # The index is used, not the file change time.
+        os.stat.assert_not_called()
+
+        # File is out of date.
+        placement['foo#001']['.metadata']['mzxid'] = 43
+
+        self.evmgr._cache_many(zkclient, ['foo#001'], check_existing=True)
+
+        treadmill.fs.write_safe.assert_called()
+
+    @mock.patch('kazoo.client.KazooClient.exists_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
+    @mock.patch('treadmill.fs.write_safe', mock.Mock())
+    @mock.patch('os.stat', mock.Mock())
+    def test__cache_check_existing_unindexed(self):
+        """Test checking not indexed files against the placement ctime.
+        """
+        # Access to a protected member _cache_many of a client class
+        # pylint: disable=W0212
+        self._mock_zk_apps(
+            placement={
+                'foo#001': {
+                    '.data': '{}\n',
+                    '.metadata': {'mzxid': 42, 'ctime': 1000},
+                },
+            },
+            scheduled={'foo#001': {'memory': '1G'}},
+        )
+        zkclient = kazoo.client.KazooClient()
+
+        # File is up to date.
         os.stat.return_value = mock.Mock(st_ctime=2)
 
-        self.evmgr._cache(zkclient, 'foo#001', check_existing=True)
+        self.evmgr._cache_many(zkclient, ['foo#001'], check_existing=True)
 
         treadmill.fs.write_safe.assert_not_called()
 
         # File is out of date.
-        treadmill.fs.write_safe.reset_mock()
+        self.evmgr._index = {}
         os.stat.return_value = mock.Mock(st_ctime=0)
 
-        self.evmgr._cache(zkclient, 'foo#001', check_existing=True)
+        self.evmgr._cache_many(zkclient, ['foo#001'], check_existing=True)
 
         treadmill.fs.write_safe.assert_called()
 
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
+    @mock.patch('treadmill.eventmgr._CACHE_WINDOW', 2)
+    def test__cache_many(self):
+        """Test the Zookeeper reads are pipelined in windows.
+        """
+        # Access to a protected member _cache_many of a client class
+        # pylint: disable=W0212
+        apps = ['foo#00%d' % idx for idx in range(5)]
+        self._mock_zk_apps(
+            placement={app: {'.data': '{}\n'} for app in apps},
+            scheduled={app: {'memory': '1G'} for app in apps},
+        )
+        zkclient = kazoo.client.KazooClient()
+
+        self.evmgr._cache_many(zkclient, apps)
+
+        self.assertEqual(kazoo.client.KazooClient.get_async.call_count, 10)
+        for app in apps:
+            self.assertTrue(os.path.exists(os.path.join(self.cache, app)))
+
     @mock.patch('glob.glob', mock.Mock())
-    @mock.patch('treadmill.eventmgr.EventMgr._cache', mock.Mock())
+    @mock.patch('treadmill.eventmgr.EventMgr._cache_many', mock.Mock())
     def test__synchronize(self):
         """Check that app events are synchronized properly."""
         # Access to a protected member _synchronize of a client class
@@ -266,12 +339,12 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
         self.evmgr._synchronize(zkclient, ['foo#001'])
 
         # cache should have been called with 'foo' app
-        treadmill.eventmgr.EventMgr._cache.assert_called_with(
-            zkclient, 'foo#001')
+        treadmill.eventmgr.EventMgr._cache_many.assert_called_with(
+            zkclient, {'foo#001'})
 
     @mock.patch('glob.glob', mock.Mock())
     @mock.patch('os.unlink', mock.Mock())
-    @mock.patch('treadmill.eventmgr.EventMgr._cache', mock.Mock())
+    @mock.patch('treadmill.eventmgr.EventMgr._cache_many', mock.Mock())
     def test__synchronize_empty(self):
         """Check synchronized properly remove extra apps."""
         # Access to a protected member _synchronize of a client class
@@ -289,9 +362,11 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
             ],
             any_order=True
         )
-        self.assertFalse(treadmill.eventmgr.EventMgr._cache.called)
+        treadmill.eventmgr.EventMgr._cache_many.assert_called_once_with(
+            zkclient, set()
+        )
 
-    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
     def test_cache_placement_data(self):
@@ -815,6 +815,57 @@ class IptablesTest(unittest.TestCase):
             0, treadmill.iptables.delete_dnat_rule.call_count
         )
 
+    @mock.patch('treadmill.iptables._iptables_restore', mock.Mock())
+    @mock.patch('treadmill.iptables.add_rule', mock.Mock())
+    @mock.patch('treadmill.iptables.delete_rule', mock.Mock())
+    def test_update_rules(self):
+        """Test batch update of rules in a single transaction"""
+        # pylint: disable=protected-access
+
+        dnat_rule = firewall.DNATRule(
+            proto='tcp',
+            src_ip='1.1.1.1',
+            dst_ip='2.2.2.2', dst_port=10000,
+            new_ip='2.2.2.2', new_port=12345
+        )
+        snat_rule = firewall.SNATRule(
+            proto='udp',
+            src_ip='2.2.2.2', src_port=12345,
+            dst_ip='1.1.1.1',
+            new_ip='2.2.2.2', new_port=10000
+        )
+
+        iptables.update_rules(
+            add=[('TEST_DNAT', dnat_rule)],
+            delete=[('TEST_SNAT', snat_rule)]
+        )
+
+        treadmill.iptables._iptables_restore.assert_called_with(
+            '*nat\n'
+            '-D TEST_SNAT -s 2.2.2.2 -d 1.1.1.1 -p udp -m udp --sport 12345'
+            ' -j SNAT --to-source 2.2.2.2:10000\n'
+            '-A TEST_DNAT -s 1.1.1.1 -d 2.2.2.2 -p tcp -m tcp --dport 10000'
+            ' -j DNAT --to-destination 2.2.2.2:12345\n'
+            'COMMIT\n',
+            noflush=True
+        )
+        treadmill.iptables.add_rule.assert_not_called()
+
+        # Fallback to one by one if the transaction is rejected.
+        treadmill.iptables._iptables_restore.side_effect = (
+            subproc.CalledProcessError(2, 'iptables_restore')
+        )
+        iptables.update_rules(
+            add=[('TEST_DNAT', dnat_rule)],
+            delete=[('TEST_SNAT', snat_rule)]
+        )
+        treadmill.iptables.delete_rule.assert_called_with(
+            snat_rule, chain='TEST_SNAT'
+        )
+        treadmill.iptables.add_rule.assert_called_with(
+            dnat_rule, chain='TEST_DNAT'
+        )
+
     @mock.patch('time.sleep', mock.Mock(spec_set=True))
     @mock.patch('treadmill.subproc.check_call', mock.Mock(spec_set=True))
     def test__iptables(self):
@@ -2301,6 +2301,46 @@ class MasterTest(mockzk.MockZookeeperTestCase):
             acl=mock.ANY
         )
 
+    @mock.patch('treadmill.reports.REPORTS',
+                {name: mock.Mock() for name in
+                 ('servers', 'allocations', 'apps')})
+    @mock.patch('treadmill.reports.serialize_report',
+                mock.Mock(return_value=b'binary'))
+    @mock.patch('treadmill.reports.serialize_report_csv',
+                mock.Mock(return_value=b'csv'))
+    @mock.patch('treadmill.scheduler.zkbackend.ZkBackend.put', mock.Mock())
+    def test_save_state_reports(self):
+        """Reports are saved as CSV unless binary reports are enabled."""
+        self.master.save_state_reports()
+        zkbackend.ZkBackend.put.assert_has_calls([
+            mock.call('/reports/servers', b'csv'),
+            mock.call('/reports/allocations', b'csv'),
+            mock.call('/reports/apps', b'csv'),
+        ])
+
+        zkbackend.ZkBackend.put.reset_mock()
+        self.master.binary_reports = True
+        self.master.save_state_reports()
+        zkbackend.ZkBackend.put.assert_has_calls([
+            mock.call('/reports/servers', b'binary'),
+            mock.call('/reports/allocations', b'binary'),
+            mock.call('/reports/apps', b'binary'),
+        ])
+
+    @mock.patch('treadmill.reports.REPORTS',
+                {name: mock.Mock() for name in
+                 ('servers', 'allocations', 'apps')})
+    @mock.patch('treadmill.reports.serialize_report_csv',
+                mock.Mock(return_value=b'csv'))
+    def test_loader_save_state_reports(self):
+        """Test a plain (read-only) loader saves CSV reports."""
+        backend = mock.Mock()
+        cell_loader = loader.Loader(backend, 'test-cell')
+        self.assertFalse(cell_loader.binary_reports)
+
+        cell_loader.save_state_reports()
+        backend.put.assert_called_with('/reports/apps', b'csv')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -10,6 +10,7 @@ import errno
 import io
 import os
 import shutil
+import socket
 import tempfile
 import unittest
 
@@ -516,6 +517,128 @@ class NetDevTest(unittest.TestCase):
         )
         mock_handle.write.assert_called_with('1')
 
+    @mock.patch('socket.if_nametoindex', mock.Mock(return_value=42))
+    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.syscall.netlink.transact', mock.Mock())
+    @mock.patch('treadmill.syscall.rtnetlink.rtnetlink_socket', mock.Mock())
+    def test_batch(self):
+        """Test batching of operations in one rtnetlink transaction.
+        """
+        with netdev.batch():
+            netdev.link_add_veth('foo0', 'foo1')
+            netdev.link_set_mtu('foo0', 9000)
+            netdev.bridge_addif('br0', 'foo0')
+            netdev.link_set_up('foo0')
+            netdev.addr_add('1.2.3.4/32', 'eth0')
+            # Nothing applied until the end of the batch
+            self.assertFalse(treadmill.syscall.netlink.transact.called)
+
+        self.assertFalse(treadmill.subproc.check_call.called)
+        sock, messages, seq = treadmill.syscall.netlink.transact.call_args[0]
+        self.assertIs(
+            sock, treadmill.syscall.rtnetlink.rtnetlink_socket.return_value
+        )
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(
+            [
+                list(treadmill.syscall.netlink.unpack_messages(msg))[0][2]
+                for msg in messages
+            ],
+            list(range(seq, seq + 5))
+        )
+        socket.if_nametoindex.assert_has_calls(
+            [
+                mock.call('br0'),
+                mock.call('eth0'),
+            ]
+        )
+        sock.close.assert_called_with()
+
+    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.syscall.rtnetlink.rtnetlink_socket',
+                mock.Mock(side_effect=OSError(errno.EPROTONOSUPPORT, 'x')))
+    def test_batch_fallback(self):
+        """Test batched operations applied with ip when rtnetlink fails.
+        """
+        with netdev.batch():
+            netdev.link_add_veth('foo0', 'foo1')
+            netdev.link_set_up('foo0')
+
+        treadmill.subproc.check_call.assert_has_calls(
+            [
+                mock.call(
+                    [
+                        'ip', 'link',
+                        'add', 'name', 'foo0',
+                        'type', 'veth',
+                        'peer', 'name', 'foo1',
+                    ],
+                ),
+                mock.call(['ip', 'link', 'set', 'dev', 'foo0', 'up']),
+            ]
+        )
+
+        # Nothing is applied if the batch fails.
+        treadmill.subproc.check_call.reset_mock()
+        with self.assertRaises(ValueError):
+            with netdev.batch():
+                netdev.link_set_up('foo0')
+                raise ValueError()
+
+        self.assertFalse(treadmill.subproc.check_call.called)
+        # Operations outside a batch are applied immediately.
+        netdev.link_set_up('foo0')
+        self.assertTrue(treadmill.subproc.check_call.called)
+
+    @mock.patch('os.path.exists', mock.Mock(return_value=False))
+    @mock.patch('socket.if_nametoindex', mock.Mock(return_value=42))
+    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.syscall.netlink.transact',
+                mock.Mock(side_effect=OSError(errno.ENODEV, 'x')))
+    @mock.patch('treadmill.syscall.rtnetlink.rtnetlink_socket', mock.Mock())
+    def test_batch_rollback(self):
+        """Test the links created by a failed batch are deleted.
+        """
+        with self.assertRaises(OSError):
+            with netdev.batch():
+                netdev.link_add_veth('foo0', 'foo1')
+                netdev.link_set_name('foo0', 'bar0')
+                netdev.bridge_addif('br0', 'bar0')
+
+        treadmill.subproc.check_call.assert_called_once_with(
+            ['ip', 'link', 'delete', 'dev', 'bar0', 'type', 'veth'],
+        )
+
+        # Links that existed before the batch are kept.
+        treadmill.subproc.check_call.reset_mock()
+        os.path.exists.return_value = True
+        with self.assertRaises(OSError):
+            with netdev.batch():
+                netdev.link_add_veth('foo0', 'foo1')
+
+        os.path.exists.assert_called_with('/sys/class/net/foo0')
+        self.assertFalse(treadmill.subproc.check_call.called)
+
+    @mock.patch('os.path.exists', mock.Mock(return_value=False))
+    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    def test_batch_rollback_ip(self):
+        """Test the links created by a failed ip batch are deleted.
+        """
+        treadmill.subproc.check_call.side_effect = [
+            None,
+            treadmill.subproc.CalledProcessError(2, 'ip'),
+            None,
+        ]
+
+        with self.assertRaises(treadmill.subproc.CalledProcessError):
+            with netdev.batch(use_netlink=False):
+                netdev.link_add_veth('foo0', 'foo1')
+                netdev.link_set_up('foo0')
+
+        treadmill.subproc.check_call.assert_called_with(
+            ['ip', 'link', 'delete', 'dev', 'foo0', 'type', 'veth'],
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
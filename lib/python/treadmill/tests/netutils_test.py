@@ -14,6 +14,10 @@ import unittest
 from treadmill import netutils
 
 
+# Disable warning about accessing protected members.
+#
+# pylint: disable=W0212
+
 @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
 class NetutilsTest(unittest.TestCase):
     """Tests for teadmill.netutils
@@ -40,6 +44,37 @@ class NetutilsTest(unittest.TestCase):
         self.assertNotIn(port, netutils.netstat(os.getpid()))
         sock.close()
 
+    def test_listen_scanner(self):
+        """Tests netutils.ListenScanner"""
+        tcp6 = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+        tcp6.bind(('::', 0))
+        tcp6.listen(1)
+        udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp.bind(('0.0.0.0', 0))
+        local = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        local.bind(('127.0.0.1', 0))
+        local.listen(1)
+
+        scanner = netutils.ListenScanner()
+        try:
+            ports = scanner.scan(os.getpid())
+            self.assertIn(tcp6.getsockname()[1], ports['tcp'])
+            self.assertIn(udp.getsockname()[1], ports['udp'])
+            self.assertNotIn(local.getsockname()[1], ports['tcp'])
+
+            # Namespace is cached across scans.
+            self.assertIn(str(os.getpid()), scanner._netns)
+            scanner.scan(os.getpid())
+            self.assertEqual(len(scanner._netns), 1)
+
+            scanner.retain([])
+            self.assertEqual(scanner._netns, {})
+        finally:
+            scanner.close()
+            tcp6.close()
+            udp.close()
+            local.close()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -87,7 +87,9 @@ class NewnetTest(unittest.TestCase):
                 mock.call('eth0'),
             ]
         )
-        treadmill.netdev.dev_conf_arp_ignore_set.assert_called_with('eth0', 3)
+        treadmill.netdev.dev_conf_arp_ignore_set.assert_called_with(
+            'test1234', 3
+        )
         treadmill.netdev.addr_add.assert_called_with(
             '192.168.0.100/32', 'eth0', addr_scope='link'
         )
@@ -107,6 +109,35 @@ class NewnetTest(unittest.TestCase):
         )
         self.assertTrue(treadmill.iptables.initialize_container.called)
 
+    @mock.patch('treadmill.iptables.initialize_container', mock.Mock())
+    @mock.patch('treadmill.netdev.addr_add', mock.Mock())
+    @mock.patch('treadmill.netdev.dev_conf_arp_ignore_set', mock.Mock())
+    @mock.patch('treadmill.netdev.link_del_veth', mock.Mock(
+        side_effect=[OSError(19, 'No such device'), None]
+    ))
+    @mock.patch('treadmill.netdev.link_set_name', mock.Mock())
+    @mock.patch('treadmill.netdev.link_set_up', mock.Mock())
+    @mock.patch('treadmill.netdev.route_add', mock.Mock(
+        side_effect=OSError(17, 'File exists')
+    ))
+    def test__configure_veth_failure(self):
+        """Tests the container device is deleted if its setup fails.
+        """
+        # Access protected _configure_veth
+        # pylint: disable=W0212
+        with self.assertRaises(OSError):
+            newnet._configure_veth(
+                'test1234', '192.168.0.100', '192.168.254.254'
+            )
+
+        treadmill.netdev.link_del_veth.assert_has_calls(
+            [
+                mock.call('eth0'),
+                mock.call('test1234'),
+            ]
+        )
+        self.assertFalse(treadmill.iptables.initialize_container.called)
+
     @mock.patch('treadmill.iptables.initialize_container', mock.Mock())
     @mock.patch('treadmill.iptables.add_raw_rule', mock.Mock())
     @mock.patch('treadmill.netdev.addr_add', mock.Mock())
@@ -129,7 +160,9 @@ class NewnetTest(unittest.TestCase):
                 mock.call('eth0'),
             ]
         )
-        treadmill.netdev.dev_conf_arp_ignore_set.assert_called_with('eth0', 3)
+        treadmill.netdev.dev_conf_arp_ignore_set.assert_called_with(
+            'test1234', 3
+        )
         treadmill.netdev.addr_add.assert_has_calls(
             [
                 mock.call('10.0.0.1/32', 'eth0', addr_scope='host'),
@@ -0,0 +1,54 @@
+"""Performance test for treadmill.psmem.
+
+Measures per-node psmem collection time against process count, sequential
+and with a bounded thread pool.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import timeit
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill import psmem
+
+
+def collect(pids, workers):
+    """Collect memory usage of the pids, output some stats."""
+
+    def _collect():
+        """Run psmem collection."""
+        meminfo = psmem.get_memory_usage(pids, use_pss=True, workers=workers)
+        print('processes: ', len(meminfo))
+
+    interval = timeit.timeit(stmt=_collect, number=1)
+    print('workers: %s, time: %s' % (workers, interval))
+
+
+def test_collect(proc_count, workers=(None, 4, 16)):
+    """Start proc_count processes and time psmem collection on them."""
+    print('procs: %s' % proc_count)
+    procs = [
+        subprocess.Popen(['sleep', '60'])
+        for _idx in range(proc_count)
+    ]
+    try:
+        pids = set([proc.pid for proc in procs] + [os.getpid()])
+        for count in workers:
+            collect(pids, count)
+    finally:
+        for proc in procs:
+            proc.kill()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    test_collect(10)
+    test_collect(100)
+    test_collect(1000)
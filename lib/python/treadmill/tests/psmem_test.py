@@ -0,0 +1,87 @@
+"""Unit test for treadmill.psmem.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import unittest
+
+import mock
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill import psmem
+
+_SMAPS = b"""00400000-0040b000 r-xp 00000000 fd:00 1234 /bin/cat
+Size:                 44 kB
+Rss:                  20 kB
+Pss:                  10 kB
+Shared_Clean:         20 kB
+Shared_Dirty:          0 kB
+Private_Clean:         0 kB
+Private_Dirty:         0 kB
+SwapPss:               0 kB
+0060a000-0060b000 rw-p 0000a000 fd:00 1234 /bin/cat
+Size:                  4 kB
+Rss:                   4 kB
+Pss:                   4 kB
+Shared_Clean:          0 kB
+Shared_Dirty:          0 kB
+Private_Clean:         0 kB
+Private_Dirty:         4 kB
+"""
+
+_SMAPS_ROLLUP = b"""00400000-7ffc5a5fe000 ---p 00000000 00:00 0 [rollup]
+Rss:                  24 kB
+Pss:                  14 kB
+Pss_Anon:              4 kB
+Pss_File:             10 kB
+Shared_Clean:         20 kB
+Shared_Dirty:          0 kB
+Private_Clean:         0 kB
+Private_Dirty:         4 kB
+"""
+
+
+class PsmemTest(unittest.TestCase):
+    """Tests for teadmill.psmem."""
+
+    def test__parse_smaps(self):
+        """Test parsing smaps and smaps_rollup content."""
+        self.assertEqual(psmem._parse_smaps(_SMAPS), (4, 20, 14, 2))
+        self.assertEqual(psmem._parse_smaps(_SMAPS_ROLLUP), (4, 20, 14, 1))
+        self.assertEqual(psmem._parse_smaps(b''), (0, 0, 0, 0))
+
+    @mock.patch('os.path.exists', mock.Mock(return_value=True))
+    @mock.patch('treadmill.psmem.proc_read_bytes',
+                mock.Mock(return_value=_SMAPS_ROLLUP))
+    def test__read_smaps_rollup(self):
+        """Test reading smaps_rollup when available."""
+        self.assertEqual(psmem._read_smaps(123), (4, 20, 14, 1))
+        psmem.proc_read_bytes.assert_called_once_with(123, 'smaps_rollup')
+
+    @mock.patch('os.path.exists', mock.Mock(return_value=False))
+    @mock.patch('treadmill.psmem.proc_read_bytes',
+                mock.Mock(return_value=_SMAPS))
+    def test__read_smaps_fallback(self):
+        """Test falling back to smaps."""
+        self.assertEqual(psmem._read_smaps(123), (4, 20, 14, 2))
+        psmem.proc_read_bytes.assert_called_once_with(123, 'smaps')
+
+    def test_get_memory_usage(self):
+        """Test sequential and concurrent sampling give same result."""
+        pids = [os.getpid()]
+        expected = psmem.get_memory_usage(pids, use_pss=False)
+        self.assertEqual(len(expected), 1)
+        for info in [expected, psmem.get_memory_usage(pids, use_pss=False,
+                                                      workers=4)]:
+            self.assertEqual(info[0]['tgid'], os.getpid())
+            self.assertIn('total', info[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -288,6 +288,68 @@ class ReportsTest(unittest.TestCase):
         df = reports.explain_placement(self.cell, app1, mode='servers')
         self.assertEqual(len(df), 4)
 
+    def test_report(self):
+        """Test building reports per partition from columns."""
+        report = reports.servers_report(self.cell, self.trait_codes)
+        self.assertEqual(len(report), 4)
+        self.assertEqual(report.column('name'),
+                         ['srv3', 'srv4', 'srv1', 'srv2'])
+        self.assertEqual(report.column('partition'),
+                         ['_default', '_default', 'part', 'part'])
+
+        report = reports.Report.from_rows(['a', 'b'], [], {'a': 'int'})
+        self.assertEqual(report.data, [[], []])
+        report.extend(reports.Report.from_rows(['a', 'b'], [(1.0, 'x')]))
+        pd.util.testing.assert_frame_equal(
+            report.to_dataframe(),
+            pd.DataFrame([[1, 'x']], columns=['a', 'b'])
+        )
+        self.assertEqual(report.to_csv(), 'a,b\n1,x\n')
+
+        report = reports.Report.from_rows(
+            ['a', 'b'], [(1.5, 'x'), (float('nan'), None)]
+        )
+        self.assertEqual(report.to_csv(),
+                         report.to_dataframe().to_csv(index=False))
+        self.assertEqual(report.to_csv(), 'a,b\n1.5,x\n,\n')
+
+    def test_serialize_report(self):
+        """Test the binary serialization of reports."""
+        app = scheduler.Application('foo.xxx#1', 100,
+                                    demand=[1, 1, 1],
+                                    affinity='foo.xxx')
+        (self.cell.partitions['part'].allocation
+         .get_sub_alloc('t2')
+         .get_sub_alloc('a2').add(app))
+        self.cell.schedule()
+
+        for report_type, builder in reports.REPORTS.items():
+            report = builder(self.cell, self.trait_codes)
+            data = reports.serialize_report(report)
+            self.assertTrue(reports.is_report(data))
+            self.assertFalse(
+                reports.is_report(reports.serialize_dataframe(
+                    report.to_dataframe()
+                ))
+            )
+
+            pd.util.testing.assert_frame_equal(
+                reports.deserialize_dataframe(data),
+                getattr(reports, report_type)(self.cell, self.trait_codes)
+            )
+            self.assertEqual(
+                reports.deserialize_report(data).to_csv(),
+                report.to_dataframe().to_csv(index=False)
+            )
+
+        empty_cell = _construct_cell(empty=True)
+        pd.util.testing.assert_frame_equal(
+            reports.deserialize_dataframe(reports.serialize_report(
+                reports.servers_report(empty_cell, self.trait_codes)
+            )),
+            reports.servers(empty_cell, self.trait_codes)
+        )
+
     def test_serialize_dataframe(self):
         """Test serializing a dataframe."""
         df = pd.DataFrame([
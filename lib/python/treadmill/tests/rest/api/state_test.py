@@ -90,6 +90,30 @@ class StateTest(unittest.TestCase):
         self.assertEqual(resp.status_code, http_client.OK)
         self.impl.list.assert_called_with('test*', True, 'part1')
 
+    def test_post_state_list(self):
+        """Test getting the state of a list of instances."""
+        self.impl.get.side_effect = lambda instance_id: (
+            {'name': instance_id, 'host': 'baz1', 'state': 'running'}
+            if instance_id.endswith('1') else None
+        )
+
+        resp = self.client.post(
+            '/state/',
+            data=json.dumps({
+                'instances': ['foo.bar#0000000001', 'foo.bar#0000000002']
+            }),
+            content_type='application/json'
+        )
+        self.assertEqual(resp.status_code, http_client.OK)
+        self.assertEqual(
+            [state['name'] for state in json.loads(resp.data.decode())],
+            ['foo.bar#0000000001']
+        )
+        # The authorization decisions are prefetched.
+        self.impl.get.auth_prefetch.assert_called_once_with(
+            [('foo.bar#0000000001',), ('foo.bar#0000000002',)]
+        )
+
     @unittest.skip('BROKEN: Flask exception handling')  # FIXME
     def test_get_state(self):
         """Test getting an instance state."""
@@ -0,0 +1,165 @@
+"""Unit test for treadmill.rest.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import unittest
+
+from concurrent import futures
+
+import mock
+
+from treadmill import rest
+
+
+class AdmissionTest(unittest.TestCase):
+    """Tests for the request admission control."""
+
+    def test_acquire(self):
+        """Test the total and by route limits."""
+        # pylint: disable=protected-access
+        admission = rest._Admission(3, {'/state': 1})
+
+        self.assertTrue(admission.acquire('/state'))
+        self.assertFalse(admission.acquire('/state'))
+        self.assertTrue(admission.acquire('/instance'))
+        self.assertTrue(admission.acquire('/instance'))
+        self.assertFalse(admission.acquire('/instance'))
+
+        admission.release('/state')
+        self.assertEqual(
+            admission.stats(),
+            {'inflight': 2, 'routes': {'/instance': 2}, 'rejected': 2}
+        )
+        self.assertTrue(admission.acquire('/state'))
+
+    def test_route(self):
+        """Test the route of request paths."""
+        # pylint: disable=protected-access
+        self.assertEqual(rest._route('/instance/foo.bar#1'), '/instance')
+        self.assertEqual(rest._route('/state/'), '/state')
+        self.assertEqual(rest._route('/'), '/')
+
+
+class ThreadedWSGIContainerTest(unittest.TestCase):
+    """Tests for treadmill.rest.ThreadedWSGIContainer."""
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+        def _app(environ, start_response):
+            """Test WSGI app, blocks until released."""
+            self.started.set()
+            self.release.wait(5)
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [environ['PATH_INFO'].encode()]
+
+        self.container = rest.ThreadedWSGIContainer(
+            _app, threads=1, queue_size=1, route_limits={'/slow': 1}
+        )
+        self.ioloop = mock.patch('tornado.ioloop.IOLoop.current').start()
+        self.ioloop.return_value.add_callback.side_effect = (
+            lambda func, *args: func(*args)
+        )
+        mock.patch.object(
+            self.container, 'environ',
+            side_effect=lambda request: {'PATH_INFO': request.path}
+        ).start()
+        mock.patch.object(self.container, '_log').start()
+
+    def tearDown(self):
+        self.release.set()
+        mock.patch.stopall()
+
+    @staticmethod
+    def _request(path):
+        """Mock request to path."""
+        return mock.Mock(path=path, method='GET')
+
+    def test_call(self):
+        """Test requests run on the thread pool and overload is shed."""
+        first = self._request('/slow/1')
+        self.container(first)
+        self.started.wait(5)
+
+        # Route limit reached.
+        shed = self._request('/slow/2')
+        self.container(shed)
+        start_line, headers = shed.connection.write_headers.call_args[0][:2]
+        self.assertEqual(start_line.code, 503)
+        self.assertEqual(headers['Retry-After'], '1')
+
+        # Queued behind the running request.
+        queued = self._request('/fast')
+        self.container(queued)
+        self.assertEqual(
+            self.container.stats(),
+            {
+                'inflight': 2, 'active': 1, 'queued': 1, 'rejected': 1,
+                'routes': {'/slow': 1, '/fast': 1},
+            }
+        )
+        # Queue full.
+        self.container(self._request('/fast'))
+        first.connection.write_headers.assert_not_called()
+
+        self.release.set()
+        # pylint: disable=protected-access
+        self.container._pool.shutdown(wait=True)
+
+        start_line, _headers, = first.connection.write_headers.call_args[0]
+        self.assertEqual(start_line.code, 200)
+        self.assertEqual(
+            first.connection.write_headers.call_args[1], {'chunk': b'/slow/1'}
+        )
+        first.connection.finish.assert_called_once_with()
+        queued.connection.finish.assert_called_once_with()
+        self.assertEqual(self.container.stats()['inflight'], 0)
+        self.assertEqual(self.container.stats()['rejected'], 2)
+
+    def test_call_streamed(self):
+        """Test responses of several chunks are streamed."""
+        written = []
+
+        def _app(_environ, start_response):
+            """Test WSGI app, streams its response."""
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            for idx in range(3):
+                # A chunk is produced once the previous ones were written,
+                # the second chunk is read ahead.
+                self.assertEqual(len(written), idx if idx > 1 else 0)
+                yield 'line {}\n'.format(idx)
+
+        def _flushed(*args, **kwargs):
+            """Record the write, return a flushed write future."""
+            written.append(kwargs.get('chunk', args[-1]))
+            future = futures.Future()
+            future.set_result(None)
+            return future
+
+        container = rest.ThreadedWSGIContainer(_app, threads=1)
+        mock.patch.object(container, 'environ', return_value={}).start()
+        mock.patch.object(container, '_log').start()
+
+        request = self._request('/stream')
+        request.connection.write_headers.side_effect = _flushed
+        request.connection.write.side_effect = _flushed
+        container(request)
+        # pylint: disable=protected-access
+        container._pool.shutdown(wait=True)
+
+        self.assertEqual(written, [b'line 0\n', b'line 1\n', b'line 2\n'])
+        _start_line, headers = request.connection.write_headers.call_args[0]
+        # No Content-Length, the body is sent with chunked encoding.
+        self.assertNotIn('Content-Length', headers)
+        request.connection.finish.assert_called_once_with()
+        self.assertEqual(container.stats()['inflight'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
+import threading
 import unittest
 
 import mock
@@ -24,7 +26,7 @@ class RESTClientTest(unittest.TestCase):
         """Setup common test variables"""
         pass
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_ok(self, resp_mock):
         """Test treadmill.restclient.get OK (200)"""
@@ -36,7 +38,7 @@ class RESTClientTest(unittest.TestCase):
         self.assertIsNotNone(resp)
         self.assertEqual(resp.text, 'foo')
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_404(self, resp_mock):
         """Test treadmill.restclient.get NOT_FOUND (404)"""
@@ -45,7 +47,7 @@ class RESTClientTest(unittest.TestCase):
         with self.assertRaises(restclient.NotFoundError):
             restclient.get('http://foo.com', '/')
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_409(self, resp_mock):
         """Test treadmill.restclient.get CONFLICT (409)"""
@@ -54,7 +56,7 @@ class RESTClientTest(unittest.TestCase):
         with self.assertRaises(restclient.AlreadyExistsError):
             restclient.get('http://foo.com', '/')
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_424(self, resp_mock):
         """Test treadmill.restclient.get FAILED_DEPENDENCY (424)"""
@@ -64,7 +66,7 @@ class RESTClientTest(unittest.TestCase):
         with self.assertRaises(restclient.ValidationError):
             restclient.get('http://foo.com', '/')
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_401(self, resp_mock):
         """Test treadmill.restclient.get UNAUTHORIZED (401)"""
@@ -76,7 +78,7 @@ class RESTClientTest(unittest.TestCase):
         with self.assertRaises(restclient.NotAuthorizedError):
             restclient.get('http://foo.com', '/')
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_403(self, resp_mock):
         """Test treadmill.restclient.get FORBIDDEN (403)"""
@@ -86,7 +88,7 @@ class RESTClientTest(unittest.TestCase):
         with self.assertRaises(restclient.NotAuthorizedError):
             restclient.get('http://foo.com', '/')
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_bad_json(self, resp_mock):
         """Test treadmill.restclient.get bad JSON"""
@@ -102,7 +104,7 @@ class RESTClientTest(unittest.TestCase):
 
     @mock.patch('time.sleep', mock.Mock())
     @mock.patch('treadmill.restclient._handle_error', mock.Mock())
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_retry(self, resp_mock):
         """Tests retry logic."""
@@ -120,7 +122,7 @@ class RESTClientTest(unittest.TestCase):
         # Requests are done in order, by because other methods are being
         # called, to make test simpler, any_order is set to True so that
         # test will pass.
-        requests.get.assert_has_calls([
+        requests.Session.get.assert_has_calls([
             mock.call('http://foo.com/baz', json=None, proxies=None,
                       headers=None, auth=mock.ANY, timeout=(.5, 10),
                       stream=None, verify=True, allow_redirects=True),
@@ -140,10 +142,10 @@ class RESTClientTest(unittest.TestCase):
                       headers=None, auth=mock.ANY, timeout=(2.5, 10),
                       stream=None, verify=True, allow_redirects=True),
         ], any_order=True)
-        self.assertEqual(requests.get.call_count, 6)
+        self.assertEqual(requests.Session.get.call_count, 6)
 
     @mock.patch('time.sleep', mock.Mock())
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 side_effect=requests.exceptions.ConnectionError)
     def test_retry_on_connection_error(self, _):
         """Test retry on connection error"""
@@ -154,7 +156,8 @@ class RESTClientTest(unittest.TestCase):
         self.assertEqual(len(err.attempts), 5)
 
     @mock.patch('time.sleep', mock.Mock())
-    @mock.patch('requests.get', side_effect=requests.exceptions.Timeout)
+    @mock.patch('requests.Session.get',
+                side_effect=requests.exceptions.Timeout)
     def test_retry_on_request_timeout(self, _):
         """Test retry on request timeout"""
 
@@ -164,7 +167,8 @@ class RESTClientTest(unittest.TestCase):
         self.assertEqual(len(err.attempts), 5)
 
     @mock.patch('time.sleep', mock.Mock())
-    @mock.patch('requests.get', return_value=mock.MagicMock(requests.Response))
+    @mock.patch('requests.Session.get',
+                return_value=mock.MagicMock(requests.Response))
     def test_retry_on_503(self, resp_mock):
         """Test retry for status code that should be retried (e.g. 503)"""
         resp_mock.return_value.status_code = http_client.SERVICE_UNAVAILABLE
@@ -172,7 +176,8 @@ class RESTClientTest(unittest.TestCase):
         with self.assertRaises(restclient.MaxRequestRetriesError):
             restclient.get('http://foo.com', '/')
 
-    @mock.patch('requests.get', return_value=mock.MagicMock(requests.Response))
+    @mock.patch('requests.Session.get',
+                return_value=mock.MagicMock(requests.Response))
     def test_default_timeout_get(self, resp_mock):
         """Tests that default timeout for get request is set correctly."""
         resp_mock.return_value.status_code = http_client.OK
@@ -184,7 +189,7 @@ class RESTClientTest(unittest.TestCase):
             allow_redirects=True,
         )
 
-    @mock.patch('requests.delete',
+    @mock.patch('requests.Session.delete',
                 return_value=mock.MagicMock(requests.Response))
     def test_default_timeout_delete(self, resp_mock):
         """Tests that default timeout for delete request is set correctly."""
@@ -197,7 +202,7 @@ class RESTClientTest(unittest.TestCase):
             allow_redirects=True
         )
 
-    @mock.patch('requests.post',
+    @mock.patch('requests.Session.post',
                 return_value=mock.MagicMock(requests.Response))
     def test_default_timeout_post(self, resp_mock):
         """Tests that default timeout for post request is set correctly."""
@@ -210,7 +215,8 @@ class RESTClientTest(unittest.TestCase):
             allow_redirects=True
         )
 
-    @mock.patch('requests.put', return_value=mock.MagicMock(requests.Response))
+    @mock.patch('requests.Session.put',
+                return_value=mock.MagicMock(requests.Response))
     def test_default_timeout_put(self, resp_mock):
         """Tests that default timeout for put request is set correctly."""
         resp_mock.return_value.status_code = http_client.OK
@@ -222,7 +228,8 @@ class RESTClientTest(unittest.TestCase):
             allow_redirects=True
         )
 
-    @mock.patch('requests.get', return_value=mock.MagicMock(requests.Response))
+    @mock.patch('requests.Session.get',
+                return_value=mock.MagicMock(requests.Response))
     def test_verify_get(self, resp_mock):
         """Tests that 'verify' for get request is set correctly."""
         resp_mock.return_value.status_code = http_client.OK
@@ -234,7 +241,7 @@ class RESTClientTest(unittest.TestCase):
             verify='/path/to/ca/certs', allow_redirects=True
         )
 
-    @mock.patch('requests.delete',
+    @mock.patch('requests.Session.delete',
                 return_value=mock.MagicMock(requests.Response))
     def test_verify_delete(self, resp_mock):
         """Tests that 'verify' for delete request is set correctly."""
@@ -247,7 +254,7 @@ class RESTClientTest(unittest.TestCase):
             verify='/path/to/ca/certs', allow_redirects=True
         )
 
-    @mock.patch('requests.post',
+    @mock.patch('requests.Session.post',
                 return_value=mock.MagicMock(requests.Response))
     def test_verify_post(self, resp_mock):
         """Tests that 'verify' for post request is set correctly."""
@@ -260,7 +267,8 @@ class RESTClientTest(unittest.TestCase):
             verify='/path/to/ca/certs', allow_redirects=True
         )
 
-    @mock.patch('requests.put', return_value=mock.MagicMock(requests.Response))
+    @mock.patch('requests.Session.put',
+                return_value=mock.MagicMock(requests.Response))
     def test_verify_put(self, resp_mock):
         """Tests that 'verify' for put request is set correctly."""
         resp_mock.return_value.status_code = http_client.OK
@@ -272,7 +280,7 @@ class RESTClientTest(unittest.TestCase):
             verify='/path/to/ca/certs', allow_redirects=True
         )
 
-    @mock.patch('requests.delete',
+    @mock.patch('requests.Session.delete',
                 return_value=mock.MagicMock(requests.Response))
     def test_raw_payload_delete(self, resp_mock):
         """Tests that delete can handle not json serializable payload."""
@@ -286,7 +294,7 @@ class RESTClientTest(unittest.TestCase):
             data='payload', verify=True, allow_redirects=True
         )
 
-    @mock.patch('requests.post',
+    @mock.patch('requests.Session.post',
                 return_value=mock.MagicMock(requests.Response))
     def test_raw_payload_post(self, resp_mock):
         """Tests that post can send payload not in json."""
@@ -300,7 +308,8 @@ class RESTClientTest(unittest.TestCase):
             data='payload', verify=True, allow_redirects=True
         )
 
-    @mock.patch('requests.put', return_value=mock.MagicMock(requests.Response))
+    @mock.patch('requests.Session.put',
+                return_value=mock.MagicMock(requests.Response))
     def test_raw_payload_put(self, resp_mock):
         """Tests that put can send payload not in json."""
         resp_mock.return_value.status_code = http_client.OK
@@ -313,6 +322,70 @@ class RESTClientTest(unittest.TestCase):
             data='payload', verify=True, allow_redirects=True
         )
 
+    @mock.patch('treadmill.restclient._SESSIONS',
+                collections.defaultdict(collections.deque))
+    @mock.patch('requests.Session.get',
+                return_value=mock.MagicMock(requests.Response))
+    def test_session_reuse(self, resp_mock):
+        """Tests sessions are kept per endpoint and reused."""
+        resp_mock.return_value.status_code = http_client.OK
+        restclient.get('http://foo.com', '/a')
+        restclient.get('http://foo.com', '/b')
+        restclient.get('http://bar.com', '/a')
+
+        # pylint: disable=protected-access
+        self.assertEqual(
+            sorted(restclient._SESSIONS),
+            ['http://bar.com', 'http://foo.com']
+        )
+        self.assertEqual(len(restclient._SESSIONS['http://foo.com']), 1)
+
+    def test_backoff(self):
+        """Tests the retry delays grow exponentially, with jitter."""
+        # pylint: disable=protected-access
+        for retry, (low, high) in enumerate([(0.25, 0.5), (0.5, 1), (1, 2),
+                                             (2, 4), (4, 8), (4, 8)]):
+            delay = restclient._backoff(retry)
+            self.assertTrue(low <= delay <= high, (retry, delay))
+
+    @mock.patch('treadmill.restclient._LATENCIES',
+                collections.defaultdict(list))
+    @mock.patch('treadmill.restclient._call')
+    def test_hedged_get(self, call_mock):
+        """Tests slow requests are hedged to the next endpoint."""
+        slow = threading.Event()
+        ok_response = mock.Mock(status_code=http_client.OK)
+
+        def _call(url, *_args, **_kwargs):
+            if url.startswith('http://slow'):
+                slow.wait(5)
+                return False, None, http_client.REQUEST_TIMEOUT
+            return True, ok_response, http_client.OK
+
+        call_mock.side_effect = _call
+        # pylint: disable=protected-access
+        restclient._LATENCIES['http://slow.com'].extend([0.01] * 10)
+
+        response = restclient.get(
+            ['http://slow.com', 'http://fast.com'], '/', hedge=True
+        )
+        slow.set()
+
+        self.assertIs(response, ok_response)
+        self.assertEqual(
+            [call[0][0] for call in call_mock.call_args_list],
+            ['http://slow.com/', 'http://fast.com/']
+        )
+
+        # Non idempotent requests are not hedged.
+        call_mock.reset_mock()
+        restclient.call(['http://slow.com', 'http://fast.com'], '/', 'post',
+                        hedge=True)
+        self.assertEqual(
+            [call[0][0] for call in call_mock.call_args_list],
+            ['http://slow.com/', 'http://fast.com/']
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -259,6 +259,37 @@ class RulefileTest(unittest.TestCase):
         self.assertIn(('SOME_CHAIN', self.udpsnatrule), rules)
         self.assertEqual(3, len(rules))
 
+    def test_sync_rules(self):
+        """Test syncing the rules of an owner in one batch.
+        """
+        self.rules.create_rules(
+            [('SOME_CHAIN', self.tcpdnatrule),
+             ('SOME_CHAIN', self.udpdnatrule),
+             ('OTHER_CHAIN', self.udpsnatrule)],
+            self.tcpdnatuid
+        )
+        self.rules.create_rule('SOME_CHAIN', self.passthroughrule,
+                               self.passthroughuid)
+
+        self.rules.sync_rules(
+            [('SOME_CHAIN', self.udpdnatrule),
+             ('SOME_CHAIN', self.udpsnatrule)],
+            self.tcpdnatuid,
+            chains=['SOME_CHAIN']
+        )
+
+        self.assertEqual(
+            self.rules.get_owner_rules(self.tcpdnatuid),
+            set([('SOME_CHAIN', self.udpdnatrule),
+                 ('SOME_CHAIN', self.udpsnatrule),
+                 ('OTHER_CHAIN', self.udpsnatrule)])
+        )
+        # Rules of other owners are untouched.
+        self.assertEqual(
+            self.rules.get_owner_rules(self.passthroughuid),
+            set([('SOME_CHAIN', self.passthroughrule)])
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
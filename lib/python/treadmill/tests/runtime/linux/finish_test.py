@@ -52,6 +52,9 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
             svc_network=mock.Mock(
                 spec_set=treadmill.services._base_service.ResourceService,
             ),
+            svc_port=mock.Mock(
+                spec_set=treadmill.services._base_service.ResourceService,
+            ),
             rules=mock.Mock(
                 spec_set=treadmill.rulefile.RuleMgr,
             )
@@ -72,7 +75,7 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
     @mock.patch('treadmill.iptables.rm_ip_set', mock.Mock())
     @mock.patch('treadmill.iptables.flush_cnt_conntrack_table', mock.Mock())
     @mock.patch('treadmill.rrdutils.flush_noexc', mock.Mock())
-    @mock.patch('treadmill.runtime.archive_logs', mock.Mock())
+    @mock.patch('treadmill.runtime.queue_archive', mock.Mock())
     @mock.patch('treadmill.subproc.check_call', mock.Mock())
     @mock.patch('treadmill.iptables.rm_ip_set', mock.Mock())
     @mock.patch('treadmill.zkutils.get',
@@ -284,7 +287,7 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
             os.path.join(data_dir, 'metrics.rrd')
         )
 
-        treadmill.runtime.archive_logs.assert_called()
+        treadmill.runtime.queue_archive.assert_called()
 
     @mock.patch('shutil.copy', mock.Mock())
     @mock.patch('treadmill.appevents.post', mock.Mock())
@@ -300,7 +303,7 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
     @mock.patch('treadmill.supervisor.control_service', mock.Mock())
     @mock.patch('treadmill.zkutils.get', mock.Mock(return_value=None))
     @mock.patch('treadmill.rrdutils.flush_noexc', mock.Mock())
-    @mock.patch('treadmill.runtime.archive_logs', mock.Mock())
+    @mock.patch('treadmill.runtime.queue_archive', mock.Mock())
     def test_finish_error(self):
         """Tests container finish procedure when app is improperly finished."""
         manifest = {
@@ -396,7 +399,7 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
             os.path.join(data_dir, 'metrics.rrd')
         )
 
-        treadmill.runtime.archive_logs.assert_called()
+        treadmill.runtime.queue_archive.assert_called()
 
     @mock.patch('shutil.copy', mock.Mock())
     @mock.patch('treadmill.appevents.post', mock.Mock())
@@ -405,7 +408,7 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
     @mock.patch('treadmill.sysinfo.hostname',
                 mock.Mock(return_value='hostname'))
     @mock.patch('treadmill.rulefile.RuleMgr.unlink_rule', mock.Mock())
-    @mock.patch('treadmill.runtime.archive_logs', mock.Mock())
+    @mock.patch('treadmill.runtime.queue_archive', mock.Mock())
     @mock.patch('treadmill.subproc.check_call', mock.Mock())
     @mock.patch('treadmill.iptables.rm_ip_set', mock.Mock())
     @mock.patch('treadmill.zkutils.get', mock.Mock(return_value=None))
@@ -515,7 +518,7 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
             )
         )
 
-        treadmill.runtime.archive_logs.assert_called()
+        treadmill.runtime.queue_archive.assert_called()
 
     @mock.patch('treadmill.subproc.check_call', mock.Mock(return_value=0))
     def test_finish_no_manifest(self):
@@ -533,7 +536,7 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
                 mock.Mock(return_value='xxx.ms.com'))
     @mock.patch('treadmill.iptables.rm_ip_set', mock.Mock())
     @mock.patch('treadmill.rrdutils.flush_noexc', mock.Mock())
-    @mock.patch('treadmill.runtime.archive_logs', mock.Mock())
+    @mock.patch('treadmill.runtime.queue_archive', mock.Mock())
     @mock.patch('treadmill.subproc.check_call', mock.Mock())
     @mock.patch('treadmill.iptables.rm_ip_set', mock.Mock())
     @mock.patch('treadmill.zkutils.get',
@@ -654,10 +657,12 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
             os.path.join(data_dir, 'metrics.rrd')
         )
 
-        treadmill.runtime.archive_logs.assert_called()
+        treadmill.runtime.queue_archive.assert_called()
 
     @mock.patch('treadmill.runtime.load_app', mock.Mock())
     @mock.patch('treadmill.runtime.linux._finish._cleanup', mock.Mock())
+    @mock.patch('treadmill.runtime.linux._finish._cleanup_deferred',
+                mock.Mock())
     @mock.patch('treadmill.apphook.cleanup', mock.Mock())
     @mock.patch('treadmill.appevents.post', mock.Mock())
     def test_finish_exitinfo_event(self):
@@ -678,6 +683,8 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
 
     @mock.patch('treadmill.runtime.load_app', mock.Mock())
     @mock.patch('treadmill.runtime.linux._finish._cleanup', mock.Mock())
+    @mock.patch('treadmill.runtime.linux._finish._cleanup_deferred',
+                mock.Mock())
     @mock.patch('treadmill.apphook.cleanup', mock.Mock())
     @mock.patch('treadmill.appevents.post', mock.Mock())
     def test_finish_aborted_event(self):
@@ -698,6 +705,8 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
 
     @mock.patch('treadmill.runtime.load_app', mock.Mock())
     @mock.patch('treadmill.runtime.linux._finish._cleanup', mock.Mock())
+    @mock.patch('treadmill.runtime.linux._finish._cleanup_deferred',
+                mock.Mock())
     @mock.patch('treadmill.apphook.cleanup', mock.Mock())
     @mock.patch('treadmill.appevents.post', mock.Mock())
     def test_finish_oom_event(self):
@@ -717,6 +726,8 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
 
     @mock.patch('treadmill.runtime.load_app', mock.Mock())
     @mock.patch('treadmill.runtime.linux._finish._cleanup', mock.Mock())
+    @mock.patch('treadmill.runtime.linux._finish._cleanup_deferred',
+                mock.Mock())
     @mock.patch('treadmill.apphook.cleanup', mock.Mock())
     @mock.patch('treadmill.appevents.post', mock.Mock())
     def test_terminated_no_event(self):
@@ -735,6 +746,34 @@ class LinuxRuntimeFinishTest(unittest.TestCase):
 
         treadmill.appevents.post.assert_not_called()
 
+    @mock.patch('treadmill.runtime.load_app', mock.Mock())
+    @mock.patch('treadmill.runtime.linux._finish._cleanup', mock.Mock())
+    @mock.patch('treadmill.runtime.linux._finish._cleanup_deferred',
+                mock.Mock())
+    @mock.patch('treadmill.apphook.cleanup', mock.Mock())
+    @mock.patch('treadmill.appevents.post', mock.Mock())
+    def test_finish_deferred_cleanup(self):
+        """Test the logs are queued after the finished event is posted.
+        """
+        calls = mock.Mock()
+        calls.attach_mock(app_finish._cleanup, 'cleanup')
+        calls.attach_mock(treadmill.appevents.post, 'post')
+        calls.attach_mock(app_finish._cleanup_deferred, 'cleanup_deferred')
+
+        app_unique_name = 'proid.myapp-001-0000000ID1234'
+        app_dir = os.path.join(self.tm_env.apps_dir, app_unique_name)
+        data_dir = os.path.join(app_dir, 'data')
+        fs.mkdir_safe(data_dir)
+        with io.open(os.path.join(data_dir, 'exitinfo'), 'w') as f:
+            f.write('{"service": "web_server", "return_code": 0, "signal": 0}')
+
+        app_finish.finish(self.tm_env, app_dir)
+
+        self.assertEqual(
+            [name for name, _args, _kwargs in calls.mock_calls],
+            ['cleanup', 'post', 'cleanup_deferred']
+        )
+
     def test__copy_metrics(self):
         """Test that metrics are copied safely.
         """
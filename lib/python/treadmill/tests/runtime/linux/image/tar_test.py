@@ -19,6 +19,7 @@ import pkg_resources
 import treadmill.tests.treadmill_test_skip_windows   # pylint: disable=W0611
 
 import treadmill
+import treadmill.fs.linux
 import treadmill.services
 import treadmill.subproc
 import treadmill.rulefile
@@ -34,6 +35,11 @@ def _test_data(name):
         return f.read()
 
 
+_SLEEP_SHA256 = (
+    '5a0f99c73b03f7f17a9e03b20816c2931784d5e1fc574eb2d0dece57f509e520'
+)
+
+
 class TarImageTest(unittest.TestCase):
     """Tests for treadmill.runtime.linux.image.tar."""
 
@@ -95,6 +101,7 @@ class TarImageTest(unittest.TestCase):
         if self.tmp_dir and os.path.isdir(self.tmp_dir):
             shutil.rmtree(self.tmp_dir)
 
+    @mock.patch('treadmill.fs.linux.mount_filesystem', mock.Mock())
     @mock.patch('treadmill.runtime.linux.image.native.NativeImage',
                 mock.Mock())
     def test_get_tar_sha256_unpack(self):
@@ -106,14 +113,85 @@ class TarImageTest(unittest.TestCase):
         img = repo.get(
             'file://{0}/sleep.tar?sha256={1}'.format(
                 self.tmp_dir,
-                '5a0f99c73b03f7f17a9e03b20816c2931784d5e1fc574eb2d0dece57'
-                'f509e520'
+                _SLEEP_SHA256
             )
         )
 
         self.assertIsNotNone(img)
+        self.assertEqual(
+            img.layer_dir,
+            os.path.join(self.images_dir, 'tar', 'layers', _SLEEP_SHA256)
+        )
+        self.assertTrue(os.listdir(img.layer_dir))
+
         img.unpack(self.container_dir, self.root, self.app)
 
+        treadmill.fs.linux.mount_filesystem.assert_called_with(
+            'overlay', self.root, 'overlay',
+            lowerdir=img.layer_dir,
+            upperdir=os.path.join(self.root, '.image', 'upper'),
+            workdir=os.path.join(self.root, '.image', 'work'),
+        )
+        self.assertEqual(
+            os.readlink(
+                os.path.join(self.images_dir, 'tar', 'refs', _SLEEP_SHA256,
+                             os.path.basename(self.container_dir))
+            ),
+            self.container_dir
+        )
+
+    @mock.patch('treadmill.runtime.linux.image.tar._copy',
+                mock.Mock(side_effect=tar._copy))
+    def test_get_tar_cached(self):
+        """Validates images are fetched once."""
+        with io.open(os.path.join(self.tmp_dir, 'sleep.tar'), 'wb') as f:
+            f.write(_test_data('sleep.tar'))
+
+        repo = tar.TarImageRepository(self.tm_env)
+        url = 'file://{0}/sleep.tar?sha256={1}'.format(
+            self.tmp_dir, _SLEEP_SHA256
+        )
+        img1 = repo.get(url)
+        img2 = repo.get(url)
+
+        self.assertEqual(img1.layer_dir, img2.layer_dir)
+        self.assertEqual(tar._copy.call_count, 1)
+
+        # Same content from another url is stored once.
+        shutil.copy(os.path.join(self.tmp_dir, 'sleep.tar'),
+                    os.path.join(self.tmp_dir, 'other.tar'))
+        img3 = repo.get('file://{0}/other.tar'.format(self.tmp_dir))
+        self.assertEqual(img1.layer_dir, img3.layer_dir)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.images_dir, 'tar', 'layers'))),
+            [_SLEEP_SHA256, _SLEEP_SHA256 + '.size'],
+        )
+
+    def test_evict(self):
+        """Validates least recently used images eviction."""
+        # Access protected _evict
+        # pylint: disable=W0212
+        images_dir = os.path.join(self.images_dir, 'tar')
+        layers_dir = os.path.join(images_dir, 'layers')
+        for name, last_used in (('a', 100), ('b', 200), ('c', 300)):
+            os.makedirs(os.path.join(layers_dir, name))
+            with io.open(os.path.join(layers_dir, name + '.size'), 'w') as f:
+                f.write('10')
+            os.utime(os.path.join(layers_dir, name), (last_used, last_used))
+        os.makedirs(os.path.join(images_dir, 'locks'))
+        # 'a' is in use by a container
+        os.makedirs(os.path.join(images_dir, 'refs', 'a'))
+        os.symlink(self.container_dir,
+                   os.path.join(images_dir, 'refs', 'a', 'app'))
+
+        repo = tar.TarImageRepository(self.tm_env, cache_size=15)
+        repo._evict(images_dir, keep=os.path.join(layers_dir, 'c'))
+
+        self.assertEqual(
+            sorted(os.listdir(layers_dir)),
+            ['a', 'a.size', 'c', 'c.size']
+        )
+
     def test_get_tar__invalid_sha256(self):
         """Validates getting a test tar file with an invalid sha256 hash_code.
         """
@@ -36,6 +36,11 @@ from treadmill.runtime.linux import _run as app_run
 _PATH_EXISTS = os.path.exists
 
 
+def _WAIT_ALL(requests):  # pylint: disable=C0103
+    """Wait on each of the (mock) clients in turn."""
+    return [client.wait(rsrc_id) for client, rsrc_id in requests]
+
+
 class LinuxRuntimeRunTest(unittest.TestCase):
     """Tests for treadmill.runtime.linux._run."""
 
@@ -57,6 +62,9 @@ class LinuxRuntimeRunTest(unittest.TestCase):
             svc_network=mock.Mock(
                 spec_set=treadmill.services._base_service.ResourceService,
             ),
+            svc_port=mock.Mock(
+                spec_set=treadmill.services._base_service.ResourceService,
+            ),
             rules=mock.Mock(
                 spec_set=treadmill.rulefile.RuleMgr,
             ),
@@ -383,7 +391,7 @@ class LinuxRuntimeRunTest(unittest.TestCase):
 
     @mock.patch('shutil.copy', mock.Mock())
     @mock.patch('shutil.copytree', mock.Mock())
-    @mock.patch('treadmill.runtime.allocate_network_ports', mock.Mock())
+    @mock.patch('treadmill.runtime.bind_network_ports', mock.Mock())
     @mock.patch('treadmill.runtime.linux._run._create_root_dir',
                 mock.Mock(return_value='/foo'))
     @mock.patch('treadmill.runtime.linux._run._unshare_network', mock.Mock())
@@ -392,6 +400,8 @@ class LinuxRuntimeRunTest(unittest.TestCase):
     @mock.patch('treadmill.fs.linux.cleanup_mounts', mock.Mock(set_spec=True))
     @mock.patch('treadmill.fs.linux.mount_bind', mock.Mock())
     @mock.patch('treadmill.runtime.linux.image.get_image_repo', mock.Mock())
+    @mock.patch('treadmill.services.wait_all',
+                mock.Mock(side_effect=_WAIT_ALL))
     @mock.patch('treadmill.apphook.configure', mock.Mock())
     @mock.patch('treadmill.subproc.exec_pid1', mock.Mock())
     @mock.patch('treadmill.subproc.check_call', mock.Mock())
@@ -462,6 +472,7 @@ class LinuxRuntimeRunTest(unittest.TestCase):
         mock_cgroup_client = self.tm_env.svc_cgroup.make_client.return_value
         mock_ld_client = self.tm_env.svc_localdisk.make_client.return_value
         mock_nwrk_client = self.tm_env.svc_network.make_client.return_value
+        mock_port_client = self.tm_env.svc_port.make_client.return_value
         cgroups = {
             'cpu': '/some/path',
             'cpuacct': '/some/other/path',
@@ -477,13 +488,13 @@ class LinuxRuntimeRunTest(unittest.TestCase):
         }
         mock_nwrk_client.wait.return_value = network
 
-        def _fake_allocate_network_ports(_ip, manifest):
-            """Mimick inplace manifest modification in allocate_network_ports.
+        def _fake_bind_network_ports(_ip, manifest, *_args):
+            """Mimick inplace manifest modification in bind_network_ports.
             """
             manifest['ephemeral_ports'] = {'tcp': ['1', '2', '3']}
             return mock.DEFAULT
-        treadmill.runtime.allocate_network_ports.side_effect = \
-            _fake_allocate_network_ports
+        treadmill.runtime.bind_network_ports.side_effect = \
+            _fake_bind_network_ports
         mock_image = mock.Mock()
         treadmill.runtime.linux.image.get_image_repo.return_value = mock_image
         mock_runtime_config = mock.Mock()
@@ -510,6 +521,15 @@ class LinuxRuntimeRunTest(unittest.TestCase):
                 'environment': 'dev',
             }
         )
+        port_req = {
+            'environment': 'dev',
+            'tcp': 6,
+            'udp': 0,
+        }
+        mock_port_client.put.assert_called_with(
+            app_unique_name,
+            port_req
+        )
         mock_cgroup_client.wait.assert_called_with(
             app_unique_name
         )
@@ -522,9 +542,10 @@ class LinuxRuntimeRunTest(unittest.TestCase):
         # Check that port allocation is correctly called.
         manifest['network'] = network
         manifest['ephemeral_ports'] = {'tcp': ['1', '2', '3']}
-        treadmill.runtime.allocate_network_ports\
+        treadmill.runtime.bind_network_ports\
             .assert_called_with(
                 '172.31.81.67', manifest,
+                mock_port_client, app_unique_name, port_req
             )
         # Make sure, post modification, that the manifest is readable by other.
         st = os.stat(os.path.join(app_dir, 'state.json'))
@@ -544,17 +565,25 @@ class LinuxRuntimeRunTest(unittest.TestCase):
             app_dir,
             mock_ld_client.wait.return_value
         )
+        # The start phases are recorded in the container state.
+        state = treadmill.runtime.load_app(app_dir)
+        self.assertEqual(
+            set(state.start_timings._fields),
+            set(['cgroups', 'image', 'resources', 'network', 'root_dir',
+                 'unpack', 'presence', 'total'])
+        )
 
     @mock.patch('pwd.getpwnam', mock.Mock())
     @mock.patch('shutil.copy', mock.Mock())
-    @mock.patch('treadmill.runtime.allocate_network_ports',
-                mock.Mock())
+    @mock.patch('treadmill.runtime.bind_network_ports', mock.Mock())
     @mock.patch('treadmill.runtime.linux._run._create_root_dir',
                 mock.Mock(return_value='/foo'))
     @mock.patch('treadmill.runtime.linux._run._unshare_network', mock.Mock())
     @mock.patch('treadmill.runtime.linux._run._apply_cgroup_limits',
                 mock.Mock())
     @mock.patch('treadmill.runtime.linux.image.get_image_repo', mock.Mock())
+    @mock.patch('treadmill.services.wait_all',
+                mock.Mock(side_effect=_WAIT_ALL))
     @mock.patch('treadmill.fs.linux.cleanup_mounts', mock.Mock(set_spec=True))
     @mock.patch('treadmill.fs.linux.mount_bind', mock.Mock())
     @mock.patch('treadmill.apphook.configure', mock.Mock())
@@ -621,13 +650,13 @@ class LinuxRuntimeRunTest(unittest.TestCase):
         mock_nwrk_client.wait.return_value = network
         rootdir = os.path.join(app_dir, 'root')
 
-        def _fake_allocate_network_ports(_ip, manifest):
-            """Mimick inplace manifest modification in allocate_network_ports.
+        def _fake_bind_network_ports(_ip, manifest, *_args):
+            """Mimick inplace manifest modification in bind_network_ports.
             """
             manifest['ephemeral_ports'] = {'tcp': 0, 'udp': 0}
             return mock.DEFAULT
-        treadmill.runtime.allocate_network_ports.side_effect = \
-            _fake_allocate_network_ports
+        treadmill.runtime.bind_network_ports.side_effect = \
+            _fake_bind_network_ports
         mock_runtime_config = mock.Mock()
         mock_runtime_config.host_mount_whitelist = []
 
@@ -641,13 +670,15 @@ class LinuxRuntimeRunTest(unittest.TestCase):
 
     @mock.patch('pwd.getpwnam', mock.Mock())
     @mock.patch('shutil.copy', mock.Mock())
-    @mock.patch('treadmill.runtime.allocate_network_ports', mock.Mock())
+    @mock.patch('treadmill.runtime.bind_network_ports', mock.Mock())
     @mock.patch('treadmill.runtime.linux._run._create_root_dir',
                 mock.Mock(return_value='/foo'))
     @mock.patch('treadmill.runtime.linux._run._unshare_network', mock.Mock())
     @mock.patch('treadmill.runtime.linux._run._apply_cgroup_limits',
                 mock.Mock())
     @mock.patch('treadmill.runtime.linux.image.get_image_repo', mock.Mock())
+    @mock.patch('treadmill.services.wait_all',
+                mock.Mock(side_effect=_WAIT_ALL))
     @mock.patch('treadmill.fs.linux.cleanup_mounts', mock.Mock(set_spec=True))
     @mock.patch('treadmill.fs.linux.mount_bind', mock.Mock())
     @mock.patch('treadmill.apphook.configure', mock.Mock())
@@ -701,13 +732,13 @@ class LinuxRuntimeRunTest(unittest.TestCase):
         }
         mock_nwrk_client.wait.return_value = network
 
-        def _fake_allocate_network_ports(_ip, manifest):
-            """Mimick inplace manifest modification in allocate_network_ports.
+        def _fake_bind_network_ports(_ip, manifest, *_args):
+            """Mimick inplace manifest modification in bind_network_ports.
             """
             manifest['ephemeral_ports'] = {'tcp': 0, 'udp': 0}
             return mock.DEFAULT
-        treadmill.runtime.allocate_network_ports.side_effect = \
-            _fake_allocate_network_ports
+        treadmill.runtime.bind_network_ports.side_effect = \
+            _fake_bind_network_ports
         mock_runtime_config = mock.Mock()
         mock_runtime_config.host_mount_whitelist = []
         # Make sure that despite ticket absence there is no throw.
@@ -16,6 +16,8 @@ import tempfile
 import time
 import unittest
 
+from concurrent import futures
+
 import mock
 
 import treadmill
@@ -38,6 +40,7 @@ class RuntimeTest(unittest.TestCase):
             # nfs_dir=os.path.join(self.root, 'mnt', 'nfs'),
             apps_dir=os.path.join(self.root, 'apps'),
             archives_dir=os.path.join(self.root, 'archives'),
+            archiving_dir=os.path.join(self.root, 'archiving'),
             metrics_dir=os.path.join(self.root, 'metrics'),
             rules=mock.Mock(
                 spec_set=treadmill.rulefile.RuleMgr,
@@ -172,6 +175,55 @@ class RuntimeTest(unittest.TestCase):
             manifest['ephemeral_ports']['tcp']
         )
 
+    def test_bind_network_ports(self):
+        """Test binding the ports allocated by the port service.
+        """
+        busy = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        busy.bind(('127.0.0.1', 0))
+        busy.listen(0)
+        busy_port = busy.getsockname()[1]
+
+        def _free_port():
+            """Find a free port."""
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+            sock.close()
+            return port
+
+        port1, port2 = _free_port(), _free_port()
+        port_client = mock.Mock()
+        port_client.wait.side_effect = [
+            {'environment': 'dev', 'tcp': [port1, busy_port], 'udp': []},
+            {'environment': 'dev', 'tcp': [port1, port2], 'udp': []},
+        ]
+        manifest = {
+            'environment': 'dev',
+            'endpoints': [{'name': 'http', 'port': 0}],
+            'ephemeral_ports': {'tcp': 1, 'udp': 0},
+        }
+
+        sockets = treadmill.runtime.bind_network_ports(
+            '127.0.0.1', manifest, port_client, 'app'
+        )
+
+        # The port in use is excluded from the request.
+        port_client.put.assert_called_once_with(
+            'app',
+            {
+                'environment': 'dev',
+                'tcp': 2,
+                'udp': 0,
+                'exclude': {'tcp': [busy_port], 'udp': []},
+            }
+        )
+        self.assertEqual(manifest['endpoints'][0]['real_port'], port1)
+        self.assertEqual(manifest['endpoints'][0]['port'], port1)
+        self.assertEqual(manifest['ephemeral_ports']['tcp'], [port2])
+
+        for sock in sockets + [busy]:
+            sock.close()
+
     def test__archive_logs(self):
         """Tests archiving local logs."""
         # Access protected module _archive_logs
@@ -209,8 +261,9 @@ class RuntimeTest(unittest.TestCase):
         _touch_file('log/current')
         _touch_file('whatever')
 
-        treadmill.runtime.archive_logs(self.tm_env, 'xxx.yyy-1234-qwerty',
-                                       data_dir)
+        with futures.ThreadPoolExecutor(max_workers=2) as executor:
+            treadmill.runtime.archive_logs(self.tm_env, 'xxx.yyy-1234-qwerty',
+                                           data_dir, executor=executor)
 
         tar = tarfile.open(sys_archive)
         files = sorted([member.name for member in tar.getmembers()])
@@ -229,16 +282,48 @@ class RuntimeTest(unittest.TestCase):
         )
         tar.close()
 
+    def test_queue_archive(self):
+        """Tests archiving the logs queued in the background."""
+        data_dir = os.path.join(self.root, 'xxx.yyy-1234-qwerty', 'data')
+        for path in ('sys/foo/data/log/current', 'services/xxx/data/log/xxx',
+                     'a.json', 'whatever'):
+            fpath = os.path.join(data_dir, path)
+            fs.mkdir_safe(os.path.dirname(fpath))
+            io.open(fpath, 'w').close()
+        fs.mkdir_safe(self.tm_env.archives_dir)
+        fs.mkdir_safe(self.tm_env.archiving_dir)
+
+        treadmill.runtime.queue_archive(self.tm_env, 'xxx.yyy-1234-qwerty',
+                                        data_dir)
+        shutil.rmtree(data_dir)
+
+        queued_dir = os.path.join(self.tm_env.archiving_dir,
+                                  'xxx.yyy-1234-qwerty')
+        self.assertEqual(
+            sorted(os.listdir(queued_dir)), ['a.json', 'sys']
+        )
+
+        treadmill.runtime.archive_queued(self.tm_env, queued_dir)
+
+        self.assertFalse(os.path.exists(queued_dir))
+        sys_archive = os.path.join(self.tm_env.archives_dir,
+                                   'xxx.yyy-1234-qwerty.sys.tar.gz')
+        with tarfile.open(sys_archive) as tar:
+            self.assertEqual(
+                sorted(member.name for member in tar.getmembers()),
+                ['a.json', 'sys/foo/data/log/current']
+            )
+
+    @mock.patch('treadmill.runtime._ARCHIVE_LIMIT', 20)
     def test__archive_cleanup(self):
         """Tests cleanup of local logs."""
-        # Access protected module _ARCHIVE_LIMIT, _cleanup_archive_dir
+        # Access protected module _cleanup_archive_dir
         #
         # pylint: disable=W0212
         fs.mkdir_safe(self.tm_env.archives_dir)
 
         # Cleanup does not care about file extensions, it will cleanup
         # oldest file if threshold is exceeded.
-        treadmill.runtime._ARCHIVE_LIMIT = 20
         file1 = os.path.join(self.tm_env.archives_dir, '1')
         with io.open(file1, 'w') as f:
             f.write('x' * 10)
@@ -251,14 +336,57 @@ class RuntimeTest(unittest.TestCase):
         with io.open(file2, 'w') as f:
             f.write('x' * 10)
 
-        treadmill.runtime._cleanup_archive_dir(self.tm_env)
+        treadmill.runtime._cleanup_archive_dir(self.tm_env, [file2])
         self.assertTrue(os.path.exists(file1))
 
         with io.open(os.path.join(self.tm_env.archives_dir, '2'), 'w') as f:
             f.write('x' * 15)
+        treadmill.runtime._cleanup_archive_dir(self.tm_env, [file2])
+        self.assertFalse(os.path.exists(file1))
+        self.assertTrue(os.path.exists(file2))
+
+    @mock.patch('treadmill.runtime._ARCHIVE_LIMIT', 20)
+    def test__archive_cleanup_index(self):
+        """Tests the archives are accounted for incrementally."""
+        # Access protected module _cleanup_archive_dir
+        #
+        # pylint: disable=W0212
+        fs.mkdir_safe(self.tm_env.archives_dir)
+        index = os.path.join(self.tm_env.archives_dir, '.index')
+        file1 = os.path.join(self.tm_env.archives_dir, '1')
+        file2 = os.path.join(self.tm_env.archives_dir, '2')
+        with io.open(file1, 'w') as f:
+            f.write('x' * 10)
+
+        # The index is built from the directory.
+        treadmill.runtime._cleanup_archive_dir(self.tm_env)
+        with io.open(index) as f:
+            self.assertEqual(f.read(), '10 1\n')
+
+        # Only the new archives are accounted for.
+        with io.open(file1, 'w') as f:
+            f.write('x' * 30)
+        with io.open(file2, 'w') as f:
+            f.write('x' * 5)
+        treadmill.runtime._cleanup_archive_dir(self.tm_env, [file2])
+        self.assertTrue(os.path.exists(file1))
+        with io.open(index) as f:
+            self.assertEqual(f.read(), '10 1\n5 2\n')
+
+        # The index is rebuilt if missing.
+        os.utime(file1, (time.time() - 1, time.time() - 1))
+        os.unlink(index)
         treadmill.runtime._cleanup_archive_dir(self.tm_env)
         self.assertFalse(os.path.exists(file1))
         self.assertTrue(os.path.exists(file2))
+        with io.open(index) as f:
+            self.assertEqual(f.read(), '5 2\n')
+
+        # The index is rebuilt if archives are removed behind its back.
+        os.unlink(file2)
+        treadmill.runtime._cleanup_archive_dir(self.tm_env)
+        with io.open(index) as f:
+            self.assertEqual(f.read(), '')
 
     def test_load_app_safe(self):
         """Test loading corrupted or invalid app manifest."""
@@ -6,8 +6,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import io
 import os
+import shutil
 import tempfile
+import time
 import unittest
 import select
 import socket
@@ -122,6 +125,9 @@ class BaseServiceTest(unittest.TestCase):
     @mock.patch('treadmill.services._linux_base_service.LinuxResourceService'
                 '._create_status_socket',
                 mock.Mock(return_value='status_socket'))
+    @mock.patch('treadmill.services._linux_base_service.LinuxResourceService'
+                '._create_fast_socket',
+                mock.Mock(return_value='fast_socket'))
     @mock.patch('treadmill.services._linux_base_service.LinuxResourceService'
                 '._check_requests',
                 mock.Mock(return_value=['foo-1', 'foo-2']))
@@ -214,6 +220,7 @@ class BaseServiceTest(unittest.TestCase):
                 ('eventfd', mock.ANY, mock.ANY),
                 ('mock_inotiy', mock.ANY, mock.ANY),
                 ('status_socket', mock.ANY, mock.ANY),
+                ('fast_socket', mock.ANY, mock.ANY),
                 ('filenoA', mock.ANY, mock.ANY),
                 ('filenoB', mock.ANY, mock.ANY),
             ],
@@ -289,6 +296,161 @@ class BaseServiceTest(unittest.TestCase):
 
         self.assertTrue(res)
 
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+    def test_linux_fast_path(self):
+        """Test requests and replies over the service fast path.
+        """
+        # Access to a protected member of a client class
+        # pylint: disable=W0212
+        from treadmill.services import _linux_base_service
+
+        instance = services.ResourceService(
+            service_dir=os.path.join(self.root, 'svc'),
+            impl='a.sample.module',
+        )
+        impl = mock.create_autospec(MyTestService)
+        impl.PAYLOAD_SCHEMA = MyTestService.PAYLOAD_SCHEMA
+        srv_sock, clt_sock = socket.socketpair()
+        conn = _linux_base_service._Connection(srv_sock)
+        channel = _linux_base_service._FastChannel(clt_sock)
+        conn_fd = conn.fileno()
+        self.addCleanup(conn.close)
+        self.addCleanup(channel.close)
+
+        impl.on_create_request.side_effect = [None, {'foo': 'bar'}]
+        req_dir = os.path.join(instance._rsrc_dir, 'req-1')
+        os.makedirs(req_dir)
+        with io.open(os.path.join(req_dir, 'request.yml'), 'w') as f:
+            f.write('--- {}\n...\n')
+        instance._sessions[conn_fd] = (conn, None)
+
+        # Request not actioned yet, the client is registered for the reply.
+        channel.send({'op': 'create', 'id': 'req-1'})
+        self.assertFalse(instance._handle_session(impl, conn))
+        self.assertIsNone(channel.wait('req-1', 0))
+
+        # Retried request is processed and replied.
+        os.utime(os.path.join(req_dir, 'request.yml'), (0, 0))
+        self.assertTrue(instance._on_created(impl, req_dir))
+        self.assertEqual(channel.wait('req-1', 1), {'foo': 'bar'})
+        self.assertTrue(
+            os.path.exists(os.path.join(req_dir, 'reply.yml'))
+        )
+        # The journal event of a processed request is skipped.
+        self.assertFalse(instance._on_created(impl, req_dir))
+        self.assertEqual(impl.on_create_request.call_count, 2)
+        # The payload is read from the journal.
+        impl.on_create_request.assert_called_with('req-1', {})
+
+        # Deletion of a live request is left to the journal.
+        channel.send({'op': 'delete', 'id': 'req-1'})
+        instance._handle_session(impl, conn)
+        impl.on_delete_request.assert_not_called()
+
+        # Deletion is processed once.
+        shutil.rmtree(req_dir)
+        channel.send({'op': 'delete', 'id': 'req-1'})
+        instance._handle_session(impl, conn)
+        instance._on_deleted(impl, req_dir)
+        impl.on_delete_request.assert_called_once_with('req-1')
+
+        # Requests without journal fall back to the slow path.
+        channel.send({'op': 'create', 'id': 'req-2'})
+        instance._handle_session(impl, conn)
+        self.assertIsNone(channel.wait('req-2', 1))
+
+        # Request ids which are not plain names are ignored.
+        channel.send({'op': 'delete', 'id': '../svc/req-1'})
+        channel.send({'op': 'create', 'id': '..'})
+        self.assertFalse(instance._handle_session(impl, conn))
+        self.assertEqual(impl.on_create_request.call_count, 2)
+
+        # Idle sessions expire.
+        instance._expire_sessions()
+        self.assertIn(conn_fd, instance._sessions)
+        with mock.patch('time.time',
+                        mock.Mock(return_value=time.time() + 3600)):
+            instance._expire_sessions()
+        self.assertEqual(instance._sessions, {})
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+    def test_linux_fast_path_sessions(self):
+        """Test the fast path connection admission.
+        """
+        # Access to a protected member of a client class
+        # pylint: disable=W0212
+        from treadmill.services import _linux_base_service
+
+        instance = services.ResourceService(
+            service_dir=os.path.join(self.root, 'svc'),
+            impl='a.sample.module',
+        )
+        fast_socket = instance._create_fast_socket()
+        self.addCleanup(fast_socket.close)
+        self.assertEqual(os.stat(instance.fast_sock).st_mode & 0o777, 0o600)
+
+        channel = instance.clt_connect()
+        self.addCleanup(channel.close)
+        instance._accept_session(fast_socket)
+        self.assertEqual(len(instance._sessions), 1)
+
+        # Connections from other users are rejected.
+        other = instance.clt_connect()
+        self.addCleanup(other.close)
+        with mock.patch('os.geteuid', mock.Mock(return_value=12345)):
+            instance._accept_session(fast_socket)
+        self.assertEqual(len(instance._sessions), 1)
+
+        # Connections above the limit are rejected.
+        extra = instance.clt_connect()
+        self.addCleanup(extra.close)
+        with mock.patch.object(_linux_base_service, '_MAX_SESSIONS', 1):
+            instance._accept_session(fast_socket)
+        self.assertEqual(len(instance._sessions), 1)
+
+        # Client disconnection closes the session.
+        (conn, _callback), = instance._sessions.values()
+        channel.close()
+        self.assertFalse(instance._handle_session(mock.Mock(), conn))
+        self.assertEqual(instance._sessions, {})
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+    def test_wait_all(self):
+        """Test waiting on several requests with a single watcher.
+        """
+        # Access to a protected member _rep_filename of a client class
+        # pylint: disable=W0212
+
+        instance = services.ResourceService(
+            service_dir=os.path.join(self.root, 'svc'),
+            impl='a.sample.module',
+        )
+        clients = [
+            instance.make_client(os.path.join(self.root, name))
+            for name in ('foo', 'bar')
+        ]
+        for idx, client in enumerate(clients):
+            rep_file = client._rep_filename('app-0-%d' % idx)
+            os.makedirs(os.path.dirname(rep_file))
+            with io.open(rep_file, 'w') as f:
+                f.write('--- {\'idx\': %d}\n...\n' % idx)
+
+        replies = services.wait_all(
+            [(client, 'app-0-%d' % idx) for idx, client in enumerate(clients)]
+        )
+        self.assertEqual(replies, [{'idx': 0}, {'idx': 1}])
+
+        # Missing replies time out.
+        os.makedirs(
+            os.path.dirname(clients[1]._rep_filename('app-0-2'))
+        )
+        self.assertRaises(
+            services.ResourceServiceTimeoutError,
+            services.wait_all,
+            [(clients[0], 'app-0-0'), (clients[1], 'app-0-2')],
+            timeout=0.1
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
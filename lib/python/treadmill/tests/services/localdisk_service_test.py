@@ -95,6 +95,7 @@ class LocalDiskServiceTest(unittest.TestCase):
     @mock.patch('treadmill.lvm.lvdisplay', mock.Mock())
     @mock.patch('treadmill.localdiskutils.refresh_vg_status',
                 mock.Mock())
+    @mock.patch('os.stat', mock.Mock())
     def test_on_create_request(self):
         """Test processing of a localdisk create request.
         """
@@ -117,13 +118,7 @@ class LocalDiskServiceTest(unittest.TestCase):
             'size': '100M',
         }
         request_id = 'myproid.test-0-ID1234'
-        treadmill.lvm.lvdisplay.return_value = {
-            'block_dev': '/dev/test',
-            'dev_major': 42,
-            'dev_minor': 43,
-            'extent_size': 10,
-            'name': 'tm-ID1234',
-        }
+        os.stat.return_value.st_rdev = os.makedev(42, 43)
 
         localdisk = svc.on_create_request(request_id, request)
 
@@ -132,9 +127,13 @@ class LocalDiskServiceTest(unittest.TestCase):
             group='treadmill',
             size_in_bytes=100 * 1024**2,
         )
-        self.assertTrue(
+        os.stat.assert_called_with('/dev/treadmill/tm-ID1234')
+        # The volume is accounted for without querying LVM.
+        self.assertFalse(treadmill.lvm.lvdisplay.called)
+        self.assertFalse(
             treadmill.localdiskutils.refresh_vg_status.called
         )
+        self.assertEqual(svc._vg_status['extent_free'], 511)
         cgrp = os.path.join('treadmill/apps', request_id)
         treadmill.cgroups.create.assert_called_with(
             'blkio', cgrp
@@ -160,10 +159,10 @@ class LocalDiskServiceTest(unittest.TestCase):
         self.assertEqual(
             localdisk,
             {
-                'block_dev': '/dev/test',
+                'block_dev': '/dev/treadmill/tm-ID1234',
                 'dev_major': 42,
                 'dev_minor': 43,
-                'extent_size': 10,
+                'extent_size': 1,
                 'name': 'tm-ID1234',
             }
         )
@@ -175,6 +174,7 @@ class LocalDiskServiceTest(unittest.TestCase):
     @mock.patch('treadmill.lvm.lvdisplay', mock.Mock())
     @mock.patch('treadmill.localdiskutils.refresh_vg_status',
                 mock.Mock())
+    @mock.patch('os.stat', mock.Mock())
     def test_on_create_request_existing(self):
         """Test processing of a localdisk create request when volume already
         created.
@@ -194,13 +194,7 @@ class LocalDiskServiceTest(unittest.TestCase):
             'extent_size': 4 * 1024**3,
             'extent_free': 512,
         }
-        treadmill.lvm.lvdisplay.return_value = {
-            'block_dev': '/dev/test',
-            'dev_major': 42,
-            'dev_minor': 43,
-            'extent_size': 10,
-            'name': 'tm-ID1234',
-        }
+        os.stat.return_value.st_rdev = os.makedev(42, 43)
         request = {
             'size': '100M',
         }
@@ -213,20 +207,18 @@ class LocalDiskServiceTest(unittest.TestCase):
         treadmill.lvm.lvcreate.reset_mock()
         treadmill.lvm.lvdisplay.reset_mock()
         treadmill.localdiskutils.refresh_vg_status.reset_mock()
-        treadmill.lvm.lvdisplay.return_value = {
-            'block_dev': '/dev/test',
-            'dev_major': 24,
-            'dev_minor': 34,
-            'extent_size': 10,
-            'name': 'tm-ID1234',
-        }
+        os.stat.reset_mock()
         # Issue a second request
         localdisk = svc.on_create_request(request_id, request)
 
+        # The recorded volume is reused, LVM is not queried again.
         self.assertFalse(treadmill.lvm.lvcreate.called)
+        self.assertFalse(treadmill.lvm.lvdisplay.called)
+        self.assertFalse(os.stat.called)
         self.assertFalse(
             treadmill.localdiskutils.refresh_vg_status.called
         )
+        self.assertEqual(svc._vg_status['extent_free'], 511)
         cgrp = os.path.join('treadmill/apps', request_id)
         treadmill.cgroups.create.assert_called_with(
             'blkio', cgrp
@@ -235,30 +227,325 @@ class LocalDiskServiceTest(unittest.TestCase):
             [
                 mock.call('blkio', cgrp,
                           'blkio.throttle.read_bps_device',
-                          '24:34 20971520'),
+                          '42:43 20971520'),
                 mock.call('blkio', cgrp,
                           'blkio.throttle.read_iops_device',
-                          '24:34 100'),
+                          '42:43 100'),
                 mock.call('blkio', cgrp,
                           'blkio.throttle.write_bps_device',
-                          '24:34 20971520'),
+                          '42:43 20971520'),
                 mock.call('blkio', cgrp,
                           'blkio.throttle.write_iops_device',
-                          '24:34 100'),
+                          '42:43 100'),
             ],
             any_order=True
         )
         self.assertEqual(
             localdisk,
             {
-                'block_dev': '/dev/test',
-                'dev_major': 24,
-                'dev_minor': 34,
-                'extent_size': 10,
+                'block_dev': '/dev/treadmill/tm-ID1234',
+                'dev_major': 42,
+                'dev_minor': 43,
+                'extent_size': 1,
+                'name': 'tm-ID1234',
+            }
+        )
+
+    @mock.patch('treadmill.cgroups.create', mock.Mock())
+    @mock.patch('treadmill.cgroups.set_value', mock.Mock())
+    @mock.patch('treadmill.lvm.lvcreate', mock.Mock())
+    @mock.patch('treadmill.services.localdisk_service.'
+                'LocalDiskResourceService.retry_request', mock.Mock())
+    @mock.patch('os.stat', mock.Mock())
+    def test_on_create_request_pending(self):
+        """Test delayed requests are admitted as they fit.
+        """
+        # Access to a protected member
+        # pylint: disable=W0212
+
+        svc = localdisk_service.LocalDiskResourceService(
+            block_dev='/dev/block',
+            vg_name='treadmill',
+            read_bps='100M',
+            write_bps='100M',
+            read_iops=1000,
+            write_iops=1000
+        )
+        svc._vg_status = {
+            'extent_size': 4 * 1024**2,
+            'extent_free': 0,
+        }
+        os.stat.return_value.st_rdev = os.makedev(42, 43)
+
+        self.assertIsNone(
+            svc.on_create_request('proid.a-0-A', {'size': '100M'})
+        )
+        self.assertIsNone(
+            svc.on_create_request('proid.b-0-B', {'size': '20M'})
+        )
+        self.assertIsNone(
+            svc.on_create_request('proid.c-0-C', {'size': '20M'})
+        )
+        self.assertEqual(
+            list(svc._pending.items()),
+            [('proid.a-0-A', 25), ('proid.b-0-B', 5), ('proid.c-0-C', 5)]
+        )
+
+        # 12 free extents, room for the two small requests only.
+        svc._vg_status['extent_free'] = 12
+        svc._admit_pending()
+
+        svc.retry_request.assert_has_calls(
+            [mock.call('proid.b-0-B'), mock.call('proid.c-0-C')]
+        )
+        self.assertEqual(list(svc._pending), ['proid.a-0-A'])
+        self.assertEqual(svc._free_extents(), 2)
+
+        # Admitted requests get the extents held for them.
+        self.assertIsNotNone(
+            svc.on_create_request('proid.b-0-B', {'size': '20M'})
+        )
+        self.assertEqual(svc._vg_status['extent_free'], 7)
+        self.assertEqual(svc._free_extents(), 2)
+
+    @mock.patch('treadmill.localdiskutils.refresh_vg_status', mock.Mock(
+        return_value={'extent_size': 4 * 1024**2, 'extent_free': 20,
+                      'extent_nb': 200}
+    ))
+    @mock.patch('treadmill.lvm.lvsdisplay', mock.Mock(
+        return_value=[{'name': 'tm-ID1234'}]
+    ))
+    @mock.patch('treadmill.services.localdisk_service.'
+                'LocalDiskResourceService.retry_request', mock.Mock())
+    @mock.patch('treadmill.syscall.timerfd.timerfd_read', mock.Mock())
+    def test__reconcile(self):
+        """Test reconciliation of the accounting with LVM.
+        """
+        # Access to a protected member
+        # pylint: disable=W0212
+
+        svc = localdisk_service.LocalDiskResourceService(
+            block_dev='/dev/block',
+            vg_name='treadmill',
+            read_bps='100M',
+            write_bps='100M',
+            read_iops=1000,
+            write_iops=1000
+        )
+        svc._vg_status = {
+            'extent_size': 4 * 1024**2,
+            'extent_free': 0,
+            'extent_nb': 200,
+        }
+        svc._volumes = {
+            'tm-ID1234': {'name': 'tm-ID1234', 'extent_size': 5},
+            'tm-ID5678': {'name': 'tm-ID5678', 'extent_size': 5},
+        }
+        svc._pending['proid.a-0-A'] = 15
+
+        self.assertTrue(svc._reconcile())
+
+        self.assertEqual(svc._vg_status['extent_free'], 20)
+        self.assertEqual(list(svc._volumes), ['tm-ID1234'])
+        svc.retry_request.assert_called_with('proid.a-0-A')
+        self.assertEqual(svc._free_extents(), 5)
+
+    @mock.patch('treadmill.cgroups.create', mock.Mock())
+    @mock.patch('treadmill.cgroups.set_value', mock.Mock())
+    @mock.patch('treadmill.lvm.lvcreate', mock.Mock())
+    @mock.patch('treadmill.lvm.lvdisplay', mock.Mock())
+    @mock.patch('treadmill.lvm.lvrename', mock.Mock())
+    @mock.patch('treadmill.localdiskutils.refresh_vg_status',
+                mock.Mock())
+    def test_on_create_request_pool(self):
+        """Test processing of a localdisk create request served from the
+        warm pool.
+        """
+        # Access to a protected member
+        # pylint: disable=W0212
+
+        svc = localdisk_service.LocalDiskResourceService(
+            block_dev='/dev/block',
+            vg_name='treadmill',
+            read_bps='100M',
+            write_bps='100M',
+            read_iops=1000,
+            write_iops=1000,
+            pool_sizes=['100M'],
+            pool_depth=1,
+        )
+        svc._vg_status = {
+            'extent_size': 4 * 1024**2,
+            'extent_free': 512,
+        }
+        svc._pool = {
+            25: [
+                {
+                    'block_dev': '/dev/treadmill/tm-pool-1234',
+                    'dev_major': 42,
+                    'dev_minor': 43,
+                    'extent_size': 25,
+                    'name': 'tm-pool-1234',
+                },
+            ],
+        }
+
+        localdisk = svc.on_create_request(
+            'myproid.test-0-ID1234', {'size': '100M'}
+        )
+
+        treadmill.lvm.lvrename.assert_called_with(
+            'tm-pool-1234', 'tm-ID1234', group='treadmill'
+        )
+        self.assertFalse(treadmill.lvm.lvcreate.called)
+        self.assertFalse(treadmill.lvm.lvdisplay.called)
+        self.assertFalse(treadmill.localdiskutils.refresh_vg_status.called)
+        self.assertEqual(svc._pool, {25: []})
+        self.assertEqual(
+            localdisk,
+            {
+                'block_dev': '/dev/treadmill/tm-ID1234',
+                'dev_major': 42,
+                'dev_minor': 43,
+                'extent_size': 25,
+                'formatted': True,
                 'name': 'tm-ID1234',
             }
         )
 
+    @mock.patch('treadmill.fs.linux.blk_fs_create', mock.Mock())
+    @mock.patch('treadmill.lvm.lvcreate', mock.Mock())
+    @mock.patch('treadmill.lvm.lvrename', mock.Mock())
+    @mock.patch('uuid.uuid4', mock.Mock())
+    @mock.patch('os.stat', mock.Mock())
+    def test__fill_volume(self):
+        """Test creation of a pre-formatted pool volume.
+        """
+        # Access to a protected member
+        # pylint: disable=W0212
+
+        os.stat.return_value.st_rdev = os.makedev(42, 43)
+        localdisk_service.uuid.uuid4.return_value.hex = '1234'
+
+        lv_info = localdisk_service._fill_volume(
+            'treadmill', 25, 100 * 1024**2
+        )
+
+        treadmill.lvm.lvcreate.assert_called_with(
+            volume='tm-fill-1234',
+            group='treadmill',
+            size_in_bytes=100 * 1024**2,
+        )
+        treadmill.fs.linux.blk_fs_create.assert_called_with(
+            '/dev/treadmill/tm-fill-1234'
+        )
+        treadmill.lvm.lvrename.assert_called_with(
+            'tm-fill-1234', 'tm-pool-1234', group='treadmill'
+        )
+        self.assertEqual(
+            lv_info,
+            {
+                'block_dev': '/dev/treadmill/tm-pool-1234',
+                'dev_major': 42,
+                'dev_minor': 43,
+                'extent_size': 25,
+                'name': 'tm-pool-1234',
+            }
+        )
+
+    @mock.patch('treadmill.fs.linux.blk_fs_create', mock.Mock())
+    @mock.patch('treadmill.lvm.lvcreate', mock.Mock())
+    @mock.patch('treadmill.lvm.lvremove', mock.Mock())
+    @mock.patch('treadmill.lvm.lvrename', mock.Mock())
+    @mock.patch('uuid.uuid4', mock.Mock())
+    @mock.patch('os.stat', mock.Mock())
+    def test__fill_volume_failure(self):
+        """Test a partially created pool volume is removed.
+        """
+        # Access to a protected member
+        # pylint: disable=W0212
+
+        localdisk_service.uuid.uuid4.return_value.hex = '1234'
+        treadmill.fs.linux.blk_fs_create.side_effect = (
+            subproc.CalledProcessError(1, 'mke2fs')
+        )
+
+        with self.assertRaises(subproc.CalledProcessError):
+            localdisk_service._fill_volume('treadmill', 25, 100 * 1024**2)
+
+        treadmill.lvm.lvremove.assert_called_with(
+            'tm-fill-1234', group='treadmill'
+        )
+        treadmill.lvm.lvrename.assert_not_called()
+
+        treadmill.lvm.lvremove.reset_mock()
+        treadmill.fs.linux.blk_fs_create.side_effect = None
+        os.stat.side_effect = OSError(2, 'No such file or directory')
+
+        with self.assertRaises(OSError):
+            localdisk_service._fill_volume('treadmill', 25, 100 * 1024**2)
+
+        treadmill.lvm.lvremove.assert_called_with(
+            'tm-pool-1234', group='treadmill'
+        )
+
+    @mock.patch('treadmill.localdiskutils.setup_device_lvm', mock.Mock())
+    @mock.patch('treadmill.localdiskutils.refresh_vg_status', mock.Mock(
+        return_value={'extent_size': 4 * 1024**2, 'extent_free': 100,
+                      'extent_nb': 200}
+    ))
+    @mock.patch('treadmill.lvm.lvsdisplay', mock.Mock())
+    def test_initialize_pool(self):
+        """Test pool volumes are kept across restarts.
+        """
+        # Access to a protected member
+        # pylint: disable=W0212
+
+        def _lv(name, extent_size):
+            return {
+                'block_dev': '/dev/treadmill/' + name,
+                'dev_major': 42,
+                'dev_minor': 43,
+                'extent_size': extent_size,
+                'name': name,
+                'open_count': 0,
+            }
+
+        treadmill.lvm.lvsdisplay.return_value = [
+            _lv('tm-pool-1', 25),
+            _lv('tm-pool-2', 50),
+            _lv('tm-fill-3', 25),
+            _lv('tm-ID1234', 25),
+            _lv('other', 10),
+        ]
+        svc = localdisk_service.LocalDiskResourceService(
+            block_dev='/dev/block',
+            vg_name='treadmill',
+            read_bps='100M',
+            write_bps='100M',
+            read_iops=1000,
+            write_iops=1000,
+            pool_sizes=['100M'],
+            pool_depth=1,
+        )
+
+        svc.initialize(self.root)
+
+        self.assertEqual(
+            [lv['name'] for lv in svc._pool[25]],
+            ['tm-pool-1']
+        )
+        self.assertEqual(
+            {
+                name for name, lv in svc._volumes.items()
+                if lv['stale']
+            },
+            {'tm-pool-2', 'tm-fill-3', 'tm-ID1234'}
+        )
+        self.assertEqual(svc._extent_reserved, 10)
+        # Reconciliation timer and pool fills notifications.
+        self.assertEqual(len(svc.event_handlers()), 2)
+
     @mock.patch('treadmill.lvm.lvdisplay', mock.Mock())
     @mock.patch('treadmill.lvm.lvremove', mock.Mock())
     @mock.patch('treadmill.localdiskutils.refresh_vg_status',
@@ -277,7 +564,18 @@ class LocalDiskServiceTest(unittest.TestCase):
             read_iops=1000,
             write_iops=1000
         )
+        svc._vg_status = {
+            'extent_size': 4 * 1024**2,
+            'extent_free': 10,
+        }
         request_id = 'myproid.test-0-ID1234'
+        treadmill.lvm.lvdisplay.return_value = {
+            'block_dev': '/dev/treadmill/tm-ID1234',
+            'dev_major': 42,
+            'dev_minor': 43,
+            'extent_size': 25,
+            'name': 'tm-ID1234',
+        }
 
         svc.on_delete_request(request_id)
 
@@ -289,7 +587,20 @@ class LocalDiskServiceTest(unittest.TestCase):
             'tm-ID1234',
             group='treadmill'
         )
-        treadmill.localdiskutils.refresh_vg_status.assert_called()
+        treadmill.localdiskutils.refresh_vg_status.assert_not_called()
+        self.assertEqual(svc._vg_status['extent_free'], 35)
+
+        # Known volumes are removed without querying LVM.
+        treadmill.lvm.lvdisplay.reset_mock()
+        svc._volumes['tm-ID1234'] = {
+            'name': 'tm-ID1234',
+            'extent_size': 5,
+        }
+
+        svc.on_delete_request(request_id)
+
+        treadmill.lvm.lvdisplay.assert_not_called()
+        self.assertEqual(svc._vg_status['extent_free'], 40)
 
     @mock.patch('treadmill.lvm.lvdisplay', mock.Mock())
     @mock.patch('treadmill.lvm.lvremove', mock.Mock())
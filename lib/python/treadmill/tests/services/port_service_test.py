@@ -0,0 +1,171 @@
+"""Unit test for port_service - Treadmill port allocation service.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill import iptables
+from treadmill import services
+from treadmill import yamlwrapper as yaml
+from treadmill.services import port_service
+
+
+class PortServiceTest(unittest.TestCase):
+    """Unit tests for the port service implementation.
+    """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.rsrc_dir = os.path.join(self.root, 'resources')
+        os.mkdir(self.rsrc_dir)
+
+    def tearDown(self):
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    def _service(self):
+        """Create and initialize a port service."""
+        svc = port_service.PortResourceService()
+        svc.initialize(self.root)
+        return svc
+
+    def test_pool(self):
+        """Test the allocation index of a port range."""
+        # Access to a protected member _PortPool of a client class
+        # pylint: disable=W0212
+        pool = port_service._PortPool(10, 13, allocated=[11, 42])
+        self.assertEqual(pool.allocated, 1)
+
+        ports = {pool.alloc(), pool.alloc(), pool.alloc()}
+        self.assertEqual(ports, {10, 12, 13})
+        self.assertIn(12, pool)
+        self.assertRaises(port_service.PortsExhaustedError, pool.alloc)
+
+        pool.release(12)
+        pool.release(12)
+        self.assertNotIn(12, pool)
+        self.assertEqual(pool.allocated, 3)
+        self.assertEqual(pool.alloc(), 12)
+
+    def test_on_create_request(self):
+        """Test allocating the ports of a container."""
+        svc = self._service()
+
+        res = svc.on_create_request(
+            'app-0',
+            {'environment': 'prod', 'tcp': 3, 'udp': 1}
+        )
+
+        self.assertEqual(res['environment'], 'prod')
+        self.assertEqual(len(set(res['tcp'])), 3)
+        self.assertEqual(len(res['udp']), 1)
+        for port in res['tcp'] + res['udp']:
+            self.assertTrue(
+                iptables.PROD_PORT_LOW <= port <= iptables.PROD_PORT_HIGH
+            )
+
+        res = svc.on_create_request(
+            'app-1',
+            {'environment': 'dev', 'tcp': 1}
+        )
+        self.assertTrue(
+            iptables.NONPROD_PORT_LOW <= res['tcp'][0] <=
+            iptables.NONPROD_PORT_HIGH
+        )
+        self.assertEqual(res['udp'], [])
+
+        status = svc.report_status()
+        self.assertEqual(status['prod']['tcp']['allocated'], 3)
+        self.assertEqual(status['prod']['udp']['allocated'], 1)
+        self.assertEqual(status['nonprod']['tcp']['allocated'], 1)
+
+        svc.on_delete_request('app-0')
+        status = svc.report_status()
+        self.assertEqual(status['prod']['tcp']['allocated'], 0)
+        self.assertEqual(status['prod']['tcp']['utilization'], 0)
+
+    def test_on_create_request_exclude(self):
+        """Test replacing the ports that are in use."""
+        svc = self._service()
+        res = svc.on_create_request(
+            'app-0',
+            {'environment': 'prod', 'tcp': 2}
+        )
+        in_use, kept = res['tcp']
+
+        res = svc.on_create_request(
+            'app-0',
+            {'environment': 'prod', 'tcp': 2, 'exclude': {'tcp': [in_use]}}
+        )
+
+        self.assertEqual(res['tcp'][0], kept)
+        self.assertNotIn(in_use, res['tcp'])
+        self.assertEqual(svc.report_status()['prod']['tcp']['allocated'], 2)
+
+    @mock.patch('treadmill.services.port_service._RANGES',
+                {'prod': (10, 12), 'nonprod': (13, 15)})
+    def test_on_create_request_exhausted(self):
+        """Test the request fails when the range is exhausted."""
+        svc = self._service()
+        svc.on_create_request('app-0', {'environment': 'prod', 'tcp': 2})
+        svc.on_create_request('app-1', {'environment': 'prod', 'tcp': 1})
+
+        self.assertRaises(
+            port_service.PortsExhaustedError,
+            svc.on_create_request,
+            'app-1', {'environment': 'prod', 'tcp': 2}
+        )
+        # Nothing is held by the failed request.
+        self.assertEqual(svc.report_status()['prod']['tcp']['allocated'], 2)
+
+    def test_initialize(self):
+        """Test the allocations are reloaded from the replies."""
+        for rsrc_id, ports in (('app-0', [41000, 41001]),
+                               ('app-1', [41002])):
+            os.mkdir(os.path.join(self.rsrc_dir, rsrc_id))
+            with io.open(os.path.join(self.rsrc_dir, rsrc_id, 'reply.yml'),
+                         'w') as f:
+                yaml.dump(
+                    {'environment': 'dev', 'tcp': ports, 'udp': []},
+                    stream=f
+                )
+
+        svc = self._service()
+        self.assertEqual(svc.report_status()['nonprod']['tcp']['allocated'],
+                         3)
+
+        # Replayed requests keep their ports.
+        res = svc.on_create_request(
+            'app-0',
+            {'environment': 'dev', 'tcp': 2}
+        )
+        self.assertEqual(res['tcp'], [41000, 41001])
+
+        # Allocations without request are released.
+        svc.synchronize()
+        self.assertEqual(svc.report_status()['nonprod']['tcp']['allocated'],
+                         2)
+
+    def test_load(self):
+        """Test loading service using alias."""
+        # pylint: disable=W0212
+        self.assertEqual(
+            port_service.PortResourceService,
+            services.ResourceService(self.root, 'port')._load_impl()
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -279,6 +279,95 @@ class AppMonitorTest(unittest.TestCase):
             else:
                 restclient.post.assert_not_called()
 
+    @mock.patch('time.time', mock.Mock(return_value=101))
+    @mock.patch('treadmill.restclient.post', mock.Mock())
+    @mock.patch('treadmill.zkutils.update', mock.Mock())
+    def test_reevaluate_batched(self):
+        """Test the instances of all the monitors are reconciled together."""
+        zkclient = mock.Mock()
+        alerter = mock.Mock()
+
+        def _monitor(count):
+            """Monitor with all its tokens available."""
+            return {
+                'count': count,
+                'available': 2 * count,
+                'rate': 1.0,
+                'last_update': 100,
+            }
+
+        state = {
+            'scheduled': {
+                'foo.a': ['foo.a#1', 'foo.a#2'],
+                'foo.b': ['foo.b#3', 'foo.b#4'],
+                'bar.c': ['bar.c#5', 'bar.c#6'],
+            },
+            'monitors': {
+                'foo.a': _monitor(1),
+                'foo.b': _monitor(1),
+                'bar.c': _monitor(1),
+                'foo.d': _monitor(2),
+                'foo.e': _monitor(1),
+                'foo.f': _monitor(1),
+            },
+            'suspended': {},
+        }
+
+        def _post(_api, url, payload, headers):
+            """Mock create/delete requests."""
+            del payload, headers
+            if url.startswith('/instance/foo.e'):
+                raise restclient.NotFoundError('foo.e')
+            return mock.Mock()
+
+        restclient.post.side_effect = _post
+
+        appmonitor.reevaluate('/cellapi.sock', alerter, state, zkclient, {})
+
+        calls = {
+            (call[0][1], tuple(call[1]['payload'].get('instances', ())))
+            for call in restclient.post.call_args_list
+        }
+        self.assertEqual(
+            calls,
+            {
+                ('/instance/_bulk/delete', ('foo.a#1', 'foo.b#3')),
+                ('/instance/_bulk/delete', ('bar.c#5',)),
+                ('/instance/foo.d?count=2', ()),
+                ('/instance/foo.e?count=1', ()),
+                ('/instance/foo.f?count=1', ()),
+            }
+        )
+        self.assertEqual(state['monitors']['foo.d']['available'], 2)
+        self.assertEqual(state['monitors']['foo.e']['available'], 2)
+        self.assertEqual(state['suspended'], {'foo.e': 101 + 300})
+        alerter.assert_called_once_with(
+            'foo.e', 'Monitor suspended: App not configured'
+        )
+
+    def test_update_scheduled(self):
+        """Test updating the scheduled instances grouped by app."""
+        # pylint: disable=protected-access
+        scheduled = appmonitor._update_scheduled(
+            {}, ['foo.a#2', 'foo.b#3', 'foo.a#1']
+        )
+        self.assertEqual(
+            scheduled,
+            {'foo.a': ['foo.a#1', 'foo.a#2'], 'foo.b': ['foo.b#3']}
+        )
+
+        foo_a = scheduled['foo.a']
+        updated = appmonitor._update_scheduled(
+            scheduled, ['foo.a#2', 'foo.a#1', 'foo.c#5', 'foo.c#4']
+        )
+        self.assertEqual(
+            updated,
+            {'foo.a': ['foo.a#1', 'foo.a#2'], 'foo.c': ['foo.c#4', 'foo.c#5']}
+        )
+        # Unchanged groups are kept, the previous view is not modified.
+        self.assertIs(updated['foo.a'], foo_a)
+        self.assertIn('foo.b', scheduled)
+
 
 if __name__ == '__main__':
     unittest.main()
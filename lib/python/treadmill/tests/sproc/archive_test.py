@@ -0,0 +1,60 @@
+"""Unit test for treadmill.sproc.archive.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+import treadmill
+from treadmill.sproc import archive
+
+
+class ArchiveTest(unittest.TestCase):
+    """Test treadmill.sproc.archive"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    @mock.patch('treadmill.runtime.archive_queued', mock.Mock())
+    def test_archive(self):
+        """Test only the queued containers are archived.
+        """
+        # Disable W0212: Test access protected members of archive module.
+        # pylint: disable=W0212
+        tm_env = mock.Mock()
+        queued_dir = os.path.join(self.root, 'proid.app-001-00000ID')
+        os.mkdir(queued_dir)
+        os.mkdir(os.path.join(self.root, '.proid.app-002-00000ID'))
+
+        archive._archive(tm_env, 'executor', queued_dir)
+        archive._archive(tm_env, 'executor',
+                         os.path.join(self.root, '.proid.app-002-00000ID'))
+        archive._archive(tm_env, 'executor',
+                         os.path.join(self.root, 'proid.app-003-00000ID'))
+
+        treadmill.runtime.archive_queued.assert_called_once_with(
+            tm_env, queued_dir, executor='executor'
+        )
+
+        # Errors are logged, not raised.
+        treadmill.runtime.archive_queued.side_effect = OSError()
+        archive._archive(tm_env, 'executor', queued_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""Unit test for rtnetlink message builders.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import struct
+import unittest
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows   # pylint: disable=W0611
+
+from treadmill.syscall import netlink
+from treadmill.syscall import rtnetlink
+
+
+def _attrs(data):
+    """Parse route attributes into a type -> data dict."""
+    attrs = {}
+    offset = 0
+    while offset < len(data):
+        (length, attr_type) = struct.unpack_from('=HH', data, offset)
+        attrs[attr_type] = data[offset + 4:offset + length]
+        offset += netlink.align(length)
+    return attrs
+
+
+class RtnetlinkTest(unittest.TestCase):
+    """Tests rtnetlink message encoding."""
+
+    def test_link_add_veth(self):
+        """Test veth pair creation message."""
+        ((msg_type, flags, seq, payload),) = netlink.unpack_messages(
+            rtnetlink.link_add_veth(7, 'foo0', 'foo1')
+        )
+
+        self.assertEqual(msg_type, rtnetlink.RTM_NEWLINK)
+        self.assertTrue(flags & netlink.NLM_F_CREATE)
+        self.assertTrue(flags & netlink.NLM_F_ACK)
+        self.assertEqual(seq, 7)
+        attrs = _attrs(payload[16:])
+        self.assertEqual(attrs[rtnetlink.IFLA_IFNAME], b'foo0\0')
+        linkinfo = _attrs(attrs[rtnetlink.IFLA_LINKINFO])
+        self.assertEqual(linkinfo[rtnetlink.IFLA_INFO_KIND], b'veth\0')
+        peer = _attrs(linkinfo[rtnetlink.IFLA_INFO_DATA])
+        self.assertEqual(
+            _attrs(peer[rtnetlink.VETH_INFO_PEER][16:]),
+            {rtnetlink.IFLA_IFNAME: b'foo1\0'}
+        )
+
+    def test_link_set(self):
+        """Test link update message."""
+        ((_type, _flags, _seq, payload),) = netlink.unpack_messages(
+            rtnetlink.link_set(1, 'foo0', up=True, mtu=9000)
+        )
+
+        (index, ifi_flags, change) = struct.unpack_from('=iII', payload, 4)
+        self.assertEqual(
+            (index, ifi_flags, change),
+            (0, rtnetlink.IFF_UP, rtnetlink.IFF_UP)
+        )
+        self.assertEqual(
+            _attrs(payload[16:]),
+            {
+                rtnetlink.IFLA_IFNAME: b'foo0\0',
+                rtnetlink.IFLA_MTU: struct.pack('=I', 9000),
+            }
+        )
+
+    def test_route_add(self):
+        """Test route creation message."""
+        ((_type, _flags, _seq, payload),) = netlink.unpack_messages(
+            rtnetlink.route_add(1, 'default', via='192.168.0.1',
+                                src='10.0.0.1')
+        )
+
+        (dst_len, scope) = struct.unpack_from('=B4xB', payload, 1)
+        self.assertEqual((dst_len, scope), (0, rtnetlink.RT_SCOPE_UNIVERSE))
+        self.assertEqual(
+            _attrs(payload[12:]),
+            {
+                rtnetlink.RTA_GATEWAY: b'\xc0\xa8\x00\x01',
+                rtnetlink.RTA_PREFSRC: b'\x0a\x00\x00\x01',
+            }
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
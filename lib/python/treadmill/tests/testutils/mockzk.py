@@ -107,6 +107,25 @@ class MockZookeeperMetadata(namedtuple('MockZookeeperMetadata',
                    children_count=children_count)
 
 
+class MockAsyncResult:
+    """Mock of the result of an asynchronous Zookeeper call."""
+
+    def __init__(self, func, *args, **kwargs):
+        self._value = None
+        self._exception = None
+        try:
+            self._value = func(*args, **kwargs)
+        except Exception as err:  # pylint: disable=W0703
+            self._exception = err
+
+    def get(self, block=True, timeout=None):
+        """Return the result of the call or raise its exception."""
+        # pylint: disable=unused-argument
+        if self._exception is not None:
+            raise self._exception
+        return self._value
+
+
 class MockZookeeperTestCase(unittest.TestCase):
     """Helper class to mock Zk get[children] events."""
     # Disable too many branches warning.
@@ -241,9 +260,26 @@ class MockZookeeperTestCase(unittest.TestCase):
 
             threading.Thread(target=run_events).start()
 
+        def mock_get_async(zkpath, watch=None):
+            """Asynchronous mock_get."""
+            return MockAsyncResult(mock_get, zkpath, watch=watch)
+
+        def mock_exists_async(zkpath, watch=None):
+            """Asynchronous exists, the result is the node metadata."""
+            def _stat():
+                try:
+                    _data, metadata = mock_get(zkpath, watch=watch)
+                    return metadata
+                except kazoo.client.NoNodeError:
+                    return None
+
+            return MockAsyncResult(_stat)
+
         side_effects = [
             (kazoo.client.KazooClient.exists, mock_exists),
+            (kazoo.client.KazooClient.exists_async, mock_exists_async),
             (kazoo.client.KazooClient.get, mock_get),
+            (kazoo.client.KazooClient.get_async, mock_get_async),
             (kazoo.client.KazooClient.delete, mock_delete),
             (kazoo.client.KazooClient.get_children, mock_get_children)]
 
@@ -70,6 +70,49 @@ class VipFileTest(unittest.TestCase):
         self.vips.free(owner, ip0)
         self.assertFalse(os.path.exists(os.path.join(self.vips_dir, ip0)))
 
+    def test_alloc_sequence(self):
+        """Tests the order of allocations."""
+        self.assertEqual(self.vips.alloc('0'), '192.168.0.1')
+        # Picked IPs are skipped.
+        self.assertEqual(self.vips.alloc('1', '192.168.0.2'), '192.168.0.2')
+        # IPs allocated out of band are skipped.
+        os.symlink('../owners/2', os.path.join(self.vips_dir, '192.168.0.3'))
+        self.assertEqual(self.vips.alloc('3'), '192.168.0.4')
+        self.assertIn(('192.168.0.3', '2'), self.vips.list())
+        # Freed IPs are reused last.
+        self.vips.free('0', '192.168.0.1')
+        self.assertEqual(self.vips.alloc('0'), '192.168.0.5')
+
+    def test_reload(self):
+        """Tests the allocations are rebuilt from the directory."""
+        self.vips.alloc('0')
+        self.vips.alloc('1')
+        self.vips.alloc('2')
+        self.vips.free('1', '192.168.0.2')
+
+        vips = vipfile.VipMgr(self.vips_dir, os.path.join(self.root, 'owners'))
+        self.assertEqual(
+            vips.list(),
+            [('192.168.0.1', '0'), ('192.168.0.3', '2')]
+        )
+        self.assertEqual(vips.alloc('4'), '192.168.0.2')
+
+        vips.initialize()
+        self.assertEqual(vips.list(), [])
+        self.assertEqual(os.listdir(self.vips_dir), [])
+
+    def test_garbage_collect(self):
+        """Tests reclaiming the IPs without owner."""
+        ip0 = self.vips.alloc('0')
+        ip1 = self.vips.alloc('1')
+        os.unlink(os.path.join(self.root, 'owners', '1'))
+
+        self.vips.garbage_collect()
+
+        self.assertEqual(self.vips.list(), [(ip0, '0')])
+        self.assertEqual(os.listdir(self.vips_dir), [ip0])
+        self.assertNotEqual(self.vips.alloc('2'), ip1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -11,6 +11,9 @@ import unittest
 
 import mock
 
+# Disable W0212: Access to a protected member
+# pylint: disable=W0212
+
 # Disable W0611: Unused import
 import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
 
@@ -18,13 +21,40 @@ import treadmill
 from treadmill import vring
 
 
+def _batches(changes):
+    """Deliver each discovery change in its own batch.
+
+    The first change is the snapshot queued by the initial discovery sync.
+    """
+    batches = [[change] for change in changes]
+    return [batches[:1], batches[1:]]
+
+
+def _created(rulemgr):
+    """Return all (chain, rule) synced or created through the rule manager."""
+    rules = []
+    for call in rulemgr.sync_rules.call_args_list:
+        rules.extend(call[0][0])
+    for call in rulemgr.create_rules.call_args_list:
+        rules.extend(call[0][0])
+    return rules
+
+
+def _unlinked(rulemgr):
+    """Return all (chain, rule) unlinked through the rule manager."""
+    rules = []
+    for call in rulemgr.unlink_rules.call_args_list:
+        rules.extend(call[0][0])
+    return rules
+
+
 class VRingTest(unittest.TestCase):
     """Mock test for treadmill.vring."""
 
     @mock.patch('treadmill.sysinfo.hostname', mock.Mock())
     @mock.patch('treadmill.rulefile.RuleMgr', mock.Mock(set_spec=True))
     @mock.patch('socket.gethostbyname', mock.Mock())
-    @mock.patch('treadmill.discovery.Discovery.iteritems', mock.Mock())
+    @mock.patch('treadmill.discovery.Discovery.iterbatches', mock.Mock())
     def test_run(self):
         """Test vring."""
         dns = {
@@ -43,7 +73,7 @@ class VRingTest(unittest.TestCase):
         treadmill.sysinfo.hostname.return_value = 'zzz.xx.com'
         mock_discovery = treadmill.discovery.Discovery(None, 'a.a', None)
         mock_rulemgr = treadmill.rulefile.RuleMgr('/test', '/owners')
-        treadmill.discovery.Discovery.iteritems.return_value = [
+        treadmill.discovery.Discovery.iterbatches.side_effect = _batches([
             ('proid.foo#123:tcp:tcp_ep', 'xxx.xx.com:12345'),
             ('proid.foo#123:udp:udp_ep', 'xxx.xx.com:23456'),
             ('proid.foo#123:tcp:other_tcp_ep', 'xxx.xx.com:34567'),
@@ -56,7 +86,7 @@ class VRingTest(unittest.TestCase):
             ('proid.foo#125:tcp:tcp_ep', 'yyy.xx.com:45678'),
             ('proid.foo#125:udp:udp_ep', 'yyy.xx.com:56789'),
             ('proid.foo#125:tcp:other_tcp_ep', 'yyy.xx.com:34567'),
-        ]
+        ])
 
         vring.run(
             {
@@ -79,118 +109,115 @@ class VRingTest(unittest.TestCase):
         # Ignore all but tcp0 endpoints.
         #
         # Ignore tcp2 as it is not listed in the port map.
-        mock_rulemgr.create_rule.assert_has_calls(
-            [
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+        self.assertEqual(
+            set(_created(mock_rulemgr)),
+            set([
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='tcp',
                         src_ip='192.168.7.7',
                         dst_ip='3.3.3.3', dst_port=10000,
                         new_ip='192.168.7.7', new_port=10000
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='udp',
                         src_ip='192.168.7.7',
                         dst_ip='3.3.3.3', dst_port=11000,
                         new_ip='192.168.7.7', new_port=11000
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
 
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='tcp',
                         src_ip='192.168.7.7',
                         dst_ip='1.1.1.1', dst_port=10000,
                         new_ip='1.1.1.1', new_port=12345
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_SNAT,
-                    rule=treadmill.firewall.SNATRule(
+                (
+                    treadmill.iptables.VRING_SNAT,
+                    treadmill.firewall.SNATRule(
                         proto='tcp',
                         src_ip='1.1.1.1', src_port=12345,
                         dst_ip='192.168.7.7',
                         new_ip='1.1.1.1', new_port=10000
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='udp',
                         src_ip='192.168.7.7',
                         dst_ip='1.1.1.1', dst_port=11000,
                         new_ip='1.1.1.1', new_port=23456
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_SNAT,
-                    rule=treadmill.firewall.SNATRule(
+                (
+                    treadmill.iptables.VRING_SNAT,
+                    treadmill.firewall.SNATRule(
                         proto='udp',
                         src_ip='1.1.1.1', src_port=23456,
                         dst_ip='192.168.7.7',
                         new_ip='1.1.1.1', new_port=11000
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
 
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='tcp',
                         src_ip='192.168.7.7',
                         dst_ip='2.2.2.2', dst_port=10000,
                         new_ip='2.2.2.2', new_port=45678,
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_SNAT,
-                    rule=treadmill.firewall.SNATRule(
+                (
+                    treadmill.iptables.VRING_SNAT,
+                    treadmill.firewall.SNATRule(
                         proto='tcp',
                         src_ip='2.2.2.2', src_port=45678,
                         dst_ip='192.168.7.7',
                         new_ip='2.2.2.2', new_port=10000
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='udp',
                         src_ip='192.168.7.7',
                         dst_ip='2.2.2.2', dst_port=11000,
                         new_ip='2.2.2.2', new_port=56789,
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_SNAT,
-                    rule=treadmill.firewall.SNATRule(
+                (
+                    treadmill.iptables.VRING_SNAT,
+                    treadmill.firewall.SNATRule(
                         proto='udp',
                         src_ip='2.2.2.2', src_port=56789,
                         dst_ip='192.168.7.7',
                         new_ip='2.2.2.2', new_port=11000
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-            ],
-            any_order=True
+            ])
+        )
+        self.assertEqual(len(_created(mock_rulemgr)), 10)
+        # First batch is reconciled at once with the reflective rules.
+        mock_rulemgr.sync_rules.assert_called_once_with(
+            mock.ANY,
+            'proid.foo#124',
+            chains=(treadmill.iptables.VRING_DNAT,
+                    treadmill.iptables.VRING_SNAT)
         )
-        self.assertEqual(mock_rulemgr.create_rule.call_count, 10)
 
-        mock_rulemgr.create_rule.reset_mock()
+        mock_rulemgr.reset_mock()
         ############
-        treadmill.discovery.Discovery.iteritems.return_value = [
+        treadmill.discovery.Discovery.iterbatches.side_effect = _batches([
             ('proid.foo#123:tcp:tcp_ep', 'xxx.xx.com:12345'),
             ('proid.foo#123:udp:udp_ep', 'xxx.xx.com:23456'),
             ('proid.foo#123:tcp:other_tcp_ep', 'xxx.xx.com:34567'),
@@ -203,7 +230,7 @@ class VRingTest(unittest.TestCase):
             ('proid.foo#125:tcp:tcp_ep', None),
             ('proid.foo#125:udp:udp_ep', None),
             ('proid.foo#125:tcp:other_tcp_ep', None),
-        ]
+        ])
 
         vring.run(
             {
@@ -223,120 +250,221 @@ class VRingTest(unittest.TestCase):
             'proid.foo#124'
         )
 
-        mock_rulemgr.create_rule.assert_has_calls(
-            [
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+        self.assertEqual(
+            set(_created(mock_rulemgr)),
+            set([
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='tcp',
                         src_ip='192.168.7.7',
                         dst_ip='3.3.3.3', dst_port=10000,
                         new_ip='192.168.7.7', new_port=10000
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='udp',
                         src_ip='192.168.7.7',
                         dst_ip='3.3.3.3', dst_port=11000,
                         new_ip='192.168.7.7', new_port=11000
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
 
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='tcp',
                         src_ip='192.168.7.7',
                         dst_ip='1.1.1.1', dst_port=10000,
                         new_ip='1.1.1.1', new_port=12345
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_SNAT,
-                    rule=treadmill.firewall.SNATRule(
+                (
+                    treadmill.iptables.VRING_SNAT,
+                    treadmill.firewall.SNATRule(
                         proto='tcp',
                         src_ip='1.1.1.1', src_port=12345,
                         dst_ip='192.168.7.7',
                         new_ip='1.1.1.1', new_port=10000
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='udp',
                         src_ip='192.168.7.7',
                         dst_ip='1.1.1.1', dst_port=11000,
                         new_ip='1.1.1.1', new_port=23456
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_SNAT,
-                    rule=treadmill.firewall.SNATRule(
+                (
+                    treadmill.iptables.VRING_SNAT,
+                    treadmill.firewall.SNATRule(
                         proto='udp',
                         src_ip='1.1.1.1', src_port=23456,
                         dst_ip='192.168.7.7',
                         new_ip='1.1.1.1', new_port=11000
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-            ],
-            any_order=True
+            ])
         )
-        self.assertEqual(mock_rulemgr.create_rule.call_count, 6)
+        self.assertEqual(len(_created(mock_rulemgr)), 6)
         # Check the rule is removed for foo#123 but not foo#125.
-        mock_rulemgr.unlink_rule.assert_has_calls(
-            [
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+        self.assertEqual(
+            set(_unlinked(mock_rulemgr)),
+            set([
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='tcp',
                         src_ip='192.168.7.7',
                         dst_ip='1.1.1.1', dst_port=10000,
                         new_ip='1.1.1.1', new_port=12345
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_SNAT,
-                    rule=treadmill.firewall.SNATRule(
+                (
+                    treadmill.iptables.VRING_SNAT,
+                    treadmill.firewall.SNATRule(
                         proto='tcp',
                         src_ip='1.1.1.1', src_port=12345,
                         dst_ip='192.168.7.7',
                         new_ip='1.1.1.1', new_port=10000
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_DNAT,
-                    rule=treadmill.firewall.DNATRule(
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
                         proto='udp',
                         src_ip='192.168.7.7',
                         dst_ip='1.1.1.1', dst_port=11000,
                         new_ip='1.1.1.1', new_port=23456
-                    ),
-                    owner='proid.foo#124'
+                    )
                 ),
-                mock.call(
-                    chain=treadmill.iptables.VRING_SNAT,
-                    rule=treadmill.firewall.SNATRule(
+                (
+                    treadmill.iptables.VRING_SNAT,
+                    treadmill.firewall.SNATRule(
                         proto='udp',
                         src_ip='1.1.1.1', src_port=23456,
                         dst_ip='192.168.7.7',
                         new_ip='1.1.1.1', new_port=11000
-                    ),
-                    owner='proid.foo#124'
+                    )
+                ),
+            ])
+        )
+        self.assertEqual(len(_unlinked(mock_rulemgr)), 4)
+
+    @mock.patch('treadmill.sysinfo.hostname',
+                mock.Mock(return_value='zzz.xx.com'))
+    @mock.patch('treadmill.rulefile.RuleMgr', mock.Mock(set_spec=True))
+    @mock.patch('socket.gethostbyname', mock.Mock(return_value='3.3.3.3'))
+    @mock.patch('treadmill.discovery.Discovery.iterbatches', mock.Mock())
+    def test_run_no_endpoints(self):
+        """Test vring without any matching endpoint."""
+        mock_discovery = treadmill.discovery.Discovery(None, 'a.a', None)
+        mock_rulemgr = treadmill.rulefile.RuleMgr('/test', '/owners')
+        # Nothing is queued by the initial sync.
+        treadmill.discovery.Discovery.iterbatches.side_effect = [[], []]
+
+        vring.run(
+            {
+                'tcp_ep': {
+                    'port': 10000,
+                    'proto': 'tcp',
+                },
+            },
+            ['tcp_ep'],
+            mock_discovery,
+            mock_rulemgr,
+            '192.168.7.7',
+            'proid.foo#124'
+        )
+
+        # Reflective rules are installed and stale rules reconciled.
+        mock_rulemgr.sync_rules.assert_called_once_with(
+            {
+                (
+                    treadmill.iptables.VRING_DNAT,
+                    treadmill.firewall.DNATRule(
+                        proto='tcp',
+                        src_ip='192.168.7.7',
+                        dst_ip='3.3.3.3', dst_port=10000,
+                        new_ip='192.168.7.7', new_port=10000
+                    )
                 ),
-            ],
-            any_order=True
+            },
+            'proid.foo#124',
+            chains=(treadmill.iptables.VRING_DNAT,
+                    treadmill.iptables.VRING_SNAT)
+        )
+        mock_rulemgr.create_rules.assert_not_called()
+
+    @mock.patch('treadmill.sysinfo.hostname',
+                mock.Mock(return_value='zzz.xx.com'))
+    @mock.patch('socket.gethostbyname', mock.Mock())
+    def test__apply_batch_moved(self):
+        """Test endpoint moving to another host within one batch."""
+        socket.gethostbyname.side_effect = lambda host: {
+            'xxx.xx.com': '1.1.1.1',
+            'yyy.xx.com': '2.2.2.2',
+        }[host]
+        vring_state = {
+            'proid.foo#123:tcp:tcp_ep': ('tcp', '1.1.1.1', 12345),
+        }
+
+        added, deleted = vring._apply_batch(
+            [('proid.foo#123:tcp:tcp_ep', 'yyy.xx.com:45678')],
+            {'tcp_ep': {'port': 10000, 'proto': 'tcp'}},
+            ['tcp_ep'],
+            '192.168.7.7',
+            'zzz.xx.com',
+            treadmill.discovery.HostCache(),
+            vring_state
+        )
+
+        self.assertEqual(
+            vring_state,
+            {'proid.foo#123:tcp:tcp_ep': ('tcp', '2.2.2.2', 45678)}
+        )
+        self.assertEqual(len(deleted), 2)
+        self.assertIn(
+            (
+                treadmill.iptables.VRING_DNAT,
+                treadmill.firewall.DNATRule(
+                    proto='tcp',
+                    src_ip='192.168.7.7',
+                    dst_ip='1.1.1.1', dst_port=10000,
+                    new_ip='1.1.1.1', new_port=12345
+                )
+            ),
+            deleted
+        )
+        self.assertEqual(len(added), 2)
+        self.assertIn(
+            (
+                treadmill.iptables.VRING_DNAT,
+                treadmill.firewall.DNATRule(
+                    proto='tcp',
+                    src_ip='192.168.7.7',
+                    dst_ip='2.2.2.2', dst_port=10000,
+                    new_ip='2.2.2.2', new_port=45678
+                )
+            ),
+            added
+        )
+
+        # Unchanged route in the batch does not touch the rules.
+        added, deleted = vring._apply_batch(
+            [('proid.foo#123:tcp:tcp_ep', 'yyy.xx.com:45678')],
+            {'tcp_ep': {'port': 10000, 'proto': 'tcp'}},
+            ['tcp_ep'],
+            '192.168.7.7',
+            'zzz.xx.com',
+            treadmill.discovery.HostCache(),
+            vring_state
         )
-        self.assertEqual(mock_rulemgr.unlink_rule.call_count, 4)
+        self.assertEqual((added, deleted), ([], []))
 
 
 if __name__ == '__main__':
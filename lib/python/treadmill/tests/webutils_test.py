@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import zlib
 import unittest
 
 import flask
@@ -67,6 +68,45 @@ class WebUtilsTest(unittest.TestCase):
             m_api, 'treadmill_foo.rest.api.allocation_group', 'foo')
         self.assertEqual(ns, 'allocation-group')
 
+    def test_opt_gzip(self):
+        """Tests opt_gzip() compresses streamed responses as a stream."""
+        app = flask.Flask(__name__)
+
+        def _lines():
+            yield 'line 1\n'
+            yield 'line 2\n'
+
+        @webutils.opt_gzip
+        def stream():
+            """Return a streamed response."""
+            return flask.Response(_lines(), mimetype='text/plain')
+
+        @webutils.opt_gzip
+        def data():
+            """Return a buffered response."""
+            return flask.Response('line 1\n', mimetype='text/plain')
+
+        with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+            resp = stream()
+            self.assertTrue(resp.is_streamed)
+            self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+            self.assertNotIn('Content-Length', resp.headers)
+            self.assertEqual(
+                zlib.decompress(b''.join(resp.response),
+                                16 + zlib.MAX_WBITS),
+                b'line 1\nline 2\n'
+            )
+
+            resp = data()
+            self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(
+                zlib.decompress(resp.data, 16 + zlib.MAX_WBITS), b'line 1\n'
+            )
+
+        with app.test_request_context():
+            resp = stream()
+            self.assertNotIn('Content-Encoding', resp.headers)
+
 
 if __name__ == '__main__':
     unittest.main()
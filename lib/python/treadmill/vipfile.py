@@ -6,8 +6,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import errno
-import glob
 import logging
 import os
 
@@ -18,10 +18,47 @@ from treadmill import fs
 
 _LOGGER = logging.getLogger(__name__)
 
+#: Number of addresses in the 192.168.0.0/16 vIP range.
+_VIP_COUNT = 256 ** 2
+
+
+def _valid_index(index):
+    """Whether the vIP of the given index can be allocated.
+    """
+    major, minor = (index >> 8), (index & 0xff)
+    return major != 128 and minor != 0
+
+
+def _index_ip(index):
+    """vIP of the given index.
+    """
+    return '192.168.{major}.{minor}'.format(major=(index >> 8),
+                                            minor=(index & 0xff))
+
+
+def _ip_index(ip):
+    """Index of the given vIP, or ``None`` if it is not a vIP.
+    """
+    try:
+        (net0, net1, major, minor) = [int(octet) for octet in ip.split('.')]
+    except ValueError:
+        return None
+
+    if (net0, net1) != (192, 168) or not (0 <= major < 256 and
+                                          0 <= minor < 256):
+        return None
+
+    return (major << 8) | minor
+
 
 class VipMgr:
     """VIP allocation manager.
 
+    The allocated vIPs are symlinks, named after the vIP, to their owner. They
+    are the durable record of the allocations. The manager keeps a bitmap of
+    the allocated vIPs and a queue of the free ones, rebuilt from the links
+    when created.
+
     :param basepath:
         Base directory that will contain all the allocated VIPs.
     :type basepath:
@@ -30,6 +67,9 @@ class VipMgr:
     __slots__ = (
         '_base_path',
         '_owner_path',
+        '_allocated',
+        '_free',
+        '_owners',
     )
 
     def __init__(self, path, owner_path):
@@ -37,11 +77,13 @@ class VipMgr:
         fs.mkdir_safe(path)
         self._base_path = os.path.realpath(path)
         self._owner_path = os.path.realpath(owner_path)
+        self._load()
 
     def initialize(self):
         """Initialize the vip folder."""
-        for vip in glob.glob(os.path.join(self._base_path, '*')):
-            os.unlink(vip)
+        for vip in os.listdir(self._base_path):
+            os.unlink(os.path.join(self._base_path, vip))
+        self._load()
 
     def alloc(self, owner, picked_ip=None):
         """Atomically allocates virtual IP pair for the container.
@@ -53,22 +95,17 @@ class VipMgr:
                 )
             return picked_ip
 
-        for index in six.moves.range(0, 256**2):
-            major, minor = (index >> 8), (index % 256)
-            if major in [128, 256]:
+        while self._free:
+            index = self._free.popleft()
+            if self._allocated[index]:
+                # Allocated by pick since it was freed.
                 continue
-            if minor in [0, 256]:
-                continue
-            ip = '192.168.{major}.{minor}'.format(major=major, minor=minor)
-            if not self._alloc(owner, ip):
-                continue
-            # We were able to grab the IP.
-            break
+            ip = _index_ip(index)
+            if self._alloc(owner, ip):
+                # We were able to grab the IP.
+                return ip
 
-        else:
-            raise Exception('Unabled to find free IP for %r' % owner)
-
-        return ip
+        raise Exception('Unabled to find free IP for %r' % owner)
 
     def free(self, owner, owned_ip):
         """Atomically frees virtual IP associated with the container.
@@ -89,57 +126,102 @@ class VipMgr:
             else:
                 raise
 
+        self._release(owned_ip)
+
     def garbage_collect(self):
         """Garbage collect all VIPs without owner.
         """
-        allocated = glob.glob(
-            os.path.join(self._base_path, '*')
-        )
-        for link in allocated:
+        owners = set(os.listdir(self._owner_path))
+        for index, ip_owner in list(six.iteritems(self._owners)):
+            if ip_owner in owners:
+                continue
+
+            ip = _index_ip(index)
+            _LOGGER.warning('Reclaimed: %r', ip)
             try:
-                _link_st = os.stat(link)
+                os.unlink(os.path.join(self._base_path, ip))
             except OSError as err:
                 if err.errno == errno.ENOENT:
-                    _LOGGER.warning('Reclaimed: %r', link)
-                    try:
-                        os.unlink(link)
-                    except OSError as err:
-                        if err.errno == errno.ENOENT:
-                            pass
-                        else:
-                            raise
+                    pass
                 else:
                     raise
+            self._release(ip)
 
     def list(self):
         """List all allocated IPs and their owner
         """
-        ips = []
-        allocated = glob.glob(
-            os.path.join(self._base_path, '*')
-        )
-        for link in allocated:
+        return [
+            (_index_ip(index), ip_owner)
+            for index, ip_owner in sorted(six.iteritems(self._owners))
+        ]
+
+    def _load(self):
+        """Rebuild the allocation state from the vIP links.
+        """
+        self._allocated = bytearray(_VIP_COUNT)
+        self._owners = {}
+        for vip in os.listdir(self._base_path):
+            index = _ip_index(vip)
+            if index is None:
+                continue
             try:
-                ip_owner = os.readlink(link)
+                ip_owner = os.readlink(os.path.join(self._base_path, vip))
             except OSError as err:
                 if err.errno == errno.EINVAL:
                     # not a link
                     continue
                 raise
-            ips.append((os.path.basename(link), os.path.basename(ip_owner)))
+            self._allocated[index] = 1
+            self._owners[index] = os.path.basename(ip_owner)
 
-        return ips
+        self._free = collections.deque(
+            index
+            for index in six.moves.range(_VIP_COUNT)
+            if _valid_index(index) and not self._allocated[index]
+        )
 
     def _alloc(self, owner, new_ip):
         """Atomaticly grab an IP for an owner.
         """
         ip_file = os.path.join(self._base_path, new_ip)
         owner_file = os.path.join(self._owner_path, owner)
+        index = _ip_index(new_ip)
         try:
             os.symlink(os.path.relpath(owner_file, self._base_path), ip_file)
             _LOGGER.debug('Allocated %r for %r', new_ip, owner)
         except OSError as err:
             if err.errno == errno.EEXIST:
+                if index is not None and not self._allocated[index]:
+                    # Allocated outside of this manager, track it.
+                    self._track(index, ip_file)
                 return False
             raise
+
+        if index is not None:
+            self._allocated[index] = 1
+            self._owners[index] = owner
         return True
+
+    def _track(self, index, ip_file):
+        """Record an allocation found on disk.
+        """
+        try:
+            ip_owner = os.path.basename(os.readlink(ip_file))
+        except OSError as err:
+            if err.errno in (errno.ENOENT, errno.EINVAL):
+                return
+            raise
+        self._allocated[index] = 1
+        self._owners[index] = ip_owner
+
+    def _release(self, ip):
+        """Mark a vIP as free, it is handed out after the other free vIPs.
+        """
+        index = _ip_index(ip)
+        if index is None or not self._allocated[index]:
+            return
+
+        self._allocated[index] = 0
+        del self._owners[index]
+        if _valid_index(index):
+            self._free.append(index)
@@ -13,6 +13,7 @@ from __future__ import unicode_literals
 import logging
 import socket
 
+from treadmill import discovery as discovery_mod
 from treadmill import firewall
 from treadmill import iptables
 from treadmill import sysinfo
@@ -29,13 +30,14 @@ def run(routing, endpoints, discovery, rulemgr, ip_owner, rules_owner):
     :param endpoints:
         The set of endpoints to monitor.
     :param discovery:
-        The treadmill.discovery object/iterator. Loop over discovery never
-        ends, and it yields results in a form:
+        The treadmill.discovery object, already synced. Loop over
+        discovery.iterbatches() never ends, and it yields batches of changes,
+        each in a form:
         appname:endpoint hostname:port
         appname:endpoint
 
         Absense of hostname:port indicates that given endpoint no longer
-        exists.
+        exists. The whole batch is applied at once.
     :param ``RuleMgr`` rulemgr:
         Firewall rule manager instance.
     :param ``str`` rules_owner:
@@ -49,7 +51,8 @@ def run(routing, endpoints, discovery, rulemgr, ip_owner, rules_owner):
     _LOGGER.info('Starting vring: %r %r %r %r %r',
                  local_host, ip_owner, rules_owner, routing, endpoints)
 
-    # Add reflective rules back to the container
+    # Reflective rules back to the container
+    reflective_rules = set()
     for endpoint in endpoints:
         dnat_rule = firewall.DNATRule(
             proto=routing[endpoint]['proto'],
@@ -59,12 +62,63 @@ def run(routing, endpoints, discovery, rulemgr, ip_owner, rules_owner):
             new_ip=ip_owner,
             new_port=routing[endpoint]['port']
         )
-        rulemgr.create_rule(chain=iptables.VRING_DNAT,
-                            rule=dnat_rule,
-                            owner=rules_owner)
+        reflective_rules.add((iptables.VRING_DNAT, dnat_rule))
 
+    host_cache = discovery_mod.HostCache()
     vring_state = {}
-    for (app, hostport) in discovery.iteritems():
+
+    # The initial discovery sync queues the full snapshot of the matching
+    # endpoints (nothing when no endpoint matches). Reconcile the whole rule
+    # set at once, this also removes rules left over by a previous run.
+    snapshot_rules = set(reflective_rules)
+    for batch in discovery.iterbatches(block=False):
+        added, deleted = _apply_batch(batch, routing, endpoints, ip_owner,
+                                      local_host, host_cache, vring_state)
+        snapshot_rules.difference_update(deleted)
+        snapshot_rules.update(added)
+
+    rulemgr.sync_rules(
+        snapshot_rules,
+        rules_owner,
+        chains=(iptables.VRING_DNAT, iptables.VRING_SNAT)
+    )
+
+    for batch in discovery.iterbatches():
+        added, deleted = _apply_batch(batch, routing, endpoints, ip_owner,
+                                      local_host, host_cache, vring_state)
+        rulemgr.unlink_rules(deleted, rules_owner)
+        rulemgr.create_rules(added, rules_owner)
+
+
+def _apply_batch(batch, routing, endpoints, ip_owner, local_host, host_cache,
+                 vring_state):
+    """Apply a batch of discovery changes to the vring state.
+
+    :returns:
+        ``tuple`` -- Lists of (chain, rule) to add and to delete.
+    """
+    added = []
+    deleted = []
+
+    # Deletions first, an updated endpoint is a delete followed by an add.
+    for app, hostport in batch:
+        vring_route = vring_state.pop(app, None)
+        if not vring_route:
+            continue
+
+        _name, _proto, endpoint = app.split(':')
+        private_port = int(routing[endpoint]['port'])
+        _LOGGER.info('del vring route: %r', vring_route)
+        proto, ipaddr, public_port = vring_route
+        dnat_rule, snat_rule = _vring_rules(
+            proto, ip_owner, ipaddr, private_port, public_port
+        )
+        deleted.append((iptables.VRING_DNAT, dnat_rule))
+        deleted.append((iptables.VRING_SNAT, snat_rule))
+
+    for app, hostport in batch:
+        if not hostport:
+            continue
         # app is in the form appname:endpoint. We care only about endpoint
         # name.
         _name, proto, endpoint = app.split(':')
@@ -74,70 +128,50 @@ def run(routing, endpoints, discovery, rulemgr, ip_owner, rules_owner):
             continue
 
         private_port = int(routing[endpoint]['port'])
-        if hostport:
-            host, public_port = hostport.split(':')
-
-            if host == local_host:
-                continue
-
-            try:
-                ipaddr = socket.gethostbyname(host)
-            except socket.gaierror as err:
-                _LOGGER.warning('Error resolving %r(%s), skipping.', host, err)
-                continue
-            public_port = int(public_port)
-            vring_route = (proto, ipaddr, public_port)
-            _LOGGER.info('add vring route: %r', vring_route)
-            vring_state[app] = vring_route
-            dnat_rule = firewall.DNATRule(
-                proto=proto,
-                src_ip=ip_owner,
-                dst_ip=ipaddr,
-                dst_port=private_port,
-                new_ip=ipaddr,
-                new_port=public_port
-            )
-            snat_rule = firewall.SNATRule(
-                proto=proto,
-                src_ip=ipaddr,
-                src_port=public_port,
-                dst_ip=ip_owner,
-                new_ip=ipaddr,
-                new_port=private_port
-            )
-            rulemgr.create_rule(chain=iptables.VRING_DNAT,
-                                rule=dnat_rule,
-                                owner=rules_owner)
-            rulemgr.create_rule(chain=iptables.VRING_SNAT,
-                                rule=snat_rule,
-                                owner=rules_owner)
-
-        else:
-            vring_route = vring_state.pop(app, None)
-            if not vring_route:
-                continue
-
-            _LOGGER.info('del vring route: %r', vring_route)
-            proto, ipaddr, public_port = vring_route
-            dnat_rule = firewall.DNATRule(
-                proto=proto,
-                src_ip=ip_owner,
-                dst_ip=ipaddr,
-                dst_port=private_port,
-                new_ip=ipaddr,
-                new_port=public_port
-            )
-            snat_rule = firewall.SNATRule(
-                proto=proto,
-                src_ip=ipaddr,
-                src_port=public_port,
-                dst_ip=ip_owner,
-                new_ip=ipaddr,
-                new_port=private_port,
-            )
-            rulemgr.unlink_rule(chain=iptables.VRING_DNAT,
-                                rule=dnat_rule,
-                                owner=rules_owner)
-            rulemgr.unlink_rule(chain=iptables.VRING_SNAT,
-                                rule=snat_rule,
-                                owner=rules_owner)
+        host, public_port = hostport.split(':')
+
+        if host == local_host:
+            continue
+
+        try:
+            ipaddr = host_cache.resolve(host)
+        except socket.gaierror as err:
+            _LOGGER.warning('Error resolving %r(%s), skipping.', host, err)
+            continue
+        public_port = int(public_port)
+        vring_route = (proto, ipaddr, public_port)
+        _LOGGER.info('add vring route: %r', vring_route)
+        vring_state[app] = vring_route
+        dnat_rule, snat_rule = _vring_rules(
+            proto, ip_owner, ipaddr, private_port, public_port
+        )
+        added.append((iptables.VRING_DNAT, dnat_rule))
+        added.append((iptables.VRING_SNAT, snat_rule))
+
+    # A route deleted and re-added unchanged needs no rule change.
+    unchanged = set(added) & set(deleted)
+    return (
+        [rule for rule in added if rule not in unchanged],
+        [rule for rule in deleted if rule not in unchanged],
+    )
+
+
+def _vring_rules(proto, ip_owner, ipaddr, private_port, public_port):
+    """Return the (DNAT, SNAT) rules pair of a vring route."""
+    dnat_rule = firewall.DNATRule(
+        proto=proto,
+        src_ip=ip_owner,
+        dst_ip=ipaddr,
+        dst_port=private_port,
+        new_ip=ipaddr,
+        new_port=public_port
+    )
+    snat_rule = firewall.SNATRule(
+        proto=proto,
+        src_ip=ipaddr,
+        src_port=public_port,
+        dst_ip=ip_owner,
+        new_ip=ipaddr,
+        new_port=private_port
+    )
+    return dnat_rule, snat_rule
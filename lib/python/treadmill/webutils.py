@@ -14,6 +14,7 @@ import json
 import logging
 import re
 import shutil
+import zlib
 
 import flask
 import six
@@ -375,6 +376,14 @@ def opt_gzip(func):
         if 'gzip' not in accept_encodings.lower():
             return response
 
+        if response.is_streamed:
+            # Compress the chunks as they are produced instead of reading
+            # the whole stream in memory.
+            response.response = _gzip_stream(response.response)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = 'gzip'
+            return response
+
         uncompressed = response.data
         if not isinstance(response.data, io.IOBase):
             uncompressed = io.BytesIO(response.data)
@@ -391,3 +400,21 @@ def opt_gzip(func):
         return response
 
     return decorated_function
+
+
+def _gzip_stream(chunks):
+    """Gzip a stream of response chunks."""
+    compressor = zlib.compressobj(
+        zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+    )
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, six.text_type):
+                chunk = chunk.encode()
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()